@@ -105,6 +105,8 @@ class CSVSource(weeimport.Source):
                                                                              self.interval,
                                                                              self.raw_datetime_format)
         self.wlog.verboselog(syslog.LOG_DEBUG, _msg)
+        _msg = "     processes=%s" % (self.processes, )
+        self.wlog.verboselog(syslog.LOG_DEBUG, _msg)
         _msg = "     rain=%s, wind_direction=%s" % (self.rain, self.wind_dir)
         self.wlog.verboselog(syslog.LOG_DEBUG, _msg)
         _msg = "     UV=%s, radiation=%s" % (self.UV_sensor, self.solar_sensor)
@@ -131,10 +133,13 @@ class CSVSource(weeimport.Source):
     def getRawData(self, period):
         """Obtain an iterable containing the raw data to be imported.
 
-        Raw data is read and any clean-up/pre-processing carried out before the
-        iterable is returned. In this case we will use csv.Dictreader(). The
-        iterable should be of a form where the field names in the field map can
-        be used to map the data to the weeWX archive record format.
+        Raw data is read and any clean-up/pre-processing carried out as the
+        iterable is consumed. In this case we will use csv.Dictreader() over a
+        generator that reads and cleans the source file a line at a time, so
+        the source file is never held in memory. Each time the iterable is
+        iterated the source file is read afresh. The iterable should be of a
+        form where the field names in the field map can be used to map the
+        data to the weeWX archive record format.
 
         Input parameters:
 
@@ -143,32 +148,42 @@ class CSVSource(weeimport.Source):
         """
 
         # does our source exist?
-        if os.path.isfile(self.source):
-            with open(self.source, 'r') as f:
-                _raw_data = f.readlines()
-        else:
+        if not os.path.isfile(self.source):
             # if it doesn't we can't go on so raise it
             raise weeimport.WeeImportIOError(
                 "CSV source file '%s' could not be found." % self.source)
 
-        # just in case the data has been sourced from the web we will remove
-        # any HTML tags and blank lines that may exist
-        _clean_data = []
-        for _row in _raw_data:
-            # get rid of any HTML tags
-            _line = ''.join(CSVSource._tags.split(_row))
-            if _line != "\n":
-                # save anything that is not a blank line
-                _clean_data.append(_line)
-
-        # create a dictionary CSV reader, using the first line as the set of keys
-        _csv_reader = csv.DictReader(_clean_data)
+        # create a dictionary CSV reader, using the first line as the set of
+        # keys
+        _csv_reader = csv.DictReader(self.genCleanLines(self.source))
 
         # finally, get our source-to-database mapping
         self.map = self.parseMap('CSV', _csv_reader, self.csv_config_dict)
 
-        # return our CSV dict reader
-        return _csv_reader
+        # return an iterable that creates a CSV dict reader each time it is
+        # iterated
+        return weeimport.RawData(lambda: csv.DictReader(self.genCleanLines(self.source)))
+
+    @staticmethod
+    def genCleanLines(source):
+        """Generator function yielding the cleaned lines of a CSV file.
+
+        Just in case the data has been sourced from the web we will remove any
+        HTML tags and blank lines that may exist. The file is read a line at a
+        time and is closed once the generator is exhausted.
+
+        Input parameters:
+
+            source: the file name, including path, of the CSV file.
+        """
+
+        with open(source, 'r') as f:
+            for _row in f:
+                # get rid of any HTML tags
+                _line = ''.join(CSVSource._tags.split(_row))
+                if _line != "\n":
+                    # yield anything that is not a blank line
+                    yield _line
 
     def period_generator(self):
         """Generator function to control import processing in run() for CSV
@@ -11,8 +11,10 @@ observational data for use with weeimport.
 from __future__ import with_statement
 
 # Python imports
+import collections
 import csv
 import glob
+import mmap
 import os
 import syslog
 import time
@@ -122,6 +124,13 @@ class CumulusSource(weeimport.Source):
 
         # initialise our import field-to-weeWX archive field map
         self.map = None
+        # Initialise our column plan. The column plan is derived from the
+        # field map and lists the monthly log columns that need to be parsed.
+        self.plan = None
+        # Monthly log files being parsed in advance by our pool of worker
+        # processes, keyed by file name. Populated by period_generator() and
+        # consumed by getRawData().
+        self._parsed = {}
 
         # Cumulus log files have a number of 'rain' fields that can be used to
         # derive the weeWX rain field. Which one is available depends on the
@@ -236,6 +245,8 @@ class CumulusSource(weeimport.Source):
         _msg = "     tranche=%s, interval=%s" % (self.tranche,
                                                  self.interval)
         self.wlog.verboselog(syslog.LOG_DEBUG, _msg)
+        _msg = "     processes=%s" % (self.processes, )
+        self.wlog.verboselog(syslog.LOG_DEBUG, _msg)
         _msg = "     UV=%s, radiation=%s" % (self.UV_sensor, self.solar_sensor)
         self.wlog.verboselog(syslog.LOG_DEBUG, _msg)
         _msg = "Using database binding '%s', which is bound to database '%s'" % (self.db_binding_wx,
@@ -265,6 +276,11 @@ class CumulusSource(weeimport.Source):
         needs to be cleaned of unnecessary characters/codes, a date-time field
         generated for each row and an iterable returned.
 
+        Each monthly log file is memory mapped and parsed a line at a time as
+        the iterable is consumed. Only those columns in our column plan are
+        parsed. If more than one process is being used the monthly log file
+        will normally have been parsed in advance by period_generator().
+
         Input parameters:
 
             period: the file name, including path, of the Cumulus monthly log
@@ -272,51 +288,45 @@ class CumulusSource(weeimport.Source):
         """
 
         # period holds the filename of the monthly log file that contains our
-        # data. Does our source exist?
-        if os.path.isfile(period):
-            with open(period, 'r') as f:
-                _raw_data = f.readlines()
-        else:
+        # data. Has it been parsed in advance?
+        if period in self._parsed:
+            _values = self._parsed.pop(period).get()
+            return weeimport.RawData(lambda: _gen_rows_from_values(_values, self.plan))
+        # Does our source exist?
+        if not os.path.isfile(period):
             # If it doesn't we can't go on so raise it
             raise weeimport.WeeImportIOError(
                 "Cumulus monthly log file '%s' could not be found." % period)
 
-        # Our raw data needs a bit of cleaning up before we can parse/map it.
-        _clean_data = []
-        for _row in _raw_data:
-            # Make sure we have full stops as decimal points
-            _line = _row.replace(self.decimal, '.')
-            # Ignore any blank lines
-            if _line != "\n":
-                # Cumulus has separate date and time fields as the first 2
-                # fields of a row. It is easier to combine them now into a
-                # single date-time field that we can parse later when we map the
-                # raw data.
-                _datetime_line = _line.replace(self.delimiter, ' ', 1)
-                # Save what's left
-                _clean_data.append(_datetime_line)
-
         # if we haven't confirmed our source for the weeWX rain field we need
         # to do so now
         if self.rain_source_confirmed is None:
             # The Cumulus source field depends on the Cumulus version that
             # created the log files. Unfortunately, we can only determine
-            # which field to use by looking at the mapped Cumulus data. If we
-            # look at our DictReader we have no way to reset it, so we create
-            # a one off DictReader to use instead.
-            _rain_reader = csv.DictReader(_clean_data, fieldnames=self._field_list,
-                                          delimiter=self.delimiter)
+            # which field to use by looking at the mapped Cumulus data, so
+            # parse the log file with a plan that includes every field.
+            _full_plan = _make_plan(self._field_list)
+            _rain_reader = _gen_rows(_gen_log_lines(period), self.delimiter,
+                                     self.decimal, self.raw_datetime_format,
+                                     _full_plan)
             # now that we know what Cumulus fields are available we can set our
             # rain source appropriately
             self.set_rain_source(_rain_reader)
 
-        # Now create a dictionary CSV reader
-        _reader = csv.DictReader(_clean_data, fieldnames=self._field_list,
-                                 delimiter=self.delimiter)
-        # Finally, get our database-source mapping
-        self.map = self.parseMap('Cumulus', _reader, self.cumulus_config_dict)
-        # Return our dict reader
-        return _reader
+        # Get our database-source mapping and our column plan, we need only do
+        # this once
+        if self.plan is None:
+            self.map = self.parseMap('Cumulus',
+                                     csv.DictReader([], fieldnames=self._field_list),
+                                     self.cumulus_config_dict)
+            self.plan = _make_plan([_val['field_name'] for _val in self.map.itervalues()
+                                    if 'field_name' in _val])
+
+        # Return an iterable that parses our rows afresh each time it is
+        # iterated
+        return weeimport.RawData(lambda: _gen_rows(_gen_log_lines(period), self.delimiter,
+                                                   self.decimal, self.raw_datetime_format,
+                                                   self.plan))
 
     def period_generator(self):
         """Generator function yielding a sequence of monthly log file names.
@@ -325,15 +335,44 @@ class CumulusSource(weeimport.Source):
         that loops over the monthly log files to be imported. The generator
         yields a monthly log file name from the list of monthly log files to
         be imported until the list is exhausted. The generator also sets the
-        first_period and last_period properties."""
-
-        # Step through each of our file names
-        for month in self.log_list:
-            # Set flags for first period (month) and last period (month)
-            self.first_period = (month == self.log_list[0])
-            self.last_period = (month == self.log_list[-1])
-            # Yield the file name
-            yield month
+        first_period and last_period properties.
+
+        If more than one process is being used, once the column plan is known
+        upcoming monthly log files are parsed in advance by our pool of worker
+        processes, no more than two files per process ahead. Files are still
+        yielded in date order so records reach the archive in timestamp
+        order. Unlike a file parsed in this process, a file parsed in advance
+        is held in memory in full, as a list of tuples of the planned column
+        values, until it has been imported."""
+
+        _pending = collections.deque()
+        _next = 0
+        try:
+            # Step through each of our file names
+            for _i, month in enumerate(self.log_list):
+                # parse upcoming monthly logs in advance if we can
+                if self.processes > 1 and self.plan is not None:
+                    _next = max(_next, _i)
+                    while _next < len(self.log_list) and len(_pending) < 2 * self.processes:
+                        _fn = self.log_list[_next]
+                        if os.path.isfile(_fn):
+                            self._parsed[_fn] = self.getPool().apply_async(_parse_log,
+                                                                           (_fn,
+                                                                            self.delimiter,
+                                                                            self.decimal,
+                                                                            self.raw_datetime_format,
+                                                                            self.plan))
+                            _pending.append(_fn)
+                        _next += 1
+                # Set flags for first period (month) and last period (month)
+                self.first_period = (month == self.log_list[0])
+                self.last_period = (month == self.log_list[-1])
+                # Yield the file name
+                yield month
+                if _pending and _pending[0] == month:
+                    _pending.popleft()
+        finally:
+            self._parsed.clear()
 
     def set_rain_source(self, _data):
         """Set the Cumulus field to be used as the weeWX rain field source."""
@@ -358,4 +397,122 @@ class CumulusSource(weeimport.Source):
             del self._header_map['midnight_rain']
         # we only need to do this once so set our flag to True
         self.rain_source_confirmed = True
-        return
\ No newline at end of file
+        return
+
+
+# ============================================================================
+#                             Utility functions
+# ============================================================================
+
+
+def _make_plan(field_names):
+    """Make a column plan for parsing monthly log lines.
+
+    Cumulus monthly log columns 0 and 1 hold the date and time. These are
+    combined into field 'datetime', all other fields follow in
+    CumulusSource._field_list order.
+
+    Input parameters:
+
+        field_names: the names of the fields to be parsed.
+
+    Returns a list of (column index, field name) tuples for those fields other
+    than 'datetime' in field_names.
+    """
+
+    return [(_i + 1, _name) for (_i, _name) in enumerate(CumulusSource._field_list)
+            if _i > 0 and _name in field_names]
+
+
+def _gen_log_lines(filename):
+    """Generator function yielding the lines of a memory mapped log file."""
+
+    with open(filename, 'rb') as f:
+        try:
+            _m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # an empty file cannot be mapped, there is nothing to yield
+            return
+        try:
+            for _line in iter(_m.readline, ''):
+                yield _line
+        finally:
+            _m.close()
+
+
+def _gen_values(lines, delimiter, decimal, datetime_format, plan):
+    """Generator function yielding monthly log rows as tuples.
+
+    Each line is split once. The date and time columns are combined and
+    converted to a unix epoch timestamp, which is the first value of the
+    tuple. The other values are those of the columns in plan, in plan order.
+    Values that are missing from a line are None.
+
+    Input parameters:
+
+        lines: iterable yielding monthly log lines.
+
+        delimiter: monthly log field delimiter.
+
+        decimal: monthly log decimal separator.
+
+        datetime_format: format of the combined date and time columns.
+
+        plan: column plan as returned by _make_plan().
+    """
+
+    for _line in lines:
+        _line = _line.rstrip('\r\n')
+        # ignore any blank lines
+        if not _line:
+            continue
+        _cols = _line.split(delimiter)
+        _raw_datetime = ' '.join(_cols[0:2])
+        try:
+            _ts = int(time.mktime(time.strptime(_raw_datetime, datetime_format)))
+        except ValueError:
+            raise ValueError("Invalid 'datetime' field. Cannot convert '%s' to timestamp." % _raw_datetime)
+        _ncols = len(_cols)
+        # make sure we have full stops as decimal points
+        yield (str(_ts),) + tuple(_cols[_i].replace(decimal, '.') if _i < _ncols else None
+                                  for (_i, _name) in plan)
+
+
+def _gen_rows_from_values(values, plan):
+    """Generator function yielding monthly log rows as dicts.
+
+    Input parameters:
+
+        values: iterable yielding tuples as yielded by _gen_values().
+
+        plan: the column plan the values were parsed with.
+    """
+
+    _names = ['datetime'] + [_name for (_i, _name) in plan]
+    for _vals in values:
+        yield dict(zip(_names, _vals))
+
+
+def _gen_rows(lines, delimiter, decimal, datetime_format, plan):
+    """Generator function yielding monthly log rows as dicts.
+
+    The date and time columns are combined in field 'datetime', only those
+    other columns in plan are included in the row. Fields that are missing
+    from a line are set to None. See _gen_values() for the input parameters.
+    """
+
+    return _gen_rows_from_values(_gen_values(lines, delimiter, decimal,
+                                             datetime_format, plan),
+                                 plan)
+
+
+def _parse_log(filename, delimiter, decimal, datetime_format, plan):
+    """Parse a monthly log file in a worker process.
+
+    The whole file is parsed, as it is passed back to the parent process in
+    one piece. To keep it small, returns a list of the tuples yielded by
+    _gen_values() rather than a list of dicts.
+    """
+
+    return list(_gen_values(_gen_log_lines(filename), delimiter, decimal,
+                            datetime_format, plan))
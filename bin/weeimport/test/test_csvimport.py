@@ -0,0 +1,263 @@
+#
+#    Copyright (c) 2009-2017 Tom Keffer <tkeffer@gmail.com>
+#
+#    See the file LICENSE.txt for your full rights.
+#
+"""Test importing a CSV file."""
+
+from __future__ import with_statement
+import __builtin__
+import os
+import StringIO
+import sys
+import syslog
+import time
+import unittest
+
+import configobj
+
+import schemas.wview
+import weeimport.weeimport
+import weeimport.csvimport
+import weewx.manager
+
+test_root = '/var/tmp/weewx_test'
+csv_path = os.path.join(test_root, 'csvimport_test.csv')
+db_path = os.path.join(test_root, 'csvimport_test.sdb')
+
+config_dict = {
+    'WEEWX_ROOT'  : test_root,
+    'Station'     : {'altitude': ['100', 'meter'], 'latitude': '45.686', 'longitude': '-121.566'},
+    'StdConvert'  : {'target_unit': 'US'},
+    'StdArchive'  : {'data_binding': 'wx_binding', 'archive_interval': '300'},
+    'DataBindings': {'wx_binding': {'database'  : 'csv_sqlite',
+                                    'table_name': 'archive',
+                                    'manager'   : 'weewx.wxmanager.WXDaySummaryManager',
+                                    'schema'    : 'schemas.wview.schema'}},
+    'Databases'   : {'csv_sqlite': {'root'         : test_root,
+                                    'database_name': 'csvimport_test.sdb',
+                                    'driver'       : 'weedb.sqlite'}}}
+
+# 2017-07-01 00:00
+start_ts = int(time.mktime((2017, 7, 1, 0, 0, 0, 0, 0, -1)))
+
+def make_rows(nrows, gap_at=None):
+    """Rows of five minute records. If gap_at is given, the record at that
+    row, and the ones after it, are five minutes late."""
+    rows = []
+    for i in range(nrows):
+        ts = start_ts + 300 * i + (300 if gap_at is not None and i >= gap_at else 0)
+        rows.append({'timestamp': str(ts), 'Temp': '%.1f' % (60.0 + i % 17),
+                     'barometer': '%.3f' % (30.0 + 0.001 * i), 'dayrain': '%.2f' % (0.01 * (i / 3))})
+    return rows
+
+def write_csv(rows):
+    with open(csv_path, 'w') as f:
+        f.write('timestamp,Temp,barometer,dayrain\n')
+        for row in rows:
+            f.write('%(timestamp)s,%(Temp)s,%(barometer)s,%(dayrain)s\n' % row)
+
+def archived():
+    """The records committed to the archive, as (dateTime, interval, outTemp,
+    rain)"""
+    if not os.path.exists(db_path):
+        return []
+    with weewx.manager.Manager.open({'database_name': db_path, 'driver': 'weedb.sqlite'}) as manager:
+        return [(r['dateTime'], r['interval'], r['outTemp'], r['rain'])
+                for r in manager.genBatchRecords()]
+
+def write_weather_csv(nrows):
+    """Five minute records of temperature, humidity, wind, radiation and
+    rain, from which rainRate, ET and windrun can be calculated."""
+    with open(csv_path, 'w') as f:
+        f.write('timestamp,Temp,humidity,windspeed,radiation,barometer,dayrain\n')
+        for i in range(nrows):
+            f.write('%d,%.1f,%d,%.1f,%d,%.3f,%.2f\n' % (start_ts + 300 * i, 60.0 + i % 17,
+                                                      40 + i % 50, 2.0 + i % 7, 10 * i,
+                                                      30.0 + 0.001 * i, 0.01 * (i / 3)))
+
+def archived_records():
+    """The records committed to the archive, in full"""
+    with weewx.manager.Manager.open({'database_name': db_path, 'driver': 'weedb.sqlite'}) as manager:
+        return list(manager.genBatchRecords())
+
+class Options(object):
+    date = None
+    date_from = None
+    date_to = None
+    dry_run = False
+    verbose = False
+
+class StandInInput(object):
+    """Stands in for raw_input(), giving the answers it is given, and noting
+    how many records had been saved each time it was asked."""
+
+    def __init__(self, answers):
+        self.answers = list(answers)
+        self.saved = []
+
+    def __call__(self, prompt):
+        self.saved.append(len(archived()))
+        return self.answers.pop(0)
+
+
+class CSVImportTest(unittest.TestCase):
+
+    def setUp(self):
+        syslog.openlog('test_csvimport', syslog.LOG_CONS)
+        if not os.path.exists(test_root):
+            os.makedirs(test_root)
+        for path in (csv_path, db_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.raw_input = __builtin__.raw_input
+
+    def tearDown(self):
+        __builtin__.raw_input = self.raw_input
+
+    def get_source(self, config_dict=config_dict, **options):
+        csv_config_dict = {'file'        : csv_path,
+                           'interval'    : 'derive',
+                           'qc'          : False,
+                           'calc_missing': False,
+                           'tranche'     : 10,
+                           'rain'        : 'cumulative',
+                           'FieldMap'    : {'dateTime' : ['timestamp', 'unix_epoch'],
+                                            'outTemp'  : ['Temp', 'degree_F'],
+                                            'barometer': ['barometer', 'inHg'],
+                                            'rain'     : ['dayrain', 'inch']}}
+        csv_config_dict.update(options)
+        log = weeimport.weeimport.WeeImportLog(None, False, False)
+        # CSVSource tells the user what it is about to import
+        stdout, sys.stdout = sys.stdout, StringIO.StringIO()
+        try:
+            return weeimport.csvimport.CSVSource(config_dict, 'weewx.conf', csv_config_dict,
+                                                 'csv.conf', Options(), log)
+        finally:
+            sys.stdout = stdout
+
+    def run_import(self, source, answers):
+        """Run an import, giving the answers to its questions. Returns the
+        number of records saved each time a question was asked."""
+        __builtin__.raw_input = StandInInput(answers)
+        stdout, sys.stdout = sys.stdout, StringIO.StringIO()
+        try:
+            source.run()
+        finally:
+            self.output = sys.stdout.getvalue()
+            sys.stdout = stdout
+        return __builtin__.raw_input.saved
+
+    def test_import(self):
+        rows = make_rows(35)
+        write_csv(rows)
+        self.assertEqual(self.run_import(self.get_source(), ['y']), [0])
+        records = archived()
+        self.assertEqual([r[0] for r in records], [int(row['timestamp']) for row in rows])
+        self.assertEqual(set(r[1] for r in records), set([5]))
+        self.assertEqual([r[2] for r in records], [float(row['Temp']) for row in rows])
+        # There is no rain before the first record, the others have the
+        # differences of the cumulative rain
+        self.assertEqual(records[0][3], 0.0)
+        self.assertEqual([round(r[3], 2) for r in records[1:]],
+                         [0.01 if i % 3 == 0 else 0.0 for i in range(1, 35)])
+
+    def test_map_lazily(self):
+        # Raw data is mapped as the records are asked for
+        source = self.get_source()
+        source.map = source.parseMap('CSV', None, source.csv_config_dict)
+        consumed = []
+        def gen_rows():
+            for row in make_rows(35):
+                consumed.append(row)
+                yield row
+        records = source.mapRawData(gen_rows(), weewx.US)
+        # The first record is held back until the second is mapped, so that
+        # it can take its interval
+        first = records.next()
+        self.assertEqual((first['dateTime'], first['interval']), (start_ts, 5))
+        self.assertEqual(len(consumed), 2)
+        records.next()
+        records.next()
+        self.assertEqual(len(consumed), 3)
+        self.assertEqual(len(list(records)), 32)
+        source.dbm.close()
+
+    def test_raw_data(self):
+        # The raw data may be read more than once
+        write_csv(make_rows(12))
+        source = self.get_source()
+        raw_data = source.getRawData(1)
+        first = list(raw_data)
+        self.assertEqual(len(first), 12)
+        self.assertEqual(list(raw_data), first)
+        source.dbm.close()
+
+    def test_intervals_abort(self):
+        # The interval changes after three tranches. The user is asked
+        # whether to go on before any record is saved, and none are.
+        write_csv(make_rows(35, gap_at=31))
+        source = self.get_source()
+        self.assertRaises(SystemExit, self.run_import, source, ['n'])
+        self.assertTrue("multiple different 'interval' values" in self.output)
+        self.assertTrue("No records saved to archive" in self.output)
+        self.assertEqual(__builtin__.raw_input.saved, [0])
+        self.assertEqual(archived(), [])
+
+    def test_intervals_proceed(self):
+        rows = make_rows(35, gap_at=31)
+        write_csv(rows)
+        # Asked about the intervals, then whether to save, once only
+        self.assertEqual(self.run_import(self.get_source(), ['y', 'y']), [0, 0])
+        records = archived()
+        self.assertEqual([r[0] for r in records], [int(row['timestamp']) for row in rows])
+        self.assertEqual(records[31][1], 10)
+
+    def test_fixed_interval(self):
+        # With a fixed interval, the user is not asked about it
+        write_csv(make_rows(35, gap_at=31))
+        self.assertEqual(self.run_import(self.get_source(interval='5'), ['y']), [0])
+        self.assertEqual(len(archived()), 35)
+
+    def test_processes(self):
+        # Records prepared by a pool of worker processes are the same as
+        # those prepared by one process, including the derived obs that are
+        # calculated from the records already saved
+        qc_config_dict = configobj.ConfigObj(config_dict)
+        qc_config_dict['StdQC'] = {'MinMax': {'outTemp': ['0', '70']}}
+        # ... with somewhere to save windrun
+        binding_dict = qc_config_dict['DataBindings']['wx_binding']
+        binding_dict['schema'] = {}
+        for name, sql_type in schemas.wview.schema + [('windrun', 'REAL')]:
+            binding_dict['schema'][name] = sql_type
+        field_map = {'dateTime'   : ['timestamp', 'unix_epoch'],
+                     'outTemp'    : ['Temp', 'degree_F'],
+                     'outHumidity': ['humidity', 'percent'],
+                     'windSpeed'  : ['windspeed', 'mile_per_hour'],
+                     'radiation'  : ['radiation', 'watt_per_meter_squared'],
+                     'barometer'  : ['barometer', 'inHg'],
+                     'rain'       : ['dayrain', 'inch']}
+        write_weather_csv(36)
+        results = []
+        for processes in (1, 3):
+            if os.path.exists(db_path):
+                os.remove(db_path)
+            source = self.get_source(qc_config_dict, qc=True, calc_missing=True,
+                                     processes=processes, FieldMap=field_map)
+            self.run_import(source, ['y'])
+            results.append(archived_records())
+        self.assertEqual(len(results[0]), 36)
+        self.assertEqual(results[1], results[0])
+        records = results[0]
+        self.assertEqual(sum(1 for r in records if r['outTemp'] is None), 12)
+        for obs_type in ('dewpoint', 'rainRate', 'ET', 'windrun'):
+            self.assertTrue([r for r in records if r[obs_type]], obs_type)
+        # windrun adds up the wind of the day's records saved in earlier
+        # tranches, and that of the record itself
+        self.assertAlmostEqual(records[-1]['windrun'],
+                               sum(r['windSpeed'] * r['interval'] / 60.0
+                                   for r in records[1:30] + records[-1:]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+#
+#    Copyright (c) 2009-2017 Tom Keffer <tkeffer@gmail.com>
+#
+#    See the file LICENSE.txt for your full rights.
+#
+"""Test importing Cumulus monthly log files."""
+
+from __future__ import with_statement
+import __builtin__
+import os
+import shutil
+import StringIO
+import sys
+import syslog
+import time
+import unittest
+
+import weeimport.weeimport
+import weeimport.cumulusimport
+import weewx.manager
+
+test_root = '/var/tmp/weewx_test'
+log_dir = os.path.join(test_root, 'cumulus_logs')
+db_path = os.path.join(test_root, 'cumulusimport_test.sdb')
+
+config_dict = {
+    'WEEWX_ROOT'  : test_root,
+    'Station'     : {'altitude': ['100', 'meter'], 'latitude': '45.686', 'longitude': '-121.566'},
+    'StdConvert'  : {'target_unit': 'US'},
+    'StdArchive'  : {'data_binding': 'wx_binding'},
+    'DataBindings': {'wx_binding': {'database'  : 'cumulus_sqlite',
+                                    'table_name': 'archive',
+                                    'manager'   : 'weewx.wxmanager.WXDaySummaryManager',
+                                    'schema'    : 'schemas.wview.schema'}},
+    'Databases'   : {'cumulus_sqlite': {'root'         : test_root,
+                                        'database_name': 'cumulusimport_test.sdb',
+                                        'driver'       : 'weedb.sqlite'}}}
+
+# Two days of half hourly records in each month
+months = [(2017, 6), (2017, 7), (2017, 8), (2017, 9)]
+nrows = 96
+
+def write_logs():
+    """Monthly logs as Cumulus writes them, with a decimal comma and a
+    semicolon delimiter. Some lines have fewer fields than others, and there
+    are blank lines."""
+    os.makedirs(log_dir)
+    for year, month in months:
+        start_ts = time.mktime((year, month, 1, 0, 0, 0, 0, 0, -1))
+        path = os.path.join(log_dir, time.strftime('%b%ylog.txt', time.localtime(start_ts)))
+        with open(path, 'wb') as f:
+            for i in range(nrows):
+                ts = start_ts + 1800 * i
+                values = ['%d,%d' % (15 + i % 11, j) for j in range(25)]
+                # outHumidity, windDir and the rain since midnight
+                values[1] = str(40 + i % 50)
+                values[5] = str(10 * (i % 36))
+                values[24] = '%.1f' % (0.2 * (i % 48 / 4))
+                if i % 10 == 9:
+                    values = values[:20]
+                f.write(time.strftime('%d/%m/%y;%H:%M;', time.localtime(ts)))
+                f.write(';'.join(values).replace('.', ',') + '\r\n')
+                if i % 30 == 0:
+                    f.write('\r\n')
+
+def archived_records():
+    """The records committed to the archive, in full"""
+    with weewx.manager.Manager.open({'database_name': db_path, 'driver': 'weedb.sqlite'}) as manager:
+        return list(manager.genBatchRecords())
+
+class Options(object):
+    date = None
+    date_from = None
+    date_to = None
+    dry_run = False
+    verbose = False
+
+
+class CumulusImportTest(unittest.TestCase):
+
+    def setUp(self):
+        syslog.openlog('test_cumulusimport', syslog.LOG_CONS)
+        shutil.rmtree(log_dir, ignore_errors=True)
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        write_logs()
+        self.raw_input = __builtin__.raw_input
+
+    def tearDown(self):
+        __builtin__.raw_input = self.raw_input
+
+    def get_source(self, processes):
+        cumulus_config_dict = {'directory'   : log_dir,
+                               'interval'    : '30',
+                               'qc'          : False,
+                               'calc_missing': False,
+                               'tranche'     : 25,
+                               'processes'   : processes,
+                               'delimiter'   : ';',
+                               'decimal'     : ',',
+                               'Units'       : {'temperature': 'degree_C',
+                                                'pressure'   : 'hPa',
+                                                'rain'       : 'mm',
+                                                'speed'      : 'km_per_hour'}}
+        log = weeimport.weeimport.WeeImportLog(None, False, False)
+        # CumulusSource tells the user what it is about to import
+        stdout, sys.stdout = sys.stdout, StringIO.StringIO()
+        try:
+            return weeimport.cumulusimport.CumulusSource(config_dict, 'weewx.conf',
+                                                         cumulus_config_dict, 'cumulus.conf',
+                                                         Options(), log)
+        finally:
+            sys.stdout = stdout
+
+    def run_import(self, source):
+        __builtin__.raw_input = lambda prompt: 'y'
+        stdout, sys.stdout = sys.stdout, StringIO.StringIO()
+        try:
+            source.run()
+        finally:
+            sys.stdout = stdout
+
+    def test_processes(self):
+        # The monthly logs parsed in advance by worker processes give the
+        # same records as those parsed a line at a time
+        results = []
+        for processes in (1, 3):
+            if os.path.exists(db_path):
+                os.remove(db_path)
+            self.run_import(self.get_source(processes))
+            results.append(archived_records())
+        records = results[0]
+        self.assertEqual(len(records), len(months) * nrows)
+        self.assertEqual(results[1], records)
+        # The decimal commas were read, and the short lines have no rain
+        self.assertAlmostEqual(records[1]['outTemp'], 16.0 * 1.8 + 32.0)
+        self.assertAlmostEqual(records[1]['dewpoint'], 16.2 * 1.8 + 32.0)
+        self.assertEqual(records[1]['outHumidity'], 41.0)
+        self.assertEqual(records[9]['rain'], None)
+        self.assertAlmostEqual(records[8]['rain'], 0.2 / 25.4)
+
+    def test_raw_data(self):
+        # The rows of a monthly log are the same whichever way it is parsed
+        source = self.get_source(1)
+        path = source.log_list[1]
+        rows = list(source.getRawData(source.log_list[0]))
+        self.assertEqual(len(rows), nrows)
+        rows = list(source.getRawData(path))
+        values = weeimport.cumulusimport._parse_log(path, source.delimiter, source.decimal,
+                                                    source.raw_datetime_format, source.plan)
+        self.assertEqual(list(weeimport.cumulusimport._gen_rows_from_values(values, source.plan)),
+                         rows)
+        self.assertEqual(rows[0]['datetime'],
+                         str(int(time.mktime((2017, 7, 1, 0, 0, 0, 0, 0, -1)))))
+        self.assertEqual(rows[1]['cur_out_temp'], '16.0')
+        self.assertEqual(rows[9]['midnight_rain'], None)
+        source.dbm.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
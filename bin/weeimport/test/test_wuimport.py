@@ -0,0 +1,168 @@
+#
+#    Copyright (c) 2009-2017 Tom Keffer <tkeffer@gmail.com>
+#
+#    See the file LICENSE.txt for your full rights.
+#
+"""Test fetching WU daily history, against a local stand-in for WU."""
+
+from __future__ import with_statement
+import BaseHTTPServer
+import SocketServer
+import datetime
+import os
+import shutil
+import StringIO
+import sys
+import syslog
+import threading
+import time
+import unittest
+import urlparse
+
+import weeimport.weeimport
+import weeimport.wuimport
+
+test_root = '/var/tmp/weewx_test'
+cache_dir = os.path.join(test_root, 'wu_cache')
+
+config_dict = {
+    'WEEWX_ROOT'  : test_root,
+    'Station'     : {'altitude': ['100', 'meter'], 'latitude': '45.686', 'longitude': '-121.566'},
+    'StdConvert'  : {'target_unit': 'US'},
+    'StdArchive'  : {'data_binding': 'wx_binding'},
+    'DataBindings': {'wx_binding': {'database'  : 'wu_sqlite',
+                                    'table_name': 'archive',
+                                    'manager'   : 'weewx.wxmanager.WXDaySummaryManager',
+                                    'schema'    : 'schemas.wview.schema'}},
+    'Databases'   : {'wu_sqlite': {'root'         : test_root,
+                                   'database_name': 'wuimport_test.sdb',
+                                   'driver'       : 'weedb.sqlite'}}}
+
+DAYS = [datetime.datetime(2017, 5, d) for d in range(1, 6)]
+
+def make_day(day):
+    """A day of WU history, as WU returns it, with HTML tags and blank lines."""
+    lines = ["\n",
+             "Time,TemperatureF,DewpointF,PressureIn,WindDirectionDegrees,WindSpeedMPH,"
+             "WindSpeedGustMPH,Humidity,dailyrainin,DateUTC<br>\n"]
+    for hour in range(0, 24, 6):
+        lines.append("%s,%.1f,50.0,30.01,180,5.0,8.0,70,0.00,%s<br>\n" %
+                     (day.replace(hour=hour).strftime('%Y-%m-%d %H:%M:%S'), 60.0 + hour,
+                      day.replace(hour=hour).strftime('%Y-%m-%d %H:%M:%S')))
+        lines.append("\n")
+    return ''.join(lines)
+
+
+class StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Serves a day of WU history. Earlier days take longer, so that with
+    more than one fetch thread they are fetched out of order."""
+
+    def do_GET(self):
+        query = urlparse.parse_qs(urlparse.urlparse(self.path).query)
+        day = datetime.datetime(int(query['year'][0]), int(query['month'][0]), int(query['day'][0]))
+        self.server.requests.append(day)
+        time.sleep(0.05 * (DAYS[-1] - day).days)
+        body = make_day(day)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class StandInServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+class Options(object):
+    date = None
+    date_from = DAYS[0].strftime('%Y-%m-%d')
+    # The import runs up to midnight at the end of date_to, which is the
+    # start of the last day fetched
+    date_to = DAYS[-2].strftime('%Y-%m-%d')
+    dry_run = True
+    verbose = False
+
+
+class WUImportTest(unittest.TestCase):
+
+    def setUp(self):
+        syslog.openlog('test_wuimport', syslog.LOG_CONS)
+        if not os.path.exists(test_root):
+            os.makedirs(test_root)
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        self.server = StandInServer(('localhost', 0), StandInHandler)
+        self.server.requests = []
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.setDaemon(True)
+        self.server_thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def get_source(self, fetch_threads):
+        wu_config_dict = {'station_id'   : 'KORHOODR3',
+                          'calc_missing' : False,
+                          'base_url'     : 'http://localhost:%d/weatherstation/WXDailyHistory.asp' %
+                                           self.server.server_address[1],
+                          'cache_dir'    : cache_dir,
+                          'fetch_threads': fetch_threads}
+        log = weeimport.weeimport.WeeImportLog(None, False, True)
+        # WUSource tells the user what it is about to import
+        stdout, sys.stdout = sys.stdout, StringIO.StringIO()
+        try:
+            return weeimport.wuimport.WUSource(config_dict, 'weewx.conf', wu_config_dict,
+                                               'wu.conf', Options(), log)
+        finally:
+            sys.stdout = stdout
+
+    def get_days(self, source):
+        """Return the days, and the times of the rows of each, in the order
+        they are imported."""
+        days = []
+        for period in source.period_generator():
+            rows = list(source.getRawData(period))
+            days.append((period, [row['Time'] for row in rows]))
+        return days
+
+    def check_days(self, days):
+        self.assertEqual([period for period, _ in days], DAYS)
+        for period, times in days:
+            self.assertEqual(times, [period.replace(hour=hour).strftime('%Y-%m-%d %H:%M:%S')
+                                     for hour in range(0, 24, 6)])
+
+    def test_fetch(self):
+        source = self.get_source(fetch_threads=3)
+        self.assertEqual(source.fetch_threads, 3)
+        days = self.get_days(source)
+        # The days are imported in order, though they were fetched out of order
+        self.check_days(days)
+        self.assertEqual(sorted(self.server.requests), DAYS)
+        self.assertNotEqual(self.server.requests, DAYS)
+        self.assertEqual(sorted(os.listdir(cache_dir)),
+                         ['KORHOODR3-%s.csv' % day.strftime('%Y-%m-%d') for day in DAYS])
+        self.assertEqual(source._fetches, {})
+
+        # Run again, and the days are read from the cache
+        self.server.requests = []
+        self.check_days(self.get_days(self.get_source(fetch_threads=3)))
+        self.assertEqual(self.server.requests, [])
+
+    def test_one_thread(self):
+        self.check_days(self.get_days(self.get_source(fetch_threads=1)))
+        self.assertEqual(self.server.requests, DAYS)
+
+    def test_stop_early(self):
+        # An import that stops part way through leaves no fetches behind
+        source = self.get_source(fetch_threads=2)
+        gen = source.period_generator()
+        period = gen.next()
+        source.getRawData(period)
+        gen.close()
+        self.assertEqual(source._fetches, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -12,7 +12,10 @@ into weeWX.
 """
 
 # Python imports
+import collections
 import datetime
+import itertools
+import multiprocessing
 import os.path
 import re
 import sys
@@ -92,7 +95,9 @@ class Source(object):
     Child classes are used to interract with a specific source (eg CSV file,
     WU). Any such child classes must define a getRawData() method which:
         -   gets the raw observation data and returns an iterable yielding data
-            dicts whose fields can be mapped to a weeWX archive field
+            dicts whose fields can be mapped to a weeWX archive field. The
+            iterable may be iterated more than once, each time yielding the
+            same data (see class RawData)
         -   defines an import data field-to-weeWX archive field map (self.map)
 
         self.raw_datetime_format - Format of date time data field from which
@@ -128,6 +133,8 @@ class Source(object):
         self.interval = import_config_dict.get('interval', 'derive')
         # tranche, default to 250
         self.tranche = to_int(import_config_dict.get('tranche', 250))
+        # number of processes used to prepare records, default to 1
+        self.processes = max(1, to_int(import_config_dict.get('processes', 1)))
         # apply QC, default to True
         self.apply_qc = tobool(import_config_dict.get('qc', True))
         # calc-missing, default to True
@@ -171,12 +178,15 @@ class Source(object):
                     "Value 'altitude' needs a unit (%s)" % e)
             latitude_f = float(stn_dict['latitude'])
             longitude_f = float(stn_dict['longitude'])
+            # keep them, worker processes get their own WXCalculate object
+            self.wxcalculate_args = (altitude_vt, latitude_f, longitude_f)
             # get a WXCalculate object
             self.wxcalculate = weewx.wxservices.WXCalculate(config_dict,
                                                             altitude_vt,
                                                             latitude_f,
                                                             longitude_f)
         else:
+            self.wxcalculate_args = None
             self.wxcalculate = None
 
         # get ourselves a QC object to do QC on imported records
@@ -269,6 +279,8 @@ class Source(object):
         self.total_unique_rec = 0
         # time we started to first save
         self.t1 = None
+        # pool of worker processes, created when first needed
+        self._pool = None
 
     @staticmethod
     def sourceFactory(options, args, log):
@@ -321,62 +333,73 @@ class Source(object):
         (eg a single CSV file) or as a number of groups of records covering
         multiple periods(eg a WU multi-day import). Step through each group of
         records, getting the raw data, mapping the data and saving the data for
-        each period.
+        each period. Reading, mapping and saving are chained generators so
+        records are pulled through the import one at a time.
         """
 
         # setup a counter to count the periods of records
         self.period_no = 1
-        with self.dbm as archive:
-            # step through our periods of records until we reach the end. A
-            # 'period' of records may comprise the contents of a file, a day
-            # of WU obs or a month of Cumulus obs
-            for period in self.period_generator():
-
-                # get the raw data
-                _msg = 'Obtaining raw import data for period %d...' % self.period_no
-                self.wlog.verboselog(syslog.LOG_INFO, _msg)
-                _raw_data = self.getRawData(period)
-                _msg = 'Raw import data read successfully for period %d.' % self.period_no
-                self.wlog.verboselog(syslog.LOG_INFO, _msg)
-
-                # map the raw data to a weeWX archive compatible dictionary
-                _msg = 'Mapping raw import data for period %d...' % self.period_no
-                self.wlog.verboselog(syslog.LOG_INFO, _msg)
-                _mapped_data = self.mapRawData(_raw_data, self.archive_unit_sys)
-                _msg = 'Raw import data mapped successfully for period %d.' % self.period_no
-                self.wlog.verboselog(syslog.LOG_INFO, _msg)
-
-                # save the mapped data to archive
-                _msg = 'Saving mapped data to archive for period %d...' % self.period_no
-                self.wlog.verboselog(syslog.LOG_INFO, _msg)
-                self.saveToArchive(archive, _mapped_data)
-                _msg = 'Mapped data saved to archive successfully for period %d.' % self.period_no
-                self.wlog.verboselog(syslog.LOG_INFO, _msg)
-
-                # increment our period counter
-                self.period_no += 1
-            # Provide some summary info now that we have finished the import.
-            # What we say depends on whether it was a dry run or not and
-            # whether we imported and records or not.
-            if self.total_rec_proc == 0:
-                # nothing imported so say so
-                _msg = 'No records were identified for import. Exiting. Nothing done.'
-                self.wlog.printlog(syslog.LOG_INFO, _msg)
-            else:
-                # we imported something
-                if self.dry_run:
-                    # but it was a dry run
-                    _msg = "Finished dry run import. %d records were processed and %d unique records would have been imported." % (self.total_rec_proc,
-                                                                                                                                   self.total_unique_rec)
+        try:
+            with self.dbm as archive:
+                # step through our periods of records until we reach the end. A
+                # 'period' of records may comprise the contents of a file, a day
+                # of WU obs or a month of Cumulus obs
+                for period in self.period_generator():
+
+                    # get the raw data
+                    _msg = 'Obtaining raw import data for period %d...' % self.period_no
+                    self.wlog.verboselog(syslog.LOG_INFO, _msg)
+                    _raw_data = self.getRawData(period)
+
+                    # If the records may have different interval values check
+                    # them now, before any records for this period are saved,
+                    # the user may choose to abort the import.
+                    if self.interval_ans != 'y' and self.intervalMayVary():
+                        self.checkIntervals(_raw_data)
+
+                    # Map the raw data to a weeWX archive compatible dictionary.
+                    # Mapping is done lazily as records are consumed by
+                    # saveToArchive().
+                    _mapped_data = self.mapRawData(_raw_data, self.archive_unit_sys)
+
+                    # read, map and save the mapped data to archive
+                    _msg = 'Mapping and saving data to archive for period %d...' % self.period_no
+                    self.wlog.verboselog(syslog.LOG_INFO, _msg)
+                    self.saveToArchive(archive, _mapped_data)
+                    _msg = 'Mapped data saved to archive successfully for period %d.' % self.period_no
+                    self.wlog.verboselog(syslog.LOG_INFO, _msg)
+
+                    # increment our period counter
+                    self.period_no += 1
+                # Provide some summary info now that we have finished the import.
+                # What we say depends on whether it was a dry run or not and
+                # whether we imported and records or not.
+                if self.total_rec_proc == 0:
+                    # nothing imported so say so
+                    _msg = 'No records were identified for import. Exiting. Nothing done.'
                     self.wlog.printlog(syslog.LOG_INFO, _msg)
                 else:
-                    # something should have been saved to database
-                    _msg = "Finished import. %d raw records resulted in %d unique records being processed in %.2f seconds." % (self.total_rec_proc,
-                                                                                                                               self.total_unique_rec,
-                                                                                                                               self.tdiff)
-                    self.wlog.printlog(syslog.LOG_INFO, _msg)
-                    print "Those records with a timestamp already in the archive will not have been"
-                    print "imported. Confirm successful import in the weeWX log file."
+                    # we imported something
+                    if self.dry_run:
+                        # but it was a dry run
+                        _msg = "Finished dry run import. %d records were processed and %d unique records would have been imported." % (self.total_rec_proc,
+                                                                                                                                       self.total_unique_rec)
+                        self.wlog.printlog(syslog.LOG_INFO, _msg)
+                    else:
+                        # something should have been saved to database
+                        _msg = "Finished import. %d raw records resulted in %d unique records being processed in %.2f seconds (%.0f records/sec)." % (self.total_rec_proc,
+                                                                                                                                                     self.total_unique_rec,
+                                                                                                                                                     self.tdiff,
+                                                                                                                                                     self.total_rec_proc / self.tdiff if self.tdiff > 0 else 0.0)
+                        self.wlog.printlog(syslog.LOG_INFO, _msg)
+                        print "Those records with a timestamp already in the archive will not have been"
+                        print "imported. Confirm successful import in the weeWX log file."
+        finally:
+            # we are done with any worker processes
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool.join()
+                self._pool = None
 
     def parseMap(self, source_type, source, import_config_dict):
         """Produce a source field-to-weeWX archive field map.
@@ -524,11 +547,15 @@ class Source(object):
         return _map
 
     def mapRawData(self, data, unit_sys=weewx.US):
-        """Maps raw data to weeWX archive record compatible dictionaries.
+        """Generator that maps raw data to weeWX archive record compatible
+            dictionaries.
 
         Takes an iterable source of raw data observations, maps the fields of
-        each row to a list of weeWX compatible archive records and performs any
-        necessary unit conversion.
+        each row to a weeWX compatible archive record and performs any
+        necessary unit conversion. Records are yielded one at a time as they
+        are mapped so that the raw data source is never held in memory in its
+        entirety. Any check of the interval values is made by checkIntervals()
+        before mapping starts.
 
         Input parameters:
 
@@ -538,11 +565,15 @@ class Source(object):
                       provided. Omission will result in US customary (weewx.US)
                       being used.
 
-        Returns a list of dicts of weeWX compatible archive records.
+        Yields dicts of weeWX compatible archive records.
         """
 
-        # initialise our list of mapped records
-        _records = []
+        # number of records mapped
+        _nrecs = 0
+        # If interval is being derived from record timestamps our first record
+        # will have an interval of None. In this case we hold the first record
+        # back until we have the second record.
+        _first_rec = None
         # initialise some rain variables
         _last_ts = None
         _last_rain = None
@@ -554,47 +585,12 @@ class Source(object):
             _rec = {}
             # first off process the fields that require special processing
             # dateTime
-            if 'field_name' in self.map['dateTime']:
-                # we have a map for dateTime
-                try:
-                    _raw_dateTime = _row[self.map['dateTime']['field_name']]
-                except:
-                    raise WeeImportFieldError(
-                        "Field '%s' not found in source data." % self.map['dateTime']['field_name'])
-                # now process the raw date time data
-                if _raw_dateTime.isdigit():
-                    # Our dateTime is a number, is it a timestamp already?
-                    # Try to use it and catch the error if there is one and
-                    # raise it higher.
-                    try:
-                        _rec_dateTime = int(_raw_dateTime)
-                    except:
-                        raise ValueError(
-                            "Invalid '%s' field. Cannot convert '%s' to timestamp." % (self.map['dateTime']['field_name'],
-                                                                                       _raw_dateTime))
-                else:
-                    # it's a string so try to parse it and catch the error if
-                    # there is one and raise it higher
-                    try:
-                        _datetm = time.strptime(_raw_dateTime,
-                                                self.raw_datetime_format)
-                        _rec_dateTime = int(time.mktime(_datetm))
-                    except:
-                        raise ValueError(
-                            "Invalid '%s' field. Cannot convert '%s' to timestamp." % (self.map['dateTime']['field_name'],
-                                                                                       _raw_dateTime))
-                # if we have a timeframe of concern does our record fall within
-                # it
-                if (self.first_ts is None and self.last_ts is None) or self.first_ts <= _rec_dateTime <= self.last_ts:
-                    # we have no timeframe or if we do it falls within it so
-                    # save the dateTime
-                    _rec['dateTime'] = _rec_dateTime
-                else:
-                    # it is not so skip to the next record
-                    continue
-            else:
-                # there is no mapped field for dateTime so raise an error
-                raise ValueError("No mapping for weeWX field 'dateTime'.")
+            _rec_dateTime = self.mapDateTime(_row)
+            if _rec_dateTime is None:
+                # the record is outside our timeframe of concern, skip to the
+                # next record
+                continue
+            _rec['dateTime'] = _rec_dateTime
             # usUnits
             _units = None
             if 'field_name' in self.map['usUnits']:
@@ -616,32 +612,7 @@ class Source(object):
                                                                                                                               _raw_units)
                     raise weewx.UnitError(_msg)
             # interval
-            if 'field_name' in self.map['interval']:
-                # We have a map for interval so try to get the raw data. If
-                # its not there then raise an error.
-                try:
-                    _tfield = _row[self.map['interval']['field_name']]
-                except:
-                    raise WeeImportFieldError(
-                        "Field '%s' not found in source data." % self.map['interval']['field_name'])
-                # now process the raw interval data
-                if _tfield is not None and _tfield != '':
-                    try:
-                        interval = int(_tfield)
-                    except:
-                        raise ValueError(
-                            "Invalid '%s' field. Cannot convert '%s' to an integer." % (self.map['interval']['field_name'],
-                                                                                        _tfield))
-                else:
-                    # if it happens to be None then raise an error
-                    raise ValueError(
-                        "Invalid value '%s' for mapped field '%s' at timestamp '%s'." % (_tfield,
-                                                                                         self.map['interval']['field_name'],
-                                                                                         timestamp_to_string(_rec['dateTime'])))
-            else:
-                # we have no mapping so try to calculate it
-                interval = self.getInterval(_last_ts, _rec['dateTime'])
-            _rec['interval'] = interval
+            _rec['interval'] = self.mapInterval(_row, _rec['dateTime'], _last_ts)
             # now step through the rest of the fields in our map and process
             # the fields that don't require special processing
             for _field in self.map:
@@ -740,61 +711,197 @@ class Source(object):
                 # do is set 'usUnits', any bulk conversion will be taken care of
                 # by saveToArchive()
                 _rec['usUnits'] = unit_sys
-            # If interval is being derived from record timestamps our first
-            # record will have an interval of None. In this case we wait until
-            # we have the second record and then we use the interval between
-            # records 1 and 2 as the interval for record 1.
-            if len(_records) == 1 and _records[0]['interval'] is None:
-                _records[0]['interval'] = _rec['interval']
             _last_ts = _rec['dateTime']
-            # this record is done, add it to our list of records to return
-            _records.append(_rec)
-        # If we have more than 1 unique value for interval in our records it
-        # could be a sign of missing data and impact the integrity of our data,
-        # so do the check and see if the user wants to continue
-        if len(_records) > 0:
-            # if we have any records to return do the unique interval check
-            # before we return the records
-            _start_interval = _records[0]['interval']
-            _diff_interval = False
-            for _rec in _records:
-                if _rec['interval'] != _start_interval:
-                    _diff_interval = True
-                    break
-            if _diff_interval and self.interval_ans != 'y':
-                # we had more than one unique value for interval, warn the user
-                self.wlog.printlog(syslog.LOG_INFO, "Warning: Records to be imported contain multiple different 'interval' values.")
-                print "         This may mean the imported data is missing some records and it may lead"
-                print "         to data integrity issues. If the raw data has a known, fixed interval"
-                print "         value setting the relevant 'interval' setting in wee_import config to"
-                print "         this value may give a better result."
-                while self.interval_ans not in ['y', 'n']:
-                    self.interval_ans = raw_input('Are you sure you want to proceed (y/n)? ')
-                if self.interval_ans == 'n':
-                    # the user chose to abort, but we may have already
-                    # processed some records. So log it then raise a SystemExit()
-                    if self.dry_run:
-                        print "Dry run import aborted by user. %d records were processed." % self.total_rec_proc
-                    else:
-                        if self.total_rec_proc > 0:
-                            print "Those records with a timestamp already in the archive will not have been"
-                            print "imported. As the import was aborted before completion refer to the weeWX log"
-                            print "file to confirm which records were imported."
-                            raise SystemExit('Exiting.')
-                        else:
-                            print "Import aborted by user. No records saved to archive."
-                        _msg = "User chose to abort import. %d records were processed. Exiting." % self.total_rec_proc
-                        self.wlog.logonly(syslog.LOG_INFO, _msg)
-                        raise SystemExit('Exiting. Nothing done.')
-            self.wlog.verboselog(syslog.LOG_INFO,
-                                 "Mapped %d records." % len(_records))
-            # the user wants to continue or we have only one unique value for
-            # interval so return the records
-            return _records
+            _nrecs += 1
+            if _nrecs == 1:
+                # This is our first record. Hold it back until we have the
+                # second record, we can then use the interval between records
+                # 1 and 2 as the interval for record 1 if need be.
+                _first_rec = _rec
+                continue
+            elif _nrecs == 2:
+                if _first_rec['interval'] is None:
+                    _first_rec['interval'] = _rec['interval']
+                yield _first_rec
+                _first_rec = None
+            # this record is done so yield it
+            yield _rec
+        # if we only mapped one record it has not been yielded yet
+        if _first_rec is not None:
+            yield _first_rec
+        self.wlog.verboselog(syslog.LOG_INFO, "Mapped %d records." % _nrecs)
+
+    def mapDateTime(self, row):
+        """Map the date-time field of a row of raw data to a timestamp.
+
+        Input parameters:
+
+            row: a dict of raw data for a single record.
+
+        Returns the timestamp of the record, or None if the record falls
+        outside the timeframe being imported.
+        """
+
+        if 'field_name' in self.map['dateTime']:
+            # we have a map for dateTime
+            try:
+                _raw_dateTime = row[self.map['dateTime']['field_name']]
+            except:
+                raise WeeImportFieldError(
+                    "Field '%s' not found in source data." % self.map['dateTime']['field_name'])
+            # now process the raw date time data
+            if _raw_dateTime.isdigit():
+                # Our dateTime is a number, is it a timestamp already?
+                # Try to use it and catch the error if there is one and
+                # raise it higher.
+                try:
+                    _rec_dateTime = int(_raw_dateTime)
+                except:
+                    raise ValueError(
+                        "Invalid '%s' field. Cannot convert '%s' to timestamp." % (self.map['dateTime']['field_name'],
+                                                                                   _raw_dateTime))
+            else:
+                # it's a string so try to parse it and catch the error if
+                # there is one and raise it higher
+                try:
+                    _datetm = time.strptime(_raw_dateTime,
+                                            self.raw_datetime_format)
+                    _rec_dateTime = int(time.mktime(_datetm))
+                except:
+                    raise ValueError(
+                        "Invalid '%s' field. Cannot convert '%s' to timestamp." % (self.map['dateTime']['field_name'],
+                                                                                   _raw_dateTime))
+            # if we have a timeframe of concern does our record fall within
+            # it
+            if (self.first_ts is None and self.last_ts is None) or self.first_ts <= _rec_dateTime <= self.last_ts:
+                # we have no timeframe or if we do it falls within it
+                return _rec_dateTime
+            else:
+                # it is not
+                return None
+        else:
+            # there is no mapped field for dateTime so raise an error
+            raise ValueError("No mapping for weeWX field 'dateTime'.")
+
+    def mapInterval(self, row, ts, last_ts):
+        """Map or derive the interval value of a row of raw data.
+
+        Input parameters:
+
+            row: a dict of raw data for a single record.
+
+            ts: timestamp of the record.
+
+            last_ts: timestamp of the previous record, None if there was none.
+
+        Returns the interval (in minutes) of the record, None if it has to be
+        derived and there is no previous record.
+        """
+
+        if 'field_name' in self.map['interval']:
+            # We have a map for interval so try to get the raw data. If
+            # its not there then raise an error.
+            try:
+                _tfield = row[self.map['interval']['field_name']]
+            except:
+                raise WeeImportFieldError(
+                    "Field '%s' not found in source data." % self.map['interval']['field_name'])
+            # now process the raw interval data
+            if _tfield is not None and _tfield != '':
+                try:
+                    return int(_tfield)
+                except:
+                    raise ValueError(
+                        "Invalid '%s' field. Cannot convert '%s' to an integer." % (self.map['interval']['field_name'],
+                                                                                    _tfield))
+            else:
+                # if it happens to be None then raise an error
+                raise ValueError(
+                    "Invalid value '%s' for mapped field '%s' at timestamp '%s'." % (_tfield,
+                                                                                     self.map['interval']['field_name'],
+                                                                                     timestamp_to_string(ts)))
         else:
-            self.wlog.verboselog(syslog.LOG_INFO, "Mapped 0 records.")
-            # we have no records to return so return None
-            return None
+            # we have no mapping so try to calculate it
+            return self.getInterval(last_ts, ts)
+
+    def intervalMayVary(self):
+        """Whether the records being imported may have different interval
+        values, which is the case if interval is mapped from the source or
+        derived from record timestamps."""
+
+        return 'field_name' in self.map['interval'] or str(self.interval).lower() == 'derive'
+
+    def checkIntervals(self, data):
+        """Check whether the raw data of a period has more than one interval
+        value.
+
+        More than one unique value for interval could be a sign of missing
+        data and impact the integrity of our data. Only the date-time and
+        interval of each row are mapped, so the check is quick and holds no
+        records in memory. It is done before any records of the period are
+        saved so that, if the user chooses to abort, none of them are.
+
+        Input parameters:
+
+            data: iterable that yields the raw data records of the period.
+        """
+
+        _nrecs = 0
+        _start_interval = None
+        _last_ts = None
+        for _row in data:
+            _ts = self.mapDateTime(_row)
+            if _ts is None:
+                continue
+            _interval = self.mapInterval(_row, _ts, _last_ts)
+            _last_ts = _ts
+            _nrecs += 1
+            if _nrecs == 1 or (_nrecs == 2 and _start_interval is None):
+                # if interval is derived the first record takes the interval
+                # of the second, as in mapRawData()
+                _start_interval = _interval
+            elif _interval != _start_interval:
+                self.confirmIntervals()
+                return
+
+    def confirmIntervals(self):
+        """Confirm the user wishes to proceed with multiple interval values.
+
+        Records containing multiple different interval values could be a sign
+        of missing data. Warn the user and ask whether the import should
+        continue. The user is asked once only.
+        """
+
+        if self.interval_ans == 'y':
+            # the user has already chosen to continue
+            return
+        # we had more than one unique value for interval, warn the user
+        self.wlog.printlog(syslog.LOG_INFO, "Warning: Records to be imported contain multiple different 'interval' values.")
+        print "         This may mean the imported data is missing some records and it may lead"
+        print "         to data integrity issues. If the raw data has a known, fixed interval"
+        print "         value setting the relevant 'interval' setting in wee_import config to"
+        print "         this value may give a better result."
+        while self.interval_ans not in ['y', 'n']:
+            self.interval_ans = raw_input('Are you sure you want to proceed (y/n)? ')
+        if self.interval_ans == 'n':
+            # the user chose to abort. No records of this period have been
+            # saved, but those of earlier periods may have been. So log it
+            # then raise a SystemExit()
+            if self.dry_run:
+                print "Dry run import aborted by user. %d records were processed." % self.total_rec_proc
+            else:
+                if self.total_rec_proc > 0:
+                    print "Import aborted by user. Records from periods before period %d were saved to" % self.period_no
+                    print "archive, except those with a timestamp already in the archive."
+                    _msg = "User chose to abort import at period %d. %d records were processed. Exiting." % (self.period_no,
+                                                                                                             self.total_rec_proc)
+                    self.wlog.logonly(syslog.LOG_INFO, _msg)
+                    raise SystemExit('Exiting.')
+                else:
+                    print "Import aborted by user. No records saved to archive."
+                _msg = "User chose to abort import. %d records were processed. Exiting." % self.total_rec_proc
+                self.wlog.logonly(syslog.LOG_INFO, _msg)
+                raise SystemExit('Exiting. Nothing done.')
 
     def getInterval(self, last_ts, current_ts):
         """Determine an interval value for a record.
@@ -906,7 +1013,7 @@ class Source(object):
         if self.apply_qc:
             self.import_QC.apply_qc(data_dict, data_type=data_type)
 
-    def calcMissing(self, record):
+    def calcMissing(self, record, obs_list=None):
         """ Add missing observations to a record.
 
         If calc_missing option is True in the import config file then add any
@@ -918,20 +1025,129 @@ class Source(object):
 
             record: A weeWX compatible archive record.
 
+            obs_list: List of derived observations to be considered. If
+                      omitted all derived observations are considered.
+
         Returns a weeWX compatible archive record that includes any derived
         observations that were previously missing/None.
         """
 
         if self.calc_missing:
-            self.wxcalculate.do_calculations(record, 'archive')
+            self.wxcalculate.do_calculations(record, 'archive', obs_list)
         return record
 
+    def prepareRecord(self, record, obs_list=None):
+        """Prepare a single mapped record for saving to archive.
+
+        The record is converted to the archive unit system, any required QC
+        checks performed and any missing derived observations in obs_list
+        added.
+
+        Input parameters:
+
+            record: A weeWX compatible archive record.
+
+            obs_list: List of derived observations to be considered. If
+                      omitted all derived observations are considered.
+
+        Returns a weeWX compatible archive record.
+        """
+
+        # convert our record
+        _conv_rec = to_std_system(record, self.archive_unit_sys)
+        # perform any any required QC checks
+        self.qc(_conv_rec, 'Archive')
+        # now add any derived obs that we can to our record
+        return self.calcMissing(_conv_rec, obs_list)
+
+    def processRecords(self, records):
+        """Generator that prepares mapped records for saving to archive.
+
+        Each mapped record is converted to the archive unit system, any
+        required QC checks performed and any missing derived observations
+        added. Records are processed one at a time as they are requested.
+
+        If more than one process was requested the records are split into
+        chunks of self.tranche records that are prepared in a pool of worker
+        processes. Only those derived observations that depend on the record
+        alone are calculated by the workers. Those that depend on earlier
+        records (eg rainRate, ET, windrun) are calculated here, in record
+        order, as each chunk is requested. Since the previous chunk has been
+        saved by the time the next chunk is requested, the results are the
+        same as those of a single process import.
+
+        Input parameters:
+
+            records: iterable that provides weeWX compatible archive records
+                     (in dict form)
+
+        Yields weeWX compatible archive records ready to be saved to archive.
+        """
+
+        if self.processes > 1:
+            for _chunk in self.genPreparedChunks(records):
+                for _rec in _chunk:
+                    yield self.calcMissing(_rec, weewx.wxservices.WXCalculate.history_list)
+        else:
+            for _rec in records:
+                yield self.prepareRecord(_rec)
+
+    def genPreparedChunks(self, records):
+        """Generator yielding chunks of records prepared by a process pool.
+
+        Records are gathered into chunks of self.tranche records and each
+        chunk submitted to a pool of self.processes worker processes. Chunks
+        are yielded in the order they were submitted. No more than two chunks
+        per worker are outstanding at any one time so memory use is bounded.
+
+        Input parameters:
+
+            records: iterable that provides weeWX compatible archive records
+                     (in dict form)
+
+        Yields lists of weeWX compatible archive records.
+        """
+
+        _pool = self.getPool()
+        _pending = collections.deque()
+        _chunk = []
+        for _rec in records:
+            _chunk.append(_rec)
+            if len(_chunk) >= self.tranche:
+                _pending.append(_pool.apply_async(_prepare_chunk, (_chunk,)))
+                _chunk = []
+                if len(_pending) > 2 * self.processes:
+                    yield _pending.popleft().get()
+        if _chunk:
+            _pending.append(_pool.apply_async(_prepare_chunk, (_chunk,)))
+        while _pending:
+            yield _pending.popleft().get()
+
+    def getPool(self):
+        """Return our pool of worker processes, creating it if necessary.
+
+        The pool is shared by all periods of an import and is terminated when
+        run() finishes. Each worker is given only what it needs to prepare
+        records, from which it sets up its own QC and WXCalculate objects.
+        """
+
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(self.processes,
+                                              _init_worker,
+                                              (self.config_dict,
+                                               self.archive_unit_sys,
+                                               self.apply_qc,
+                                               self.wxcalculate_args))
+        return self._pool
+
     def saveToArchive(self, archive, records):
         """ Save records to the weeWX archive.
 
         Supports saving one or more records to archive. Each collection of
         records is processed and saved to archive in transactions of
-        self.tranche records at a time.
+        self.tranche records at a time. Records are consumed from the records
+        iterable as they are needed so that no more than a tranche of records
+        is held in memory at any one time.
 
         if the import config file qc option was set quality checks on the
         imported record are performed using the weeWX StdQC configuration from
@@ -960,14 +1176,22 @@ class Source(object):
                 print 'Starting dry run import ...'
             else:
                 print 'Starting import ...'
-        # do we have any records?
-        if records and len(records) > 0:
+        # Do we have any records? We can only tell by asking for the first
+        # one, if there is one we put it back in front of the rest.
+        _records = iter(records) if records is not None else iter([])
+        try:
+            _first_rec = _records.next()
+        except StopIteration:
+            _first_rec = None
+        if _first_rec is not None:
+            _records = itertools.chain([_first_rec], _records)
             # if this is the first period then give a little summary about what
             # records we have
             if self.first_period:
                 if self.last_period:
-                    # there is only 1 period, so we can count them
-                    print "%s records identified for import." % len(records)
+                    # there is only 1 period, records will be counted as they
+                    # are imported
+                    print "Records have been identified for import."
                 else:
                     # there are more periods so say so
                     print "Records covering multiple periods have been identified for import."
@@ -989,54 +1213,27 @@ class Source(object):
                 if not (self.first_period and self.last_period):
                     print "Period %d ..." % self.period_no
                 # step through each record in this period
-                for _rec in records:
-                    # convert our record
-                    _conv_rec = to_std_system(_rec, self.archive_unit_sys)
-                    # perform any any required QC checks
-                    self.qc(_conv_rec, 'Archive')
-                    # now add any derived obs that we can to our record
-                    _final_rec = self.calcMissing(_rec)
+                for _final_rec in self.processRecords(_records):
                     # add the record to our tranche and increment our count
                     _tranche.append(_final_rec)
                     nrecs += 1
                     # if we have a full tranche then save to archive and reset
                     # the tranche
                     if len(_tranche) >= self.tranche:
-                        # add the record only if it is not a dry run
-                        if not self.dry_run:
-                            # add the record only if it is not a dry run
-                            archive.addRecord(_tranche)
-                        # add our the dateTime for each record in our tranche
-                        # to the dry run set
-                        for _trec in _tranche:
-                            unique_set.add(_trec['dateTime'])
+                        self._save_tranche(archive, _tranche, unique_set)
                         # tell the user what we have done
-                        _msg = "Records processed: %d; Unique records: %d; Last timestamp: %s\r" % (nrecs,
-                                                                                                    len(unique_set),
-                                                                                                    timestamp_to_string(_final_rec['dateTime']))
-                        print >> sys.stdout, _msg,
-                        sys.stdout.flush()
+                        self._print_progress(nrecs, unique_set, _final_rec)
                         _tranche = []
                 # we have processed all records but do we have any records left
                 # in the tranche?
                 if len(_tranche) > 0:
                     # we do so process them
-                    if not self.dry_run:
-                        # add the record only if it is not a dry run
-                        archive.addRecord(_tranche)
-                    # add our the dateTime for each record in our tranche to
-                    # the dry run set
-                    for _trec in _tranche:
-                        unique_set.add(_trec['dateTime'])
+                    self._save_tranche(archive, _tranche, unique_set)
                     # tell the user what we have done
-                    _msg = "Records processed: %d; Unique records: %d; Last timestamp: %s\r" % (nrecs,
-                                                                                                len(unique_set),
-                                                                                                timestamp_to_string(_final_rec['dateTime']))
-                    print >> sys.stdout, _msg,
+                    self._print_progress(nrecs, unique_set, _final_rec)
                 print
                 sys.stdout.flush()
-                # update our counts
-                self.total_rec_proc += nrecs
+                # update our unique record count
                 self.total_unique_rec += len(unique_set)
             elif self.ans == 'n':
                 # user does not want to import so display a message and then
@@ -1058,6 +1255,54 @@ class Source(object):
         if self.last_period:
             self.tdiff = time.time() - self.t1
 
+    def _save_tranche(self, archive, tranche, unique_set):
+        """Save a tranche of records to archive and update our counts."""
+
+        # add the records only if it is not a dry run
+        if not self.dry_run:
+            archive.addRecord(tranche)
+        # add the dateTime for each record in our tranche to the dry run set
+        for _trec in tranche:
+            unique_set.add(_trec['dateTime'])
+        # update our total count of records processed
+        self.total_rec_proc += len(tranche)
+
+    def _print_progress(self, nrecs, unique_set, last_rec):
+        """Tell the user how the import is progressing."""
+
+        _msg = "Records processed: %d; Unique records: %d; Last timestamp: %s; %.0f records/sec\r" % (nrecs,
+                                                                                                     len(unique_set),
+                                                                                                     timestamp_to_string(last_rec['dateTime']),
+                                                                                                     self.rate())
+        print >> sys.stdout, _msg,
+        sys.stdout.flush()
+
+    def rate(self):
+        """Return the overall import rate in records per second."""
+
+        _elapsed = time.time() - self.t1 if self.t1 is not None else 0
+        return self.total_rec_proc / _elapsed if _elapsed > 0 else 0.0
+
+
+# ============================================================================
+#                                class RawData
+# ============================================================================
+
+
+class RawData(object):
+    """An iterable of raw observation data that may be iterated more than once.
+
+    Each iteration starts afresh with the iterator returned by factory(), so
+    the raw data can be read again, eg from file, rather than being held in
+    memory.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+
+    def __iter__(self):
+        return iter(self.factory())
+
 
 # ============================================================================
 #                              class WeeImportLog
@@ -1141,3 +1386,59 @@ def get_binding(config_dict):
         db_binding_wx = None
     return db_binding_wx
 
+
+
+# What a worker process in a multi-process import uses to prepare records,
+# a tuple of the archive unit system, a QC object (None if no QC is applied)
+# and a WXCalculate object (None if missing obs are not calculated). Set when
+# the worker process is started.
+_worker_state = None
+
+
+def _init_worker(config_dict, archive_unit_sys, apply_qc, wxcalculate_args):
+    """Initialise a worker process used to prepare records.
+
+    Input parameters:
+
+        config_dict: A weeWX config dictionary.
+
+        archive_unit_sys: The unit system used by the archive.
+
+        apply_qc: Whether StdQC checks are to be applied.
+
+        wxcalculate_args: Tuple of the altitude, latitude and longitude used
+                          to get a WXCalculate object, or None if missing
+                          derived obs are not to be calculated.
+    """
+
+    global _worker_state
+    if apply_qc:
+        _import_qc = weewx.qc.QC(config_dict, parent='weeimport')
+    else:
+        _import_qc = None
+    if wxcalculate_args is not None:
+        _wxcalculate = weewx.wxservices.WXCalculate(config_dict, *wxcalculate_args)
+    else:
+        _wxcalculate = None
+    _worker_state = (archive_unit_sys, _import_qc, _wxcalculate)
+
+
+def _prepare_chunk(chunk):
+    """Prepare a chunk of records in a worker process.
+
+    Does the same as Source.prepareRecord(). Only those derived observations
+    that depend on the record alone are calculated, those that depend on
+    earlier records are left for the parent process.
+    """
+
+    archive_unit_sys, import_qc, wxcalculate = _worker_state
+    _prepared = []
+    for _rec in chunk:
+        _conv_rec = to_std_system(_rec, archive_unit_sys)
+        if import_qc is not None:
+            import_qc.apply_qc(_conv_rec, data_type='Archive')
+        if wxcalculate is not None:
+            wxcalculate.do_calculations(_conv_rec, 'archive',
+                                        weewx.wxservices.WXCalculate.independent_list)
+        _prepared.append(_conv_rec)
+    return _prepared
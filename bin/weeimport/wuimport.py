@@ -12,18 +12,23 @@ observational data for use with weeimport.
 from __future__ import with_statement
 
 # Python imports
+import collections
 import csv
 import datetime
+import os
+import socket
 import syslog
 import urllib2
 
+from multiprocessing.pool import ThreadPool
+
 from datetime import datetime as dt
 
 # weeWX imports
 import weeimport
 import weewx
 
-from weeutil.weeutil import timestamp_to_string, option_as_list, startOfDay
+from weeutil.weeutil import timestamp_to_string, option_as_list, startOfDay, to_int
 from weewx.units import unit_nicknames
 
 
@@ -111,6 +116,20 @@ class WUSource(weeimport.Source):
         # We use the latter so force 'cumulative' for rain.
         self.rain = 'cumulative'
 
+        # the URL from which WU daily history is obtained, may be changed to
+        # point to a local stand-in for offline testing
+        self.base_url = wu_config_dict.get('base_url',
+                                           'http://www.wunderground.com/weatherstation/WXDailyHistory.asp')
+        # Directory in which raw WU daily history is cached. Days in the cache
+        # are not fetched again, so it may also be used to import from a
+        # directory of saved responses.
+        self.cache_dir = wu_config_dict.get('cache_dir')
+        # how many days of history may be fetched concurrently
+        self.fetch_threads = max(1, to_int(wu_config_dict.get('fetch_threads', 4)))
+        # Outstanding day fetches, keyed by day. Populated by
+        # period_generator() and consumed by getRawData().
+        self._fetches = {}
+
         # initialise our import field-to-weeWX archive field map
         self.map = None
         # For a WU import we might have to import multiple days but we can only
@@ -146,6 +165,11 @@ class WUSource(weeimport.Source):
                                                                     self.interval,
                                                                     self.wind_dir)
         self.wlog.verboselog(syslog.LOG_DEBUG, _msg)
+        _msg = "     fetch_threads=%s, cache_dir=%s" % (self.fetch_threads,
+                                                         self.cache_dir)
+        self.wlog.verboselog(syslog.LOG_DEBUG, _msg)
+        _msg = "     processes=%s" % (self.processes, )
+        self.wlog.verboselog(syslog.LOG_DEBUG, _msg)
         _msg = "Using database binding '%s', which is bound to database '%s'" % (self.db_binding_wx,
                                                                                  self.dbm.database_name)
         self.wlog.printlog(syslog.LOG_INFO, _msg)
@@ -167,7 +191,8 @@ class WUSource(weeimport.Source):
 
         Obtain raw observational data from WU using a http WXDailyHistory
         request. This raw data needs to be cleaned of unnecessary
-        characters/codes and an iterable returned.
+        characters/codes and an iterable returned. The data will normally
+        have been fetched and cleaned in advance by period_generator().
 
         Since WU geolocates any http request we do not know what units our WU
         data will use until we actually receive the data. A further
@@ -182,17 +207,13 @@ class WUSource(weeimport.Source):
                     which raw obs data will be read.
         """
 
-        # the date for which we want the WU data is held in a datetime object, we need to convert it to a timetuple
-        date_tt = period.timetuple()
-        # construct our URL using station ID and day, month, year
-        _url = "http://www.wunderground.com/weatherstation/WXDailyHistory.asp?ID=%s&" \
-               "month=%d&day=%d&year=%d&format=1" % (self.station_id,
-                                                     date_tt[1],
-                                                     date_tt[2],
-                                                     date_tt[0])
-        # hit the WU site, wrap in a try..except so we can catch any errors
+        # get the clean WU data for the day, fetching it now if it has not
+        # been fetched in advance
         try:
-            _wudata = urllib2.urlopen(_url)
+            if period in self._fetches:
+                _cleanWUdata = self._fetches.pop(period).get()
+            else:
+                _cleanWUdata = self.fetchDay(period)
         except urllib2.URLError, e:
             self.wlog.printlog(syslog.LOG_ERR,
                           "Unable to open Weather Underground station %s" % self.station_id)
@@ -203,6 +224,66 @@ class WUSource(weeimport.Source):
                           "Socket timeout for Weather Underground station %s" % self.station_id)
             raise
 
+        # now create a dictionary CSV reader, the first line is used as keys to
+        # the dictionary
+        _reader = csv.DictReader(_cleanWUdata)
+        # finally, get our database-source mapping
+        self.map = self.parseMap('WU', _reader, self.wu_config_dict)
+        # return an iterable that creates a dict reader each time it is
+        # iterated
+        return weeimport.RawData(lambda: csv.DictReader(_cleanWUdata))
+
+    def fetchDay(self, period):
+        """Fetch and clean a day of raw WU data.
+
+        The raw data is read from the cache if it is there, otherwise it is
+        obtained from WU and, if the day is complete, saved to the cache. May
+        be called from a fetch thread so it does no logging, any errors are
+        raised.
+
+        Input parameters:
+
+            period: a datetime object representing the day of WU data to be
+                    fetched.
+
+        Returns a list of the cleaned lines of WU data.
+        """
+
+        # the date for which we want the WU data is held in a datetime object, we need to convert it to a timetuple
+        date_tt = period.timetuple()
+        _cache_file = None
+        if self.cache_dir:
+            _cache_file = os.path.join(self.cache_dir,
+                                       "%s-%04d-%02d-%02d.csv" % (self.station_id,
+                                                                  date_tt[0],
+                                                                  date_tt[1],
+                                                                  date_tt[2]))
+        if _cache_file and os.path.isfile(_cache_file):
+            with open(_cache_file, 'r') as f:
+                _wudata = f.readlines()
+        else:
+            # construct our URL using station ID and day, month, year
+            _url = "%s?ID=%s&month=%d&day=%d&year=%d&format=1" % (self.base_url,
+                                                                  self.station_id,
+                                                                  date_tt[1],
+                                                                  date_tt[2],
+                                                                  date_tt[0])
+            # hit the WU site
+            _response = urllib2.urlopen(_url)
+            try:
+                _wudata = _response.readlines()
+            finally:
+                _response.close()
+            # Only cache complete days, today's history is still growing. Write
+            # to a temporary file first so an interrupted write does not leave
+            # a partial day in the cache.
+            if _cache_file and period.date() < datetime.date.today():
+                if not os.path.isdir(self.cache_dir):
+                    os.makedirs(self.cache_dir)
+                with open(_cache_file + '.tmp', 'w') as f:
+                    f.writelines(_wudata)
+                os.rename(_cache_file + '.tmp', _cache_file)
+
         # because the data comes back with lots of HTML tags and whitespace we
         # need a bit of logic to clean it up.
         _cleanWUdata = []
@@ -213,25 +294,38 @@ class WUSource(weeimport.Source):
             if _line != "\n":
                 # save what's left
                 _cleanWUdata.append(_line)
-
-        # now create a dictionary CSV reader, the first line is used as keys to
-        # the dictionary
-        _reader = csv.DictReader(_cleanWUdata)
-        # finally, get our database-source mapping
-        self.map = self.parseMap('WU', _reader, self.wu_config_dict)
-        # return our dict reader
-        return _reader
+        return _cleanWUdata
 
     def period_generator(self):
         """Generator function yielding a sequence of datetime objects.
 
         This generator controls the FOR statement in the parents run() method
         that loops over the WU days to be imported. The generator yields a
-        datetime object from the range of dates to be imported."""
-
-        _period = self.start
-        while _period <= self.end:
-            self.first_period = _period == self.start
-            self.last_period = _period >= self.end
-            yield _period
-            _period += self.increment
\ No newline at end of file
+        datetime object from the range of dates to be imported.
+
+        Days are fetched in advance by a pool of self.fetch_threads threads.
+        No more than two days per thread are fetched ahead of the day being
+        imported, the fetched days are collected by getRawData()."""
+
+        _pool = ThreadPool(self.fetch_threads)
+        _pending = collections.deque()
+        _next_fetch = self.start
+        try:
+            _period = self.start
+            while _period <= self.end:
+                # keep our fetch threads busy
+                while _next_fetch <= self.end and len(_pending) < 2 * self.fetch_threads:
+                    self._fetches[_next_fetch] = _pool.apply_async(self.fetchDay,
+                                                                   (_next_fetch,))
+                    _pending.append(_next_fetch)
+                    _next_fetch += self.increment
+                self.first_period = _period == self.start
+                self.last_period = _period >= self.end
+                yield _period
+                _pending.popleft()
+                _period += self.increment
+            _pool.close()
+        finally:
+            _pool.terminate()
+            _pool.join()
+            self._fetches.clear()
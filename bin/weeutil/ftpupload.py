@@ -10,14 +10,20 @@ import os
 import sys
 import ftplib
 import cPickle
-import time
+import hashlib
+import threading
+import Queue
 import syslog
 
 class FtpUpload(object):
     """Uploads a directory and all its descendants to a remote server.
     
-    Keeps track of when a file was last uploaded, so it is uploaded only
-    if its modification time is newer."""
+    Keeps an index of the modification time, size and hash of each file when
+    it was last uploaded, so a file is uploaded only if it has changed. The
+    index also remembers which remote directories have been created, so they
+    are not created again on every run. Should an upload fail, they are all
+    created again on the next run. Files can be uploaded over more than one
+    FTP session at a time."""
 
     def __init__(self, server, 
                  user, password, 
@@ -28,7 +34,8 @@ class FtpUpload(object):
                  max_tries = 3,
                  secure    = False,
                  debug     = 0,
-                 secure_data = True):
+                 secure_data = True,
+                 max_sessions = 1):
         """Initialize an instance of FtpUpload.
         
         After initializing, call method run() to perform the upload.
@@ -56,6 +63,9 @@ class FtpUpload(object):
         should we attempt a secure data connection as well? This option is useful
         due to a bug in the Python FTP client library. See Issue #284. 
         [Optional. Default is True]
+        
+        max_sessions: The maximum number of FTP sessions used to upload files
+        in parallel. [Optional. Default is 1]
         """
         self.server      = server
         self.user        = user
@@ -69,6 +79,7 @@ class FtpUpload(object):
         self.secure      = secure
         self.debug       = debug
         self.secure_data = secure_data
+        self.max_sessions = max(1, max_sessions)
 
     def run(self):
         """Perform the actual upload.
@@ -85,136 +96,224 @@ class FtpUpload(object):
         else:
             FTPClass = ftplib.FTP
         
-        # Get the timestamp and members of the last upload:
-        (timestamp, fileset) = self.getLastUpload()
+        # Get the index of the last upload:
+        (file_index, dir_set) = self.getUploadIndex()
+
+        # Walk the local directory structure, collecting the remote directories
+        # that have yet to be made and the files that have changed:
+        new_dirs = []
+        work_list = []
+        for (dirpath, unused_dirnames, filenames) in os.walk(self.local_root):
+
+            # Strip out the common local root directory. What is left
+            # will be the relative directory both locally and remotely.
+            local_rel_dir_path = dirpath.replace(self.local_root, '.')
+            if self._skipThisDir(local_rel_dir_path):
+                continue
+            # This is the absolute path to the remote directory:
+            remote_dir_path = os.path.normpath(os.path.join(self.remote_root, local_rel_dir_path))
+
+            # Make the remote directory if we have not already done so:
+            if remote_dir_path not in dir_set:
+                new_dirs.append(remote_dir_path)
+
+            # Now iterate over all members of the local directory:
+            for filename in filenames:
+
+                full_local_path = os.path.join(dirpath, filename)
+                # See if this file can be skipped:
+                if self._skipThisFile(file_index, full_local_path):
+                    continue
+
+                full_remote_path = os.path.join(remote_dir_path, filename)
+                work_list.append((full_local_path, full_remote_path))
 
         n_uploaded = 0
-        # Try to connect to the ftp server up to max_tries times:
-        
+        if not new_dirs and not work_list:
+            # Nothing has changed. No need to even connect.
+            self.saveUploadIndex(file_index, dir_set)
+            return n_uploaded
+
+        ftp_server = self._connect(FTPClass)
+        if ftp_server is None:
+            return n_uploaded
+
         try:
-            if self.secure:
-                syslog.syslog(syslog.LOG_DEBUG, "ftpupload: Attempting secure connection to %s" % self.server)
-            else:
-                syslog.syslog(syslog.LOG_DEBUG, "ftpupload: Attempting connection to %s" % self.server)
-            for count in range(self.max_tries):
-                try:
-                    ftp_server = FTPClass()
-                    ftp_server.connect(self.server, self.port)
-        
-                    if self.debug:
-                        ftp_server.set_debuglevel(self.debug)
-        
-                    ftp_server.login(self.user, self.password)
-                    ftp_server.set_pasv(self.passive)
-                    if self.secure and self.secure_data:
-                        ftp_server.prot_p()
-                        syslog.syslog(syslog.LOG_DEBUG, "ftpupload: Secure data connection to %s" % self.server)
-                    else:
-                        syslog.syslog(syslog.LOG_DEBUG, "ftpupload: Connected to %s" % self.server)
-                    break
-                except ftplib.all_errors, e:
-                    syslog.syslog(syslog.LOG_NOTICE, "ftpupload: Unable to connect or log into server : %s" % e)
-            else:
-                # This is executed only if the loop terminates naturally (without a break statement),
-                # meaning the ftp connection failed max_tries times. Abandon ftp upload
-                syslog.syslog(syslog.LOG_CRIT, 
-                                  "ftpupload: Attempted %d times to connect to server %s. Giving up." % 
-                                  (self.max_tries, self.server))
-                return n_uploaded
-            
-            # Walk the local directory structure
-            for (dirpath, unused_dirnames, filenames) in os.walk(self.local_root):
-    
-                # Strip out the common local root directory. What is left
-                # will be the relative directory both locally and remotely.
-                local_rel_dir_path = dirpath.replace(self.local_root, '.')
-                if self._skipThisDir(local_rel_dir_path):
-                    continue
-                # This is the absolute path to the remote directory:
-                remote_dir_path = os.path.normpath(os.path.join(self.remote_root, local_rel_dir_path))
-    
-                # Make the remote directory if necessary:
+            # Make any new remote directories. os.walk() is top down, so parents
+            # are made before their children.
+            for remote_dir_path in new_dirs:
                 self._make_remote_dir(ftp_server, remote_dir_path)
-                    
-                # Now iterate over all members of the local directory:
-                for filename in filenames:
-    
-                    full_local_path = os.path.join(dirpath, filename)
-                    # See if this file can be skipped:
-                    if self._skipThisFile(timestamp, fileset, full_local_path):
-                        continue
-    
-                    full_remote_path = os.path.join(remote_dir_path, filename)
-                    STOR_cmd = "STOR %s" % full_remote_path
-                    # Retry up to max_tries times:
-                    for count in range(self.max_tries):
-                        try:
-                            # If we have to retry, we should probably reopen the file as well.
-                            # Hence, the open is in the inner loop:
-                            fd = open(full_local_path, "r")
-                            ftp_server.storbinary(STOR_cmd, fd)
-                        except ftplib.all_errors, e:
-                            # Unsuccessful. Log it and go around again.
-                            syslog.syslog(syslog.LOG_ERR, "ftpupload: Attempt #%d. Failed uploading %s to %s. Reason: %s" %
-                                                          (count+1, full_remote_path, self.server, e))
-                            ftp_server.set_pasv(self.passive)
-                        else:
-                            # Success. Log it, break out of the loop
-                            n_uploaded += 1
-                            fileset.add(full_local_path)
-                            syslog.syslog(syslog.LOG_DEBUG, "ftpupload: Uploaded file %s" % full_remote_path)
-                            break
-                        finally:
-                            # This is always executed on every loop. Close the file.
-                            try:
-                                fd.close()
-                            except:
-                                pass
-                    else:
-                        # This is executed only if the loop terminates naturally (without a break statement),
-                        # meaning the upload failed max_tries times. Log it, move on to the next file.
-                        syslog.syslog(syslog.LOG_ERR, "ftpupload: Failed to upload file %s" % full_remote_path)
+                dir_set.add(remote_dir_path)
+
+            # Now upload the files, using up to max_sessions sessions:
+            work_queue = Queue.Queue()
+            for work in work_list:
+                work_queue.put(work)
+            results = []
+            n_sessions = min(self.max_sessions, len(work_list))
+            threads = []
+            for unused_i in range(1, n_sessions):
+                t = threading.Thread(target=self._upload_session,
+                                     args=(FTPClass, None, work_queue, results))
+                t.setDaemon(True)
+                t.start()
+                threads.append(t)
+            # This thread uses the session that is already open
+            self._upload_session(FTPClass, ftp_server, work_queue, results)
+            ftp_server = None
+            for t in threads:
+                t.join()
         finally:
-            try:
-                ftp_server.quit()
-            except:
-                pass
-        
-        timestamp = time.time()
-        self.saveLastUpload(timestamp, fileset)
+            if ftp_server is not None:
+                try:
+                    ftp_server.quit()
+                except:
+                    pass
+
+        for (full_local_path, file_state) in results:
+            if file_state is not None:
+                n_uploaded += 1
+                file_index[full_local_path] = file_state
+            else:
+                # The upload failed. Perhaps remote directories have been
+                # removed, so forget them all, and make them again next time.
+                dir_set.clear()
+
+        self.saveUploadIndex(file_index, dir_set)
         return n_uploaded
-    
-    def getLastUpload(self):
-        """Reads the time and members of the last upload from the local root"""
+
+    def getUploadIndex(self):
+        """Reads the index of the last upload from the local root.
+        
+        returns: a tuple. The first member is a dictionary, keyed by local
+        path, of the file state (modification time, size, MD5 digest) when the
+        file was last uploaded. The second member is the set of remote
+        directories known to exist."""
         
-        timeStampFile = os.path.join(self.local_root, "#%s.last" % self.name )
+        indexFile = os.path.join(self.local_root, "#%s.last" % self.name )
 
         # If the file does not exist, an IOError exception will be raised. 
         # If the file exists, but is truncated, an EOFError will be raised.
-        # Either way, be prepared to catch it.
+        # An index saved by an earlier version (a timestamp and a set of file
+        # names) will fail the type check. Either way, be prepared to catch it.
         try:
-            with open(timeStampFile, "r") as f:
-                timestamp = cPickle.load(f)
-                fileset   = cPickle.load(f) 
-        except (IOError, EOFError, cPickle.PickleError, AttributeError):
-            timestamp = 0
-            fileset = set()
+            with open(indexFile, "r") as f:
+                file_index = cPickle.load(f)
+                dir_set    = cPickle.load(f)
+            if not isinstance(file_index, dict) or not isinstance(dir_set, set):
+                raise TypeError("Unknown upload index format")
+        except (IOError, EOFError, cPickle.PickleError, AttributeError, TypeError, ValueError):
+            file_index = dict()
+            dir_set = set()
             # Either the file does not exist, or it is garbled.
             # Either way, it's safe to remove it.
             try:
-                os.remove(timeStampFile)
+                os.remove(indexFile)
             except OSError:
                 pass
 
-        return (timestamp, fileset)
+        return (file_index, dir_set)
+
+    def saveUploadIndex(self, file_index, dir_set):
+        """Saves the index of the last upload in the local root."""
+        indexFile = os.path.join(self.local_root, "#%s.last" % self.name )
+        with open(indexFile, "w") as f:
+            cPickle.dump(file_index, f, cPickle.HIGHEST_PROTOCOL)
+            cPickle.dump(dir_set,    f, cPickle.HIGHEST_PROTOCOL)
+
+    def _connect(self, FTPClass):
+        """Connect and log into the server, trying up to max_tries times.
+        
+        returns: the FTP session, or None if a connection could not be made."""
+        if self.secure:
+            syslog.syslog(syslog.LOG_DEBUG, "ftpupload: Attempting secure connection to %s" % self.server)
+        else:
+            syslog.syslog(syslog.LOG_DEBUG, "ftpupload: Attempting connection to %s" % self.server)
+        for unused_count in range(self.max_tries):
+            try:
+                ftp_server = FTPClass()
+                ftp_server.connect(self.server, self.port)
+
+                if self.debug:
+                    ftp_server.set_debuglevel(self.debug)
+
+                ftp_server.login(self.user, self.password)
+                ftp_server.set_pasv(self.passive)
+                if self.secure and self.secure_data:
+                    ftp_server.prot_p()
+                    syslog.syslog(syslog.LOG_DEBUG, "ftpupload: Secure data connection to %s" % self.server)
+                else:
+                    syslog.syslog(syslog.LOG_DEBUG, "ftpupload: Connected to %s" % self.server)
+                return ftp_server
+            except ftplib.all_errors, e:
+                syslog.syslog(syslog.LOG_NOTICE, "ftpupload: Unable to connect or log into server : %s" % e)
+        # The ftp connection failed max_tries times. Abandon ftp upload
+        syslog.syslog(syslog.LOG_CRIT, 
+                      "ftpupload: Attempted %d times to connect to server %s. Giving up." % 
+                      (self.max_tries, self.server))
+        return None
+
+    def _upload_session(self, FTPClass, ftp_server, work_queue, results):
+        """Upload files from the work queue until it is empty.
+        
+        If ftp_server is None a new session is opened. The session is closed
+        when the queue is empty. For each file, a tuple (local path, file
+        state) is appended to results. The file state is None if the upload
+        failed."""
+        if ftp_server is None:
+            ftp_server = self._connect(FTPClass)
+            if ftp_server is None:
+                # Leave the work for the other sessions
+                return
+        try:
+            while True:
+                try:
+                    (full_local_path, full_remote_path) = work_queue.get_nowait()
+                except Queue.Empty:
+                    break
+                file_state = self._upload_file(ftp_server, full_local_path, full_remote_path)
+                results.append((full_local_path, file_state))
+        finally:
+            try:
+                ftp_server.quit()
+            except:
+                pass
+
+    def _upload_file(self, ftp_server, full_local_path, full_remote_path):
+        """Upload a single file, trying up to max_tries times.
+        
+        returns: the state of the file that was uploaded, or None if the upload
+        failed."""
+        STOR_cmd = "STOR %s" % full_remote_path
+        # Retry up to max_tries times:
+        for count in range(self.max_tries):
+            try:
+                # If we have to retry, we should probably reopen the file as well.
+                # Hence, the open is in the inner loop:
+                fd = open(full_local_path, "r")
+                # Get the state before uploading, so a change made while
+                # uploading will be picked up next time
+                file_state = _get_file_state(full_local_path)
+                ftp_server.storbinary(STOR_cmd, fd)
+            except ftplib.all_errors, e:
+                # Unsuccessful. Log it and go around again.
+                syslog.syslog(syslog.LOG_ERR, "ftpupload: Attempt #%d. Failed uploading %s to %s. Reason: %s" %
+                                              (count+1, full_remote_path, self.server, e))
+                ftp_server.set_pasv(self.passive)
+            else:
+                # Success. Log it, return the state
+                syslog.syslog(syslog.LOG_DEBUG, "ftpupload: Uploaded file %s" % full_remote_path)
+                return file_state
+            finally:
+                # This is always executed on every loop. Close the file.
+                try:
+                    fd.close()
+                except:
+                    pass
+        # The upload failed max_tries times. Log it, move on to the next file.
+        syslog.syslog(syslog.LOG_ERR, "ftpupload: Failed to upload file %s" % full_remote_path)
+        return None
 
-    def saveLastUpload(self, timestamp, fileset):
-        """Saves the time and members of the last upload in the local root."""
-        timeStampFile = os.path.join(self.local_root, "#%s.last" % self.name )
-        with open(timeStampFile, "w") as f:
-            cPickle.dump(timestamp, f)
-            cPickle.dump(fileset,   f)
-                
     def _make_remote_dir(self, ftp_server, remote_dir_path):
         """Make a remote directory if necessary."""
         # Try to make the remote directory up max_tries times, then give up.
@@ -243,20 +342,38 @@ class FtpUpload(object):
         
         return os.path.basename(local_dir) in ('.svn', 'CVS')
 
-    def _skipThisFile(self, timestamp, fileset, full_local_path):
+    def _skipThisFile(self, file_index, full_local_path):
         
         filename = os.path.basename(full_local_path)
         if filename[-1] == '~' or filename[0] == '#' :
             return True
         
-        if full_local_path not in fileset:
+        if full_local_path not in file_index:
             return False
         
-        if os.stat(full_local_path).st_mtime > timestamp:
-            return False
+        (mtime, size, digest) = file_index[full_local_path]
+        st = os.stat(full_local_path)
+        if st.st_mtime == mtime and st.st_size == size:
+            # Filename is in the index, and is up to date.
+            return True
         
-        # Filename is in the set, and is up to date. 
-        return True
+        # The file has been touched. Skip it only if its contents are the same
+        # as when it was last uploaded, in which case update the index.
+        file_state = _get_file_state(full_local_path)
+        if file_state[2] == digest:
+            file_index[full_local_path] = file_state
+            return True
+        return False
+
+
+def _get_file_state(full_local_path):
+    """Returns the modification time, size and MD5 digest of a file."""
+    st = os.stat(full_local_path)
+    md5 = hashlib.md5()
+    with open(full_local_path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), ''):
+            md5.update(chunk)
+    return (st.st_mtime, st.st_size, md5.hexdigest())
         
         
 if __name__ == '__main__':
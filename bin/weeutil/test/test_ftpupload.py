@@ -0,0 +1,220 @@
+#
+#    Copyright (c) 2009-2017 Tom Keffer <tkeffer@gmail.com>
+#
+#    See the file LICENSE.txt for your full rights.
+#
+"""Test uploading a directory by FTP, against a stand-in FTP server."""
+
+from __future__ import with_statement
+import cPickle
+import ftplib
+import os
+import shutil
+import syslog
+import threading
+import time
+import unittest
+
+import weeutil.ftpupload
+
+test_root = '/var/tmp/weewx_test'
+local_root = os.path.join(test_root, 'ftp_local')
+
+class StandInServer(object):
+    """The files and directories of a remote server, and what was done to
+    them."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.dirs = set(['/'])
+        self.files = dict()
+        # Every STOR, as (session number, remote path)
+        self.stores = []
+        self.mkds = []
+        self.sessions = 0
+        # Connections after this many are refused
+        self.max_connections = None
+        # Remote paths that cannot be stored
+        self.bad_paths = set()
+        # How long a STOR takes
+        self.store_delay = 0.0
+
+class StandInFTP(object):
+    """Looks like an ftplib.FTP session with the stand-in server."""
+
+    server = None
+
+    def connect(self, host, port):
+        with self.server.lock:
+            if self.server.max_connections is not None and \
+                    self.server.sessions >= self.server.max_connections:
+                raise ftplib.error_temp("421 Too many connections")
+            self.server.sessions += 1
+            self.session = self.server.sessions
+
+    def set_debuglevel(self, level):
+        pass
+
+    def login(self, user, password):
+        pass
+
+    def set_pasv(self, passive):
+        pass
+
+    def mkd(self, path):
+        with self.server.lock:
+            if path in self.server.dirs:
+                raise ftplib.error_perm("550 %s: File exists" % path)
+            self.server.dirs.add(path)
+            self.server.mkds.append(path)
+
+    def storbinary(self, cmd, fd):
+        path = cmd[len("STOR "):]
+        time.sleep(self.server.store_delay)
+        with self.server.lock:
+            if os.path.dirname(path) not in self.server.dirs:
+                raise ftplib.error_perm("553 Could not create file")
+            if path in self.server.bad_paths:
+                raise ftplib.error_temp("451 Local error in processing")
+            self.server.files[path] = fd.read()
+            self.server.stores.append((self.session, path))
+
+    def quit(self):
+        pass
+
+def write_file(rel_path, contents):
+    path = os.path.join(local_root, rel_path)
+    if not os.path.exists(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as f:
+        f.write(contents)
+
+def make_tree():
+    """Local files, keyed by their remote path"""
+    files = {'/www/index.html': 'index',
+             '/www/week.html': 'week',
+             '/www/NOAA/NOAA-2017.txt': 'year',
+             '/www/NOAA/NOAA-2017-07.txt': 'month'}
+    for i in range(20):
+        files['/www/images/plot%02d.png' % i] = 'plot %d' % i
+    for remote_path, contents in files.items():
+        write_file(remote_path[len('/www/'):], contents)
+    return files
+
+
+class FtpUploadTest(unittest.TestCase):
+
+    def setUp(self):
+        syslog.openlog('test_ftpupload', syslog.LOG_CONS)
+        shutil.rmtree(local_root, ignore_errors=True)
+        os.makedirs(local_root)
+        self.server = StandInServer()
+        StandInFTP.server = self.server
+        self.FTP = ftplib.FTP
+        ftplib.FTP = StandInFTP
+
+    def tearDown(self):
+        ftplib.FTP = self.FTP
+
+    def upload(self, max_sessions=1, max_tries=1):
+        return weeutil.ftpupload.FtpUpload('ftp.example.com', 'user', 'secret',
+                                           local_root, '/www', max_tries=max_tries,
+                                           max_sessions=max_sessions).run()
+
+    def test_upload(self):
+        files = make_tree()
+        self.assertEqual(self.upload(), len(files))
+        self.assertEqual(self.server.files, files)
+        self.assertEqual(sorted(self.server.mkds), ['/www', '/www/NOAA', '/www/images'])
+        # Nothing has changed, so there is no need to connect
+        self.assertEqual(self.upload(), 0)
+        self.assertEqual(self.server.sessions, 1)
+        self.assertEqual(len(self.server.stores), len(files))
+
+    def test_changes(self):
+        make_tree()
+        self.upload()
+        stores = len(self.server.stores)
+        path = os.path.join(local_root, 'index.html')
+        # Touched, but the contents are the same: not uploaded
+        st = os.stat(path)
+        os.utime(path, (st.st_atime, st.st_mtime + 60))
+        self.assertEqual(self.upload(), 0)
+        # ... and the new time is in the index, so the file is not read again
+        file_index, _ = weeutil.ftpupload.FtpUpload('ftp.example.com', 'user', 'secret',
+                                                    local_root, '/www').getUploadIndex()
+        self.assertEqual(file_index[path][0], os.stat(path).st_mtime)
+        # Same size, but different contents: uploaded
+        write_file('index.html', 'INDEX')
+        os.utime(path, (st.st_atime, st.st_mtime + 120))
+        self.assertEqual(self.upload(), 1)
+        # A different size: uploaded
+        write_file('NOAA/NOAA-2017.txt', 'the year')
+        self.assertEqual(self.upload(), 1)
+        self.assertEqual(self.server.stores[stores:],
+                         [(2, '/www/index.html'), (3, '/www/NOAA/NOAA-2017.txt')])
+        self.assertEqual(self.server.files['/www/index.html'], 'INDEX')
+        # A new file, in a new directory
+        write_file('new/new.html', 'new')
+        self.assertEqual(self.upload(), 1)
+        self.assertEqual(self.server.mkds[-1], '/www/new')
+        self.assertEqual(self.server.files['/www/new/new.html'], 'new')
+        # Editor backups, and the index itself, are not uploaded
+        write_file('index.html~', 'backup')
+        self.assertEqual(self.upload(), 0)
+        self.assertFalse([path for path in self.server.files if '#' in path or '~' in path])
+
+    def test_sessions(self):
+        files = make_tree()
+        self.server.store_delay = 0.01
+        self.assertEqual(self.upload(max_sessions=3), len(files))
+        self.assertEqual(self.server.files, files)
+        # Each file is stored once, and each session stored some of them
+        self.assertEqual(sorted(path for _, path in self.server.stores), sorted(files))
+        self.assertEqual(self.server.sessions, 3)
+        self.assertEqual(set(session for session, _ in self.server.stores), set([1, 2, 3]))
+
+    def test_failed_session(self):
+        # Only two of the three sessions can connect. The others take the work.
+        files = make_tree()
+        self.server.max_connections = 2
+        self.assertEqual(self.upload(max_sessions=3), len(files))
+        self.assertEqual(sorted(path for _, path in self.server.stores), sorted(files))
+        self.assertEqual(self.upload(max_sessions=3), 0)
+
+    def test_failed_upload(self):
+        files = make_tree()
+        self.upload()
+        # The remote directories are removed, so changed files cannot be stored
+        self.server.dirs = set(['/'])
+        self.server.files = dict()
+        write_file('index.html', 'INDEX')
+        write_file('images/plot00.png', 'PLOT')
+        self.assertEqual(self.upload(max_tries=2), 0)
+        # Next time, the directories are made again, and the files uploaded
+        self.assertEqual(self.upload(), 2)
+        self.assertEqual(sorted(self.server.files), ['/www/images/plot00.png', '/www/index.html'])
+        self.assertEqual(self.server.mkds[-3:], ['/www', '/www/NOAA', '/www/images'])
+        # A file that fails is tried again next time
+        write_file('week.html', 'WEEK')
+        self.server.bad_paths.add('/www/week.html')
+        self.assertEqual(self.upload(), 0)
+        self.server.bad_paths.clear()
+        self.assertEqual(self.upload(), 1)
+        self.assertEqual(self.server.files['/www/week.html'], 'WEEK')
+        self.assertEqual(len(self.server.stores), len(files) + 3)
+
+    def test_old_index(self):
+        # An index left by an earlier version holds the time of the last
+        # upload, and a set of names. Everything is uploaded again, once.
+        files = make_tree()
+        with open(os.path.join(local_root, '#FTP.last'), 'w') as f:
+            cPickle.dump(time.time(), f)
+            cPickle.dump(set(['index.html']), f)
+        self.assertEqual(self.upload(), len(files))
+        self.assertEqual(self.upload(), 0)
+        self.assertEqual(len(self.server.stores), len(files))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -491,6 +491,31 @@ class WeeutilTest(unittest.TestCase):
         self.assertEqual(start_of_day, int(time.mktime((2007, 3, 11, 0, 0, 0, 0, 0, -1))))
         self.assertEqual(start2      , int(time.mktime((2007, 3, 10, 0, 0, 0, 0, 0, -1))))
 
+    def test_local_calendar(self):
+        # The calendar must agree with the C library, including across DST
+        # boundaries, and when the time zone changes
+        for tz in ('America/Los_Angeles', 'Europe/London', 'Australia/Lord_Howe', 'UTC'):
+            os.environ['TZ'] = tz
+            for day in range(0, 730, 3):
+                d = datetime.date(2015, 1, 1) + datetime.timedelta(days=day)
+                midnight = time.mktime(d.timetuple())
+                self.assertEqual(local_calendar.midnight(d.toordinal()), int(midnight))
+                for hour in range(0, 24, 5):
+                    ts = midnight + hour * 3600 + 1800
+                    self.assertEqual(local_calendar.day_of(ts),
+                                     datetime.date.fromtimestamp(ts).toordinal())
+                    self.assertEqual(startOfDay(ts), int(time.mktime(time.localtime(ts)[:3] + (0, 0, 0, 0, 0, -1))))
+        # A start or stop time in the hour repeated when DST ends is kept,
+        # not moved to the earlier of the two times with that local time
+        os.environ['TZ'] = 'Europe/London'
+        self.assertEqual(list(intervalgen(637913378, 657078883, 31536000)),
+                         [TimeSpan(637913378, 657078883)])
+        self.assertEqual(list(intervalgen(657078883, 657086083, 3600)),
+                         [TimeSpan(657078883, 657082483), TimeSpan(657082483, 657086083)])
+        self.assertEqual(list(intervalgen(654798883, 657078883, 365.25 / 12 * 24 * 3600)),
+                         [TimeSpan(654798883, 657078883)])
+        os.environ['TZ'] = 'America/Los_Angeles'
+
     def test_dnt(self):
         """test day/night transitions"""
 
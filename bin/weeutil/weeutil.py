@@ -9,12 +9,14 @@
 from __future__ import with_statement
 
 import StringIO
+import bisect
 import calendar
 import datetime
 import math
 import os
 import shutil
 import syslog
+import threading
 import time
 import traceback
 
@@ -198,7 +200,7 @@ def stampgen(startstamp, stopstamp, interval):
         # necessary because not all months have the same length.
         while dt <= stop_dt :
             t_tuple = dt.timetuple()
-            yield time.mktime(t_tuple)
+            yield local_calendar.to_ts(dt)
             year = t_tuple[0]
             month = t_tuple[1]
             month += 1
@@ -213,7 +215,7 @@ def stampgen(startstamp, stopstamp, interval):
         delta = datetime.timedelta(seconds=interval)
         ts_last = 0
         while dt <= stop_dt :
-            ts = int(time.mktime(dt.timetuple()))
+            ts = int(local_calendar.to_ts(dt))
             # This check is necessary because time.mktime() cannot
             # disambiguate between 2am ST and 3am DST. For example,
             #   time.mktime((2013, 3, 10, 2, 0, 0, 0, 0, -1)) and
@@ -277,17 +279,27 @@ def startOfInterval(time_ts, interval):
 
     interval_m = int(interval // 60)
     interval_h = int(interval // 3600)
-    time_tt = time.localtime(time_ts)
-    m = int(time_tt.tm_min  // interval_m * interval_m)
-    h = int(time_tt.tm_hour // interval_h * interval_h) if interval_h > 1 else time_tt.tm_hour
-
-    # Replace the hour, minute, and seconds with the start of the interval.
-    # Everything else gets retained:
-    start_interval_ts = time.mktime((time_tt.tm_year,
-                                     time_tt.tm_mon,
-                                     time_tt.tm_mday,
-                                     h, m, 0,
-                                     0, 0, time_tt.tm_isdst))
+    _day = local_calendar.find_day(time_ts)
+    if _day is not None:
+        # The usual case, where the UTC offset does not change during the day.
+        # The time of day is simply the time since midnight.
+        _sod_ts = _day[1]
+        _secs = int(time_ts) - _sod_ts
+        m = int(_secs % 3600 // 60 // interval_m * interval_m)
+        h = int(_secs // 3600 // interval_h * interval_h) if interval_h > 1 else _secs // 3600
+        start_interval_ts = float(_sod_ts + h * 3600 + m * 60)
+    else:
+        time_tt = time.localtime(time_ts)
+        m = int(time_tt.tm_min  // interval_m * interval_m)
+        h = int(time_tt.tm_hour // interval_h * interval_h) if interval_h > 1 else time_tt.tm_hour
+
+        # Replace the hour, minute, and seconds with the start of the interval.
+        # Everything else gets retained:
+        start_interval_ts = time.mktime((time_tt.tm_year,
+                                         time_tt.tm_mon,
+                                         time_tt.tm_mday,
+                                         h, m, 0,
+                                         0, 0, time_tt.tm_isdst))
     # Weewx uses the convention that the interval is exclusive on left, inclusive
     # on the right. So, if the timestamp is at the beginning of the interval,
     # it actually belongs to the previous interval.
@@ -296,9 +308,189 @@ def startOfInterval(time_ts, interval):
     return start_interval_ts
 
 def _ord_to_ts(_ord):
-    d = datetime.date.fromordinal(_ord)
-    t = int(time.mktime(d.timetuple()))
-    return t
+    return local_calendar.midnight(_ord)
+
+#===============================================================================
+# A memoized calendar of local midnights. Converting between unix epoch time
+# and local time goes through the C library, which is slow compared to the
+# rest of what the time span routines do. Instead, the start of each local
+# day is worked out once, and days are then looked up by bisection. Where the
+# table cannot give exactly what the C library would, such as on a day with a
+# DST change, the C library is used instead.
+#===============================================================================
+
+# The Gregorian ordinal of 1-Jan-1970:
+_EPOCH_ORD = datetime.date(1970, 1, 1).toordinal()
+
+# The environment. Going to the underlying dictionary saves a layer of Python.
+_environ = getattr(os.environ, 'data', os.environ)
+
+class LocalCalendar(object):
+    """A table of the start of each local day, in unix epoch time.
+
+    Example:
+
+    >>> os.environ['TZ'] = 'America/Los_Angeles'
+    >>> cal = LocalCalendar()
+    >>> day_ord = datetime.date(2009, 3, 8).toordinal()
+    >>> print timestamp_to_string(cal.midnight(day_ord))
+    2009-03-08 00:00:00 PST (1236499200)
+    >>> print cal.day_of(1236538800) == day_ord, cal.is_flat(day_ord), cal.is_flat(day_ord + 1)
+    True False True
+    """
+
+    # How many days to add to the table at a time:
+    CHUNK = 366
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # The table, as a tuple: the time zone it is for, the ordinal of its
+        # first day, the start of each day, and whether each day can be
+        # looked up in it.
+        self.table = None
+        self._exact = None
+        # The last day looked up, as a tuple: the time zone, the start of the
+        # day, the start of the next day, and the ordinal of the day.
+        self._day = (None, 0, 0, None)
+
+    def midnight(self, day_ord):
+        """Return the start of a day, given as a Gregorian ordinal, in unix
+        epoch time. The same as time.mktime() for 00:00:00 of that day."""
+        _, _first, _midnights, _ = self._get_table(day_ord)
+        return _midnights[day_ord - _first]
+
+    def day_of(self, time_ts):
+        """Return the Gregorian ordinal of the local day a time falls in.
+        The same as datetime.date.fromtimestamp(time_ts).toordinal()."""
+        _day = self.find_day(time_ts)
+        if _day is not None:
+            return _day[3]
+        # Around a DST change, the local date can even go backwards. Leave it
+        # to the C library.
+        return datetime.date.fromtimestamp(time_ts).toordinal()
+
+    def start_of_day(self, time_ts):
+        """Return the start of the local day a time falls in."""
+        _day = self.find_day(time_ts)
+        if _day is not None:
+            return _day[1]
+        return self.midnight(datetime.date.fromtimestamp(time_ts).toordinal())
+
+    def find_day(self, time_ts):
+        """Find the local day a time falls in, if the UTC offset is the same
+        all that day. Returns a tuple: the time zone, the start of the day,
+        the start of the next day, and the Gregorian ordinal of the day.
+        Otherwise, returns None."""
+        _day = self._day
+        if _day[1] <= time_ts < _day[2] and _day[0] == _environ.get('TZ'):
+            return _day
+        _utc_ord = _EPOCH_ORD + int(time_ts // 86400)
+        _tz, _first, _midnights, _good = self._get_table(_utc_ord)
+        # The local day can be at most a day either side of the UTC day
+        _lo = _utc_ord - _first - 2
+        _i = bisect.bisect_right(_midnights, time_ts, _lo, _lo + 5) - 1
+        if _good[_i] and _good[_i + 1] and _midnights[_i + 1] - _midnights[_i] == 86400:
+            self._day = _day = (_tz, _midnights[_i], _midnights[_i + 1], _first + _i)
+            return _day
+        return None
+
+    def is_flat(self, day_ord):
+        """Return True if the local time of day in a day is simply the time
+        since its start. That is, the UTC offset does not change during it."""
+        _, _first, _midnights, _good = self._get_table(day_ord)
+        _i = day_ord - _first
+        return _good[_i] and _good[_i + 1] and _midnights[_i + 1] - _midnights[_i] == 86400
+
+    def to_ts(self, dt):
+        """Return a naive local datetime as unix epoch time. The same as
+        time.mktime(dt.timetuple())."""
+        _day_ord = dt.toordinal()
+        _day = self._day
+        if _day[3] != _day_ord or _day[0] != _environ.get('TZ'):
+            if not self.is_flat(_day_ord):
+                return LocalCalendar.mktime(dt.timetuple()[:6])
+            _start = self.midnight(_day_ord)
+            self._day = _day = (self.table[0], _start, _start + 86400, _day_ord)
+        return float(_day[1] + dt.hour * 3600 + dt.minute * 60 + dt.second)
+
+    @staticmethod
+    def mktime(time_tt):
+        """Like time.mktime(), for a local time given as (year, month, day,
+        hour, minute, second), except that a local time that occurs twice, or
+        not at all, because of a DST change, is always resolved the same way.
+        Left to itself, time.mktime() resolves it according to earlier calls.
+
+        A time that occurs twice is taken as the earlier of the two. A time
+        that falls in the gap when clocks go forward is taken with the UTC
+        offset from before the change, as a clock that has not been set
+        forward yet would show it."""
+        _wall_ts = calendar.timegm(tuple(time_tt) + (0, 0, 0))
+        # The UTC offsets before and after any change near the time:
+        _before = LocalCalendar._utc_offset(_wall_ts - 129600)
+        _after = LocalCalendar._utc_offset(_wall_ts + 129600)
+        for _offset in sorted(set((_before, _after)), reverse=True):
+            if LocalCalendar._utc_offset(_wall_ts - _offset) == _offset:
+                return float(_wall_ts - _offset)
+        return float(_wall_ts - _before)
+
+    @staticmethod
+    def _utc_offset(time_ts):
+        return calendar.timegm(time.localtime(time_ts)) - time_ts
+
+    def _get_table(self, day_ord):
+        """Return a table that includes at least three days either side of
+        day_ord, building it up if necessary."""
+        _tz = _environ.get('TZ')
+        _table = self.table
+        if _table is not None and _table[0] == _tz \
+                and _table[1] + 3 <= day_ord < _table[1] + len(_table[2]) - 3:
+            return _table
+        with self.lock:
+            if self.table is None or self.table[0] != _tz:
+                # A new time zone. Start over.
+                _first = day_ord - LocalCalendar.CHUNK
+                _midnights, _exact = LocalCalendar._build(_first, day_ord + LocalCalendar.CHUNK)
+            else:
+                _, _first, _midnights, _good = self.table
+                _exact = self._exact
+                _stop = _first + len(_midnights)
+                if day_ord - 3 < _first:
+                    _new_first = min(day_ord - 3, _first - LocalCalendar.CHUNK)
+                    _m, _e = LocalCalendar._build(_new_first, _first)
+                    _midnights = _m + _midnights
+                    _exact = _e + _exact
+                    _first = _new_first
+                if day_ord + 3 >= _stop:
+                    _m, _e = LocalCalendar._build(_stop, max(day_ord + 4, _stop + LocalCalendar.CHUNK))
+                    _midnights = _midnights + _m
+                    _exact = _exact + _e
+            # A day can be looked up only if it starts at midnight exactly, and
+            # after the day before it.
+            _good = [_exact[i] and (i == 0 or _midnights[i] > _midnights[i - 1])
+                     for i in xrange(len(_midnights))]
+            self._exact = _exact
+            self.table = (_tz, _first, _midnights, _good)
+            return self.table
+
+    @staticmethod
+    def _build(first_ord, stop_ord):
+        _midnights = []
+        _exact = []
+        for _ord in xrange(first_ord, stop_ord):
+            _date = datetime.date.fromordinal(_ord)
+            try:
+                _ts = int(LocalCalendar.mktime((_date.year, _date.month, _date.day, 0, 0, 0)))
+                _exact.append(time.localtime(_ts)[:6] == (_date.year, _date.month, _date.day, 0, 0, 0))
+                _midnights.append(_ts)
+            except (OverflowError, ValueError):
+                # Outside what the C library can handle. Keep the table in
+                # order, but never look anything up in it here.
+                _midnights.append((_ord - _EPOCH_ORD) * 86400)
+                _exact.append(False)
+        return _midnights, _exact
+
+# The calendar used by the time span routines:
+local_calendar = LocalCalendar()
 
 #===============================================================================
 # What follows is a bunch of "time span" routines. Generally, time spans
@@ -412,8 +604,12 @@ def intervalgen(start_ts, stop_ts, interval):
     yields: A sequence of TimeSpans. Both the start and end of the timespan
     will be on the same time boundary as start_ts"""  
 
-    dt1 = datetime.datetime.fromtimestamp(start_ts)
+    start_dt = dt1 = datetime.datetime.fromtimestamp(start_ts)
     stop_dt = datetime.datetime.fromtimestamp(stop_ts)
+
+    # A local time in the hour repeated when DST ends converts back to the
+    # earlier of the two times it could be. The start and stop times may be
+    # in the later one, so they are used as they were given.
     
     if interval == 365.25 / 12 * 24 * 3600 :
         # Interval is a nominal month. This algorithm is 
@@ -427,8 +623,8 @@ def intervalgen(start_ts, stop_ts, interval):
                 month -= 12
                 year += 1
             dt2 = min(dt1.replace(year=year, month=month), stop_dt)
-            stamp1 = time.mktime(t_tuple)
-            stamp2 = time.mktime(dt2.timetuple())
+            stamp1 = start_ts if dt1 == start_dt else local_calendar.to_ts(dt1)
+            stamp2 = stop_ts if dt2 == stop_dt else local_calendar.to_ts(dt2)
             yield TimeSpan(stamp1, stamp2)
             dt1 = dt2
     else :
@@ -439,8 +635,8 @@ def intervalgen(start_ts, stop_ts, interval):
         last_stamp1 = 0
         while dt1 < stop_dt :
             dt2 = min(dt1 + delta, stop_dt)
-            stamp1 = int(time.mktime(dt1.timetuple()))
-            stamp2 = int(time.mktime(dt2.timetuple()))
+            stamp1 = int(start_ts) if dt1 == start_dt else int(local_calendar.to_ts(dt1))
+            stamp2 = int(stop_ts) if dt2 == stop_dt else int(local_calendar.to_ts(dt2))
             if stamp2 > stamp1 and stamp1 > last_stamp1:
                 yield TimeSpan(stamp1, stamp2)
                 last_stamp1 = stamp1
@@ -588,8 +784,7 @@ def archiveDaySpan(time_ts, grace=1, days_ago=0):
     if time_ts is None:
         return None
     time_ts -= grace
-    _day_date = datetime.date.fromtimestamp(time_ts)
-    _day_ord = _day_date.toordinal()
+    _day_ord = local_calendar.day_of(time_ts)
     return TimeSpan(_ord_to_ts(_day_ord - days_ago), _ord_to_ts(_day_ord - days_ago + 1))
 
 # For backwards compatibility. Not sure if anyone is actually using this
@@ -628,14 +823,14 @@ def archiveWeekSpan(time_ts, startOfWeek=6, grace=1, weeks_ago=0):
     if time_ts is None:
         return None
     time_ts -= grace
-    _day_date = datetime.date.fromtimestamp(time_ts)
+    _day_date = datetime.date.fromordinal(local_calendar.day_of(time_ts))
     _day_of_week = _day_date.weekday()
     _delta = _day_of_week - startOfWeek
     if _delta < 0: _delta += 7
     _sunday_date = _day_date - datetime.timedelta(days=(_delta + 7 * weeks_ago))
     _next_sunday_date = _sunday_date + datetime.timedelta(days=7)
-    return TimeSpan(int(time.mktime(_sunday_date.timetuple())),
-                             int(time.mktime(_next_sunday_date.timetuple())))
+    return TimeSpan(_ord_to_ts(_sunday_date.toordinal()),
+                    _ord_to_ts(_next_sunday_date.toordinal()))
 
 def archiveMonthSpan(time_ts, grace=1, months_ago=0):
     """Returns a TimeSpan representing a month that includes a given time.
@@ -670,7 +865,7 @@ def archiveMonthSpan(time_ts, grace=1, months_ago=0):
     time_ts -= grace
     
     # First find the first of the month
-    day_date = datetime.date.fromtimestamp(time_ts)
+    day_date = datetime.date.fromordinal(local_calendar.day_of(time_ts))
     start_of_month_date = day_date.replace(day=1)
 
     # Total number of months since 0AD
@@ -690,8 +885,8 @@ def archiveMonthSpan(time_ts, grace=1, months_ago=0):
     stop_month = total_months % 12 + 1
     stop_date = datetime.date(year=stop_year, month=stop_month, day=1)
      
-    return TimeSpan(int(time.mktime(start_date.timetuple())),
-                             int(time.mktime(stop_date.timetuple())))
+    return TimeSpan(_ord_to_ts(start_date.toordinal()),
+                    _ord_to_ts(stop_date.toordinal()))
 
 def archiveYearSpan(time_ts, grace=1, years_ago=0):
     """Returns a TimeSpan representing a year that includes a given time.
@@ -713,9 +908,9 @@ def archiveYearSpan(time_ts, grace=1, years_ago=0):
     if time_ts is None:
         return None
     time_ts -= grace
-    _day_date = datetime.date.fromtimestamp(time_ts)
-    return TimeSpan(int(time.mktime((_day_date.year - years_ago,     1, 1, 0, 0, 0, 0, 0, -1))),
-                    int(time.mktime((_day_date.year - years_ago + 1, 1, 1, 0, 0, 0, 0, 0, -1))))
+    _year = datetime.date.fromordinal(local_calendar.day_of(time_ts)).year - years_ago
+    return TimeSpan(_ord_to_ts(datetime.date(_year,     1, 1).toordinal()),
+                    _ord_to_ts(datetime.date(_year + 1, 1, 1).toordinal()))
 
 def archiveRainYearSpan(time_ts, sory_mon, grace=1):
     """Returns a TimeSpan representing a rain year that includes a given time.
@@ -737,10 +932,10 @@ def archiveRainYearSpan(time_ts, sory_mon, grace=1):
     if time_ts is None:
         return None
     time_ts -= grace
-    _day_date = datetime.date.fromtimestamp(time_ts)
+    _day_date = datetime.date.fromordinal(local_calendar.day_of(time_ts))
     _year = _day_date.year if _day_date.month >= sory_mon else _day_date.year - 1
-    return TimeSpan(int(time.mktime((_year, sory_mon, 1, 0, 0, 0, 0, 0, -1))),
-                             int(time.mktime((_year + 1, sory_mon, 1, 0, 0, 0, 0, 0, -1))))
+    return TimeSpan(_ord_to_ts(datetime.date(_year,     sory_mon, 1).toordinal()),
+                    _ord_to_ts(datetime.date(_year + 1, sory_mon, 1).toordinal()))
 
 def genHourSpans(start_ts, stop_ts):
     """Generator function that generates start/stop of hours in an inclusive range.
@@ -873,10 +1068,10 @@ def genMonthSpans(start_ts, stop_ts):
         _stop_month -= 1
 
     for month in range(_start_month, _stop_month + 1):
-        _this_yr, _this_mo = divmod(month, 12)
-        _next_yr, _next_mo = divmod(month + 1, 12)
-        yield TimeSpan(time.mktime((_this_yr, _this_mo, 1, 0, 0, 0, 0, 0, -1)),
-                       time.mktime((_next_yr, _next_mo, 1, 0, 0, 0, 0, 0, -1)))
+        _this_yr, _this_mo = divmod(month - 1, 12)
+        _next_yr, _next_mo = divmod(month, 12)
+        yield TimeSpan(float(_ord_to_ts(datetime.date(_this_yr, _this_mo + 1, 1).toordinal())),
+                       float(_ord_to_ts(datetime.date(_next_yr, _next_mo + 1, 1).toordinal())))
 
 def genYearSpans(start_ts, stop_ts):
     if None in (start_ts, stop_ts):
@@ -892,8 +1087,8 @@ def genYearSpans(start_ts, stop_ts):
         _stop_year -= 1
         
     for year in range(_start_year, _stop_year + 1):
-        yield TimeSpan(time.mktime((year, 1, 1, 0, 0, 0, 0, 0, -1)),
-                       time.mktime((year + 1, 1, 1, 0, 0, 0, 0, 0, -1)))
+        yield TimeSpan(float(_ord_to_ts(datetime.date(year,     1, 1).toordinal())),
+                       float(_ord_to_ts(datetime.date(year + 1, 1, 1).toordinal())))
         
 def startOfDay(time_ts):
     """Calculate the unix epoch time for the start of a (local time) day.
@@ -904,12 +1099,7 @@ def startOfDay(time_ts):
     returns: The timestamp for the start-of-day (00:00) in unix epoch time.
     
     """
-    _time_tt = time.localtime(time_ts)
-    _bod_ts = time.mktime((_time_tt.tm_year,
-                            _time_tt.tm_mon,
-                            _time_tt.tm_mday,
-                            0, 0, 0, 0, 0, -1))
-    return int(_bod_ts)
+    return local_calendar.start_of_day(time_ts)
         
 def startOfGregorianDay(date_greg):
     """Given a Gregorian day, returns the start of the day in unix epoch time.
@@ -925,10 +1115,7 @@ def startOfGregorianDay(date_greg):
     >>> print startOfGregorianDay(date_greg)
     1452412800
     """
-    date_dt = datetime.datetime.fromordinal(date_greg)
-    date_tt = date_dt.timetuple()
-    sod_ts = int(time.mktime(date_tt)) 
-    return sod_ts
+    return local_calendar.midnight(date_greg)
     
 def toGregorianDay(time_ts):
     """Return the Gregorian day a timestamp belongs to.
@@ -98,6 +98,12 @@ class END_ARCHIVE_PERIOD(object):
 class NEW_ARCHIVE_RECORD(object):
     """Event issued when a new archive record is available. The event contains
     attribute 'record', which is the new archive record."""
+class NEW_ARCHIVE_BATCH(object):
+    """Event issued after a batch of archive records, such as those caught
+    up from the console memory, has been committed to the database. The event
+    contains attribute 'records', the list of records in the batch. Each
+    record was first issued in a NEW_ARCHIVE_RECORD event, with attribute
+    'batch' set to True."""
 class POST_LOOP(object):
     """Event issued right after the main loop has been broken. Services hook
     into this to access the console for things other than generating LOOP
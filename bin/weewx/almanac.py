@@ -301,7 +301,8 @@ class Almanac(object):
                       'previous_last_quarter_moon', 'next_last_quarter_moon']:
             # This is how you call a function on an instance when all you have
             # is the function's name as a string
-            djd = getattr(ephem, attr)(self.time_djd)
+            djd = _cached((attr, self.time_djd),
+                          lambda: getattr(ephem, attr)(self.time_djd))
             return weewx.units.ValueHelper((djd, "dublin_jd", "group_time"), 
                                            context="ephem_year", formatter=self.formatter)
         else:
@@ -349,7 +350,23 @@ class AlmanacBinder(object):
 
         if attr.startswith('__'):
             raise AttributeError(attr)
-        
+
+        # The result depends on the observer and the body, and nothing else.
+        # Events during the day depend only on the day.
+        key = (self.heavenly_body, attr, self.use_center,
+               self.sod_djd if attr in fn_map else self.time_djd,
+               self.lat, self.lon, self.altitude, self.horizon,
+               self.temperature, self.pressure)
+        result = _cached(key, lambda: self._calc(attr))
+
+        if attr in fn_map or attr in ['next_rising', 'next_setting', 'next_transit', 'next_antitransit',
+                                      'previous_rising', 'previous_setting', 'previous_transit', 'previous_antitransit']:
+            return weewx.units.ValueHelper((result, "dublin_jd", "group_time"), context="ephem_day", formatter=self.formatter)
+        return result
+
+    def _calc(self, attr):
+        """Do the calculation for an observation."""
+
         # Many of these functions have the unfortunate side effect of changing the state of the body
         # being examined. So, create a temporary body and then throw it away
         ephem_body = _get_ephem_body(self.heavenly_body)
@@ -368,7 +385,7 @@ class AlmanacBinder(object):
                     time_djd = getattr(observer, attr)(ephem_body)
             except (ephem.AlwaysUpError, ephem.NeverUpError):
                 time_djd = None
-            return weewx.units.ValueHelper((time_djd, "dublin_jd", "group_time"), context="ephem_day", formatter=self.formatter)
+            return time_djd
         
         elif attr in ['next_rising', 'next_setting', 'next_transit', 'next_antitransit',
                       'previous_rising', 'previous_setting', 'previous_transit', 'previous_antitransit']:
@@ -382,7 +399,7 @@ class AlmanacBinder(object):
                     time_djd = getattr(observer, attr)(ephem_body)
             except (ephem.AlwaysUpError, ephem.NeverUpError):
                 time_djd = None
-            return weewx.units.ValueHelper((time_djd, "dublin_jd", "group_time"), context="ephem_day", formatter=self.formatter)
+            return time_djd
         else:
             # These functions need the current time in Dublin Julian Days
             observer = self._get_observer(self.time_djd)
@@ -413,6 +430,25 @@ class AlmanacBinder(object):
         observer.date      = time_ts
         return observer
         
+# The ephem calculations are slow, and reports ask for the same ones many
+# times: the sunrise appears on most pages of most skins. So, remember the
+# results, keyed by everything that goes into them. Times move on with each
+# report cycle, so old results are simply dropped when there are too many.
+MAX_CACHED = 1000
+_cache = {}
+
+def _cached(key, calc):
+    """Return the result of calc(), remembered under key."""
+    try:
+        return _cache[key]
+    except KeyError:
+        pass
+    result = calc()
+    if len(_cache) >= MAX_CACHED:
+        _cache.clear()
+    _cache[key] = result
+    return result
+
 def _get_ephem_body(heavenly_body):
     # The library 'ephem' refers to heavenly bodies using a capitalized
     # name. For example, the module used for 'mars' is 'ephem.Mars'.
@@ -463,41 +463,7 @@ class Almanac(SearchList):
     def __init__(self, generator):
         SearchList.__init__(self, generator)
 
-        celestial_ts = generator.gen_ts
-
-        # For better accuracy, the almanac requires the current temperature
-        # and barometric pressure, so retrieve them from the default archive,
-        # using celestial_ts as the time
-
-        # The default values of temperature and pressure
-        temperature_C = 15.0
-        pressure_mbar = 1010.0
-
-        # See if we can get more accurate values by looking them up in the
-        # weather database. The database might not exist, so be prepared for
-        # a KeyError exception.
-        try:
-            binding = self.generator.skin_dict.get('data_binding', 'wx_binding')
-            archive = self.generator.db_binder.get_manager(binding)
-        except (KeyError, weewx.UnknownBinding, weedb.NoDatabaseError):
-            pass
-        else:
-            # If a specific time has not been specified, then use the timestamp
-            # of the last record in the database.
-            if not celestial_ts:
-                celestial_ts = archive.lastGoodStamp()
-
-            # Check to see whether we have a good time. If so, retrieve the
-            # record from the database    
-            if celestial_ts:
-                # Look for the record closest in time. Up to one hour off is
-                # acceptable:
-                rec = archive.getRecord(celestial_ts, max_delta=3600)
-                if rec is not None:
-                    if 'outTemp' in rec:
-                        temperature_C = weewx.units.convert(weewx.units.as_value_tuple(rec, 'outTemp'), "degree_C")[0]
-                    if 'barometer' in rec:
-                        pressure_mbar = weewx.units.convert(weewx.units.as_value_tuple(rec, 'barometer'), "mbar")[0]
+        (celestial_ts, temperature_C, pressure_mbar) = _almanac_weather(generator)
         
         self.moonphases = generator.skin_dict.get('Almanac', {}).get('moon_phases', weeutil.Moon.moon_phases)
 
@@ -512,6 +478,57 @@ class Almanac(SearchList):
                                              moon_phases=self.moonphases,
                                              formatter=generator.formatter)
 
+# The weather used by the almanac, shared by all the skins of a report cycle.
+# Keyed by database, table and time.
+_almanac_weather_cache = {}
+
+def _almanac_weather(generator):
+    """Return the time for the almanac, along with the temperature in degrees
+    Celsius and the pressure in mbar at that time."""
+    celestial_ts = generator.gen_ts
+
+    # For better accuracy, the almanac requires the current temperature
+    # and barometric pressure, so retrieve them from the default archive,
+    # using celestial_ts as the time
+
+    # The default values of temperature and pressure
+    temperature_C = 15.0
+    pressure_mbar = 1010.0
+
+    # See if we can get more accurate values by looking them up in the
+    # weather database. The database might not exist, so be prepared for
+    # a KeyError exception.
+    try:
+        binding = generator.skin_dict.get('data_binding', 'wx_binding')
+        archive = generator.db_binder.get_manager(binding)
+    except (KeyError, weewx.UnknownBinding, weedb.NoDatabaseError):
+        pass
+    else:
+        # If a specific time has not been specified, then use the timestamp
+        # of the last record in the database.
+        if not celestial_ts:
+            celestial_ts = archive.lastGoodStamp()
+
+        # Check to see whether we have a good time. If so, retrieve the
+        # record from the database    
+        if celestial_ts:
+            key = (archive.database_name, archive.table_name, celestial_ts)
+            if key in _almanac_weather_cache:
+                return _almanac_weather_cache[key]
+            # Look for the record closest in time. Up to one hour off is
+            # acceptable:
+            rec = archive.getRecord(celestial_ts, max_delta=3600)
+            if rec is not None:
+                if 'outTemp' in rec:
+                    temperature_C = weewx.units.convert(weewx.units.as_value_tuple(rec, 'outTemp'), "degree_C")[0]
+                if 'barometer' in rec:
+                    pressure_mbar = weewx.units.convert(weewx.units.as_value_tuple(rec, 'barometer'), "mbar")[0]
+            # Only the latest cycle is of interest
+            _almanac_weather_cache.clear()
+            _almanac_weather_cache[key] = (celestial_ts, temperature_C, pressure_mbar)
+
+    return (celestial_ts, temperature_C, pressure_mbar)
+
 class Station(SearchList):
     """Class that implements the $station tag."""
 
@@ -40,11 +40,32 @@ _table=[
 0x6e17,  0x7e36,  0x4e55,  0x5e74,  0x2e93,  0x3eb2,  0x0ed1,  0x1ef0   # 0xF8
 ]
 
+try:
+    # binascii.crc_hqx calculates the same CCITT CRC, in C
+    from binascii import crc_hqx as _crc_hqx
+except ImportError:
+    _crc_hqx = None
+
 def crc16(string, crc_start=0):
-    """ Calculate CRC16 sum"""
+    """ Calculate CRC16 sum
+
+    string: The data. Either a string, or anything that supports the buffer
+    interface, such as a bytearray or memoryview.
+
+    crc_start: The starting value. Default is 0."""
 
-    crc_sum = reduce(lambda crc, ch : (_table[(crc >> 8) ^ ord(ch)] ^ (crc << 8)) & 0xffff, string, crc_start)
+    if _crc_hqx is not None:
+        try:
+            return _crc_hqx(string, crc_start)
+        except TypeError:
+            pass
+    return _crc16_table(string, crc_start)
 
+def _crc16_table(string, crc_start=0):
+    """Pure Python version of crc16, using the lookup table."""
+    crc_sum = crc_start
+    for ch in bytearray(string):
+        crc_sum = _table[(crc_sum >> 8) ^ ch] ^ ((crc_sum & 0xff) << 8)
     return crc_sum
 
 if __name__ == '__main__' :
@@ -53,3 +74,4 @@ if __name__ == '__main__' :
     test_str = struct.pack("<HH", 0xCEC6, 0x03A2)
     crc = crc16(test_str)
     assert(crc==0xe2b4)
+    assert(_crc16_table(test_str)==0xe2b4)
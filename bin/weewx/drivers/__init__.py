@@ -5,7 +5,12 @@
 #
 """Device drivers for the weewx weather system."""
 
+import Queue
+import sys
 import syslog
+import threading
+import time
+
 import weewx
 
 class AbstractDevice(object):
@@ -149,3 +154,246 @@ class AbstractConfEditor(object):
         this method.
         """
         pass
+
+
+PERIODIC_POLLING = 'PERIODIC'
+ADAPTIVE_POLLING = 'ADAPTIVE'
+
+class PollingScheduler(object):
+    """Decides when a polling driver should next read from its station.
+
+    In PERIODIC mode, the driver waits polling_interval seconds after it is
+    done with each reading.
+
+    In ADAPTIVE mode, the scheduler learns when the sensors update, then
+    reads just after each update. Sensors update on a fixed cycle, for
+    example every 48 seconds for Fine Offset, or every 18 seconds for the
+    AcuRite 5-in-1. If the cycle is not known, it is measured by reading every
+    min_pause seconds until several updates have been seen.
+
+    The scheduler keeps a window of time in which the next update is
+    expected. A read inside the window that sees no change moves its start
+    up; a read that sees a change moves its end back. The first read of each
+    cycle is in the middle of the window, until the window is shorter than
+    min_pause. After that there is one read per cycle, just after the window
+    closes. If no change is seen for max_misses cycles in a row, the window
+    is dropped and found again.
+
+    Drivers should skip readings that update() reports as unchanged, rather
+    than emit a duplicate packet."""
+
+    def __init__(self, name, polling_mode=PERIODIC_POLLING, polling_interval=60,
+                 sensor_period=None, min_pause=1.0, margin=0.5, max_misses=3,
+                 learn_count=4, report_interval=3600):
+        self.name = name
+        self.adaptive = polling_mode.upper() == ADAPTIVE_POLLING
+        if not self.adaptive and polling_mode.upper() != PERIODIC_POLLING:
+            raise ValueError("Unknown polling mode '%s'" % polling_mode)
+        self.polling_interval = polling_interval
+        self.sensor_period = sensor_period
+        self.period = sensor_period
+        self.min_pause = min_pause
+        self.margin = margin
+        self.max_misses = max_misses
+        self.learn_count = learn_count
+        self.report_interval = report_interval
+        self.window = None
+        self.misses = 0
+        self.last_poll = None
+        self.last_reading = None
+        self.change_times = []
+        self._reset_stats(None)
+
+    def _reset_stats(self, now):
+        self.polls = 0
+        self.changes = 0
+        self.latency_sum = 0.0
+        self.last_report = now
+
+    @property
+    def latency(self):
+        """The mean time, in seconds, from a sensor update to its reading."""
+        return self.latency_sum / self.changes if self.changes else None
+
+    def update(self, reading, now=None):
+        """Note a reading taken at time now. Returns True if it differs from
+        the previous reading."""
+        if now is None:
+            now = time.time()
+        changed = self.last_poll is None or reading != self.last_reading
+        self.polls += 1
+        self.last_reading = reading
+        if self.last_poll is not None:
+            if changed:
+                self._changed(now)
+            elif self.adaptive:
+                self._unchanged(now)
+        self.last_poll = now
+        if self.last_report is None:
+            self.last_report = now
+        elif self.adaptive and now - self.last_report >= self.report_interval:
+            self._report(now)
+        return changed
+
+    def next_poll(self):
+        """The time at which the station should next be read."""
+        if self.last_poll is None:
+            return time.time()
+        if not self.adaptive:
+            return self.last_poll + self.polling_interval
+        if self.period is None:
+            # Measuring the sensor cycle
+            return self.last_poll + self.min_pause
+        if self.window is None:
+            return self.last_poll + min(self.polling_interval, self.period / 2.0)
+        wlo, whi = self.window
+        if self.last_poll < wlo and whi - wlo > self.min_pause:
+            t = (wlo + whi) / 2.0
+        elif self.last_poll < whi + self.margin:
+            t = whi + self.margin
+        else:
+            # The update is late. Keep looking for a little while.
+            t = self.last_poll + self.min_pause
+        return max(t, self.last_poll + self.min_pause)
+
+    def delay(self, now=None):
+        """How long to wait, in seconds, before the next read. In PERIODIC
+        mode, this is always polling_interval."""
+        if not self.adaptive:
+            return self.polling_interval
+        if now is None:
+            now = time.time()
+        return max(0.0, self.next_poll() - now)
+
+    def _changed(self, now):
+        self.changes += 1
+        # The sensors updated some time after the previous read
+        lo, hi = self.last_poll, now
+        if self.window is not None:
+            wlo, whi = self.window
+            # Allow for cycles in which the readings did not change
+            k = max(0, int(round((now - whi) / self.period)))
+            wlo, whi = max(lo, wlo + k * self.period), min(hi, whi + k * self.period)
+            if wlo < whi:
+                lo, hi = wlo, whi
+            else:
+                syslog.syslog(syslog.LOG_DEBUG, "%s: update outside of expected window" % self.name)
+        self.latency_sum += now - (lo + hi) / 2.0
+        self.misses = 0
+        if self.adaptive:
+            if self.period is None:
+                self._learn(now)
+            else:
+                self.window = (lo + self.period, hi + self.period)
+
+    def _unchanged(self, now):
+        if self.window is None:
+            return
+        wlo, whi = self.window
+        if now < whi:
+            # The update has not happened yet
+            self.window = (max(wlo, now), whi)
+        elif now >= whi + self.margin + self.min_pause:
+            # Either the readings did not change this cycle, or the window is
+            # wrong. Try again next cycle, but not forever.
+            self.misses += 1
+            if self.misses > self.max_misses:
+                syslog.syslog(syslog.LOG_INFO, "%s: lost track of sensor updates" % self.name)
+                self.window = None
+                self.misses = 0
+                if self.sensor_period is None:
+                    self.period = None
+                    self.change_times = []
+            else:
+                self.window = (wlo + self.period, whi + self.period)
+
+    def _learn(self, now):
+        if now - self.last_poll > 2 * self.min_pause:
+            # Not read often enough to say when the change happened
+            self.change_times = []
+        self.change_times.append(now)
+        if len(self.change_times) > self.learn_count:
+            times = self.change_times
+            period = min(b - a for a, b in zip(times[:-1], times[1:]))
+            self.change_times = []
+            if period < 4 * self.min_pause:
+                syslog.syslog(syslog.LOG_INFO, "%s: sensors update too often (%.1f seconds) "
+                              "for adaptive polling; polling periodically" % (self.name, period))
+                self.adaptive = False
+                return
+            syslog.syslog(syslog.LOG_INFO, "%s: sensors update every %.1f seconds" % (self.name, period))
+            self.period = period
+            self.window = (now - self.min_pause + period, now + period)
+
+    def _report(self, now):
+        if self.polls:
+            latency = self.latency
+            syslog.syslog(syslog.LOG_INFO, "%s: %d reads, %d with new data, mean latency %s seconds" %
+                          (self.name, self.polls, self.changes,
+                           "%.1f" % latency if latency is not None else "unknown"))
+        self._reset_stats(now)
+
+
+def gen_read_ahead(gen, read_ahead, name='ReadAhead'):
+    """Generator function that yields what the generator gen yields, with gen
+    run in a reader thread.
+
+    The reader can get up to read_ahead items ahead of the consumer. This
+    keeps the link to the station busy while the items already read are
+    being decoded and processed. Should gen raise an exception, it is raised
+    here, once all the items before it have been consumed. When this
+    generator is closed, the reader is stopped and joined before close()
+    returns, so the station is free for other use. If read_ahead is zero, gen
+    is simply run in the calling thread.
+
+    gen: A generator, typically one that reads blocks from the station.
+
+    read_ahead: How many items the reader may get ahead of the consumer.
+
+    name: A name for the reader thread."""
+
+    if read_ahead <= 0:
+        try:
+            for item in gen:
+                yield item
+        finally:
+            gen.close()
+        return
+
+    item_queue = Queue.Queue(read_ahead)
+    stop = threading.Event()
+
+    def reader():
+        try:
+            while not stop.isSet():
+                try:
+                    item = gen.next()
+                except StopIteration:
+                    item_queue.put((False, None))
+                    return
+                item_queue.put((True, item))
+        except Exception:
+            item_queue.put((False, sys.exc_info()))
+        finally:
+            gen.close()
+
+    reader_thread = threading.Thread(target=reader, name=name)
+    reader_thread.setDaemon(True)
+    reader_thread.start()
+    try:
+        while True:
+            (more, item) = item_queue.get()
+            if not more:
+                if item is not None:
+                    raise item[0], item[1], item[2]
+                return
+            yield item
+    finally:
+        # Tell the reader to stop, and unblock it if the queue is full
+        stop.set()
+        while reader_thread.isAlive():
+            try:
+                item_queue.get(timeout=0.1)
+            except Queue.Empty:
+                pass
+        reader_thread.join()
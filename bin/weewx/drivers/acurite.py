@@ -416,6 +416,12 @@ class AcuRiteDriver(weewx.drivers.AbstractDevice):
     max_tries - How often to retry communication before giving up.
     [Optional. Default is 10]
 
+    polling_mode - PERIODIC reads the 5-in-1 sensor data (R1) every 18
+    seconds, without regard to when the sensor transmits.  ADAPTIVE learns
+    when the sensor transmits, then reads just after each transmission, and
+    skips readings that have not changed.
+    [Optional.  Default is PERIODIC]
+
     use_constants - Indicates whether to use calibration constants when
     decoding pressure and temperature.  For consoles that use the HP03 sensor,
     use the constants reported  by the sensor.  Otherwise, use a linear
@@ -443,6 +449,11 @@ class AcuRiteDriver(weewx.drivers.AbstractDevice):
         self.max_tries = int(stn_dict.get('max_tries', 10))
         self.retry_wait = int(stn_dict.get('retry_wait', 30))
         self.polling_interval = int(stn_dict.get('polling_interval', 6))
+        self.poller = weewx.drivers.PollingScheduler(
+            'acurite', stn_dict.get('polling_mode', 'PERIODIC'),
+            self._R1_INTERVAL, self._R1_INTERVAL)
+        loginf('polling mode is %s' %
+               ('ADAPTIVE' if self.poller.adaptive else 'PERIODIC'))
         self.use_constants = to_bool(stn_dict.get('use_constants', True))
         self.ignore_bounds = to_bool(stn_dict.get('ignore_bounds', False))
         if self.use_constants:
@@ -475,11 +486,14 @@ class AcuRiteDriver(weewx.drivers.AbstractDevice):
                           'usUnits': weewx.METRIC}
                 raw1 = raw2 = None
                 with Station() as station:
-                    if time.time() >= self.r1_next_read:
+                    if time.time() >= self.r1_next_read or self.poller.adaptive:
                         raw1 = station.read_R1()
                         self.r1_next_read = time.time() + self._R1_INTERVAL
                         if DEBUG_RAW > 0 and raw1:
                             logdbg("R1: %s" % _fmt_bytes(raw1))
+                        # in adaptive mode, skip readings that have not changed
+                        if self.poller.adaptive and not self.poller.update(raw1):
+                            raw1 = None
                     if time.time() >= self.r2_next_read:
                         raw2 = station.read_R2()
                         self.r2_next_read = time.time() + self._R2_INTERVAL
@@ -497,12 +511,17 @@ class AcuRiteDriver(weewx.drivers.AbstractDevice):
                     last_raw2 = raw2
                     packet.update(Station.decode_R2(
                             raw2, self.use_constants, self.ignore_bounds))
-                self._augment_packet(packet)
                 ntries = 0
-                yield packet
-                next_read = min(self.r1_next_read, self.r2_next_read)
-                delay = max(int(next_read - time.time() + 1),
-                            self.polling_interval)
+                if raw1 or raw2 or not self.poller.adaptive:
+                    self._augment_packet(packet)
+                    yield packet
+                if self.poller.adaptive:
+                    # the console data (R2) is read with the next R1
+                    delay = self.poller.delay()
+                else:
+                    next_read = min(self.r1_next_read, self.r2_next_read)
+                    delay = max(int(next_read - time.time() + 1),
+                                self.polling_interval)
                 logdbg("next read in %s seconds" % delay)
                 time.sleep(delay)
             except (usb.USBError, weewx.WeeWxIOError), e:
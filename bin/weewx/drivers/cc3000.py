@@ -383,6 +383,15 @@ class CC3000Driver(weewx.drivers.AbstractDevice):
         loginf('using serial port %s' % port)
         self.polling_interval = float(stn_dict.get('polling_interval', 1))
         loginf('polling interval is %s seconds' % self.polling_interval)
+        # with ADAPTIVE polling, learn how often the sensor data change, then
+        # poll just after each change.  this applies only when polling.
+        sensor_period = stn_dict.get('sensor_period')
+        self.poller = weewx.drivers.PollingScheduler(
+            'cc3000', stn_dict.get('polling_mode', 'PERIODIC'),
+            self.polling_interval,
+            float(sensor_period) if sensor_period is not None else None)
+        loginf('polling mode is %s' %
+               ('ADAPTIVE' if self.poller.adaptive else 'PERIODIC'))
         self.use_station_time = weeutil.weeutil.to_bool(
             stn_dict.get('use_station_time', True))
         loginf('using %s time for loop packets' %
@@ -438,7 +447,12 @@ class CC3000Driver(weewx.drivers.AbstractDevice):
                 now = int(time.time())
                 ntries = 0
                 logdbg("values: %s" % values)
-                if values:
+                # in adaptive mode, skip readings that have not changed.
+                # ignore the timestamp and checksum, which always change.
+                if cmd_mode and self.poller.adaptive and \
+                        not self.poller.update(self._sensor_values(values)):
+                    logdbg("values unchanged")
+                elif values:
                     logged_nodata = False
                     packet = self._parse_current(
                         values, self.header, self.sensor_map)
@@ -474,7 +488,9 @@ class CC3000Driver(weewx.drivers.AbstractDevice):
                             loginf("clearing all records from logger")
                             self.station.clear_memory()
 
-                if self.polling_interval:
+                if cmd_mode and self.poller.adaptive:
+                    time.sleep(self.poller.delay())
+                elif self.polling_interval:
                     time.sleep(self.polling_interval)
             except (serial.serialutil.SerialException, weewx.WeeWxIOError), e:
                 logerr("Failed attempt %d of %d to get data: %s" %
@@ -587,6 +603,9 @@ class CC3000Driver(weewx.drivers.AbstractDevice):
                    rain_total)
         return rain_delta
 
+    def _sensor_values(self, values):
+        return [v for h, v in zip(self.header, values) if h != 'TIMESTAMP']
+
     @staticmethod
     def _parse_current(values, header, sensor_map):
         return CC3000Driver._parse_values(values, header, sensor_map,
@@ -217,10 +217,11 @@ import time
 import usb
 
 import weewx.drivers
+import weewx.drivers.transport
 import weewx.wxformulas
 
 DRIVER_NAME = 'FineOffsetUSB'
-DRIVER_VERSION = '1.9'
+DRIVER_VERSION = '1.10'
 
 def loader(config_dict, engine):
     return FineOffsetUSB(**config_dict[DRIVER_NAME])
@@ -912,6 +913,18 @@ class FineOffsetUSB(weewx.drivers.AbstractDevice):
         device_id: The USB device ID for the station.  Specify this if there
         are multiple devices of the same type on the bus.
         [Optional. No default]
+
+        read_ahead: How many records a reader thread may fetch from the
+        circular buffer ahead of the record being decoded, when reading
+        records from station memory.  Zero means fetch each record only when
+        needed.
+        [Optional. Default is 0]
+
+        record_transport: Save all traffic with the station to this file.
+        [Optional. Default is to not record]
+
+        replay_transport: Replay the traffic in this file, instead of talking
+        to the station. [Optional. Default is to use the station]
         """
 
         self.model             = stn_dict.get('model', 'WH1080 (USB)')
@@ -922,6 +935,8 @@ class FineOffsetUSB(weewx.drivers.AbstractDevice):
         self.wait_before_retry = float(stn_dict.get('wait_before_retry', 30.0))
         self.max_tries         = int(stn_dict.get('max_tries', 3))
         self.device_id         = stn_dict.get('device_id', None)
+        self.read_ahead        = int(stn_dict.get('read_ahead', 0))
+        self.transport         = weewx.drivers.transport.from_config(stn_dict)
 
         # FIXME: prefer 'power_cycle_on_fail = (True|False)'
         self.pc_hub            = stn_dict.get('power_cycle_hub', None)
@@ -1026,30 +1041,36 @@ class FineOffsetUSB(weewx.drivers.AbstractDevice):
     def openPort(self):
         if self.devh is not None:
             return
+        self.devh = self.transport.open(self._open_device)
 
+    def _open_device(self):
         dev = self._find_device()
         if not dev:
             logcrt("Cannot find USB device with Vendor=0x%04x ProdID=0x%04x Device=%s" % (self.vendor_id, self.product_id, self.device_id))
             raise weewx.WeeWxIOError("Unable to find USB device")
 
-        self.devh = dev.open()
-        if not self.devh:
+        devh = dev.open()
+        if not devh:
             raise weewx.WeeWxIOError("Open USB device failed")
 
         # be sure kernel does not claim the interface
         try:
-            self.devh.detachKernelDriver(self.usb_interface)
+            devh.detachKernelDriver(self.usb_interface)
         except:
             pass
 
         # attempt to claim the interface
         try:
-            self.devh.claimInterface(self.usb_interface)
+            devh.claimInterface(self.usb_interface)
         except usb.USBError, e:
-            self.closePort()
+            try:
+                devh.releaseInterface()
+            except:
+                pass
             logcrt("Unable to claim USB interface %s: %s" %
                    (self.usb_interface, e))
             raise weewx.WeeWxIOError(e)
+        return devh
         
     def closePort(self):
         try:
@@ -1296,6 +1317,10 @@ class FineOffsetUSB(weewx.drivers.AbstractDevice):
         array go from oldest to newest.
         """
         nerr = 0
+        # blocks of the circular buffer that have been read.  if an attempt
+        # fails, the next one reads only the blocks that it does not have.
+        blocks = dict()
+        last_ptr = None
         while True:
             try:
                 fixed_block = self.get_fixed_block(unbuffered=True)
@@ -1313,26 +1338,36 @@ class FineOffsetUSB(weewx.drivers.AbstractDevice):
                     num_rec = max_count
                 logdbg('get %d records since %s' % (num_rec, dt))
                 dts, ptr = self.sync(read_period=fixed_block['read_period'])
+                if last_ptr is not None:
+                    # the station may have logged since the last attempt
+                    self._drop_blocks(blocks, last_ptr, ptr)
+                    logdbg('resuming with %d blocks already read' % len(blocks))
+                last_ptr = ptr
                 count = 0
                 records = []
-                while dts > dt and count < num_rec:
-                    raw_data = self.get_raw_data(ptr)
-                    data = self.decode(raw_data)
-                    if data['delay'] is None or data['delay'] > 30:
-                        logerr('invalid data in get_records at 0x%04x, %s' %
-                               (ptr, dts.isoformat()))
-                        dts -= datetime.timedelta(minutes=fixed_block['read_period'])
-                    else:
-                        record = dict()
-                        record['ptr'] = ptr
-                        record['datetime'] = dts
-                        record['data'] = data
-                        record['raw_data'] = raw_data
-                        record['interval'] = data['delay']
-                        records.insert(0, record)
-                        count += 1
-                        dts -= datetime.timedelta(minutes=data['delay'])
-                    ptr = self.dec_ptr(ptr)
+                raw_records = weewx.drivers.gen_read_ahead(
+                    self._gen_raw_records(ptr, blocks), self.read_ahead,
+                    'FineOffsetReader')
+                try:
+                    while dts > dt and count < num_rec:
+                        ptr, raw_data = raw_records.next()
+                        data = self.decode(raw_data)
+                        if data['delay'] is None or data['delay'] > 30:
+                            logerr('invalid data in get_records at 0x%04x, %s' %
+                                   (ptr, dts.isoformat()))
+                            dts -= datetime.timedelta(minutes=fixed_block['read_period'])
+                        else:
+                            record = dict()
+                            record['ptr'] = ptr
+                            record['datetime'] = dts
+                            record['data'] = data
+                            record['raw_data'] = raw_data
+                            record['interval'] = data['delay']
+                            records.insert(0, record)
+                            count += 1
+                            dts -= datetime.timedelta(minutes=data['delay'])
+                finally:
+                    raw_records.close()
                 return records
             except (IndexError, usb.USBError, ObservationError), e:
                 logerr('get_records failed: %s' % e)
@@ -1341,6 +1376,43 @@ class FineOffsetUSB(weewx.drivers.AbstractDevice):
                     raise weewx.WeeWxIOError("Max retries exceeded while fetching records")
                 time.sleep(self.wait_before_retry)
 
+    def _gen_raw_records(self, ptr, blocks):
+        """Generator function that returns the pointer and raw data of the
+        record at ptr, then of each record before it in the circular buffer.
+
+        blocks is a dictionary of the blocks that have been read, keyed by
+        address.  Blocks in it are not read again.  Blocks that are read are
+        added to it."""
+        count = reading_len[self.data_format]
+        while True:
+            # round down ptr to a 'block boundary'
+            idx = ptr - (ptr % 0x20)
+            raw_data = list()
+            while idx < ptr + count:
+                if idx not in blocks:
+                    blocks[idx] = self._read_block(idx)
+                raw_data += blocks[idx]
+                idx += 0x20
+            offset = ptr % 0x20
+            yield ptr, raw_data[offset:offset + count]
+            ptr = self.dec_ptr(ptr)
+
+    def _drop_blocks(self, blocks, old_ptr, new_ptr):
+        """Remove from blocks the blocks that hold the records from old_ptr up
+        to and including new_ptr, which the station may have written to."""
+        count = reading_len[self.data_format]
+        ptr = old_ptr
+        for _ in range((0x10000 - data_start) // count):
+            idx = ptr - (ptr % 0x20)
+            while idx < ptr + count:
+                blocks.pop(idx, None)
+                idx += 0x20
+            if ptr == new_ptr:
+                return
+            ptr = self.inc_ptr(ptr)
+        # new_ptr is nowhere after old_ptr, so trust none of the blocks
+        blocks.clear()
+
     def sync(self, quality=None, read_period=None):
         """Synchronise with the station to determine the date and time of the
         latest record.  Return the datetime stamp in UTC and the record
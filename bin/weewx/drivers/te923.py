@@ -49,7 +49,10 @@ From the Meade TE9233W manual (TE923W-M_IM(ENG)_BK_010511.pdf):
   Battery status of each sensor is checked every hour
 
 This implementation polls the station for data.  Use the polling_interval to
-control the frequency of polling.  Default is 10 seconds.
+control the frequency of polling.  Default is 10 seconds.  With polling_mode
+set to ADAPTIVE, the driver instead learns how often the readings change, then
+polls just after each change is due.  Readings that have not changed are not
+emitted as packets.
 
 The manual says that a single bucket tip is 0.03 inches.  In reality, a single
 bucket tip is between 0.02 and 0.03 in (0.508 to 0.762 mm).  This driver uses
@@ -441,11 +444,12 @@ import time
 import usb
 
 import weewx.drivers
+import weewx.drivers.transport
 import weewx.wxformulas
 from weeutil.weeutil import timestamp_to_string
 
 DRIVER_NAME = 'TE923'
-DRIVER_VERSION = '0.24'
+DRIVER_VERSION = '0.25'
 
 def loader(config_dict, engine):  # @UnusedVariable
     return TE923Driver(**config_dict[DRIVER_NAME])
@@ -1114,8 +1118,27 @@ class TE923Driver(weewx.drivers.AbstractDevice):
         polling_interval: How often to poll the station, in seconds.
         [Optional. Default is 10]
 
+        polling_mode: PERIODIC polls every polling_interval.  ADAPTIVE learns
+        when the readings change, then polls just after each change.
+        [Optional. Default is PERIODIC]
+
+        sensor_period: How often the readings change, in seconds, when using
+        ADAPTIVE polling.  If not specified, it is measured.
+        [Optional. No default]
+
+        read_ahead: How many records a reader thread may fetch from logger
+        memory ahead of the record being processed, when reading records from
+        the logger.  Zero means fetch each record only when needed.
+        [Optional. Default is 0]
+
         model: Which station model is this?
         [Optional. Default is 'TE923']
+
+        record_transport: Save all traffic with the station to this file.
+        [Optional. Default is to not record]
+
+        replay_transport: Replay the traffic in this file, instead of talking
+        to the station. [Optional. Default is to use the station]
         """
         loginf('driver version is %s' % DRIVER_VERSION)
 
@@ -1134,8 +1157,15 @@ class TE923Driver(weewx.drivers.AbstractDevice):
         self.max_tries = int(stn_dict.get('max_tries', 5))
         self.retry_wait = int(stn_dict.get('retry_wait', 3))
         self.read_timeout = int(stn_dict.get('read_timeout', 10))
+        self.read_ahead = int(stn_dict.get('read_ahead', 0))
         self.polling_interval = int(stn_dict.get('polling_interval', 10))
         loginf('polling interval is %s' % str(self.polling_interval))
+        self.polling_mode = stn_dict.get('polling_mode', 'PERIODIC')
+        loginf('polling mode is %s' % self.polling_mode)
+        sensor_period = stn_dict.get('sensor_period')
+        self.poller = weewx.drivers.PollingScheduler(
+            'te923', self.polling_mode, self.polling_interval,
+            float(sensor_period) if sensor_period is not None else None)
         self.sensor_map = dict(DEFAULT_MAP)
         if 'sensor_map' in stn_dict:
             self.sensor_map.update(stn_dict['sensor_map'])
@@ -1143,7 +1173,9 @@ class TE923Driver(weewx.drivers.AbstractDevice):
 
         self.station = TE923Station(max_tries=self.max_tries,
                                     retry_wait=self.retry_wait,
-                                    read_timeout=self.read_timeout)
+                                    read_timeout=self.read_timeout,
+                                    read_ahead=self.read_ahead,
+                                    transport=weewx.drivers.transport.from_config(stn_dict))
         self.station.open()
         loginf('logger capacity %s records' % self.station.get_memory_size())
         ts = self.station.get_date()
@@ -1166,13 +1198,16 @@ class TE923Driver(weewx.drivers.AbstractDevice):
     def genLoopPackets(self):
         while True:
             data = self.station.get_readings()
-            status = self.station.get_status()
-            packet = self.data_to_packet(data, status=status,
-                                         last_rain=self._last_rain_loop,
-                                         sensor_map=self.sensor_map)
-            self._last_rain_loop = packet['rainTotal']
-            yield packet
-            time.sleep(self.polling_interval)
+            # in adaptive mode, skip readings that have not changed
+            if not self.poller.adaptive or self.poller.update(
+                    dict((k, data[k]) for k in data if k != 'dateTime')):
+                status = self.station.get_status()
+                packet = self.data_to_packet(data, status=status,
+                                             last_rain=self._last_rain_loop,
+                                             sensor_map=self.sensor_map)
+                self._last_rain_loop = packet['rainTotal']
+                yield packet
+            time.sleep(self.poller.delay())
 
     # same as genStartupRecords, but insert battery status on the last record.
     # when record_generation is hardware, this results in a full suit of sensor
@@ -1511,19 +1546,23 @@ class TE923Station(object):
     TIMEOUT = 1200
     START_ADDRESS = 0x101
     RECORD_SIZE = 0x26
+    BLOCK_SIZE = 0x20
 
     idx_to_interval_sec = {
         1: 300, 2: 600, 3: 1200, 4: 1800, 5: 3600, 6: 5400, 7: 7200,
         8: 10800, 9: 14400, 10: 21600, 11: 86400}
 
     def __init__(self, vendor_id=0x1130, product_id=0x6801,
-                 max_tries=10, retry_wait=5, read_timeout=5):
+                 max_tries=10, retry_wait=5, read_timeout=5, read_ahead=0,
+                 transport=None):
         self.vendor_id = vendor_id
         self.product_id = product_id
         self.devh = None
         self.max_tries = max_tries
         self.retry_wait = retry_wait
         self.read_timeout = read_timeout
+        self.read_ahead = read_ahead
+        self.transport = transport or weewx.drivers.transport.Transport()
 
         self._num_rec = None
         self._num_blk = None
@@ -1536,35 +1575,43 @@ class TE923Station(object):
         self.close()
 
     def open(self, interface=0):
+        self.devh = self.transport.open(self._open_dev, interface)
+
+        # figure out which type of memory this station has
+        self.read_memory_size()
+
+    def _open_dev(self, interface):
         dev = self._find_dev(self.vendor_id, self.product_id)
         if not dev:
             logcrt("Cannot find USB device with VendorID=0x%04x ProductID=0x%04x" % (self.vendor_id, self.product_id))
             raise weewx.WeeWxIOError('Unable to find station on USB')
 
-        self.devh = dev.open()
-        if not self.devh:
+        devh = dev.open()
+        if not devh:
             raise weewx.WeeWxIOError('Open USB device failed')
 
         # be sure kernel does not claim the interface
         try:
-            self.devh.detachKernelDriver(interface)
+            devh.detachKernelDriver(interface)
         except (AttributeError, usb.USBError):
             pass
 
         # attempt to claim the interface
         try:
-            self.devh.claimInterface(interface)
-            self.devh.setAltInterface(interface)
+            devh.claimInterface(interface)
+            devh.setAltInterface(interface)
         except usb.USBError, e:
-            self.close()
+            try:
+                devh.releaseInterface()
+            except (ValueError, usb.USBError), e2:
+                logerr("release interface failed: %s" % e2)
             logcrt("Unable to claim USB interface %s: %s" % (interface, e))
             raise weewx.WeeWxIOError(e)
 
 # doing a reset seems to cause problems more often than it eliminates them
-#        self.devh.reset()
+#        devh.reset()
 
-        # figure out which type of memory this station has
-        self.read_memory_size()
+        return devh
 
     def close(self):
         try:
@@ -1941,28 +1988,33 @@ class TE923Station(object):
             requested += 1 # safety margin
         # get the starting address for what we want to read, plus actual count
         oldest_addr, count = self._get_starting_addr(requested)
+        # the blocks of memory read so far.  records are not aligned with the
+        # blocks, so most blocks hold parts of two records.
+        blocks = dict()
         # inner loop reads records, outer loop catches any added while reading
         more_records = True
         while more_records:
-            n = 0
-            while n < count:
-                addr = oldest_addr + n * self.RECORD_SIZE
-                if addr < self.START_ADDRESS:
-                    addr += self._num_rec * self.RECORD_SIZE
-                record = self.get_record(addr, tt.tm_year, tt.tm_mon)
-                n += 1
-                msg = "record %d of %d addr=0x%06x" % (n, count, addr)
-                if record and record['dateTime'] > since_ts:
-                    msg += " %s" % timestamp_to_string(record['dateTime'])
-                    logdbg("gen_records: yield %s" % msg)
-                    yield record
-                else:
-                    if record:
-                        msg += " since_ts=%d %s" % (
-                            since_ts, timestamp_to_string(record['dateTime']))
-                    logdbg("gen_records: skip %s" % msg)
-                # insert a sleep to simulate slow reads
-#                time.sleep(5)
+            addrs = self._get_record_addrs(oldest_addr, count)
+            raw_records = weewx.drivers.gen_read_ahead(
+                self._gen_raw_records(addrs, blocks), self.read_ahead,
+                'TE923Reader')
+            try:
+                for n, (addr, buf) in enumerate(raw_records):
+                    record = self._decode_record(addr, buf,
+                                                 tt.tm_year, tt.tm_mon)
+                    msg = "record %d of %d addr=0x%06x" % (n + 1, count, addr)
+                    if record and record['dateTime'] > since_ts:
+                        msg += " %s" % timestamp_to_string(record['dateTime'])
+                        logdbg("gen_records: yield %s" % msg)
+                        yield record
+                    else:
+                        if record:
+                            msg += " since_ts=%d %s" % (
+                                since_ts,
+                                timestamp_to_string(record['dateTime']))
+                        logdbg("gen_records: skip %s" % msg)
+            finally:
+                raw_records.close()
 
             # see if reading has taken so much time that more records have
             # arrived. read whatever records have come in since the read began.
@@ -1972,40 +2024,87 @@ class TE923Station(object):
                 newreq += 1 # safety margin
                 logdbg("gen_records: reading %d more records" % newreq)
                 oldest_addr, count = self._get_starting_addr(newreq)
+                # the station has written these since their blocks were read
+                for addr in self._get_record_addrs(oldest_addr, count):
+                    self._drop_blocks(blocks, addr, self.RECORD_SIZE)
                 start_ts = now
             else:
                 more_records = False
 
+    def _get_record_addrs(self, oldest_addr, count):
+        """the addresses of count records, starting with the oldest, allowing
+        for the wrap around the end of the record memory"""
+        addrs = []
+        for n in range(count):
+            addr = oldest_addr + n * self.RECORD_SIZE
+            if addr < self.START_ADDRESS:
+                addr += self._num_rec * self.RECORD_SIZE
+            addrs.append(addr)
+        return addrs
+
+    def _read_bytes(self, addr, count, blocks):
+        """Return count bytes of memory starting at addr.  Memory is read in
+        blocks of 32 bytes.  Any block in the dictionary blocks, which maps
+        the address of a block to its data, is not read again.  Blocks that
+        are read are added to it."""
+        data = []
+        block_addr = addr - addr % self.BLOCK_SIZE
+        while block_addr < addr + count:
+            if block_addr not in blocks:
+                # strip the header byte and the checksum
+                blocks[block_addr] = self._read(block_addr)[1:1 + self.BLOCK_SIZE]
+            data.extend(blocks[block_addr])
+            block_addr += self.BLOCK_SIZE
+        offset = addr % self.BLOCK_SIZE
+        return data[offset:offset + count]
+
+    def _drop_blocks(self, blocks, addr, count):
+        """Remove the blocks that hold any of count bytes starting at addr
+        from the dictionary blocks, so that they will be read again."""
+        block_addr = addr - addr % self.BLOCK_SIZE
+        while block_addr < addr + count:
+            blocks.pop(block_addr, None)
+            block_addr += self.BLOCK_SIZE
+
+    def _gen_raw_records(self, addrs, blocks):
+        """generator that returns the address and raw bytes of the record at
+        each of the addresses.  blocks is passed on to _read_bytes."""
+        for addr in addrs:
+            yield addr, self._read_bytes(addr, self.RECORD_SIZE, blocks)
+
     def get_record(self, addr, now_year, now_month):
         """Return a single record from station."""
 
         logdbg("get_record at address 0x%06x (year=%s month=%s)" %
                (addr, now_year, now_month))
-        buf = self._read(addr)
+        buf = self._read_bytes(addr, self.RECORD_SIZE, dict())
+        return self._decode_record(addr, buf, now_year, now_month)
+
+    @staticmethod
+    def _decode_record(addr, buf, now_year, now_month):
+        """Decode the raw bytes of the record at addr.  Return None if the
+        record holds no data."""
         if DEBUG_DECODE:
             logdbg("REC  %02x %02x %02x %02x" %
-                   (buf[1], buf[2], buf[3], buf[4]))
-        if buf[1] == 0xff:
+                   (buf[0], buf[1], buf[2], buf[3]))
+        if buf[0] == 0xff:
             logdbg("get_record: no data at address 0x%06x" % addr)
             return None
         
         year = now_year
-        month = buf[1] & 0x0f
+        month = buf[0] & 0x0f
         if month > now_month:
             year -= 1
-        day = bcd2int(buf[2])
-        hour = bcd2int(buf[3])
-        minute = bcd2int(buf[4])
+        day = bcd2int(buf[1])
+        hour = bcd2int(buf[2])
+        minute = bcd2int(buf[3])
         ts = time.mktime((year, month, day, hour, minute, 0, 0, 0, -1))
         if DEBUG_DECODE:
             logdbg("REC  %d/%02d/%02d %02d:%02d = %d" %
                    (year, month, day, hour, minute, ts))
 
-        tmpbuf = buf[5:16]
-        buf = self._read(addr + 0x10) 
-        tmpbuf.extend(buf[1:22])
-        
-        data = decode(tmpbuf)
+        # the data are in bytes 4-14 and 16-36 of the record
+        data = decode(buf[4:15] + buf[16:37])
         data['dateTime'] = int(ts)
         logdbg("get_record: found record %s" % data)
         return data
@@ -0,0 +1,315 @@
+#
+#    Copyright (c) 2017 Tom Keffer <tkeffer@gmail.com>
+#
+#    See the file LICENSE.txt for your full rights.
+#
+"""Record and replay the traffic between a driver and its hardware.
+
+A driver opens its serial port, socket or USB device handle through a
+Transport. Normally the Transport simply returns the handle. In record mode,
+every method called on the handle is saved to a file, along with what it
+returned, or the exception it raised. So is every attribute read from it. In
+replay mode, no hardware is opened. Instead, the driver gets a stand-in that
+serves back the recorded results as fast as they are asked for. This allows a driver's decoding to be timed and
+profiled without the hardware.
+
+The mode is set by the options 'record_transport' and 'replay_transport' in
+the driver's section of the configuration file. For example:
+
+[TE923]
+    ...
+    record_transport = /var/tmp/te923.rec
+
+The module can also be run directly, to time a driver against a recording:
+
+  PYTHONPATH=bin python -m weewx.drivers.transport \\
+      --driver=weewx.drivers.te923.TE923Driver \\
+      --replay=/var/tmp/te923.rec --set=polling_interval=0 --loop=1000
+
+Results are replayed in the order they were recorded, separately for each
+method or attribute name. So a driver that reads in one thread and writes in
+another will still see its reads in order. A driver that uses a method or
+attribute that was not used while recording gets an AttributeError, except
+for the methods in NO_OPS, which do nothing.
+
+Replay knows nothing of time: sleeps and timeouts in the driver itself are
+not affected, and may need to be set to zero for a useful benchmark.
+"""
+
+import cPickle
+import collections
+import syslog
+import threading
+
+import weewx
+
+MAGIC = 'weewx-transport-2'
+
+# What was recorded: a method call, or an attribute read
+CALL = 'call'
+ATTRIBUTE = 'attribute'
+
+# Methods that do nothing when replayed, if they were not called while
+# recording. A recording usually stops before the handle is closed.
+NO_OPS = frozenset(['close', 'releaseInterface'])
+
+def logmsg(level, msg):
+    syslog.syslog(level, 'transport: %s' % msg)
+
+def logdbg(msg):
+    logmsg(syslog.LOG_DEBUG, msg)
+
+def loginf(msg):
+    logmsg(syslog.LOG_INFO, msg)
+
+
+class ReplayFinished(Exception):
+    """Raised when a driver asks for more than was recorded.
+
+    It does not derive from WeeWxIOError, so that drivers do not treat it as
+    a transient error and retry."""
+
+
+class Transport(object):
+    """Opens a hardware handle, possibly recording or replaying its use."""
+
+    def __init__(self, record=None, replay=None):
+        """Initialize an instance of Transport.
+
+        record: Path of a file to which calls on the handle will be saved.
+        [Optional. Default is to not record]
+
+        replay: Path of a recording to replay, instead of opening the
+        hardware. [Optional. Default is to use the hardware]
+        """
+        if record and replay:
+            raise weewx.ViolatedPrecondition("Cannot both record and replay a transport")
+        self.record = record
+        self.replay = replay
+        self._writer = None
+        self._player = None
+
+    @property
+    def replaying(self):
+        return bool(self.replay)
+
+    def open(self, opener, *args, **kwargs):
+        """Return a handle, as returned by calling opener(*args, **kwargs).
+
+        When replaying, opener is not called."""
+        if self.replay:
+            # A driver that closes and reopens its port carries on where it
+            # left off in the recording.
+            if self._player is None:
+                loginf("replaying %s" % self.replay)
+                self._player = Player(self.replay)
+            return self._player
+        handle = opener(*args, **kwargs)
+        if self.record:
+            if self._writer is None:
+                loginf("recording to %s" % self.record)
+                self._writer = RecordWriter(self.record)
+            return Recorder(handle, self._writer)
+        return handle
+
+
+def from_config(stn_dict):
+    """Return a Transport configured from a driver's configuration section."""
+    return Transport(record=stn_dict.get('record_transport'),
+                     replay=stn_dict.get('replay_transport'))
+
+def is_replay(handle):
+    """True if the handle is being replayed from a recording."""
+    return isinstance(handle, Player)
+
+
+class RecordWriter(object):
+    """Saves calls to a recording file. Safe to use from several threads."""
+
+    def __init__(self, path):
+        self.fd = open(path, 'wb')
+        self.lock = threading.Lock()
+        cPickle.dump(MAGIC, self.fd, cPickle.HIGHEST_PROTOCOL)
+
+    def save(self, kind, name, result, exc):
+        with self.lock:
+            try:
+                data = cPickle.dumps((kind, name, result, exc), cPickle.HIGHEST_PROTOCOL)
+            except (cPickle.PicklingError, TypeError):
+                # Save an error that can be pickled in its place
+                data = cPickle.dumps((kind, name, None, weewx.WeeWxIOError(str(exc))),
+                                     cPickle.HIGHEST_PROTOCOL)
+            self.fd.write(data)
+            # Keep what has been recorded, should the driver crash
+            self.fd.flush()
+
+
+class Recorder(object):
+    """Wraps a hardware handle, saving every method call made on it, and
+    every attribute read from it."""
+
+    def __init__(self, handle, writer):
+        self._handle = handle
+        self._writer = writer
+
+    def __getattr__(self, name):
+        attr = getattr(self._handle, name)
+        writer = self._writer
+        if not callable(attr):
+            # The value may change, so every read is saved
+            writer.save(ATTRIBUTE, name, attr, None)
+            return attr
+
+        def call(*args, **kwargs):
+            try:
+                result = attr(*args, **kwargs)
+            except Exception, e:
+                writer.save(CALL, name, None, e)
+                raise
+            writer.save(CALL, name, result, None)
+            return result
+
+        # Cache the wrapper, so it is only built once
+        self.__dict__[name] = call
+        return call
+
+
+class Player(object):
+    """Stands in for a hardware handle, replaying the results of a recording."""
+
+    def __init__(self, path):
+        self._calls = collections.defaultdict(collections.deque)
+        self._attributes = collections.defaultdict(collections.deque)
+        self._lock = threading.Lock()
+        with open(path, 'rb') as fd:
+            if cPickle.load(fd) != MAGIC:
+                raise weewx.WeeWxIOError("%s is not a transport recording" % path)
+            while True:
+                try:
+                    kind, name, result, exc = cPickle.load(fd)
+                except EOFError:
+                    break
+                if kind == ATTRIBUTE:
+                    self._attributes[name].append((result, exc))
+                else:
+                    self._calls[name].append((result, exc))
+        logdbg("loaded %d calls and %d attribute reads from %s" %
+               (sum(len(q) for q in self._calls.itervalues()),
+                sum(len(q) for q in self._attributes.itervalues()), path))
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if name in self._attributes:
+            # Not cached, so that every read takes the next recorded value
+            with self._lock:
+                if not self._attributes[name]:
+                    raise ReplayFinished("No more recorded reads of %s" % name)
+                result, exc = self._attributes[name].popleft()
+            if exc is not None:
+                raise exc
+            return result
+        if name not in self._calls:
+            if name in NO_OPS:
+                return lambda *args, **kwargs: None
+            raise AttributeError("%s was not used while recording" % name)
+        queue = self._calls[name]
+        lock = self._lock
+
+        def call(*args, **kwargs):
+            with lock:
+                if not queue:
+                    raise ReplayFinished("No more recorded calls to %s" % name)
+                result, exc = queue.popleft()
+            if exc is not None:
+                raise exc
+            return result
+
+        self.__dict__[name] = call
+        return call
+
+
+def main():
+    import optparse
+    import time
+    import weeutil.weeutil
+
+    usage = """Usage: python -m weewx.drivers.transport --driver=MODULE.CLASS
+                 [--record=FILE | --replay=FILE] [--set=NAME=VALUE ...]
+                 [--loop=N] [--archive] [--profile]
+
+Time a driver, recording or replaying its traffic with the hardware."""
+    parser = optparse.OptionParser(usage=usage)
+    parser.add_option('--driver', metavar='MODULE.CLASS',
+                      help='The driver class, e.g., weewx.drivers.te923.TE923Driver')
+    parser.add_option('--record', metavar='FILE', help='Record the traffic to FILE')
+    parser.add_option('--replay', metavar='FILE', help='Replay the traffic in FILE')
+    parser.add_option('--set', metavar='NAME=VALUE', action='append', default=[],
+                      help='Set a driver option. May be given more than once')
+    parser.add_option('--loop', type=int, metavar='N', default=0,
+                      help='Get N LOOP packets')
+    parser.add_option('--archive', action='store_true',
+                      help='Get all archive records')
+    parser.add_option('--profile', action='store_true',
+                      help='Print a profile of the run')
+    parser.add_option('--debug', action='store_true', help='Log debug messages')
+    (options, _) = parser.parse_args()
+
+    if not options.driver:
+        parser.error("A driver is required")
+    syslog.openlog('transport', syslog.LOG_PID | syslog.LOG_CONS)
+    if options.debug:
+        weewx.debug = 1
+        syslog.setlogmask(syslog.LOG_UPTO(syslog.LOG_DEBUG))
+    else:
+        syslog.setlogmask(syslog.LOG_UPTO(syslog.LOG_INFO))
+
+    stn_dict = dict(opt.split('=', 1) for opt in options.set)
+    if options.record:
+        stn_dict['record_transport'] = options.record
+    if options.replay:
+        stn_dict['replay_transport'] = options.replay
+
+    def run():
+        driver = weeutil.weeutil._get_object(options.driver)(**stn_dict)
+        try:
+            if options.loop:
+                t1 = time.time()
+                n = 0
+                try:
+                    for n, _ in enumerate(driver.genLoopPackets(), 1):
+                        if n >= options.loop:
+                            break
+                except ReplayFinished:
+                    pass
+                t = time.time() - t1
+                print "%d LOOP packets in %.3f seconds; %.0f packets/second" % \
+                    (n, t, n / t if t else 0)
+            if options.archive:
+                t1 = time.time()
+                n = 0
+                try:
+                    for n, _ in enumerate(driver.genArchiveRecords(0), 1):
+                        pass
+                except ReplayFinished:
+                    pass
+                t = time.time() - t1
+                print "%d archive records in %.3f seconds; %.0f records/second" % \
+                    (n, t, n / t if t else 0)
+        finally:
+            try:
+                driver.closePort()
+            except ReplayFinished:
+                pass
+
+    if options.profile:
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        profiler.runcall(run)
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(30)
+    else:
+        run()
+
+if __name__ == '__main__':
+    main()
@@ -8,20 +8,23 @@ or VantageVue weather station"""
 
 from __future__ import with_statement
 import datetime
+import Queue
 import struct
 import sys
 import syslog
+import threading
 import time
 
 from weewx.crc16 import crc16
 from weeutil.weeutil import to_int
 import weeutil.weeutil
 import weewx.drivers
+import weewx.drivers.transport
 import weewx.units
 import weewx.engine
 
 DRIVER_NAME = 'Vantage'
-DRIVER_VERSION = '3.0.11'
+DRIVER_VERSION = '3.0.12'
 
 def loader(config_dict, engine):
     return VantageService(engine, config_dict)
@@ -230,12 +233,14 @@ def guard_termios(fn):
 class SerialWrapper(BaseWrapper):
     """Wraps a serial connection returned from package serial"""
     
-    def __init__(self, port, baudrate, timeout, wait_before_retry, command_delay):
+    def __init__(self, port, baudrate, timeout, wait_before_retry, command_delay,
+                 transport=None):
         super(SerialWrapper, self).__init__(wait_before_retry=wait_before_retry,
                                             command_delay=command_delay)
         self.port     = port
         self.baudrate = baudrate
         self.timeout  = timeout
+        self.transport = transport or weewx.drivers.transport.Transport()
 
     @guard_termios
     def flush_input(self):
@@ -280,7 +285,8 @@ class SerialWrapper(BaseWrapper):
     def openPort(self):
         import serial
         # Open up the port and store it
-        self.serial_port = serial.Serial(self.port, self.baudrate, timeout=self.timeout)
+        self.serial_port = self.transport.open(serial.Serial, self.port,
+                                               self.baudrate, timeout=self.timeout)
         syslog.syslog(syslog.LOG_DEBUG, "vantage: Opened up serial port %s; baud %d; timeout %.2f" % 
                       (self.port, self.baudrate, self.timeout))
 
@@ -299,7 +305,8 @@ class SerialWrapper(BaseWrapper):
 class EthernetWrapper(BaseWrapper):
     """Wrap a socket"""
 
-    def __init__(self, host, port, timeout, tcp_send_delay, wait_before_retry, command_delay):
+    def __init__(self, host, port, timeout, tcp_send_delay, wait_before_retry, command_delay,
+                 transport=None):
         
         super(EthernetWrapper, self).__init__(wait_before_retry=wait_before_retry, 
                                               command_delay=command_delay)
@@ -308,13 +315,19 @@ class EthernetWrapper(BaseWrapper):
         self.port           = port
         self.timeout        = timeout
         self.tcp_send_delay = tcp_send_delay
+        self.transport      = transport or weewx.drivers.transport.Transport()
+
+    def _connect(self):
+        import socket
+        _socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        _socket.settimeout(self.timeout)
+        _socket.connect((self.host, self.port))
+        return _socket
 
     def openPort(self):
         import socket
         try:
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.settimeout(self.timeout)
-            self.socket.connect((self.host, self.port))
+            self.socket = self.transport.open(self._connect)
         except (socket.error, socket.timeout, socket.herror), ex:
             syslog.syslog(syslog.LOG_ERR, "vantage: Socket error while opening port %d to ethernet host %s." % (self.port, self.host))
             # Reraise as a weewx I/O error:
@@ -461,6 +474,16 @@ class Vantage(weewx.drivers.AbstractDevice):
         
         model_type: Vantage Pro model type. 1 := Vantage Pro; 2 := Vantage Pro2
         [Optional. Default is 2]
+
+        read_ahead: How many archive pages a reader thread may fetch ahead of
+        the records being processed, while catching up. Zero means fetch each
+        page only when needed. [Optional. Default is 0]
+
+        record_transport: Save all traffic with the console to this file.
+        [Optional. Default is to not record]
+
+        replay_transport: Replay the traffic in this file, instead of talking
+        to a console. [Optional. Default is to use the console]
         """
 
         syslog.syslog(syslog.LOG_DEBUG, 'vantage: Driver version is %s' % DRIVER_VERSION)
@@ -474,6 +497,8 @@ class Vantage(weewx.drivers.AbstractDevice):
         if self.model_type not in range (1, 3):
             raise weewx.UnsupportedFeature("Unknown model_type (%d)" % self.model_type)
 
+        self.read_ahead = int(vp_dict.get('read_ahead', 0))
+
         self.save_monthRain = None
         self.max_dst_jump = 7200
 
@@ -602,41 +627,106 @@ class Vantage(weewx.drivers.AbstractDevice):
         (_npages, _start_index) = struct.unpack("<HH", _buffer[:4])
         syslog.syslog(syslog.LOG_DEBUG, "vantage: Retrieving %d page(s); starting index= %d" % (_npages, _start_index))
 
-        # Cycle through the pages...
-        for ipage in xrange(_npages):
-            # ... get a page of archive data
-            _page = self.port.get_data_with_crc16(267, prompt=_ack, max_tries=1)
-            # Now extract each record from the page
-            for _index in xrange(_start_index, 5):
-                # Get the record string buffer for this index:
-                _record_string = _page[1 + 52 * _index:53 + 52 * _index]
-                # If the console has been recently initialized, there will
-                # be unused records, which are filled with 0xff. Detect this
-                # by looking at the first 4 bytes (the date and time):
-                if _record_string[0:4] == 4 * chr(0xff) or _record_string[0:4] == 4 * chr(0x00):
-                    # This record has never been used. We're done.
-                    syslog.syslog(syslog.LOG_DEBUG, "vantage: Empty record page %d; index %d" \
-                                  % (ipage, _index))
-                    return
-                
-                # Unpack the archive packet from the string buffer:
-                _record = self._unpackArchivePacket(_record_string)
+        # Get a generator for the pages of archive data
+        if self.read_ahead > 0:
+            _page_gen = self._genPagesReadAhead(_npages)
+        else:
+            _page_gen = self._genPages(_npages)
 
-                # Check to see if the time stamps are declining, which would
-                # signal that we are done. 
-                if _record['dateTime'] is None or _record['dateTime'] <= _last_good_ts - self.max_dst_jump:
-                    # The time stamp is declining. We're done.
-                    syslog.syslog(syslog.LOG_DEBUG, "vantage: DMPAFT complete: page timestamp %s less than final timestamp %s"\
-                                  % (weeutil.weeutil.timestamp_to_string(_record['dateTime']),
-                                     weeutil.weeutil.timestamp_to_string(_last_good_ts)))
-                    syslog.syslog(syslog.LOG_DEBUG, "vantage: Catch up complete.")
-                    return
-                # Set the last time to the current time, and yield the packet
-                _last_good_ts = _record['dateTime']
-                yield _record
+        try:
+            for (ipage, _page) in enumerate(_page_gen):
+                for _record in self._genPageRecords(ipage, _page, _start_index):
+                    # An unused record means we're done
+                    if _record is None:
+                        return
+                    # Check to see if the time stamps are declining, which would
+                    # signal that we are done. 
+                    if _record['dateTime'] is None or _record['dateTime'] <= _last_good_ts - self.max_dst_jump:
+                        # The time stamp is declining. We're done.
+                        syslog.syslog(syslog.LOG_DEBUG, "vantage: DMPAFT complete: page timestamp %s less than final timestamp %s"\
+                                      % (weeutil.weeutil.timestamp_to_string(_record['dateTime']),
+                                         weeutil.weeutil.timestamp_to_string(_last_good_ts)))
+                        syslog.syslog(syslog.LOG_DEBUG, "vantage: Catch up complete.")
+                        return
+                    # Set the last time to the current time, and yield the packet
+                    _last_good_ts = _record['dateTime']
+                    yield _record
+                # The starting index for pages other than the first is always zero
+                _start_index = 0
+        finally:
+            # Stop any reader thread
+            _page_gen.close()
+
+    def _genPages(self, npages):
+        """Generator function that fetches npages pages of archive data,
+        asking for each one in turn."""
+        for _ in xrange(npages):
+            yield self.port.get_data_with_crc16(267, prompt=_ack, max_tries=1)
+
+    def _genPagesReadAhead(self, npages):
+        """Generator function that fetches npages pages of archive data.
+
+        The pages are fetched by a reader thread, which can get up to
+        read_ahead pages ahead of the consumer. This keeps the link to the
+        console busy while the records are being processed. Should fetching a
+        page fail, the exception is raised here, once all the pages before it
+        have been consumed."""
+
+        page_queue = Queue.Queue(self.read_ahead)
+        stop = threading.Event()
 
-            # The starting index for pages other than the first is always zero
-            _start_index = 0
+        def reader():
+            try:
+                for _ in xrange(npages):
+                    if stop.isSet():
+                        return
+                    _page = self.port.get_data_with_crc16(267, prompt=_ack, max_tries=1)
+                    page_queue.put((_page, None))
+                page_queue.put((None, None))
+            except Exception:
+                page_queue.put((None, sys.exc_info()))
+
+        reader_thread = threading.Thread(target=reader, name='VantageReader')
+        reader_thread.setDaemon(True)
+        reader_thread.start()
+        try:
+            while True:
+                (_page, exc_info) = page_queue.get()
+                if exc_info is not None:
+                    raise exc_info[0], exc_info[1], exc_info[2]
+                if _page is None:
+                    return
+                yield _page
+        finally:
+            # Tell the reader to stop, and unblock it if the queue is full. It
+            # must be finished with the port before anything else uses it.
+            stop.set()
+            while reader_thread.isAlive():
+                try:
+                    page_queue.get(timeout=0.1)
+                except Queue.Empty:
+                    pass
+            reader_thread.join()
+
+    def _genPageRecords(self, ipage, page, start_index=0):
+        """Generator function that decodes the records of a page of archive
+        data, starting with record start_index. Should it come across a record
+        that has never been used, it yields None and stops."""
+        for _index in xrange(start_index, 5):
+            # Get the record string buffer for this index:
+            _record_string = page[1 + 52 * _index:53 + 52 * _index]
+            # If the console has been recently initialized, there will
+            # be unused records, which are filled with 0xff. Detect this
+            # by looking at the first 4 bytes (the date and time):
+            if _record_string[0:4] == 4 * chr(0xff) or _record_string[0:4] == 4 * chr(0x00):
+                # This record has never been used. We're done.
+                syslog.syslog(syslog.LOG_DEBUG, "vantage: Empty record page %d; index %d" \
+                              % (ipage, _index))
+                yield None
+                return
+            
+            # Unpack the archive packet from the string buffer:
+            yield self._unpackArchivePacket(_record_string)
 
     def genArchiveDump(self):
         """A generator function to return all archive packets in the memory of a Davis Vantage station.
@@ -1308,19 +1398,9 @@ class Vantage(weewx.drivers.AbstractDevice):
         self.wind_cup_size    = Vantage.wind_cup_dict[self.wind_cup_type]
         self.rain_bucket_size = Vantage.rain_bucket_dict[self.rain_bucket_type]
         
-        # Adjust the translation maps to reflect the rain bucket size:
-        if self.rain_bucket_type == 1:
-            _archive_map['rain'] = _archive_map['rainRate'] = _loop_map['stormRain'] = _loop_map['dayRain'] = \
-                _loop_map['monthRain'] = _loop_map['yearRain'] = _bucket_1
-            _loop_map['rainRate'] = _bucket_1_None
-        elif self.rain_bucket_type == 2:
-            _archive_map['rain'] = _archive_map['rainRate'] = _loop_map['stormRain'] = _loop_map['dayRain'] = \
-                _loop_map['monthRain'] = _loop_map['yearRain'] = _bucket_2
-            _loop_map['rainRate'] = _bucket_2_None
-        else:
-            _archive_map['rain'] = _archive_map['rainRate'] = _loop_map['stormRain'] = _loop_map['dayRain'] = \
-                _loop_map['monthRain'] = _loop_map['yearRain'] = _val100
-            _loop_map['rainRate'] = _big_val100
+        # Get the decoders that reflect the rain bucket size:
+        (self._loop_decoder, self._archive_decoder_A,
+         self._archive_decoder_B) = _get_decoders(self.rain_bucket_type)
 
         # Try to guess the ISS ID for gauging reception strength.
         if self.iss_id is None:
@@ -1383,17 +1463,20 @@ class Vantage(weewx.drivers.AbstractDevice):
         # Get the connection type. If it is not specified, assume 'serial':
         connection_type = vp_dict.get('type', 'serial').lower()
 
+        # Allows the traffic with the console to be recorded, or replayed:
+        transport = weewx.drivers.transport.from_config(vp_dict)
+
         if connection_type == "serial":
-            port = vp_dict['port']
+            port = vp_dict.get('port') if transport.replaying else vp_dict['port']
             baudrate = int(vp_dict.get('baudrate', 19200))
             return SerialWrapper(port, baudrate, timeout,
-                                 wait_before_retry, command_delay)
+                                 wait_before_retry, command_delay, transport)
         elif connection_type == "ethernet":
-            hostname = vp_dict['host']
+            hostname = vp_dict.get('host') if transport.replaying else vp_dict['host']
             tcp_port = int(vp_dict.get('tcp_port', 22222))
             tcp_send_delay = float(vp_dict.get('tcp_send_delay', 0.5))
             return EthernetWrapper(hostname, tcp_port, timeout, tcp_send_delay,
-                                   wait_before_retry, command_delay)
+                                   wait_before_retry, command_delay, transport)
         raise weewx.UnsupportedFeature(vp_dict['type'])
 
     def _unpackLoopPacket(self, raw_loop_string):
@@ -1409,32 +1492,17 @@ class Vantage(weewx.drivers.AbstractDevice):
         # Unpack the data, using the compiled stuct.Struct string 'loop_fmt'
         data_tuple = loop_fmt.unpack(raw_loop_string)
 
-        # Put the results in a dictionary. The values will not be in physical units yet,
-        # but rather using the raw values from the console.
-        raw_loop_packet = dict(zip(loop_types, data_tuple))
-    
-        # Detect the kind of LOOP packet. Type 'A' has the character 'P' in this
-        # position. Type 'B' contains the 3-hour barometer trend in this position.
-        if raw_loop_packet['loop_type'] == ord('P'):
-            raw_loop_packet['trendIcon'] = None
-            raw_loop_packet['loop_type'] = 'A'
-        else:
-            raw_loop_packet['trendIcon'] = raw_loop_packet['loop_type']
-            raw_loop_packet['loop_type'] = 'B'
-    
         loop_packet = {'dateTime': int(time.time() + 0.5),
                        'usUnits': weewx.US}
-        
-        for _type in raw_loop_packet:
-            # Get the mapping function for this type:
-            func = _loop_map.get(_type)
-            # It it exists, apply it:
-            if func:
-                # Call the function, with the raw value as an argument:
-                val = func(raw_loop_packet[_type])
-                # Skip all null values
-                if val is not None:
-                    loop_packet[_type] = val
+
+        # Convert the raw values from the console to physical units, skipping
+        # null values:
+        self._loop_decoder(data_tuple, loop_packet)
+
+        # Detect the kind of LOOP packet. Type 'A' has the character 'P' in this
+        # position. Type 'B' contains the 3-hour barometer trend in this position.
+        if data_tuple[_loop_type_index] != ord('P'):
+            loop_packet['trendIcon'] = int(data_tuple[_loop_type_index])
             
         # Adjust sunrise and sunset:
         start_of_day = weeutil.weeutil.startOfDay(loop_packet['dateTime'])
@@ -1467,38 +1535,105 @@ class Vantage(weewx.drivers.AbstractDevice):
         if packet_type == 0xff:
             # Rev A packet type:
             archive_format = rec_fmt_A
-            dataTypes = rec_types_A
+            decoder = self._archive_decoder_A
         elif packet_type == 0x00:
             # Rev B packet type:
             archive_format = rec_fmt_B
-            dataTypes = rec_types_B
+            decoder = self._archive_decoder_B
         else:
             raise weewx.UnknownArchiveType("Unknown archive type = 0x%x" % (packet_type,)) 
             
         data_tuple = archive_format.unpack(raw_archive_string)
         
-        raw_archive_packet = dict(zip(dataTypes, data_tuple))
-        
-        archive_packet = {'dateTime': _archive_datetime(raw_archive_packet['date_stamp'], raw_archive_packet['time_stamp']),
+        # The date, time, and number of wind samples are at the same place
+        # in both types of packet.
+        archive_packet = {'dateTime': _archive_datetime(data_tuple[0], data_tuple[1]),
                           'usUnits': weewx.US}
         
-        for _type in raw_archive_packet:
-            # Get the mapping function for this type:
-            func = _archive_map.get(_type)
-            # It it exists, apply it:
-            if func:
-                # Call the function, with the raw value as an argument:
-                val = func(raw_archive_packet[_type])
-                # Skip all null values
-                if val is not None:
-                    archive_packet[_type] = val
+        # Convert the raw values to physical units, skipping null values:
+        decoder(data_tuple, archive_packet)
         
         # Divide archive interval by 60 to keep consistent with wview
         archive_packet['interval']   = int(self.archive_interval / 60) 
         archive_packet['rxCheckPercent'] = _rxcheck(self.model_type, archive_packet['interval'], 
-                                                    self.iss_id, raw_archive_packet['number_of_wind_samples'])
+                                                    self.iss_id, data_tuple[_wind_samples_index])
         return archive_packet
     
+#===============================================================================
+#                           class VantageReplay
+#===============================================================================
+
+class VantageReplay(Vantage):
+    """Decodes captured byte streams, rather than talking to a console.
+
+    This allows the decoders to be checked, profiled and timed without any
+    hardware. A LOOP stream is a sequence of 99 byte packets, as returned by
+    the LOOP command. An archive stream is a sequence of 267 byte pages, as
+    returned by the DMP or DMPAFT commands."""
+
+    def __init__(self, rain_bucket_type=0, archive_interval=300, model_type=2,
+                 iss_id=1):
+        """Initialize an object of type VantageReplay.
+
+        rain_bucket_type: 0 := 0.01 inches; 1 := 0.2 mm; 2 := 0.1 mm
+        [Optional. Default is 0]
+
+        archive_interval: The archive interval in seconds [Optional. Default
+        is 300]
+
+        model_type: Vantage Pro model type. 1 := Vantage Pro; 2 := Vantage Pro2
+        [Optional. Default is 2]
+
+        iss_id: The station number of the ISS [Optional. Default is 1]
+        """
+        self.hardware_type = None
+        self.max_tries = 1
+        self.read_ahead = 0
+        self.iss_id = iss_id
+        self.model_type = model_type
+        self.save_monthRain = None
+        self.max_dst_jump = 7200
+        self.port = None
+        self.archive_interval_ = archive_interval
+        self.rain_bucket_type = rain_bucket_type
+        (self._loop_decoder, self._archive_decoder_A,
+         self._archive_decoder_B) = _get_decoders(self.rain_bucket_type)
+
+    def openPort(self):
+        pass
+
+    def closePort(self):
+        pass
+
+    def genReplayLoopPackets(self, stream):
+        """Generator function that decodes the LOOP packets in a stream.
+
+        stream: A file-like object holding the LOOP packets."""
+        while True:
+            _buffer = stream.read(99)
+            if len(_buffer) < 99:
+                return
+            if crc16(_buffer):
+                raise weewx.CRCError("LOOP buffer failed CRC check")
+            yield self._unpackLoopPacket(_buffer[:95])
+
+    def genReplayArchiveRecords(self, stream):
+        """Generator function that decodes the archive records in a stream
+        of pages. Unused records are skipped.
+
+        stream: A file-like object holding the pages."""
+        while True:
+            _page = stream.read(267)
+            if len(_page) < 267:
+                return
+            if crc16(_page):
+                raise weewx.CRCError("Archive page failed CRC check")
+            for _index in xrange(5):
+                _record_string = _page[1 + 52 * _index:53 + 52 * _index]
+                if _record_string[0:4] == 4 * chr(0xff) or _record_string[0:4] == 4 * chr(0x00):
+                    continue
+                yield self._unpackArchivePacket(_record_string)
+
 #===============================================================================
 #                                 LOOP packet
 #===============================================================================
@@ -1533,6 +1668,7 @@ loop_format = [('loop',              '3s'), ('loop_type',          'b'), ('packe
 # Extract the types and struct.Struct formats for the LOOP packets:
 loop_types, fmt = zip(*loop_format)
 loop_fmt = struct.Struct('<' + ''.join(fmt))
+_loop_type_index = loop_types.index('loop_type')
 
 #===============================================================================
 #                              archive packet
@@ -1572,6 +1708,8 @@ rec_types_A, fmt_A = zip(*rec_format_A)
 rec_types_B, fmt_B = zip(*rec_format_B)
 rec_fmt_A = struct.Struct('<' + ''.join(fmt_A))
 rec_fmt_B = struct.Struct('<' + ''.join(fmt_B))
+_wind_samples_index = rec_types_A.index('number_of_wind_samples')
+assert _wind_samples_index == rec_types_B.index('number_of_wind_samples')
 
 def _rxcheck(model_type, interval, iss_id, number_of_wind_samples):
     """Gives an estimate of the fraction of packets received.
@@ -1813,6 +1951,110 @@ _archive_map = {'barometer'      : _val1000Zero,
                 'readClosed'     : _null,
                 'readOpened'     : _null}
 
+# The rain conversions for each type of rain bucket. The first is used for
+# rain totals, the second for the LOOP rain rate.
+_bucket_map = {0 : (_val100,   _big_val100),
+               1 : (_bucket_1, _bucket_1_None),
+               2 : (_bucket_2, _bucket_2_None)}
+
+def _get_maps(rain_bucket_type):
+    """Return copies of the LOOP and archive maps, adjusted to reflect the
+    rain bucket type."""
+    rain_func, rate_func = _bucket_map.get(rain_bucket_type, _bucket_map[0])
+    loop_map = dict(_loop_map)
+    archive_map = dict(_archive_map)
+    archive_map['rain'] = archive_map['rainRate'] = rain_func
+    for _type in ('stormRain', 'dayRain', 'monthRain', 'yearRain'):
+        loop_map[_type] = rain_func
+    loop_map['rainRate'] = rate_func
+    return loop_map, archive_map
+
+# Inline versions of the common decoding functions, for use by generated
+# decoders. Each is a 2-way tuple: a condition for the raw value 'v' to be
+# valid (or None if it is always valid), and an expression giving its value.
+_inline_map = {_big_val        : ('v != 0x7fff', 'float(v)'),
+               _big_val10      : ('v != 0x7fff', 'float(v) / 10.0'),
+               _big_val100     : ('v != 0xffff', 'float(v) / 100.0'),
+               _val100         : (None,          'float(v) / 100.0'),
+               _val1000        : (None,          'float(v) / 1000.0'),
+               _val1000Zero    : ('v != 0',      'float(v) / 1000.0'),
+               _null           : (None,          'v'),
+               _null_float     : (None,          'float(v)'),
+               _null_int       : (None,          'int(v)'),
+               _bucket_1       : (None,          'float(v) * 0.00787401575'),
+               _bucket_1_None  : ('v != 0xffff', 'float(v) * 0.00787401575'),
+               _bucket_2       : (None,          'float(v) * 0.00393700787'),
+               _bucket_2_None  : ('v != 0xffff', 'float(v) * 0.00393700787')}
+
+def _make_decoder(name, packet_format, type_map):
+    """Generate a function that decodes the raw values of a packet.
+
+    Rather than looking up and calling a decoding function for every value of
+    every packet, the decoder is generated once as a single function, with a
+    line of code for each type in the packet. One byte values are decoded by
+    looking them up in a table. Common conversions of larger values are done
+    in line. Anything else calls the decoding function in type_map.
+
+    name: A name for the function.
+
+    packet_format: A list of (type, struct format) tuples, one for each value
+    in the packet.
+
+    type_map: A dictionary mapping a type to its decoding function. Types
+    that are not in the map are not decoded.
+
+    returns: A function with signature decoder(data_tuple, packet). It
+    decodes the tuple of raw values unpacked from a packet, and puts any
+    values that are not null into the dictionary packet."""
+
+    namespace = {}
+    lines = ["def %s(t, packet):" % name]
+    for (i, (obs_type, obs_fmt)) in enumerate(packet_format):
+        func = type_map.get(obs_type)
+        if func is None:
+            continue
+        if obs_fmt == 'B':
+            # Tabulate the function for all possible byte values
+            table = tuple(func(v) for v in xrange(256))
+            table_name = '_table_%d' % i
+            namespace[table_name] = table
+            if None in table:
+                lines.append("    x = %s[t[%d]]" % (table_name, i))
+                lines.append("    if x is not None: packet[%r] = x" % obs_type)
+            else:
+                lines.append("    packet[%r] = %s[t[%d]]" % (obs_type, table_name, i))
+        elif func in _inline_map:
+            condition, expression = _inline_map[func]
+            lines.append("    v = t[%d]" % i)
+            if condition:
+                lines.append("    if %s: packet[%r] = %s" % (condition, obs_type, expression))
+            else:
+                lines.append("    packet[%r] = %s" % (obs_type, expression))
+        else:
+            func_name = '_func_%d' % i
+            namespace[func_name] = func
+            lines.append("    x = %s(t[%d])" % (func_name, i))
+            lines.append("    if x is not None: packet[%r] = x" % obs_type)
+    source = '\n'.join(lines) + '\n'
+    exec compile(source, '<vantage %s>' % name, 'exec') in namespace
+    decoder = namespace[name]
+    decoder.source = source
+    return decoder
+
+# Decoders that have been generated, keyed by rain bucket type
+_decoder_cache = {}
+
+def _get_decoders(rain_bucket_type):
+    """Return the decoders for the LOOP packet, and for rev A and rev B
+    archive packets, for the given rain bucket type."""
+    if rain_bucket_type not in _decoder_cache:
+        loop_map, archive_map = _get_maps(rain_bucket_type)
+        _decoder_cache[rain_bucket_type] = (
+            _make_decoder('decode_loop', loop_format, loop_map),
+            _make_decoder('decode_archive_A', rec_format_A, archive_map),
+            _make_decoder('decode_archive_B', rec_format_B, archive_map))
+    return _decoder_cache[rain_bucket_type]
+
 #===============================================================================
 #                      class VantageService
 #===============================================================================
@@ -2767,3 +3009,62 @@ class VantageConfEditor(weewx.drivers.AbstractConfEditor):
             print "an ethernet interface."
             settings['host'] = self._prompt('host')
         return settings
+
+
+# Replay captured LOOP or archive streams through the decoders. For example:
+#
+#   PYTHONPATH=bin python bin/weewx/drivers/vantage.py --loop=loop.dat
+#
+#   PYTHONPATH=bin python bin/weewx/drivers/vantage.py --archive=dmp.dat --time
+
+if __name__ == '__main__':
+    import optparse
+
+    usage = """%prog (--loop=FILE | --archive=FILE) [options] [--help]"""
+
+    syslog.openlog('vantage', syslog.LOG_PID | syslog.LOG_CONS)
+    syslog.setlogmask(syslog.LOG_UPTO(syslog.LOG_INFO))
+    parser = optparse.OptionParser(usage=usage)
+    parser.add_option('--version', dest='version', action='store_true',
+                      help='display driver version')
+    parser.add_option('--loop', dest='loop', metavar='FILE',
+                      help='decode the LOOP packets captured in FILE')
+    parser.add_option('--archive', dest='archive', metavar='FILE',
+                      help='decode the archive pages captured in FILE')
+    parser.add_option('--rain-bucket-type', dest='bucket', type=int, default=0,
+                      metavar='TYPE', help='rain bucket type (0, 1, or 2)')
+    parser.add_option('--archive-interval', dest='interval', type=int,
+                      default=300, metavar='SECONDS', help='archive interval')
+    parser.add_option('--repeat', dest='repeat', type=int, default=1,
+                      metavar='N', help='decode the stream N times')
+    parser.add_option('--time', dest='time', action='store_true',
+                      help='report throughput instead of the decoded data')
+    (options, args) = parser.parse_args()
+
+    if options.version:
+        print "vantage driver version %s" % DRIVER_VERSION
+        exit(1)
+    if not options.loop and not options.archive:
+        parser.error("Specify either --loop or --archive")
+
+    station = VantageReplay(rain_bucket_type=options.bucket,
+                            archive_interval=options.interval)
+    with open(options.loop or options.archive, 'rb') as f:
+        data = f.read()
+    import StringIO
+    n = 0
+    t1 = time.time()
+    for _ in xrange(options.repeat):
+        stream = StringIO.StringIO(data)
+        if options.loop:
+            gen = station.genReplayLoopPackets(stream)
+        else:
+            gen = station.genReplayArchiveRecords(stream)
+        for packet in gen:
+            n += 1
+            if not options.time:
+                print weeutil.weeutil.to_sorted_string(packet)
+    t2 = time.time()
+    if options.time:
+        print "Decoded %d packets in %.3f seconds (%.0f packets/second)" % \
+            (n, t2 - t1, n / (t2 - t1) if t2 > t1 else 0)
@@ -45,6 +45,7 @@ import time
 import usb
 
 import weewx.drivers
+import weewx.drivers.transport
 import weeutil.weeutil
 
 DRIVER_NAME = 'WMR200'
@@ -166,9 +167,11 @@ class WMR200ProtocolError(weewx.WeeWxIOError):
 
 class UsbDevice(object):
     """General class to handles all access to device via USB bus."""
-    def __init__(self):
+    def __init__(self, transport=None):
         # Polling read timeout.
         self.timeout_read = _WMR200_USB_READ_DATA_INTERVAL
+        # Opens the device handle, possibly recording or replaying its use
+        self.transport = transport or weewx.drivers.transport.Transport()
         # USB device used for libusb
         self.dev = None
         # Holds device handle for access
@@ -196,9 +199,14 @@ class UsbDevice(object):
     def open_device(self):
         """Opens a USB device and get a handle to read and write.
        
-        A specific device must have been found."""
+        A specific device must have been found, unless a recording is
+        being replayed."""
+        self.handle = self.transport.open(self._open_handle)
+
+    def _open_handle(self):
+        """Opens the device found by find_device() and returns its handle."""
         try:
-            self.handle = self.dev.open()
+            handle = self.dev.open()
         except usb.USBError, exception:
             logcrt(('open_device() Unable to open USB interface.'
                     ' Reason: %s' % exception))
@@ -209,16 +217,17 @@ class UsbDevice(object):
 
         # Detach any old claimed interfaces
         try:
-            self.handle.detachKernelDriver(self.interface)
+            handle.detachKernelDriver(self.interface)
         except usb.USBError:
             pass
 
         try:
-            self.handle.claimInterface(self.interface)
+            handle.claimInterface(self.interface)
         except usb.USBError, exception:
             logcrt(('open_device() Unable to'
                     ' claim USB interface. Reason: %s' % exception))
             raise weewx.WakeupError(exception)
+        return handle
 
     def close_device(self):
         """Close a device for access.
@@ -1430,6 +1439,9 @@ class WMR200(weewx.drivers.AbstractDevice):
         product_id: The USB product ID for the WM [Optional]
         interface: The USB interface [Optional]
         in_endpoint: The IN USB endpoint used by the WMR [Optional]
+        record_transport: Save all USB traffic to this file [Optional]
+        replay_transport: Replay the USB traffic in this file, instead of
+        talking to the console [Optional]
         """
         super(WMR200, self).__init__()
 
@@ -1493,14 +1505,16 @@ class WMR200(weewx.drivers.AbstractDevice):
         self.time_drift = None
 
         # Create USB accessor to communiate with weather console device.
-        self.usb_device = UsbDevice()
+        self.usb_device = UsbDevice(
+            weewx.drivers.transport.from_config(stn_dict))
 
         # Pass USB parameters to the USB device accessor.
         self.usb_device.in_endpoint = in_endpoint
         self.usb_device.interface = interface
 
         # Locate the weather console device on the USB bus.
-        if not self.usb_device.find_device(vendor_id, product_id):
+        if not self.usb_device.transport.replaying and \
+           not self.usb_device.find_device(vendor_id, product_id):
             logcrt('Unable to find device with VendorID=%04x ProductID=%04x' %
                    (vendor_id, product_id))
             raise weewx.WeeWxIOError("Unable to find USB device")
@@ -62,6 +62,12 @@ The driver ignores USB timeouts.  It would seem that a timeout just means that
 the station is not ready to communicate; it does not indicate a communication
 failure.
 
+While waiting for data, the driver blocks in a USB read, with a timeout that
+ends when the next heartbeat is due.  So it uses no processor time between
+packets, and gets each packet as soon as the station sends it.  Those libusb
+versions that report "No data available" at once, instead of waiting for the
+timeout, get a short pause instead, so that the driver does not spin.
+
 Internal observation names use the convention name_with_specifier.  These are
 mapped to the wview or other schema as needed with a configuration setting.
 For example, for the wview schema, wind_speed maps to windSpeed, temperature_0
@@ -782,6 +788,7 @@ import time
 import usb
 
 import weewx.drivers
+import weewx.drivers.transport
 import weewx.wxformulas
 from weeutil.weeutil import timestamp_to_string
 
@@ -958,6 +965,7 @@ class WMR300Driver(weewx.drivers.AbstractDevice):
         self.log_interval = 24 * 3600 # how often to log station status
 
         self.heartbeat = 20 # how often to send a6 messages, in seconds
+        self.idle_wait = 0.05 # pause when a read returns at once with no data
         self.history_retry = 60 # how often to retry history, in seconds
         self.last_rain = None # last rain total
         self.last_a6 = 0 # timestamp of last 0xa6 message
@@ -965,7 +973,8 @@ class WMR300Driver(weewx.drivers.AbstractDevice):
         self.last_7x = 0 # timestamp of last 0x7x message
         self.last_record = Station.HISTORY_START_REC - 1
         self.pressure_cache = dict() # FIXME: make the cache values age
-        self.station = Station()
+        self.station = Station(
+            transport=weewx.drivers.transport.from_config(stn_dict))
         self.station.open()
         pkt = self.init_comm()
         loginf("communication established: %s" % pkt)
@@ -1167,7 +1176,7 @@ class WMR300Driver(weewx.drivers.AbstractDevice):
         processed = 0
         while True:
             try:
-                buf = self.station.read()
+                buf = self.read_message()
                 if buf:
                     # the message length is 64 bytes, but historical records
                     # are 128 bytes.  so we have to assemble the two 64-byte
@@ -1233,13 +1242,12 @@ class WMR300Driver(weewx.drivers.AbstractDevice):
                 raise weewx.WeeWxIOError(e)
             except DecodeError, e:
                 loginf("genLoopPackets: %s" % e)
-            time.sleep(0.001)        
         self.finish_history()
 
     def genLoopPackets(self):
         while True:
             try:
-                buf = self.station.read()
+                buf = self.read_message()
                 if buf:
                     if buf[0] in [0xd3, 0xd4, 0xd5, 0xd6, 0xdb, 0xdc]:
                         # compose ack for most data packets
@@ -1271,7 +1279,21 @@ class WMR300Driver(weewx.drivers.AbstractDevice):
                 raise weewx.WeeWxIOError(e)
             except (DecodeError, ProtocolError), e:
                 loginf("genLoopPackets: %s" % e)
-            time.sleep(0.001)
+
+    def read_message(self):
+        """wait for the next message from the station, but only until the
+        next heartbeat is due.  return the message, or an empty list if
+        there was none."""
+        wait = self.last_a6 + self.heartbeat - time.time()
+        t1 = time.time()
+        buf = self.station.read(timeout=max(int(wait * 1000), 1))
+        if not buf and not self.station.replaying:
+            # some libusb versions say there is no data without waiting for
+            # the timeout.  do not spin.
+            pause = min(self.idle_wait, wait) - (time.time() - t1)
+            if pause > 0:
+                time.sleep(pause)
+        return buf
 
     def genStartupRecords(self, since_ts):
         for rec in self.get_history(since_ts):
@@ -1378,9 +1400,11 @@ class Station(object):
     HISTORY_N_RECORDS = 32704 # maximum number of records (MAX_REC - START_REC)
     MAX_RAIN_MM = 10160       # maximum value of rain counter, in mm
 
-    def __init__(self, vend_id=VENDOR_ID, prod_id=PRODUCT_ID):
+    def __init__(self, vend_id=VENDOR_ID, prod_id=PRODUCT_ID, transport=None):
         self.vendor_id = vend_id
         self.product_id = prod_id
+        # opens the device handle, possibly recording or replaying its use
+        self.transport = transport or weewx.drivers.transport.Transport()
         self.handle = None
         self.timeout = 500
         self.interface = 0
@@ -1394,7 +1418,14 @@ class Station(object):
     def __exit__(self, _, value, traceback):  # @UnusedVariable
         self.close()
 
+    @property
+    def replaying(self):
+        return self.transport.replaying
+
     def open(self):
+        self.handle = self.transport.open(self._open_handle)
+
+    def _open_handle(self):
         dev = self._find_dev(self.vendor_id, self.product_id)
         if not dev:
             raise WMR300Error("Unable to find station on USB: "
@@ -1402,26 +1433,30 @@ class Station(object):
                               "VendorID=0x%04x ProductID=0x%04x" %
                               (self.vendor_id, self.product_id))
 
-        self.handle = dev.open()
-        if not self.handle:
+        handle = dev.open()
+        if not handle:
             raise WMR300Error('Open USB device failed')
 
         # FIXME: reset is actually a no-op for some versions of libusb/pyusb?
-        self.handle.reset()
+        handle.reset()
 
         # for HID devices on linux, be sure kernel does not claim the interface
         try:
-            self.handle.detachKernelDriver(self.interface)
+            handle.detachKernelDriver(self.interface)
         except (AttributeError, usb.USBError):
             pass
 
         # attempt to claim the interface
         try:
-            self.handle.claimInterface(self.interface)
+            handle.claimInterface(self.interface)
         except usb.USBError, e:
-            self.close()
+            try:
+                handle.releaseInterface()
+            except (ValueError, usb.USBError):
+                pass
             raise WMR300Error("Unable to claim interface %s: %s" %
                               (self.interface, e))
+        return handle
 
     def close(self):
         if self.handle is not None:
@@ -253,6 +253,7 @@ import tty
 
 import weeutil.weeutil
 import weewx.drivers
+import weewx.drivers.transport
 import weewx.wxformulas
 
 DRIVER_NAME = 'WS23xx'
@@ -419,6 +420,12 @@ class WS23xxDriver(weewx.drivers.AbstractDevice):
 
         model: Which station model is this?
         [Optional. Default is 'LaCrosse WS23xx']
+
+        record_transport: Save all traffic with the station to this file.
+        [Optional. Default is to not record]
+
+        replay_transport: Replay the traffic in this file, instead of talking
+        to the station. [Optional. Default is to use the station]
         """
         self._last_rain = None
         self._last_cn = None
@@ -436,13 +443,14 @@ class WS23xxDriver(weewx.drivers.AbstractDevice):
         self.enable_archive_records = stn_dict.get('enable_archive_records',
                                                    True)
         self.mode = stn_dict.get('mode', 'single_open')
+        self.transport = weewx.drivers.transport.from_config(stn_dict)
 
         loginf('driver version is %s' % DRIVER_VERSION)
         loginf('serial port is %s' % self.port)
         loginf('polling interval is %s' % self.polling_interval)
 
         if self.mode == 'single_open':
-            self.station = WS23xx(self.port)
+            self.station = WS23xx(self.port, self.transport)
         else:
             self.station = None
 
@@ -470,7 +478,7 @@ class WS23xxDriver(weewx.drivers.AbstractDevice):
                 if self.station:
                     data = self.station.get_raw_data(SENSOR_IDS)
                 else:
-                    with WS23xx(self.port) as s:
+                    with WS23xx(self.port, self.transport) as s:
                         data = s.get_raw_data(SENSOR_IDS)
                 packet = data_to_packet(data, int(time.time() + 0.5),
                                         last_rain=self._last_rain)
@@ -507,7 +515,7 @@ class WS23xxDriver(weewx.drivers.AbstractDevice):
         if self.station:
             return self.genRecords(self.station, since_ts)
         else:
-            with WS23xx(self.port) as s:
+            with WS23xx(self.port, self.transport) as s:
                 return self.genRecords(s, since_ts)
 
     def genArchiveRecords(self, since_ts, count=0):
@@ -516,7 +524,7 @@ class WS23xxDriver(weewx.drivers.AbstractDevice):
         if self.station:
             return self.genRecords(self.station, since_ts, count)
         else:
-            with WS23xx(self.port) as s:
+            with WS23xx(self.port, self.transport) as s:
                 return self.genRecords(s, since_ts, count)
 
     def genRecords(self, s, since_ts, count=0):
@@ -539,14 +547,14 @@ class WS23xxDriver(weewx.drivers.AbstractDevice):
         if self.station:
             return self.station.get_archive_interval()
         else:
-            with WS23xx(self.port) as s:
+            with WS23xx(self.port, self.transport) as s:
                 return s.get_archive_interval()
 
     def setArchiveInterval(self, interval):
         if self.station:
             self.station.set_archive_interval(interval)
         else:
-            with WS23xx(self.port) as s:
+            with WS23xx(self.port, self.transport) as s:
                 s.set_archive_interval(interval)
 
     def getConfig(self):
@@ -554,7 +562,7 @@ class WS23xxDriver(weewx.drivers.AbstractDevice):
         if self.station:
             data = self.station.get_raw_data(Measure.IDS.keys())
         else:
-            with WS23xx(self.port) as s:
+            with WS23xx(self.port, self.transport) as s:
                 data = s.get_raw_data(Measure.IDS.keys())
         for key in data:
             fdata[Measure.IDS[key].name] = data[key]
@@ -564,14 +572,14 @@ class WS23xxDriver(weewx.drivers.AbstractDevice):
         if self.station:
             return self.station.get_record_count()
         else:
-            with WS23xx(self.port) as s:
+            with WS23xx(self.port, self.transport) as s:
                 return s.get_record_count()
 
     def clearHistory(self):
         if self.station:
             self.station.clear_memory()
         else:
-            with WS23xx(self.port) as s:
+            with WS23xx(self.port, self.transport) as s:
                 s.clear_memory()
 
 
@@ -643,9 +651,11 @@ class WS23xx(object):
     """Wrap the Ws2300 object so we can easily open serial port, read/write,
     close serial port without all of the try/except/finally scaffolding."""
 
-    def __init__(self, port):
+    def __init__(self, port, transport=None):
         logdbg('create LinuxSerialPort')
-        self.serial_port = LinuxSerialPort(port)
+        if transport is None:
+            transport = weewx.drivers.transport.Transport()
+        self.serial_port = transport.open(LinuxSerialPort, port)
         logdbg('create Ws2300')
         self.ws = Ws2300(self.serial_port)
 
@@ -1001,6 +1011,7 @@ class Ws2300(object):
     log_mode    = None    # string, Log mode
     long_nest    = None    # int,    Nesting of log actions
     serial_port    = None    # string, SerialPort port to use
+    read_delay    = None    # float,  Pause after reading each byte
     #
     # Initialise ourselves.
     #
@@ -1008,6 +1019,8 @@ class Ws2300(object):
         self.log_buffer = []
         self.log_nest = 0
         self.serial_port = serial_port
+        # There is no contention to avoid when replaying a recording
+        self.read_delay = 0 if weewx.drivers.transport.is_replay(serial_port) else 0.01
     #
     # Write data to the device.
     #
@@ -1030,7 +1043,7 @@ class Ws2300(object):
             self.log("--")
         else:
             self.log("%02x" % ord(result))
-        time.sleep(0.01) # reduce chance of data spike by avoiding contention
+        time.sleep(self.read_delay) # reduce chance of data spike by avoiding contention
         return result
     #
     # Remove all pending incoming characters.
@@ -925,6 +925,7 @@ Step 8. Go to step 1 to wait for state 0xde16 again.
 
 from datetime import datetime
 
+import binascii
 import StringIO
 import sys
 import syslog
@@ -938,7 +939,7 @@ import weewx.wxformulas
 import weeutil.weeutil
 
 DRIVER_NAME = 'WS28xx'
-DRIVER_VERSION = '0.35'
+DRIVER_VERSION = '0.36'
 
 
 def loader(config_dict, engine):
@@ -2250,6 +2251,232 @@ class USBHardware(object):
         return result
 
 
+# Decoders for the frames of current weather data and history records. Rather
+# than calling the functions of USBHardware for each field, which look at the
+# nibbles one at a time, the frame is converted in one step to a string with a
+# hexadecimal digit for each nibble. A decoder that is generated from the
+# layout of the frame then reads each field from a slice of that string. A
+# field that holds only decimal digits is valid. Any other field is either an
+# error (a nibble of 0xA to 0xE) or an overflow (a nibble of 0xF). The results
+# are identical to those of the USBHardware functions, which remain for the
+# rest of the driver.
+#
+# Each field of a layout is a tuple (attribute, kind, byte, StartOnHiNibble),
+# where kind names the USBHardware function that would decode the field. The
+# 'datetime' fields have a fifth element, the label used to report bogus
+# dates. A 'datetime_if_valid' field is the time of the value of the same
+# measurement, and is None if the value is an error or an overflow.
+
+# The decimal fields, as a tuple (number of nibbles, number of integer digits,
+# offset, no data value, overflow value). The digits after the integer digits
+# are tenths, hundredths and thousandths.
+_decimal_kinds = {
+    'temperature_5_3':   (5, 2, CWeatherTraits.TemperatureOffset(),
+                          CWeatherTraits.TemperatureNP(), CWeatherTraits.TemperatureOFL()),
+    'temperature_3_1':   (3, 2, CWeatherTraits.TemperatureOffset(),
+                          CWeatherTraits.TemperatureNP(), CWeatherTraits.TemperatureOFL()),
+    'humidity_2_0':      (2, 2, None,
+                          CWeatherTraits.HumidityNP(), CWeatherTraits.HumidityOFL()),
+    'rain_6_2':          (6, 4, None, CWeatherTraits.RainNP(), CWeatherTraits.RainOFL()),
+    'rain_7_3':          (7, 4, None, CWeatherTraits.RainNP(), CWeatherTraits.RainOFL()),
+    'pressure_hPa_5_1':  (5, 4, None,
+                          CWeatherTraits.PressureNP(), CWeatherTraits.PressureOFL()),
+    'pressure_inHg_5_2': (5, 3, None,
+                          CWeatherTraits.PressureNP(), CWeatherTraits.PressureOFL())}
+
+# The fields of 3 hexadecimal nibbles with 1 decimal, as a tuple (factor, no
+# data value, overflow value).
+_hex_kinds = {
+    'windspeed_3_1': (3.6, CWeatherTraits.WindNP(), CWeatherTraits.WindOFL()),
+    'rain_3_1':      (2.54, CWeatherTraits.RainNP(), CWeatherTraits.RainOFL())}
+
+# The values of a decimal digit as tenths, hundredths and thousandths. These
+# are the products the USBHardware functions add up, so the sums are the same.
+_fraction_tables = [dict((str(d), d * w) for d in xrange(10))
+                    for w in (0.1, 0.01, 0.001)]
+
+_nibble_values = dict(('%x' % d, d) for d in xrange(16))
+
+def _np_or_ofl(digits, np_value, ofl_value):
+    """The value of a field with a nibble that is not a decimal digit."""
+    if digits.translate(None, '0123456789f'):
+        return np_value
+    return ofl_value
+
+def _make_decoder(name, layout):
+    """Generate a function that decodes the fields of a frame.
+
+    name: A name for the function.
+
+    layout: A list of fields, as described above.
+
+    returns: A function with signature decoder(buf, obj). It decodes the frame
+    in buf[0], and sets the attributes of obj to the values of the fields."""
+
+    namespace = {'_hexlify': binascii.hexlify,
+                 '_datetime': datetime,
+                 '_to_datetime': USBHardware.toDateTime,
+                 '_np_or_ofl': _np_or_ofl,
+                 '_nibble_values': _nibble_values}
+    for i, table in enumerate(_fraction_tables):
+        namespace['_fraction_%d' % i] = table
+    lines = ["def %s(buf, obj):" % name,
+             "    h = _hexlify(bytearray(buf[0]))"]
+    kinds = {}
+    for i, field in enumerate(layout):
+        attr, kind, start, hi = field[:4]
+        kinds[attr] = kind
+        n = 2 * start + (0 if hi else 1)
+        if kind in _decimal_kinds:
+            nibbles, digits, offset, np_value, ofl_value = _decimal_kinds[kind]
+            namespace['_np_%s' % kind] = np_value
+            namespace['_ofl_%s' % kind] = ofl_value
+            terms = ["int(s[:%d])" % digits]
+            terms.extend("_fraction_%d[s[%d]]" % (j, digits + j)
+                         for j in xrange(nibbles - digits))
+            expression = ' + '.join(terms)
+            if offset is not None:
+                namespace['_offset_%s' % kind] = offset
+                expression += " - _offset_%s" % kind
+            lines.append("    s = h[%d:%d]" % (n, n + nibbles))
+            lines.append("    if s.isdigit(): obj.%s = %s" % (attr, expression))
+            lines.append("    else: obj.%s = _np_or_ofl(s, _np_%s, _ofl_%s)" % (attr, kind, kind))
+        elif kind in _hex_kinds:
+            factor, np_value, ofl_value = _hex_kinds[kind]
+            namespace['_np_%s' % kind] = np_value
+            namespace['_ofl_%s' % kind] = ofl_value
+            lines.append("    s = h[%d:%d]" % (n, n + 3))
+            lines.append("    if s == 'ffe': obj.%s = _np_%s" % (attr, kind))
+            lines.append("    elif s == 'fff': obj.%s = _ofl_%s" % (attr, kind))
+            lines.append("    else: obj.%s = int(s, 16) / 10.0 * %r" % (attr, factor))
+        elif kind == 'windspeed_6_2':
+            # Never checked for errors, but the time of a gust is
+            namespace['_np_%s' % kind] = CWeatherTraits.WindNP()
+            namespace['_ofl_%s' % kind] = CWeatherTraits.WindOFL()
+            lines.append("    obj.%s = int(h[%d:%d], 16) / 256.0 / 100.0" % (attr, n, n + 6))
+        elif kind == 'nibble':
+            lines.append("    obj.%s = _nibble_values[h[%d]]" % (attr, n))
+        elif kind in ('datetime', 'datetime_if_valid'):
+            label = field[4]
+            indent = "    "
+            if kind == 'datetime_if_valid':
+                value_attr = attr.rsplit('.', 1)[0] + '._Value'
+                value_kind = kinds[value_attr]
+                lines.append("    x = obj.%s" % value_attr)
+                lines.append("    if x == _np_%s or x == _ofl_%s: obj.%s = None" % (value_kind, value_kind, attr))
+                lines.append("    else:")
+                indent += "    "
+            # Anything but a valid date is left to USBHardware, which
+            # reports it.
+            fallback = "obj.%s = _to_datetime(buf, %d, %d, %r)" % (attr, start, hi, label)
+            lines.append(indent + "s = h[%d:%d]" % (n, n + 10))
+            lines.append(indent + "if s.isdigit():")
+            lines.append(indent + "    try: obj.%s = _datetime(int(s[:2]) + 2000, int(s[2:4]), "
+                         "int(s[4:6]), int(s[6:8]), int(s[8:]))" % attr)
+            lines.append(indent + "    except ValueError: " + fallback)
+            lines.append(indent + "else: " + fallback)
+        else:
+            raise ValueError("Unknown kind of field '%s' for %s" % (kind, attr))
+    source = '\n'.join(lines) + '\n'
+    exec compile(source, '<ws28xx %s>' % name, 'exec') in namespace
+    decoder = namespace[name]
+    decoder.source = source
+    return decoder
+
+_current_weather_layout = [
+    ('_TempIndoorMinMax._Max._Value', 'temperature_5_3', 19, 0),
+    ('_TempIndoorMinMax._Min._Value', 'temperature_5_3', 22, 1),
+    ('_TempIndoor', 'temperature_5_3', 24, 0),
+    ('_TempIndoorMinMax._Max._Time', 'datetime_if_valid', 9, 0, 'TempIndoorMax'),
+    ('_TempIndoorMinMax._Min._Time', 'datetime_if_valid', 14, 0, 'TempIndoorMin'),
+    ('_TempOutdoorMinMax._Max._Value', 'temperature_5_3', 37, 0),
+    ('_TempOutdoorMinMax._Min._Value', 'temperature_5_3', 40, 1),
+    ('_TempOutdoor', 'temperature_5_3', 42, 0),
+    ('_TempOutdoorMinMax._Max._Time', 'datetime_if_valid', 27, 0, 'TempOutdoorMax'),
+    ('_TempOutdoorMinMax._Min._Time', 'datetime_if_valid', 32, 0, 'TempOutdoorMin'),
+    ('_WindchillMinMax._Max._Value', 'temperature_5_3', 55, 0),
+    ('_WindchillMinMax._Min._Value', 'temperature_5_3', 58, 1),
+    ('_Windchill', 'temperature_5_3', 60, 0),
+    ('_WindchillMinMax._Max._Time', 'datetime_if_valid', 45, 0, 'WindchillMax'),
+    ('_WindchillMinMax._Min._Time', 'datetime_if_valid', 50, 0, 'WindchillMin'),
+    ('_DewpointMinMax._Max._Value', 'temperature_5_3', 73, 0),
+    ('_DewpointMinMax._Min._Value', 'temperature_5_3', 76, 1),
+    ('_Dewpoint', 'temperature_5_3', 78, 0),
+    ('_DewpointMinMax._Min._Time', 'datetime_if_valid', 68, 0, 'DewpointMin'),
+    ('_DewpointMinMax._Max._Time', 'datetime_if_valid', 63, 0, 'DewpointMax'),
+    ('_HumidityIndoorMinMax._Max._Value', 'humidity_2_0', 91, 1),
+    ('_HumidityIndoorMinMax._Min._Value', 'humidity_2_0', 92, 1),
+    ('_HumidityIndoor', 'humidity_2_0', 93, 1),
+    ('_HumidityIndoorMinMax._Max._Time', 'datetime_if_valid', 81, 1, 'HumidityIndoorMax'),
+    ('_HumidityIndoorMinMax._Min._Time', 'datetime_if_valid', 86, 1, 'HumidityIndoorMin'),
+    ('_HumidityOutdoorMinMax._Max._Value', 'humidity_2_0', 104, 1),
+    ('_HumidityOutdoorMinMax._Min._Value', 'humidity_2_0', 105, 1),
+    ('_HumidityOutdoor', 'humidity_2_0', 106, 1),
+    ('_HumidityOutdoorMinMax._Max._Time', 'datetime_if_valid', 94, 1, 'HumidityOutdoorMax'),
+    ('_HumidityOutdoorMinMax._Min._Time', 'datetime_if_valid', 99, 1, 'HumidityOutdoorMin'),
+    ('_RainLastMonthMax._Max._Time', 'datetime', 107, 1, 'RainLastMonthMax'),
+    ('_RainLastMonthMax._Max._Value', 'rain_6_2', 112, 1),
+    ('_RainLastMonth', 'rain_6_2', 115, 1),
+    ('_RainLastWeekMax._Max._Time', 'datetime', 118, 1, 'RainLastWeekMax'),
+    ('_RainLastWeekMax._Max._Value', 'rain_6_2', 123, 1),
+    ('_RainLastWeek', 'rain_6_2', 126, 1),
+    ('_Rain24HMax._Max._Time', 'datetime', 129, 1, 'Rain24HMax'),
+    ('_Rain24HMax._Max._Value', 'rain_6_2', 134, 1),
+    ('_Rain24H', 'rain_6_2', 137, 1),
+    ('_Rain1HMax._Max._Time', 'datetime', 140, 1, 'Rain1HMax'),
+    ('_Rain1HMax._Max._Value', 'rain_6_2', 145, 1),
+    ('_Rain1H', 'rain_6_2', 148, 1),
+    ('_LastRainReset', 'datetime', 151, 0, 'LastRainReset'),
+    ('_RainTotal', 'rain_7_3', 156, 0),
+    ('_WindDirection', 'nibble', 162, 0),
+    ('_WindDirection1', 'nibble', 162, 1),
+    ('_WindDirection2', 'nibble', 161, 0),
+    ('_WindDirection3', 'nibble', 161, 1),
+    ('_WindDirection4', 'nibble', 160, 0),
+    ('_WindDirection5', 'nibble', 160, 1),
+    ('_WindSpeed', 'windspeed_6_2', 172, 1),
+    # FIXME: read the WindErrFlags
+    ('_GustDirection', 'nibble', 177, 0),
+    ('_GustDirection1', 'nibble', 177, 1),
+    ('_GustDirection2', 'nibble', 176, 0),
+    ('_GustDirection3', 'nibble', 176, 1),
+    ('_GustDirection4', 'nibble', 175, 0),
+    ('_GustDirection5', 'nibble', 175, 1),
+    ('_GustMax._Max._Value', 'windspeed_6_2', 184, 1),
+    ('_GustMax._Max._Time', 'datetime_if_valid', 179, 1, 'GustMax'),
+    ('_Gust', 'windspeed_6_2', 187, 1),
+    # Apparently the station returns only ONE date time for both hPa/inHg
+    # Min Time Reset and Max Time Reset
+    ('_PressureRelative_hPaMinMax._Max._Time', 'datetime', 190, 1, 'PressureRelative_hPaMax'),
+    # The pressures are shared: the inHg value starts on the high nibble of
+    # a byte, and the hPa value on the low nibble 2 bytes later.
+    # firmware bug, should be: self._PressureRelative_hPaMinMax._Min._Time
+    ('_PresRel_hPa_Max', 'pressure_hPa_5_1', 197, 0),
+    ('_PresRel_inHg_Max', 'pressure_inHg_5_2', 195, 1),
+    ('_PressureRelative_hPaMinMax._Max._Value', 'pressure_hPa_5_1', 202, 0),
+    ('_PressureRelative_inHgMinMax._Max._Value', 'pressure_inHg_5_2', 200, 1),
+    ('_PressureRelative_hPaMinMax._Min._Value', 'pressure_hPa_5_1', 207, 0),
+    ('_PressureRelative_inHgMinMax._Min._Value', 'pressure_inHg_5_2', 205, 1),
+    ('_PressureRelative_hPa', 'pressure_hPa_5_1', 212, 0),
+    ('_PressureRelative_inHg', 'pressure_inHg_5_2', 210, 1)]
+
+_history_layout = [
+    ('Gust', 'windspeed_3_1', 12, 0),
+    ('GustDirection', 'nibble', 14, 1),
+    ('WindSpeed', 'windspeed_3_1', 14, 0),
+    ('WindDirection', 'nibble', 14, 1),
+    ('RainCounterRaw', 'rain_3_1', 16, 1),
+    ('HumidityOutdoor', 'humidity_2_0', 17, 0),
+    ('HumidityIndoor', 'humidity_2_0', 18, 0),
+    ('PressureRelative', 'pressure_hPa_5_1', 19, 0),
+    ('TempIndoor', 'temperature_3_1', 23, 0),
+    ('TempOutdoor', 'temperature_3_1', 22, 1),
+    ('Time', 'datetime', 25, 1, 'HistoryData')]
+
+_decode_current_weather = _make_decoder('decode_current_weather', _current_weather_layout)
+_decode_history = _make_decoder('decode_history', _history_layout)
+
+
 class CCurrentWeatherData(object):
 
     def __init__(self):
@@ -2324,94 +2551,40 @@ class CCurrentWeatherData(object):
         if self._WeatherState > 3:
             self._WeatherState = 3 
 
-        self._TempIndoorMinMax._Max._Value = USBHardware.toTemperature_5_3(nbuf, 19, 0)
-        self._TempIndoorMinMax._Min._Value = USBHardware.toTemperature_5_3(nbuf, 22, 1)
-        self._TempIndoor = USBHardware.toTemperature_5_3(nbuf, 24, 0)
+        _decode_current_weather(nbuf, self)
+
         self._TempIndoorMinMax._Min._IsError = (self._TempIndoorMinMax._Min._Value == CWeatherTraits.TemperatureNP())
         self._TempIndoorMinMax._Min._IsOverflow = (self._TempIndoorMinMax._Min._Value == CWeatherTraits.TemperatureOFL())
         self._TempIndoorMinMax._Max._IsError = (self._TempIndoorMinMax._Max._Value == CWeatherTraits.TemperatureNP())
         self._TempIndoorMinMax._Max._IsOverflow = (self._TempIndoorMinMax._Max._Value == CWeatherTraits.TemperatureOFL())
-        self._TempIndoorMinMax._Max._Time = None if self._TempIndoorMinMax._Max._IsError or self._TempIndoorMinMax._Max._IsOverflow else USBHardware.toDateTime(nbuf, 9, 0, 'TempIndoorMax')
-        self._TempIndoorMinMax._Min._Time = None if self._TempIndoorMinMax._Min._IsError or self._TempIndoorMinMax._Min._IsOverflow else USBHardware.toDateTime(nbuf, 14, 0, 'TempIndoorMin')
 
-        self._TempOutdoorMinMax._Max._Value = USBHardware.toTemperature_5_3(nbuf, 37, 0)
-        self._TempOutdoorMinMax._Min._Value = USBHardware.toTemperature_5_3(nbuf, 40, 1)
-        self._TempOutdoor = USBHardware.toTemperature_5_3(nbuf, 42, 0)
         self._TempOutdoorMinMax._Min._IsError = (self._TempOutdoorMinMax._Min._Value == CWeatherTraits.TemperatureNP())
         self._TempOutdoorMinMax._Min._IsOverflow = (self._TempOutdoorMinMax._Min._Value == CWeatherTraits.TemperatureOFL())
         self._TempOutdoorMinMax._Max._IsError = (self._TempOutdoorMinMax._Max._Value == CWeatherTraits.TemperatureNP())
         self._TempOutdoorMinMax._Max._IsOverflow = (self._TempOutdoorMinMax._Max._Value == CWeatherTraits.TemperatureOFL())
-        self._TempOutdoorMinMax._Max._Time = None if self._TempOutdoorMinMax._Max._IsError or self._TempOutdoorMinMax._Max._IsOverflow else USBHardware.toDateTime(nbuf, 27, 0, 'TempOutdoorMax')
-        self._TempOutdoorMinMax._Min._Time = None if self._TempOutdoorMinMax._Min._IsError or self._TempOutdoorMinMax._Min._IsOverflow else USBHardware.toDateTime(nbuf, 32, 0, 'TempOutdoorMin')
 
-        self._WindchillMinMax._Max._Value = USBHardware.toTemperature_5_3(nbuf, 55, 0)
-        self._WindchillMinMax._Min._Value = USBHardware.toTemperature_5_3(nbuf, 58, 1)
-        self._Windchill = USBHardware.toTemperature_5_3(nbuf, 60, 0)
         self._WindchillMinMax._Min._IsError = (self._WindchillMinMax._Min._Value == CWeatherTraits.TemperatureNP())
         self._WindchillMinMax._Min._IsOverflow = (self._WindchillMinMax._Min._Value == CWeatherTraits.TemperatureOFL())
         self._WindchillMinMax._Max._IsError = (self._WindchillMinMax._Max._Value == CWeatherTraits.TemperatureNP())
         self._WindchillMinMax._Max._IsOverflow = (self._WindchillMinMax._Max._Value == CWeatherTraits.TemperatureOFL())
-        self._WindchillMinMax._Max._Time = None if self._WindchillMinMax._Max._IsError or self._WindchillMinMax._Max._IsOverflow else USBHardware.toDateTime(nbuf, 45, 0, 'WindchillMax')
-        self._WindchillMinMax._Min._Time = None if self._WindchillMinMax._Min._IsError or self._WindchillMinMax._Min._IsOverflow else USBHardware.toDateTime(nbuf, 50, 0, 'WindchillMin')
 
-        self._DewpointMinMax._Max._Value = USBHardware.toTemperature_5_3(nbuf, 73, 0)
-        self._DewpointMinMax._Min._Value = USBHardware.toTemperature_5_3(nbuf, 76, 1)
-        self._Dewpoint = USBHardware.toTemperature_5_3(nbuf, 78, 0)
         self._DewpointMinMax._Min._IsError = (self._DewpointMinMax._Min._Value == CWeatherTraits.TemperatureNP())
         self._DewpointMinMax._Min._IsOverflow = (self._DewpointMinMax._Min._Value == CWeatherTraits.TemperatureOFL())
         self._DewpointMinMax._Max._IsError = (self._DewpointMinMax._Max._Value == CWeatherTraits.TemperatureNP())
         self._DewpointMinMax._Max._IsOverflow = (self._DewpointMinMax._Max._Value == CWeatherTraits.TemperatureOFL())
-        self._DewpointMinMax._Min._Time = None if self._DewpointMinMax._Min._IsError or self._DewpointMinMax._Min._IsOverflow else USBHardware.toDateTime(nbuf, 68, 0, 'DewpointMin')
-        self._DewpointMinMax._Max._Time = None if self._DewpointMinMax._Max._IsError or self._DewpointMinMax._Max._IsOverflow else USBHardware.toDateTime(nbuf, 63, 0, 'DewpointMax')
 
-        self._HumidityIndoorMinMax._Max._Value = USBHardware.toHumidity_2_0(nbuf, 91, 1)
-        self._HumidityIndoorMinMax._Min._Value = USBHardware.toHumidity_2_0(nbuf, 92, 1)
-        self._HumidityIndoor = USBHardware.toHumidity_2_0(nbuf, 93, 1)
         self._HumidityIndoorMinMax._Min._IsError = (self._HumidityIndoorMinMax._Min._Value == CWeatherTraits.HumidityNP())
         self._HumidityIndoorMinMax._Min._IsOverflow = (self._HumidityIndoorMinMax._Min._Value == CWeatherTraits.HumidityOFL())
         self._HumidityIndoorMinMax._Max._IsError = (self._HumidityIndoorMinMax._Max._Value == CWeatherTraits.HumidityNP())
         self._HumidityIndoorMinMax._Max._IsOverflow = (self._HumidityIndoorMinMax._Max._Value == CWeatherTraits.HumidityOFL())
-        self._HumidityIndoorMinMax._Max._Time = None if self._HumidityIndoorMinMax._Max._IsError or self._HumidityIndoorMinMax._Max._IsOverflow else USBHardware.toDateTime(nbuf, 81, 1, 'HumidityIndoorMax')
-        self._HumidityIndoorMinMax._Min._Time = None if self._HumidityIndoorMinMax._Min._IsError or self._HumidityIndoorMinMax._Min._IsOverflow else USBHardware.toDateTime(nbuf, 86, 1, 'HumidityIndoorMin')
 
-        self._HumidityOutdoorMinMax._Max._Value = USBHardware.toHumidity_2_0(nbuf, 104, 1)
-        self._HumidityOutdoorMinMax._Min._Value = USBHardware.toHumidity_2_0(nbuf, 105, 1)
-        self._HumidityOutdoor = USBHardware.toHumidity_2_0(nbuf, 106, 1)
         self._HumidityOutdoorMinMax._Min._IsError = (self._HumidityOutdoorMinMax._Min._Value == CWeatherTraits.HumidityNP())
         self._HumidityOutdoorMinMax._Min._IsOverflow = (self._HumidityOutdoorMinMax._Min._Value == CWeatherTraits.HumidityOFL())
         self._HumidityOutdoorMinMax._Max._IsError = (self._HumidityOutdoorMinMax._Max._Value == CWeatherTraits.HumidityNP())
         self._HumidityOutdoorMinMax._Max._IsOverflow = (self._HumidityOutdoorMinMax._Max._Value == CWeatherTraits.HumidityOFL())
-        self._HumidityOutdoorMinMax._Max._Time = None if self._HumidityOutdoorMinMax._Max._IsError or self._HumidityOutdoorMinMax._Max._IsOverflow else USBHardware.toDateTime(nbuf, 94, 1, 'HumidityOutdoorMax')
-        self._HumidityOutdoorMinMax._Min._Time = None if self._HumidityOutdoorMinMax._Min._IsError or self._HumidityOutdoorMinMax._Min._IsOverflow else USBHardware.toDateTime(nbuf, 99, 1, 'HumidityOutdoorMin')
-
-        self._RainLastMonthMax._Max._Time = USBHardware.toDateTime(nbuf, 107, 1, 'RainLastMonthMax')
-        self._RainLastMonthMax._Max._Value = USBHardware.toRain_6_2(nbuf, 112, 1)
-        self._RainLastMonth = USBHardware.toRain_6_2(nbuf, 115, 1)
 
-        self._RainLastWeekMax._Max._Time = USBHardware.toDateTime(nbuf, 118, 1, 'RainLastWeekMax')
-        self._RainLastWeekMax._Max._Value = USBHardware.toRain_6_2(nbuf, 123, 1)
-        self._RainLastWeek = USBHardware.toRain_6_2(nbuf, 126, 1)
-
-        self._Rain24HMax._Max._Time = USBHardware.toDateTime(nbuf, 129, 1, 'Rain24HMax')
-        self._Rain24HMax._Max._Value = USBHardware.toRain_6_2(nbuf, 134, 1)
-        self._Rain24H = USBHardware.toRain_6_2(nbuf, 137, 1)
-        
-        self._Rain1HMax._Max._Time = USBHardware.toDateTime(nbuf, 140, 1, 'Rain1HMax')
-        self._Rain1HMax._Max._Value = USBHardware.toRain_6_2(nbuf, 145, 1)
-        self._Rain1H = USBHardware.toRain_6_2(nbuf, 148, 1)
-
-        self._LastRainReset = USBHardware.toDateTime(nbuf, 151, 0, 'LastRainReset')
-        self._RainTotal = USBHardware.toRain_7_3(nbuf, 156, 0)
-
-        (w ,w1) = USBHardware.readWindDirectionShared(nbuf, 162)
-        (w2,w3) = USBHardware.readWindDirectionShared(nbuf, 161)
-        (w4,w5) = USBHardware.readWindDirectionShared(nbuf, 160)
-        self._WindDirection = w
-        self._WindDirection1 = w1
-        self._WindDirection2 = w2
-        self._WindDirection3 = w3
-        self._WindDirection4 = w4
-        self._WindDirection5 = w5
+        self._GustMax._Max._IsError = (self._GustMax._Max._Value == CWeatherTraits.WindNP())
+        self._GustMax._Max._IsOverflow = (self._GustMax._Max._Value == CWeatherTraits.WindOFL())
 
         if DEBUG_WEATHER_DATA > 2:
             unknownbuf = [0]*9
@@ -2422,37 +2595,10 @@ class CCurrentWeatherData(object):
                 strbuf += str("%.2x " % i)
             logdbg('Bytes with unknown meaning at 157-165: %s' % strbuf)
 
-        self._WindSpeed = USBHardware.toWindspeed_6_2(nbuf, 172)
-
-        # FIXME: read the WindErrFlags
-        (g ,g1) = USBHardware.readWindDirectionShared(nbuf, 177)
-        (g2,g3) = USBHardware.readWindDirectionShared(nbuf, 176)
-        (g4,g5) = USBHardware.readWindDirectionShared(nbuf, 175)
-        self._GustDirection = g
-        self._GustDirection1 = g1
-        self._GustDirection2 = g2
-        self._GustDirection3 = g3
-        self._GustDirection4 = g4
-        self._GustDirection5 = g5
-
-        self._GustMax._Max._Value = USBHardware.toWindspeed_6_2(nbuf, 184)
-        self._GustMax._Max._IsError = (self._GustMax._Max._Value == CWeatherTraits.WindNP())
-        self._GustMax._Max._IsOverflow = (self._GustMax._Max._Value == CWeatherTraits.WindOFL())
-        self._GustMax._Max._Time = None if self._GustMax._Max._IsError or self._GustMax._Max._IsOverflow else USBHardware.toDateTime(nbuf, 179, 1, 'GustMax')
-        self._Gust = USBHardware.toWindspeed_6_2(nbuf, 187)
-
-        # Apparently the station returns only ONE date time for both hPa/inHg
-        # Min Time Reset and Max Time Reset
-        self._PressureRelative_hPaMinMax._Max._Time = USBHardware.toDateTime(nbuf, 190, 1, 'PressureRelative_hPaMax')
         self._PressureRelative_inHgMinMax._Max._Time = self._PressureRelative_hPaMinMax._Max._Time
         self._PressureRelative_hPaMinMax._Min._Time  = self._PressureRelative_hPaMinMax._Max._Time # firmware bug, should be: USBHardware.toDateTime(nbuf, 195, 1)
         self._PressureRelative_inHgMinMax._Min._Time = self._PressureRelative_hPaMinMax._Min._Time        
 
-        (self._PresRel_hPa_Max, self._PresRel_inHg_Max) = USBHardware.readPressureShared(nbuf, 195, 1) # firmware bug, should be: self._PressureRelative_hPaMinMax._Min._Time
-        (self._PressureRelative_hPaMinMax._Max._Value, self._PressureRelative_inHgMinMax._Max._Value) = USBHardware.readPressureShared(nbuf, 200, 1)
-        (self._PressureRelative_hPaMinMax._Min._Value, self._PressureRelative_inHgMinMax._Min._Value) = USBHardware.readPressureShared(nbuf, 205, 1)
-        (self._PressureRelative_hPa, self._PressureRelative_inHg) = USBHardware.readPressureShared(nbuf, 210, 1)
-
     def toLog(self):
         logdbg("_WeatherState=%s _WeatherTendency=%s _AlarmRingingFlags %04x" % (CWeatherTraits.forecastMap[self._WeatherState], CWeatherTraits.trendMap[self._WeatherTendency], self._AlarmRingingFlags))
         logdbg("_TempIndoor=     %8.3f _Min=%8.3f (%s)  _Max=%8.3f (%s)" % (self._TempIndoor, self._TempIndoorMinMax._Min._Value, self._TempIndoorMinMax._Min._Time, self._TempIndoorMinMax._Max._Value, self._TempIndoorMinMax._Max._Time))
@@ -2897,17 +3043,7 @@ class CHistoryData(object):
     def read(self, buf):
         nbuf = [0]
         nbuf[0] = buf[0]
-        self.Gust = USBHardware.toWindspeed_3_1(nbuf, 12, 0)
-        self.GustDirection = (nbuf[0][14] >> 4) & 0xF
-        self.WindSpeed = USBHardware.toWindspeed_3_1(nbuf, 14, 0)
-        self.WindDirection = (nbuf[0][14] >> 4) & 0xF
-        self.RainCounterRaw = USBHardware.toRain_3_1(nbuf, 16, 1)
-        self.HumidityOutdoor = USBHardware.toHumidity_2_0(nbuf, 17, 0)
-        self.HumidityIndoor = USBHardware.toHumidity_2_0(nbuf, 18, 0)    
-        self.PressureRelative = USBHardware.toPressure_hPa_5_1(nbuf, 19, 0)
-        self.TempIndoor = USBHardware.toTemperature_3_1(nbuf, 23, 0)
-        self.TempOutdoor = USBHardware.toTemperature_3_1(nbuf, 22, 1)
-        self.Time = USBHardware.toDateTime(nbuf, 25, 1, 'HistoryData')
+        _decode_history(nbuf, self)
 
     def toLog(self):
         """emit raw historical data"""
@@ -27,6 +27,7 @@ import daemon
 import weedb
 import weewx.accum
 import weewx.manager
+import weewx.packet
 import weewx.qc
 import weewx.station
 import weewx.reportengine
@@ -65,6 +66,9 @@ class StdEngine(object):
         # Default garbage collection is every 3 hours:
         self.gc_interval = int(config_dict.get('gc_interval', 3 * 3600))
 
+        # Whether to pass LOOP packets around as compact packets:
+        self.compact_packets = to_bool(config_dict.get('compact_packets', False))
+
         # Set up the callback dictionary:
         self.callbacks = dict()
 
@@ -186,7 +190,10 @@ class StdEngine(object):
                     # throwing an exception (usually when an archive period
                     # has passed).
                     for packet in self.console.genLoopPackets():
-                        
+
+                        if self.compact_packets:
+                            packet = weewx.packet.CompactPacket(packet)
+
                         # Package the packet as an event, then dispatch it.
                         self.dispatchEvent(weewx.Event(weewx.NEW_LOOP_PACKET, packet=packet))
 
@@ -447,6 +454,7 @@ class StdArchive(StdService):
             software_interval = to_int(config_dict['StdArchive'].get('archive_interval', 300))
             self.loop_hilo = to_bool(config_dict['StdArchive'].get('loop_hilo', True))
             self.record_augmentation = to_bool(config_dict['StdArchive'].get('record_augmentation', True))
+            self.catchup_batch_size = to_int(config_dict['StdArchive'].get('catchup_batch_size', 0))
         else:
             self.data_binding = 'wx_binding'
             self.record_generation = 'hardware'
@@ -454,6 +462,7 @@ class StdArchive(StdService):
             software_interval = 300
             self.loop_hilo = True
             self.record_augmentation = True
+            self.catchup_batch_size = 0
             
         syslog.syslog(syslog.LOG_INFO, "engine: Archive will use data binding %s" % self.data_binding)
         
@@ -614,6 +623,10 @@ class StdArchive(StdService):
         # Find out when the database was last updated.
         lastgood_ts = dbmanager.lastGoodStamp()
 
+        if self.catchup_batch_size > 1:
+            self._batch_catchup(generator(lastgood_ts), dbmanager)
+            return
+
         try:
             # Now ask the console for any new records since then.
             # (Not all consoles support this feature).
@@ -624,6 +637,56 @@ class StdArchive(StdService):
         except weewx.HardwareError, e:
             syslog.syslog(syslog.LOG_ERR, "engine: Internal error detected. Catchup abandoned")
             syslog.syslog(syslog.LOG_ERR, "**** %s" % e)
+
+    def _batch_catchup(self, record_generator, dbmanager):
+        """Archive the records coming off the console in batches.
+
+        Each record still goes through the services as a NEW_ARCHIVE_RECORD
+        event, but all the records of a batch are committed in a single
+        transaction. Once committed, the batch is announced with a
+        NEW_ARCHIVE_BATCH event. Services that act on the records as they are
+        dispatched, other than the uploaders, see them before they have been
+        committed.
+
+        Should the console or a service raise an exception part way through
+        a batch, the records dispatched so far are committed before the
+        exception is passed on, so that the next catch up starts after them."""
+        record_iter = iter(record_generator)
+        done = False
+        error = None
+        while not done:
+            batch = []
+            with dbmanager.batch():
+                try:
+                    # Each pass picks up where the last one left off
+                    for record in record_iter:
+                        self.engine.dispatchEvent(weewx.Event(weewx.NEW_ARCHIVE_RECORD,
+                                                              record=record,
+                                                              origin='hardware',
+                                                              batch=True))
+                        batch.append(record)
+                        if len(batch) >= self.catchup_batch_size:
+                            break
+                    else:
+                        done = True
+                except weewx.HardwareError, e:
+                    # Keep the records that made it so far
+                    syslog.syslog(syslog.LOG_ERR, "engine: Internal error detected. Catchup abandoned")
+                    syslog.syslog(syslog.LOG_ERR, "**** %s" % e)
+                    done = True
+                except Exception:
+                    # Keep the records that made it so far, then pass the
+                    # exception on
+                    error = sys.exc_info()
+                    done = True
+            if batch:
+                syslog.syslog(syslog.LOG_INFO, "engine: Caught up %d records, ending %s" %
+                              (len(batch), weeutil.weeutil.timestamp_to_string(batch[-1]['dateTime'])))
+                self.engine.dispatchEvent(weewx.Event(weewx.NEW_ARCHIVE_BATCH,
+                                                      records=batch,
+                                                      origin='hardware'))
+        if error is not None:
+            raise error[0], error[1], error[2]
         
     def _software_catchup(self):
         # Extract a record out of the old accumulator. 
@@ -720,12 +783,15 @@ class StdPrint(StdService):
 #==============================================================================
 
 class StdReport(StdService):
-    """Launches a separate thread to do reporting."""
+    """Launches a separate thread, or optionally a separate process, to do
+    reporting."""
     
     def __init__(self, engine, config_dict):
         super(StdReport, self).__init__(engine, config_dict)
         self.max_wait = int(config_dict['StdReport'].get('max_wait', 600))
+        self.use_process = to_bool(config_dict['StdReport'].get('use_process', False))
         self.thread = None
+        self.process = None
         self.launch_time = None
         self.record = None
         
@@ -738,6 +804,9 @@ class StdReport(StdService):
     
     def launch_report_thread(self, event):  # @UnusedVariable
         """Called after the packet LOOP. Processes any new data."""
+        if self.use_process:
+            self.launch_report_process()
+            return
         # Do not launch the reporting thread if an old one is still alive.
         # To guard against a zombie thread (alive, but doing nothing) launch
         # anyway if enough time has passed.
@@ -765,6 +834,46 @@ class StdReport(StdService):
             syslog.syslog(syslog.LOG_ERR, "Unable to launch report thread.")
             self.thread = None
 
+    def launch_report_process(self):
+        """Hand a report cycle to the report process, starting the process
+        if necessary."""
+        if self.process is None:
+            self.process = weewx.reportengine.ReportProcess(self.config_dict)
+
+        # Log the timing of the previous cycle, if it has finished
+        elapsed = self.process.poll()
+        if elapsed is not None:
+            syslog.syslog(syslog.LOG_INFO,
+                          "engine: Report process finished cycle in %.2f seconds"
+                          % elapsed)
+
+        # Same zombie protection as for the report thread. If the process is
+        # stuck, kill it and start afresh.
+        if self.process.busy:
+            process_age = time.time() - self.launch_time
+            if process_age < self.max_wait:
+                syslog.syslog(syslog.LOG_INFO,
+                              "engine: Launch of report cycle aborted: "
+                              "report process still busy")
+                return
+            else:
+                syslog.syslog(syslog.LOG_WARNING,
+                              "engine: Report process has been busy %s seconds."
+                              "  Restarting it." % process_age)
+                self.process.terminate()
+
+        try:
+            if not self.process.is_alive():
+                self.process.start()
+            self.process.start_cycle(self.engine.stn_info,
+                                     self.record,
+                                     first_run=not self.launch_time)
+            self.launch_time = time.time()
+        except (OSError, IOError), e:
+            syslog.syslog(syslog.LOG_ERR,
+                          "engine: Unable to launch report process: %s" % e)
+            self.process.terminate()
+
     def shutDown(self):
         if self.thread:
             syslog.syslog(syslog.LOG_INFO, "engine: Shutting down StdReport thread")
@@ -773,7 +882,15 @@ class StdReport(StdService):
                 syslog.syslog(syslog.LOG_ERR, "engine: Unable to shut down StdReport thread")
             else:
                 syslog.syslog(syslog.LOG_DEBUG, "engine: StdReport thread has been terminated")
+        if self.process:
+            syslog.syslog(syslog.LOG_INFO, "engine: Shutting down StdReport process")
+            if not self.process.stop(20.0):
+                syslog.syslog(syslog.LOG_ERR, "engine: Unable to shut down StdReport process. Killing it.")
+                self.process.terminate()
+            else:
+                syslog.syslog(syslog.LOG_DEBUG, "engine: StdReport process has been terminated")
         self.thread = None
+        self.process = None
         self.launch_time = None
 
 #==============================================================================
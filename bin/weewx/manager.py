@@ -66,6 +66,8 @@ class Manager(object):
 
         self.connection = connection
         self.table_name = table_name
+        # The batch currently open, if any. See class Batch.
+        self._batch = None
 
         # Now get the SQL types. 
         try:
@@ -230,32 +232,55 @@ class Manager(object):
         # something iterable (a list):
         record_list = [record_obj] if hasattr(record_obj, 'keys') else record_obj
         
+        if self._batch is not None:
+            # A batch is open. The records will be committed along with it.
+            self._addRecords(record_list, self._batch.cursor, log_level, accumulator)
+        else:
+            with Batch(self) as _batch:
+                self._addRecords(record_list, _batch.cursor, log_level, accumulator)
+
+    def batch(self):
+        """Return a context manager that will gather all records added
+        within it into a single transaction. See class Batch."""
+        return Batch(self)
+
+    def _addRecords(self, record_list, cursor, log_level, accumulator):
+        """Internal function for adding records within an open transaction."""
+
         min_ts = None
         max_ts = 0
-        with weedb.Transaction(self.connection) as cursor:
+        for record in record_list:
+            try:
+                # If the accumulator time matches the record we are working with,
+                # use it to update the highs and lows.
+                if accumulator and record['dateTime'] == accumulator.timespan.stop:
+                    self._updateHiLo(accumulator, cursor)
 
-            for record in record_list:
-                try:
-                    # If the accumulator time matches the record we are working with,
-                    # use it to update the highs and lows.
-                    if accumulator and record_obj['dateTime'] == accumulator.timespan.stop:
-                        self._updateHiLo(accumulator, cursor)
-
-                    # Then add the record to the archives:
-                    self._addSingleRecord(record, cursor, log_level)
-
-                    min_ts = min(min_ts, record['dateTime']) if min_ts is not None else record['dateTime']
-                    max_ts = max(max_ts, record['dateTime'])
-                except (weedb.IntegrityError, weedb.OperationalError), e:
-                    syslog.syslog(syslog.LOG_ERR, "manager: "
-                                  "Unable to add record %s to database '%s': %s" %
-                                  (weeutil.weeutil.timestamp_to_string(record['dateTime']), 
-                                   self.database_name, e))
-
-        # Update the cached timestamps. This has to sit outside the
-        # transaction context, in case an exception occurs.
+                # Then add the record to the archives:
+                self._addSingleRecord(record, cursor, log_level)
+
+                min_ts = min(min_ts, record['dateTime']) if min_ts is not None else record['dateTime']
+                max_ts = max(max_ts, record['dateTime'])
+            except (weedb.IntegrityError, weedb.OperationalError), e:
+                syslog.syslog(syslog.LOG_ERR, "manager: "
+                              "Unable to add record %s to database '%s': %s" %
+                              (weeutil.weeutil.timestamp_to_string(record['dateTime']), 
+                               self.database_name, e))
+
+        # Update the cached timestamps. Should the transaction get rolled
+        # back, class Batch will resynch them.
         self.first_timestamp = min(min_ts, self.first_timestamp)
         self.last_timestamp  = max(max_ts, self.last_timestamp)
+
+    def _flush(self, cursor):
+        """Write out anything held back while adding records. Called just
+        before a transaction is committed. This version holds nothing back."""
+        pass
+
+    def _discard(self):
+        """Forget anything held back while adding records. Called when a
+        transaction is rolled back."""
+        pass
         
     def _addSingleRecord(self, record, cursor, log_level):
         """Internal function for adding a single record to the database."""
@@ -792,6 +817,56 @@ class Manager(object):
                 ValueTuple(data_vec, data_type, data_group))
 
 
+#==============================================================================
+#                         class Batch
+#==============================================================================
+
+class Batch(object):
+    """Class to be used to gather the records added to a manager in a 'with'
+    clause into a single transaction.
+
+    Example:
+        with dbmanager.batch():
+            for record in record_list:
+                dbmanager.addRecord(record)
+
+    Records added within the clause are visible to queries made through the
+    same manager, but not to other connections, until the clause exits and
+    the transaction is committed. If an exception is raised, everything added
+    within the clause is rolled back."""
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.cursor = None
+
+    def __enter__(self):
+        if self.manager._batch is not None:
+            raise weewx.ViolatedPrecondition("Batches cannot be nested")
+        self.manager.connection.begin()
+        self.cursor = self.manager.connection.cursor()
+        self.manager._batch = self
+        return self
+
+    def __exit__(self, etyp, einst, etb):  # @UnusedVariable
+        self.manager._batch = None
+        committed = False
+        try:
+            if etyp is None:
+                # Write out anything the manager held back, then commit
+                self.manager._flush(self.cursor)
+                self.manager.connection.commit()
+                committed = True
+        finally:
+            if not committed:
+                self.manager.connection.rollback()
+                self.manager._discard()
+                self.manager._sync()
+            try:
+                self.cursor.close()
+            except weedb.DatabaseError:
+                pass
+
+
 def reconfig(old_db_dict, new_db_dict, new_unit_system=None, new_schema=None):
     """Copy over an old archive to a new one, using a provided schema."""
     
@@ -1162,6 +1237,12 @@ class DaySummaryManager(Manager):
         self.version = self._read_metadata('Version')
         syslog.syslog(syslog.LOG_DEBUG,
                       'manager: Daily summary version is %s' % self.version)
+
+        # The daily summary being updated in the current transaction, as a
+        # tuple (start of day, accumulator), and the time of the last update
+        # to it. See _get_cached_day_summary().
+        self._day_cache = None
+        self._last_update = None
     
     def close(self):
         del self.version
@@ -1196,9 +1277,9 @@ class DaySummaryManager(Manager):
         _weight = self._calc_weight(record)
 
         # Now add to the daily summary for the appropriate day:
-        _day_summary = self._get_day_summary(_sod_ts, cursor)
+        _day_summary = self._get_cached_day_summary(_sod_ts, cursor)
         _day_summary.addRecord(record, weight=_weight)
-        self._set_day_summary(_day_summary, record['dateTime'], cursor)
+        self._last_update = record['dateTime']
         syslog.syslog(log_level, "manager: Added record %s to daily summary in '%s'" % 
                       (weeutil.weeutil.timestamp_to_string(record['dateTime']), 
                        self.database_name))
@@ -1210,11 +1291,34 @@ class DaySummaryManager(Manager):
         _sod_ts = weeutil.weeutil.startOfArchiveDay(accumulator.timespan.stop)
 
         # Retrieve the daily summaries seen so far:
-        _stats_dict = self._get_day_summary(_sod_ts, cursor)
-        # Update them with the contents of the accumulator:
+        _stats_dict = self._get_cached_day_summary(_sod_ts, cursor)
+        # Update them with the contents of the accumulator. They will be saved
+        # when the transaction is committed.
         _stats_dict.updateHiLo(accumulator)
-        # Then save the results:
-        self._set_day_summary(_stats_dict, accumulator.timespan.stop, cursor)
+        self._last_update = accumulator.timespan.stop
+
+    def _get_cached_day_summary(self, sod_ts, cursor):
+        """Return the daily summary for the day starting at sod_ts.
+
+        Within a transaction, a day's summary is read from the database only
+        once, then written back when records for another day arrive, or when
+        the transaction is committed. A batch of records thus costs one
+        read-modify-write per day, rather than one per record."""
+        if self._day_cache is None or self._day_cache[0] != sod_ts:
+            self._flush(cursor)
+            self._day_cache = (sod_ts, self._get_day_summary(sod_ts, cursor))
+        return self._day_cache[1]
+
+    def _flush(self, cursor):
+        """Write the cached daily summary back to the database."""
+        if self._day_cache is not None:
+            self._set_day_summary(self._day_cache[1], self._last_update, cursor)
+        self._discard()
+
+    def _discard(self):
+        """Forget the cached daily summary."""
+        self._day_cache = None
+        self._last_update = None
         
     def getAggregate(self, timespan, obs_type, aggregate_type, **option_dict):
         """Returns an aggregation of a statistical type for a given time period.
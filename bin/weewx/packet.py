@@ -0,0 +1,219 @@
+#
+#    Copyright (c) 2017 Tom Keffer <tkeffer@gmail.com>
+#
+#    See the file LICENSE.txt for your full rights.
+#
+"""A compact, dictionary compatible, representation of LOOP packets.
+
+A CompactPacket holds its values in a list, indexed by a schema that maps each
+observation type to a position in the list. The schema is shared by all
+packets, and grows as new observation types are seen. Which observation types
+are actually present in a packet is recorded in a bit mask.
+
+Copying a CompactPacket does not copy its values. Instead, the list of values
+is shared between the two packets, until one of them is changed. So, a service
+that makes a copy of a packet but only reads it costs very little.
+
+Example:
+
+>>> p = CompactPacket({'dateTime': 1500000000, 'usUnits': 1, 'outTemp': 68.0})
+>>> print p['outTemp']
+68.0
+>>> q = p.copy()
+>>> q['outTemp'] = 70.0
+>>> print p['outTemp'], q['outTemp']
+68.0 70.0
+>>> print sorted(q.keys())
+['dateTime', 'outTemp', 'usUnits']
+>>> del q['outTemp']
+>>> print 'outTemp' in q, 'outTemp' in p
+False True
+"""
+
+import collections
+import threading
+
+# The most layouts a Schema will remember
+MAX_LAYOUTS = 256
+
+class Schema(object):
+    """Maps observation types to list positions. Positions are never reused,
+    so packets built against an earlier version of the schema remain valid."""
+
+    def __init__(self, names=()):
+        self.names = []
+        self.index = {}
+        self.lock = threading.Lock()
+        # Maps a presence mask to the names and positions it selects. Most
+        # packets from a station have the same types, so there are few.
+        self._layouts = {}
+        for name in names:
+            self.add(name)
+
+    def add(self, name):
+        """Return the position of an observation type, adding it if new."""
+        try:
+            return self.index[name]
+        except KeyError:
+            with self.lock:
+                if name not in self.index:
+                    self.names.append(name)
+                    self.index[name] = len(self.names) - 1
+                return self.index[name]
+
+    def layout(self, mask):
+        """Return the names and positions of the types present in a mask."""
+        try:
+            return self._layouts[mask]
+        except KeyError:
+            indexes = []
+            i = 0
+            m = mask
+            while m:
+                if m & 1:
+                    indexes.append(i)
+                m >>= 1
+                i += 1
+            layout = (tuple(self.names[i] for i in indexes), tuple(indexes))
+            if len(self._layouts) >= MAX_LAYOUTS:
+                self._layouts.clear()
+            self._layouts[mask] = layout
+            return layout
+
+    def __len__(self):
+        return len(self.names)
+
+# The schema used by default. Starting with the types found in most packets
+# keeps them at the front of the value lists.
+default_schema = Schema(['dateTime', 'usUnits', 'interval'])
+
+
+class CompactPacket(collections.MutableMapping):
+    """A packet of observations, which can be used like a dictionary."""
+
+    __slots__ = ('_schema', '_values', '_mask', '_shared')
+
+    def __init__(self, data=None, schema=None):
+        """Initialize an instance of CompactPacket.
+
+        data: A dictionary, or any mapping, of initial values. [Optional]
+
+        schema: The Schema to use. [Optional. Default is default_schema]
+        """
+        self._schema = schema if schema is not None else default_schema
+        self._mask = 0
+        self._shared = False
+        if data:
+            # Add any new types first, so the list is only allocated once
+            index = self._schema.index
+            for name in data:
+                if name not in index:
+                    self._schema.add(name)
+            values = [None] * len(self._schema)
+            mask = 0
+            for name in data:
+                i = index[name]
+                values[i] = data[name]
+                mask |= 1 << i
+            self._values = values
+            self._mask = mask
+        else:
+            self._values = []
+
+    @property
+    def schema(self):
+        return self._schema
+
+    def __getitem__(self, key):
+        i = self._schema.index.get(key)
+        if i is None or not (self._mask >> i) & 1:
+            raise KeyError(key)
+        return self._values[i]
+
+    def __setitem__(self, key, value):
+        i = self._schema.index.get(key)
+        if i is None:
+            i = self._schema.add(key)
+        if self._shared:
+            # Copy on write
+            self._values = list(self._values)
+            self._shared = False
+        if i >= len(self._values):
+            self._values.extend([None] * (len(self._schema) - len(self._values)))
+        self._values[i] = value
+        self._mask |= 1 << i
+
+    def __delitem__(self, key):
+        i = self._schema.index.get(key)
+        if i is None or not (self._mask >> i) & 1:
+            raise KeyError(key)
+        self._mask &= ~(1 << i)
+        if not self._shared:
+            # Let go of the value
+            self._values[i] = None
+
+    def __contains__(self, key):
+        i = self._schema.index.get(key)
+        return i is not None and bool((self._mask >> i) & 1)
+
+    has_key = __contains__
+
+    def __len__(self):
+        return len(self._schema.layout(self._mask)[1])
+
+    def __iter__(self):
+        return iter(self._schema.layout(self._mask)[0])
+
+    iterkeys = __iter__
+
+    def itervalues(self):
+        return iter(self.values())
+
+    def iteritems(self):
+        return iter(self.items())
+
+    def keys(self):
+        return list(self._schema.layout(self._mask)[0])
+
+    def values(self):
+        values = self._values
+        return [values[i] for i in self._schema.layout(self._mask)[1]]
+
+    def items(self):
+        names, indexes = self._schema.layout(self._mask)
+        values = self._values
+        return [(name, values[i]) for name, i in zip(names, indexes)]
+
+    def get(self, key, default=None):
+        i = self._schema.index.get(key)
+        if i is None or not (self._mask >> i) & 1:
+            return default
+        return self._values[i]
+
+    def copy(self):
+        """Return a copy. The values are not copied until one of the two
+        packets is changed."""
+        other = CompactPacket.__new__(CompactPacket)
+        other._schema = self._schema
+        other._values = self._values
+        other._mask = self._mask
+        other._shared = self._shared = True
+        return other
+
+    def clear(self):
+        self._values = []
+        self._mask = 0
+        self._shared = False
+
+    def __reduce__(self):
+        return (CompactPacket, (dict(self.iteritems()),))
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, dict(self.iteritems()))
+
+
+if __name__ == '__main__':
+    import doctest
+
+    if not doctest.testmod().failed:
+        print("PASSED")
@@ -9,8 +9,10 @@
 import datetime
 import ftplib
 import glob
+import multiprocessing
 import os.path
 import shutil
+import signal
 import socket
 import sys
 import syslog
@@ -254,6 +256,125 @@ class StdReportEngine(threading.Thread):
                 finally:
                     obj.finalize()
 
+# =============================================================================
+#                    Class ReportProcess
+# =============================================================================
+
+class ReportProcess(object):
+    """Runs the report engine in a long-lived child process.
+
+    Report generation (Cheetah templates, PIL plots) is CPU bound. Running it
+    in a thread means it competes with the LOOP processing in the main
+    process for the GIL. This class instead hands each report cycle to a child
+    process over a pipe. The child runs the cycle synchronously and sends back
+    how long it took.
+    """
+
+    def __init__(self, config_dict):
+        self.config_dict = config_dict
+        self.process = None
+        self.conn = None
+        self.busy = False
+
+    def start(self):
+        """Start the child process."""
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_run_report_process,
+                                               name="ReportProcess",
+                                               args=(self.config_dict, child_conn))
+        self.process.daemon = True
+        self.process.start()
+        # The parent has no use for the child end of the pipe
+        child_conn.close()
+        self.busy = False
+
+    def is_alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def start_cycle(self, stn_info, record=None, first_run=True):
+        """Ask the child process to run the reports once."""
+        self.conn.send((stn_info, record, first_run))
+        self.busy = True
+
+    def poll(self):
+        """Check whether the current cycle has finished.
+
+        Returns the time in seconds the cycle took, or None if no cycle has
+        finished since the last call."""
+        if not self.busy:
+            return None
+        try:
+            if not self.conn.poll():
+                if not self.is_alive():
+                    self.busy = False
+                return None
+            elapsed = self.conn.recv()
+        except (EOFError, IOError):
+            # The child has gone away
+            elapsed = None
+        self.busy = False
+        return elapsed
+
+    def stop(self, timeout=None):
+        """Ask the child to exit, then wait up to timeout seconds for it to
+        do so. Returns True if the child is no longer running."""
+        if self.process is None:
+            return True
+        try:
+            self.conn.send(None)
+        except (IOError, EOFError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            return False
+        self.conn.close()
+        self.process = self.conn = None
+        self.busy = False
+        return True
+
+    def terminate(self):
+        """Kill the child process outright."""
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join(5.0)
+            self.conn.close()
+        self.process = self.conn = None
+        self.busy = False
+
+
+def _run_report_process(config_dict, conn):
+    """Entry point of the report child process. Runs report cycles as they
+    are requested by the parent, until it receives None."""
+
+    # Restarts and shutdowns are managed by the parent
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, IOError):
+            break
+        if job is None:
+            break
+        stn_info, record, first_run = job
+        t1 = time.time()
+        engine = StdReportEngine(config_dict, stn_info, record,
+                                 first_run=first_run)
+        # Run it synchronously in this process
+        try:
+            engine.run()
+        except Exception, e:
+            syslog.syslog(syslog.LOG_ERR, "reportengine: "
+                          "Report cycle failed: %s" % e)
+            weeutil.weeutil.log_traceback("        ****  ")
+        try:
+            conn.send(time.time() - t1)
+        except (EOFError, IOError):
+            break
+    conn.close()
+
 # =============================================================================
 #                    Class ReportGenerator
 # =============================================================================
@@ -315,7 +436,8 @@ class FtpGenerator(ReportGenerator):
                 max_tries=int(self.skin_dict.get('max_tries', 3)),
                 secure=to_bool(self.skin_dict.get('secure_ftp', False)),
                 debug=int(self.skin_dict.get('debug', 0)),
-                secure_data=to_bool(self.skin_dict.get('secure_data', True)))
+                secure_data=to_bool(self.skin_dict.get('secure_data', True)),
+                max_sessions=int(self.skin_dict.get('max_sessions', 1)))
         except Exception:
             syslog.syslog(syslog.LOG_DEBUG,
                           "ftpgenerator: FTP upload not requested. Skipped.")
@@ -31,6 +31,11 @@ posting object to terminate by putting a 'None' in the queue.
 The posting object should inherit from class RESTThread. It monitors the queue
 and blocks until a new record arrives.
 
+Optionally, the posting objects can share a single thread, an UploaderHost,
+rather than each running in a thread of its own. The host takes records from
+each queue in turn, and calls process_record() for them, just as
+RESTThread.run_loop() does.
+
 The base class RESTThread has a lot of functionality, so specializing classes
 should only have to implement a few functions. In particular, 
 
@@ -48,7 +53,8 @@ should only have to implement a few functions. In particular,
    
  - post_request(self, request). This function takes a urllib2.Request object
    and is responsible for performing the HTTP GET or POST. The default version
-   simply uses urllib2.urlopen(request) and returns the result. If the post
+   opens the request through http_pool, which works like urllib2.urlopen(),
+   but keeps the connection open for the next post. If the post
    could raise an unusual exception, override this function and catch the
    exception. See the WOWThread implementation for an example.
    
@@ -68,11 +74,15 @@ In unusual cases, you might also have to implement the following:
 """
 from __future__ import with_statement
 import Queue
+import collections
+import cStringIO
 import datetime
+import errno
 import hashlib
 import httplib
 import platform
 import re
+import select
 import socket
 import sys
 import syslog
@@ -110,6 +120,231 @@ class SendError(IOError):
     """Raised when unable to send through a socket."""
 
 
+# ==============================================================================
+#                    Persistent HTTP connections
+# ==============================================================================
+
+class ConnectionPool(object):
+    """Keeps HTTP connections open between posts, for reuse by any thread
+    posting to the same host.
+
+    Opening a connection takes a TCP handshake, plus a TLS handshake for
+    https. For posts every few seconds, such as the Weather Underground
+    RapidFire protocol, that is most of the cost of a post."""
+
+    def __init__(self, keep_alive=True, idle_timeout=30, max_idle=4):
+        """Initialize an instance of ConnectionPool.
+
+        keep_alive: If False, every request uses a new connection, as
+        urllib2.urlopen() does. Default is True.
+
+        idle_timeout: Connections unused for longer than this many seconds
+        are closed, rather than reused. Servers close idle connections too,
+        so this should be less than what they allow. Default is 30.
+
+        max_idle: How many idle connections to keep for each host.
+        Default is 4.
+        """
+        self.lock = threading.Lock()
+        self.idle = {}
+        # Count of connections opened, and requests sent:
+        self.connects = 0
+        self.requests = 0
+        handlers = [PooledHTTPHandler(self)]
+        if hasattr(httplib, 'HTTPSConnection'):
+            handlers.append(PooledHTTPSHandler(self))
+        self.opener = urllib2.build_opener(*handlers)
+        self.configure(keep_alive, idle_timeout, max_idle)
+
+    def configure(self, keep_alive=True, idle_timeout=30, max_idle=4):
+        self.keep_alive = to_bool(keep_alive)
+        self.idle_timeout = to_float(idle_timeout)
+        self.max_idle = to_int(max_idle)
+        if not self.keep_alive:
+            self.close()
+
+    def urlopen(self, request, data=None, timeout=socket._GLOBAL_DEFAULT_TIMEOUT):
+        """Open a urllib2.Request, as urllib2.urlopen() does, but reusing a
+        connection to the host if there is one."""
+        if not self.keep_alive:
+            return urllib2.urlopen(request, data=data, timeout=timeout)
+        return self.opener.open(request, data=data, timeout=timeout)
+
+    def get(self, key, timeout):
+        """Return an idle connection for key, or None. Connections that
+        have been idle for too long are closed."""
+        now = time.time()
+        with self.lock:
+            idle = self.idle.get(key, [])
+            while idle:
+                (conn, last_used) = idle.pop()
+                if now - last_used < self.idle_timeout:
+                    if conn.sock is not None:
+                        conn.sock.settimeout(None if timeout is socket._GLOBAL_DEFAULT_TIMEOUT else timeout)
+                    return conn
+                conn.close()
+        return None
+
+    def put(self, key, conn):
+        """Return a connection to the pool, for reuse."""
+        with self.lock:
+            idle = self.idle.setdefault(key, [])
+            if self.keep_alive and len(idle) < self.max_idle:
+                idle.append((conn, time.time()))
+                return
+        conn.close()
+
+    def close(self):
+        """Close all idle connections."""
+        with self.lock:
+            for idle in self.idle.itervalues():
+                for (conn, _) in idle:
+                    conn.close()
+            self.idle = {}
+
+    def do_open(self, conn_factory, req):
+        """Send a request, using a pooled connection if possible. Returns a
+        response like the one urllib2 returns."""
+        host = req.get_host()
+        if not host:
+            raise urllib2.URLError('no host given')
+        key = (req.get_type(), host)
+
+        headers = dict(req.unredirected_hdrs)
+        headers.update(dict((k, v) for k, v in req.headers.items()
+                            if k not in headers))
+        headers['Connection'] = 'keep-alive'
+        headers = dict((name.title(), val) for name, val in headers.items())
+
+        while True:
+            conn = self.get(key, req.timeout)
+            reused = conn is not None
+            if not reused:
+                conn = conn_factory(host, req.timeout)
+                with self.lock:
+                    self.connects += 1
+                if weewx.debug >= 2:
+                    syslog.syslog(syslog.LOG_DEBUG, "restx: New connection to %s" % host)
+            with self.lock:
+                self.requests += 1
+            # The server may have closed a reused connection while it was
+            # idle. Then the request cannot be sent, or there is no response
+            # at all, and it is safe to try again with a new connection. Any
+            # other error, a timeout in particular, may come after the server
+            # has acted on the request, so it is left to the caller.
+            try:
+                conn.request(req.get_method(), req.get_selector(), req.data, headers)
+            except socket.error, e:
+                conn.close()
+                if reused and e.errno in (errno.ECONNRESET, errno.EPIPE):
+                    continue
+                raise urllib2.URLError(e)
+            try:
+                response = conn.getresponse()
+                # Read all of the response now, so the connection can be used
+                # again right away.
+                body = response.read()
+            except httplib.BadStatusLine:
+                conn.close()
+                if reused:
+                    continue
+                raise
+            except (socket.error, httplib.HTTPException):
+                conn.close()
+                raise
+            break
+
+        if response.will_close:
+            conn.close()
+        else:
+            self.put(key, conn)
+
+        result = urllib.addinfourl(cStringIO.StringIO(body), response.msg,
+                                   req.get_full_url())
+        result.code = response.status
+        result.msg = response.reason
+        return result
+
+
+class PooledHTTPHandler(urllib2.HTTPHandler):
+    """urllib2 handler that gets its http connections from a ConnectionPool."""
+
+    def __init__(self, pool):
+        urllib2.HTTPHandler.__init__(self)
+        self.pool = pool
+
+    def http_open(self, req):
+        return self.pool.do_open(self._new_connection, req)
+
+    @staticmethod
+    def _new_connection(host, timeout):
+        return httplib.HTTPConnection(host, timeout=timeout)
+
+
+if hasattr(httplib, 'HTTPSConnection'):
+    class PooledHTTPSHandler(urllib2.HTTPSHandler):
+        """urllib2 handler that gets its https connections from a
+        ConnectionPool."""
+
+        def __init__(self, pool):
+            urllib2.HTTPSHandler.__init__(self)
+            self.pool = pool
+
+        def https_open(self, req):
+            if req._tunnel_host:
+                # Going through a proxy. Do it the usual way.
+                return urllib2.HTTPSHandler.https_open(self, req)
+            return self.pool.do_open(self._new_connection, req)
+
+        def _new_connection(self, host, timeout):
+            if getattr(self, '_context', None) is not None:
+                return httplib.HTTPSConnection(host, timeout=timeout, context=self._context)
+            return httplib.HTTPSConnection(host, timeout=timeout)
+
+# The pool shared by all the RESTful threads.
+http_pool = ConnectionPool()
+
+
+# ==============================================================================
+#                    Record queues
+# ==============================================================================
+
+class RESTQueue(Queue.Queue):
+    """A queue of records for a RESTful service to post.
+
+    Unlike a plain Queue.Queue, a RESTQueue does not let records pile up
+    while the service is unable to post them. Once more than max_backlog
+    records are waiting behind the one to be posted next, the oldest is
+    dropped to make room for the newest. For LOOP packets, with a max_backlog
+    of zero, this coalesces any backlog into the newest packet.
+
+    Attributes dropped, and qsize(), tell how the service is keeping up."""
+
+    def __init__(self, max_backlog=None):
+        """Initialize an instance of RESTQueue.
+
+        max_backlog: How many records can wait behind the one to be posted
+        next. If not given, that of the RESTThread the queue is given to is
+        used. [Optional]
+        """
+        Queue.Queue.__init__(self)
+        self.max_backlog = max_backlog
+        # How many records have been dropped:
+        self.dropped = 0
+        # Set whenever something is put in the queue, if not None:
+        self.wakeup = None
+
+    def _put(self, item):
+        # Never drop the None that signals the end
+        if item is not None and self.max_backlog is not None:
+            while len(self.queue) > self.max_backlog and self.queue[0] is not None:
+                self.queue.popleft()
+                self.dropped += 1
+        self.queue.append(item)
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+
 # ==============================================================================
 #                    Abstract base classes
 # ==============================================================================
@@ -119,6 +354,27 @@ class StdRESTful(weewx.engine.StdService):
     
     Offers a few common bits of functionality."""
 
+    def __init__(self, engine, config_dict):
+        super(StdRESTful, self).__init__(engine, config_dict)
+        # Set up the connections shared by all the RESTful threads:
+        http_pool.configure(keep_alive=config_dict.get('http_keep_alive', True),
+                            idle_timeout=config_dict.get('http_idle_timeout', 30))
+        # Have the RESTful threads share a single thread, if requested:
+        if to_bool(config_dict.get('uploader_host', False)):
+            start_uploader_host()
+
+    def new_archive_record(self, event):
+        """Puts new archive records in the archive queue. Records that are
+        part of a batch are held back until the batch has been committed to
+        the database."""
+        if not getattr(event, 'batch', False):
+            self.archive_queue.put(event.record)
+
+    def new_archive_batch(self, event):
+        """Puts a committed batch of archive records in the archive queue."""
+        for record in event.records:
+            self.archive_queue.put(record)
+
     def shutDown(self):
         """Shut down any threads"""
         if hasattr(self, 'loop_queue') and hasattr(self, 'loop_thread'):
@@ -129,7 +385,16 @@ class StdRESTful(weewx.engine.StdService):
     @staticmethod
     def shutDown_thread(q, t):
         """Function to shut down a thread."""
-        if q and t.isAlive():
+        if q and getattr(t, 'host', None) is not None:
+            # The thread is hosted. Wait up to 20 seconds for the host to
+            # post what is in the queue:
+            if t.host.remove(t, 20.0):
+                syslog.syslog(syslog.LOG_DEBUG,
+                              "restx: Shut down %s service." % t.name)
+            else:
+                syslog.syslog(syslog.LOG_ERR,
+                              "restx: Unable to shut down %s service" % t.name)
+        elif q and t.isAlive():
             # Put a None in the queue to signal the thread to shutdown
             q.put(None)
             # Wait up to 20 seconds for the thread to exit:
@@ -142,6 +407,15 @@ class StdRESTful(weewx.engine.StdService):
                               "restx: Shut down %s thread." % t.name)
 
 
+def describe_batch(records):
+    """Describe a list of records, for the log."""
+    if len(records) == 1:
+        return "record %s" % timestamp_to_string(records[0]['dateTime'])
+    return "%d records %s to %s" % (len(records),
+                                    timestamp_to_string(records[0]['dateTime']),
+                                    timestamp_to_string(records[-1]['dateTime']))
+
+
 # For backwards compatibility with early v2.6 alphas. In particular, the WeatherCloud uploader depends on it.
 StdRESTbase = StdRESTful
 
@@ -151,6 +425,10 @@ class RESTThread(threading.Thread):
     
     Offers a few bits of common functionality."""
 
+    # How many records can be posted in one request. Protocols that accept
+    # more than one should set this, and override process_records().
+    max_batch = 1
+
     def __init__(self, queue, protocol_name, manager_dict=None,
                  post_interval=None, max_backlog=sys.maxint, stale=None,
                  log_success=True, log_failure=True,
@@ -161,6 +439,8 @@ class RESTThread(threading.Thread):
         Required parameters:
 
           queue: An instance of Queue.Queue where the records will appear.
+          If it is a RESTQueue, it is trimmed to max_backlog as records are
+          put in it.
 
           protocol_name: A string holding the name of the protocol.
           
@@ -214,6 +494,8 @@ class RESTThread(threading.Thread):
         self.log_success = to_bool(log_success)
         self.log_failure = to_bool(log_failure)
         self.max_backlog = to_int(max_backlog)
+        if isinstance(queue, RESTQueue) and queue.max_backlog is None:
+            queue.max_backlog = self.max_backlog
         self.max_tries = to_int(max_tries)
         self.stale = to_int(stale)
         self.post_interval = to_int(post_interval)
@@ -223,6 +505,19 @@ class RESTThread(threading.Thread):
         self.softwaretype = softwaretype
         self.lastpost = 0
         self.skip_upload = to_bool(skip_upload)
+        # The UploaderHost doing the posting, if any:
+        self.host = None
+        # How many dropped records have been logged:
+        self.dropped = 0
+
+    def start(self):
+        """Start posting. If there is an UploaderHost, it does the posting,
+        rather than a thread of our own."""
+        _host = uploader_host
+        if _host is not None and _host.isAlive() and _host.can_host(self):
+            _host.add(self)
+        else:
+            threading.Thread.start(self)
 
     def get_record(self, record, dbmanager):
         """Augment record data with additional data from the archive.
@@ -309,13 +604,16 @@ class RESTThread(threading.Thread):
         run_loop() with the database.  If no database is specified, simply
         call run_loop()."""
 
-        # Open up the archive. Use a 'with' statement. This will automatically
-        # close the archive in the case of an exception:
-        if self.manager_dict is not None:
-            with weewx.manager.open_manager(self.manager_dict) as _manager:
-                self.run_loop(_manager)
-        else:
-            self.run_loop()
+        try:
+            # Open up the archive. Use a 'with' statement. This will
+            # automatically close the archive in the case of an exception:
+            if self.manager_dict is not None:
+                with weewx.manager.open_manager(self.manager_dict) as _manager:
+                    self.run_loop(_manager)
+            else:
+                self.run_loop()
+        finally:
+            self.close_session()
 
     def run_loop(self, dbmanager=None):
         """Runs a continuous loop, waiting for records to appear in the queue,
@@ -337,16 +635,16 @@ class RESTThread(threading.Thread):
             if self.skip_this_post(_record['dateTime']):
                 continue
 
+            # Post any records waiting behind this one along with it, if the
+            # protocol allows:
+            _records = self.get_batch(_record)
+
             try:
-                # Process the record, using whatever method the specializing
+                # Process the records, using whatever method the specializing
                 # class provides
-                self.process_record(_record, dbmanager)
+                self.post_batch(_records, dbmanager)
             except AbortedPost:
-                if self.log_success:
-                    _time_str = timestamp_to_string(_record['dateTime'])
-                    syslog.syslog(syslog.LOG_INFO,
-                                  "restx: %s: Skipped record %s" %
-                                  (self.protocol_name, _time_str))
+                self.log_batch(_records, "Skipped")
             except BadLogin:
                 syslog.syslog(syslog.LOG_ERR, "restx: %s: Bad login; "
                                               "waiting %s minutes then retrying" %
@@ -354,10 +652,9 @@ class RESTThread(threading.Thread):
                 time.sleep(self.retry_login)
             except FailedPost, e:
                 if self.log_failure:
-                    _time_str = timestamp_to_string(_record['dateTime'])
                     syslog.syslog(syslog.LOG_ERR,
-                                  "restx: %s: Failed to publish record %s: %s"
-                                  % (self.protocol_name, _time_str, e))
+                                  "restx: %s: Failed to publish %s: %s"
+                                  % (self.protocol_name, describe_batch(_records), e))
             except Exception, e:
                 # Some unknown exception occurred. This is probably a serious
                 # problem. Exit.
@@ -370,11 +667,52 @@ class RESTThread(threading.Thread):
                               (self.protocol_name, e))
                 return
             else:
-                if self.log_success:
-                    _time_str = timestamp_to_string(_record['dateTime'])
-                    syslog.syslog(syslog.LOG_INFO,
-                                  "restx: %s: Published record %s" %
-                                  (self.protocol_name, _time_str))
+                self.log_batch(_records, "Published")
+
+    def get_batch(self, record):
+        """Return a list of the record, plus any records waiting in the queue
+        behind it, up to max_batch in all."""
+        _records = [record]
+        while len(_records) < self.max_batch:
+            try:
+                _record = self.queue.get_nowait()
+            except Queue.Empty:
+                break
+            if _record is None:
+                # Leave the signal to exit for later
+                self.queue.put(None)
+                break
+            if not self.skip_this_post(_record['dateTime']):
+                _records.append(_record)
+        return _records
+
+    def post_batch(self, records, dbmanager):
+        """Post a list of records, in one request if there is more than one."""
+        if len(records) == 1:
+            self.process_record(records[0], dbmanager)
+        else:
+            self.process_records(records, dbmanager)
+
+    def log_batch(self, records, what):
+        """Log the outcome of posting a list of records."""
+        if self.log_success:
+            syslog.syslog(syslog.LOG_INFO, "restx: %s: %s %s" %
+                          (self.protocol_name, what, describe_batch(records)))
+        # Note any records dropped from a backlog since last time
+        _dropped = getattr(self.queue, 'dropped', 0)
+        if _dropped > self.dropped:
+            syslog.syslog(syslog.LOG_DEBUG, "restx: %s: Dropped %d backlogged records" %
+                          (self.protocol_name, _dropped - self.dropped))
+            self.dropped = _dropped
+
+    def process_records(self, records, dbmanager):
+        """Post a list of records. Protocols that set max_batch should
+        override this, to post them in one request, raising the same
+        exceptions as process_record().
+
+        This default version posts them one at a time."""
+        for record in records:
+            self.process_record(record, dbmanager)
 
     def process_record(self, record, dbmanager):
         """Default version of process_record.
@@ -421,7 +759,8 @@ class RESTThread(threading.Thread):
         """
         
         # Retry up to max_tries times:
-        for _count in range(self.max_tries):
+        _max_tries = self.get_tries()
+        for _count in range(_max_tries):
             try:
                 # Do a single post. The function post_request() can be
                 # specialized by a RESTful service to catch any unusual
@@ -447,12 +786,25 @@ class RESTThread(threading.Thread):
                 # Provide method for derived classes to behave otherwise if
                 # necessary.
                 self.handle_exception(e, _count + 1)
-            time.sleep(self.retry_wait)
+            if self.host is None:
+                time.sleep(self.retry_wait)
         else:
             # This is executed only if the loop terminates normally, meaning
             # the upload failed max_tries times. Raise an exception. Caller
             # can decide what to do with it.
-            raise FailedPost("Failed upload after %d tries" % (self.max_tries,))
+            raise FailedPost("Failed upload after %d tries" % (_max_tries,))
+
+    def close_session(self):
+        """Close any session with the server that is kept open between
+        posts. Called when posting stops. This version has none: HTTP
+        connections are kept in http_pool."""
+        pass
+
+    def get_tries(self):
+        """Return how many times to try a post before giving up. When the
+        thread is hosted, the UploaderHost does the retrying, so that is
+        just once."""
+        return 1 if self.host is not None else self.max_tries
 
     def check_response(self, response):
         """Check the response from a HTTP post. This version does nothing."""
@@ -486,7 +838,7 @@ class RESTThread(threading.Thread):
             # Python 2.5 and earlier do not have a "timeout" parameter.
             # Including one could cause a TypeError exception. Be prepared
             # to catch it.
-            _response = urllib2.urlopen(request, data=data, timeout=self.timeout)
+            _response = http_pool.urlopen(request, data=data, timeout=self.timeout)
         except TypeError:
             # Must be Python 2.5 or early. Use a simple, unadorned request
             _response = urllib2.urlopen(request, data=data)
@@ -541,6 +893,271 @@ class RESTThread(threading.Thread):
         """
         return None
 
+# ==============================================================================
+#                    Hosted uploaders
+# ==============================================================================
+
+class UploaderHost(threading.Thread):
+    """Does the posting for any number of RESTful services, in one thread.
+
+    Normally, each RESTful service has a thread of its own, which spends
+    nearly all its time waiting: for a record, for a server, or before retrying
+    a failed post. An UploaderHost instead takes records from the queue of
+    each service in turn. Instead of sleeping before a retry, or after a bad
+    login, it puts the service aside until it is due, and gets on with the
+    others. The services also share one database connection.
+
+    Only services that rely on RESTThread to run their loop can be hosted."""
+
+    def __init__(self, poll_interval=1.0):
+        """Initialize an instance of UploaderHost.
+
+        poll_interval: How often, in seconds, to check a queue that cannot
+        tell the host when a record arrives. Default is 1.0.
+        """
+        threading.Thread.__init__(self, name='UploaderHost')
+        self.setDaemon(True)
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        # Set whenever there may be something to do:
+        self.wakeup = threading.Event()
+        self.services = []
+        # The database managers, as (manager_dict, manager) pairs:
+        self.managers = []
+
+    @staticmethod
+    def can_host(thread):
+        """Return True if the posting object can be hosted."""
+        cls = type(thread)
+        return isinstance(thread, RESTThread) \
+            and cls.run.im_func is RESTThread.run.im_func \
+            and cls.run_loop.im_func is RESTThread.run_loop.im_func
+
+    def add(self, thread):
+        """Start posting for a RESTThread."""
+        service = HostedService(thread, self)
+        thread.host = self
+        with self.lock:
+            self.services.append(service)
+        self.wakeup.set()
+        syslog.syslog(syslog.LOG_DEBUG, "restx: %s: Hosted by %s" %
+                      (thread.protocol_name, self.name))
+
+    def remove(self, thread, timeout=None):
+        """Stop posting for a RESTThread, after it has posted whatever is in
+        its queue. Returns True if it finished within timeout seconds."""
+        for service in list(self.services):
+            if service.thread is thread:
+                thread.queue.put(None)
+                self.wakeup.set()
+                service.done.wait(timeout)
+                return service.done.isSet()
+        return True
+
+    def run(self):
+        try:
+            while True:
+                # Clear the signal before looking at the queues, so that a
+                # record put in one after it is looked at is not missed.
+                self.wakeup.clear()
+                now = time.time()
+                busy = False
+                timeout = None
+                for service in list(self.services):
+                    service.collect()
+                    wait = service.due_in(now)
+                    if wait is None:
+                        # Nothing to do
+                        pass
+                    elif wait <= 0:
+                        service.step(now)
+                        busy = True
+                        if service.stopped:
+                            self._retire(service)
+                    elif timeout is None or wait < timeout:
+                        timeout = wait
+                    if not service.hooked:
+                        timeout = min(timeout, self.poll_interval) \
+                            if timeout is not None else self.poll_interval
+                # After a post, go round again right away. Otherwise, wait
+                # until a retry is due, or a record arrives.
+                if not busy:
+                    self.wakeup.wait(timeout)
+        finally:
+            for _, manager in self.managers:
+                manager.close()
+            self.managers = []
+
+    def get_manager(self, manager_dict):
+        """Return the database manager for a manager dictionary, opening it if
+        necessary. Services using the same database share the manager."""
+        if manager_dict is None:
+            return None
+        for _manager_dict, _manager in self.managers:
+            if _manager_dict == manager_dict:
+                return _manager
+        _manager = weewx.manager.open_manager(manager_dict)
+        self.managers.append((manager_dict, _manager))
+        return _manager
+
+    def _retire(self, service):
+        with self.lock:
+            self.services.remove(service)
+        # Close the database manager, if no other service is using it
+        _manager_dict = service.thread.manager_dict
+        if _manager_dict is not None and \
+                not any(s.thread.manager_dict == _manager_dict for s in self.services):
+            for pair in self.managers:
+                if pair[0] == _manager_dict:
+                    self.managers.remove(pair)
+                    pair[1].close()
+                    break
+        if service.hooked:
+            service.queue.wakeup = None
+        service.thread.close_session()
+        service.thread.host = None
+        syslog.syslog(syslog.LOG_DEBUG, "restx: %s: No longer hosted" %
+                      service.thread.protocol_name)
+        service.done.set()
+
+
+class HostedService(object):
+    """Posts the records in the queue of a RESTThread, one step at a time,
+    on behalf of an UploaderHost. Log messages are the same as those of
+    RESTThread.run_loop()."""
+
+    # The most a failed service is put aside for, as a power of two times
+    # retry_wait:
+    MAX_BACKOFF = 6
+
+    def __init__(self, thread, host):
+        self.thread = thread
+        self.host = host
+        self.queue = thread.queue
+        self.pending = collections.deque()
+        # The records being posted, if any:
+        self.batch = None
+        self.closing = False
+        # Set once the service has stopped posting, and is to be retired:
+        self.stopped = False
+        # Set once it has been retired:
+        self.done = threading.Event()
+        # The host does the retrying, rather than post_with_retries(), so it
+        # need not sleep in between. See RESTThread.get_tries().
+        self.max_tries = max(thread.max_tries, 1)
+        self.retry_wait = thread.retry_wait
+        # How many times the batch has failed, and how many batches in a row
+        # have failed:
+        self.tries = 0
+        self.failures = 0
+        # When the service is next due:
+        self.due_ts = 0
+        # Have a RESTQueue signal the host when a record arrives. The host
+        # polls any other queue.
+        self.hooked = isinstance(self.queue, RESTQueue)
+        if self.hooked:
+            self.queue.wakeup = host.wakeup
+
+    def collect(self):
+        """Move any records in the queue to the list of pending records."""
+        while not self.closing:
+            try:
+                _record = self.queue.get_nowait()
+            except Queue.Empty:
+                break
+            # A None record is the signal to stop, once everything before it
+            # has been posted.
+            if _record is None:
+                self.closing = True
+            else:
+                self.pending.append(_record)
+        # If records have backed up, trim them until no more than the max
+        # allowed backlog are waiting behind the next one to be posted:
+        while len(self.pending) > self.thread.max_backlog + (self.batch is None):
+            self.pending.popleft()
+            if hasattr(self.queue, 'dropped'):
+                self.queue.dropped += 1
+
+    def due_in(self, now):
+        """Return how many seconds until the service is due, or None if there
+        is nothing to do."""
+        if self.batch is None and not self.pending:
+            return 0 if self.closing else None
+        return self.due_ts - now
+
+    def step(self, now):
+        """Post the next batch of records, or stop, if there is nothing left
+        to post."""
+        thread = self.thread
+        if self.batch is None:
+            self.batch = []
+            while self.pending and len(self.batch) < thread.max_batch:
+                _record = self.pending.popleft()
+                if not thread.skip_this_post(_record['dateTime']):
+                    self.batch.append(_record)
+            if not self.batch:
+                self.batch = None
+                if not self.pending and self.closing:
+                    self.stopped = True
+                return
+
+        try:
+            thread.post_batch(self.batch, self.host.get_manager(thread.manager_dict))
+        except AbortedPost:
+            thread.log_batch(self.batch, "Skipped")
+        except BadLogin:
+            syslog.syslog(syslog.LOG_ERR, "restx: %s: Bad login; "
+                                          "waiting %s minutes then retrying" %
+                          (thread.protocol_name, thread.retry_login / 60.0))
+            self.due_ts = now + thread.retry_login
+        except FailedPost, e:
+            self.tries += 1
+            if self.tries < self.max_tries:
+                # Try again later. Back off further after each failure.
+                self.due_ts = now + self.retry_wait * 2 ** min(self.tries - 1, self.MAX_BACKOFF)
+                return
+            if thread.log_failure:
+                syslog.syslog(syslog.LOG_ERR,
+                              "restx: %s: Failed to publish %s: %s"
+                              % (thread.protocol_name, describe_batch(self.batch), e))
+            # Keep backing off while the server keeps failing
+            self.failures += 1
+            self.due_ts = now + self.retry_wait * 2 ** min(self.failures - 1, self.MAX_BACKOFF)
+        except Exception, e:
+            # Some unknown exception occurred. This is probably a serious
+            # problem. Stop posting for this service.
+            syslog.syslog(syslog.LOG_CRIT,
+                          "restx: %s: Unexpected exception of type %s" %
+                          (thread.protocol_name, type(e)))
+            weeutil.weeutil.log_traceback('*** ', syslog.LOG_DEBUG)
+            syslog.syslog(syslog.LOG_CRIT,
+                          "restx: %s: Service stopping. Reason: %s" %
+                          (thread.protocol_name, e))
+            self.batch = None
+            self.pending.clear()
+            self.stopped = True
+            return
+        else:
+            thread.log_batch(self.batch, "Published")
+            self.failures = 0
+        self.tries = 0
+        self.batch = None
+
+
+# The host for the RESTful services, if they are to share one thread.
+uploader_host = None
+_uploader_host_lock = threading.Lock()
+
+def start_uploader_host():
+    """Start the UploaderHost, if it is not already running."""
+    global uploader_host
+    with _uploader_host_lock:
+        if uploader_host is None or not uploader_host.isAlive():
+            uploader_host = UploaderHost()
+            uploader_host.start()
+        return uploader_host
+
+
 # ==============================================================================
 #                    Ambient protocols
 # ==============================================================================
@@ -575,7 +1192,7 @@ class StdWunderground(StdRESTful):
 
         if do_archive_post:
             _ambient_dict.setdefault('server_url', StdWunderground.pws_url)
-            self.archive_queue = Queue.Queue()
+            self.archive_queue = RESTQueue()
             self.archive_thread = AmbientThread(
                 self.archive_queue,
                 _manager_dict,
@@ -583,6 +1200,7 @@ class StdWunderground(StdRESTful):
                 **_ambient_dict)
             self.archive_thread.start()
             self.bind(weewx.NEW_ARCHIVE_RECORD, self.new_archive_record)
+            self.bind(weewx.NEW_ARCHIVE_BATCH, self.new_archive_batch)
             syslog.syslog(syslog.LOG_INFO, "restx: Wunderground-PWS: "
                                            "Data for station %s will be posted" %
                           _ambient_dict['station'])
@@ -594,7 +1212,7 @@ class StdWunderground(StdRESTful):
             _ambient_dict.setdefault('max_backlog', 0)
             _ambient_dict.setdefault('max_tries', 1)
             self.cached_values = CachedValues()
-            self.loop_queue = Queue.Queue()
+            self.loop_queue = RESTQueue()
             self.loop_thread = AmbientLoopThread(
                 self.loop_queue,
                 _manager_dict,
@@ -617,10 +1235,6 @@ class StdWunderground(StdRESTful):
         self.loop_queue.put(
             self.cached_values.get_packet(event.packet['dateTime']))
 
-    def new_archive_record(self, event):
-        """Puts new archive records in the archive queue"""
-        self.archive_queue.put(event.record)
-
 
 class CachedValues(object):
     """Dictionary of value-timestamp pairs.  Each timestamp indicates when the
@@ -686,19 +1300,17 @@ class StdPWSWeather(StdRESTful):
             config_dict, 'wx_binding')
 
         _ambient_dict.setdefault('server_url', StdPWSWeather.archive_url)
-        self.archive_queue = Queue.Queue()
+        self.archive_queue = RESTQueue()
         self.archive_thread = AmbientThread(self.archive_queue, _manager_dict,
                                             protocol_name="PWSWeather",
                                             **_ambient_dict)
         self.archive_thread.start()
         self.bind(weewx.NEW_ARCHIVE_RECORD, self.new_archive_record)
+        self.bind(weewx.NEW_ARCHIVE_BATCH, self.new_archive_batch)
         syslog.syslog(syslog.LOG_INFO, "restx: PWSWeather: "
                                        "Data for station %s will be posted" %
                       _ambient_dict['station'])
 
-    def new_archive_record(self, event):
-        self.archive_queue.put(event.record)
-
 
 # For backwards compatibility with early alpha versions:
 StdPWSweather = StdPWSWeather
@@ -728,19 +1340,17 @@ class StdWOW(StdRESTful):
 
         _ambient_dict.setdefault('server_url', StdWOW.archive_url)
         _ambient_dict.setdefault('post_interval', 900)
-        self.archive_queue = Queue.Queue()
+        self.archive_queue = RESTQueue()
         self.archive_thread = WOWThread(self.archive_queue, _manager_dict,
                                         protocol_name="WOW",
                                         **_ambient_dict)
         self.archive_thread.start()
         self.bind(weewx.NEW_ARCHIVE_RECORD, self.new_archive_record)
+        self.bind(weewx.NEW_ARCHIVE_BATCH, self.new_archive_batch)
         syslog.syslog(syslog.LOG_INFO, "restx: WOW: "
                                        "Data for station %s will be posted" %
                       _ambient_dict['station'])
 
-    def new_archive_record(self, event):
-        self.archive_queue.put(event.record)
-
 
 class AmbientThread(RESTThread):
     """Concrete class for threads posting from the archive queue,
@@ -936,7 +1546,7 @@ class WOWThread(AmbientThread):
         uses a response error code to signal a bad login."""
         try:
             try:
-                _response = urllib2.urlopen(request, timeout=self.timeout)
+                _response = http_pool.urlopen(request, timeout=self.timeout)
             except TypeError:
                 _response = urllib2.urlopen(request)
         except urllib2.HTTPError, e:
@@ -993,18 +1603,16 @@ class StdCWOP(StdRESTful):
         _cwop_dict.setdefault('longitude', self.engine.stn_info.longitude_f)
         _cwop_dict.setdefault('station_type', config_dict['Station'].get(
             'station_type', 'Unknown'))
-        self.archive_queue = Queue.Queue()
+        self.archive_queue = RESTQueue()
         self.archive_thread = CWOPThread(self.archive_queue, _manager_dict,
                                          **_cwop_dict)
         self.archive_thread.start()
         self.bind(weewx.NEW_ARCHIVE_RECORD, self.new_archive_record)
+        self.bind(weewx.NEW_ARCHIVE_BATCH, self.new_archive_batch)
         syslog.syslog(syslog.LOG_INFO, "restx: CWOP: "
                                        "Data for station %s will be posted" %
                       _cwop_dict['station'])
 
-    def new_archive_record(self, event):
-        self.archive_queue.put(event.record)
-
 
 class CWOPThread(RESTThread):
     """Concrete class for threads posting from the archive queue,
@@ -1015,7 +1623,8 @@ class CWOPThread(RESTThread):
                  server_list=StdCWOP.default_servers,
                  post_interval=600, max_backlog=sys.maxint, stale=600,
                  log_success=True, log_failure=True,
-                 timeout=10, max_tries=3, retry_wait=5, skip_upload=False):
+                 timeout=10, max_tries=3, retry_wait=5, skip_upload=False,
+                 keep_alive=False, keepalive_timeout=60):
 
         """
         Initializer for the CWOPThread class.
@@ -1036,6 +1645,12 @@ class CWOPThread(RESTThread):
           server_list: A list of strings holding the CWOP server name and
           port. Default is ['cwop.aprs.net:14580', 'cwop.aprs.net:23']
 
+          keep_alive: If True, keep the session with the server open between
+          posts. Default is False.
+
+          keepalive_timeout: A session that has heard nothing from the server
+          for this many seconds is assumed to be dead. Default is 60.
+
         Parameters customized for this class:
           
           post_interval: How long to wait between posts.
@@ -1059,7 +1674,22 @@ class CWOPThread(RESTThread):
                                          skip_upload=skip_upload)
         self.station = station
         self.passcode = passcode
-        self.server_list = server_list
+        self.server_list = weeutil.weeutil.option_as_list(server_list)
+        self.servers = []
+        for _serv_addr_str in self.server_list:
+            try:
+                _server, _port_str = _serv_addr_str.split(":")
+                _port = int(_port_str)
+            except ValueError:
+                syslog.syslog(syslog.LOG_ALERT,
+                              "restx: %s: Bad server address: '%s'; ignored" %
+                              (self.protocol_name, _serv_addr_str))
+                continue
+            self.servers.append(APRSServer(_server, _port, len(self.servers)))
+        self.keep_alive = to_bool(keep_alive)
+        self.keepalive_timeout = to_int(keepalive_timeout)
+        # The session left open by the last post, if any:
+        self.session = None
         self.latitude = to_float(latitude)
         self.longitude = to_float(longitude)
         self.station_type = station_type
@@ -1159,88 +1789,247 @@ class CWOPThread(RESTThread):
         return _tnc_packet
 
     def send_packet(self, login, tnc_packet):
+        """Send a packet to a CWOP server, over the session left open by the
+        last post, if there is one. Otherwise, try the servers in order of how
+        well they have been doing lately."""
 
-        # Go through the list of known server:ports, looking for
-        # a connection that works:
-        for _serv_addr_str in self.server_list:
-
-            try:
-                _server, _port_str = _serv_addr_str.split(":")
-                _port = int(_port_str)
-            except ValueError:
-                syslog.syslog(syslog.LOG_ALERT,
-                              "restx: %s: Bad server address: '%s'; ignored" %
-                              (self.protocol_name, _serv_addr_str))
-                continue
-
-            # Try each combination up to max_tries times:
-            for _count in range(self.max_tries):
+        if self.session is not None:
+            if self.session.login == login and self.session.is_alive(self.keepalive_timeout):
+                try:
+                    self.session.send(tnc_packet, 'packet')
+                    return
+                except SendError, e:
+                    syslog.syslog(syslog.LOG_DEBUG,
+                                  "restx: %s: Session with %s lost: %s" %
+                                  (self.protocol_name, self.session.server, e))
+            else:
+                syslog.syslog(syslog.LOG_DEBUG,
+                              "restx: %s: Session with %s no longer alive" %
+                              (self.protocol_name, self.session.server))
+            # The session has gone bad. Open a new one, without using up a try.
+            self.close_session()
+
+        _max_tries = self.get_tries()
+        for _count in range(_max_tries):
+            _now = time.time()
+            for _server in sorted(self.servers, key=lambda s: s.rank(_now)):
+                _session = APRSSession(_server, login, self.timeout)
                 try:
-                    # Get a socket connection:
-                    _sock = self._get_connect(_server, _port)
+                    # Connect and log in ...
+                    _latency = _session.open()
                     syslog.syslog(syslog.LOG_DEBUG,
-                                  "restx: %s: Connected to server %s:%d" %
-                                  (self.protocol_name, _server, _port))
-                    try:
-                        # Send the login ...
-                        self._send(_sock, login, 'login')
-                        # ... and then the packet
-                        self._send(_sock, tnc_packet, 'packet')
-                        return
-                    finally:
-                        _sock.close()
+                                  "restx: %s: Connected to server %s" %
+                                  (self.protocol_name, _server))
+                    # ... and then send the packet
+                    _session.send(tnc_packet, 'packet')
                 except ConnectError, e:
                     syslog.syslog(
                         syslog.LOG_DEBUG,
-                        "restx: %s: Attempt %d to %s:%d. Connection error: %s"
-                        % (self.protocol_name, _count + 1, _server, _port, e))
+                        "restx: %s: Attempt %d to %s. Connection error: %s"
+                        % (self.protocol_name, _count + 1, _server, e))
                 except SendError, e:
                     syslog.syslog(
                         syslog.LOG_DEBUG,
-                        "restx: %s: Attempt %d to %s:%d. Socket send error: %s"
-                        % (self.protocol_name, _count + 1, _server, _port, e))
+                        "restx: %s: Attempt %d to %s. Socket send error: %s"
+                        % (self.protocol_name, _count + 1, _server, e))
+                else:
+                    _server.succeeded(_latency)
+                    if self.keep_alive:
+                        self.session = _session
+                    else:
+                        _session.close()
+                    return
+                _server.failed()
+                _session.close()
 
         # If we get here, the loop terminated normally, meaning we failed
         # all tries
         raise FailedPost("Tried %d servers %d times each" %
-                         (len(self.server_list), self.max_tries))
+                         (len(self.servers), _max_tries))
 
-    def _get_connect(self, server, port):
-        """Get a socket connection to a specific server and port."""
+    def close_session(self):
+        """Close the session left open by the last post, if any."""
+        if self.session is not None:
+            self.session.close()
+            self.session = None
 
-        _sock = None
-        try:
-            _sock = socket.socket()
-            _sock.connect((server, port))
-        except IOError, e:
-            # Unsuccessful. Close it in case it was open:
-            try:
-                _sock.close()
-            except AttributeError, socket.error:
-                pass
-            raise ConnectError(e)
 
-        return _sock
+class APRSServer(object):
+    """An APRS-IS server, with a record of how it has been doing lately."""
+
+    # The weight given to the latest outcome:
+    ALPHA = 0.3
+    # Failures count for half as much after this many seconds, so a server
+    # that has failed gets another chance, eventually:
+    HALF_LIFE = 1800.0
+
+    def __init__(self, host, port, order=0):
+        """Initialize an instance of APRSServer.
 
-    def _send(self, sock, msg, dbg_msg):
-        """Send a message to a specific socket."""
+        host, port: Where the server is.
+
+        order: Where the server appears in the list of servers. Between
+        servers doing equally well, the earlier one is preferred.
+        """
+        self.host = host
+        self.port = port
+        self.order = order
+        # Smoothed time taken to connect, in seconds:
+        self.latency = None
+        # Smoothed rate of failures, between 0 and 1:
+        self.failure_rate = 0.0
+        self.last_ts = None
+
+    def __str__(self):
+        return "%s:%d" % (self.host, self.port)
+
+    def succeeded(self, latency, now=None):
+        """Note a successful post, and how long the connection took."""
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += APRSServer.ALPHA * (latency - self.latency)
+        self._update(0.0, now)
 
+    def failed(self, now=None):
+        """Note a failed post."""
+        self._update(1.0, now)
+
+    def get_failure_rate(self, now=None):
+        if self.last_ts is None:
+            return 0.0
+        if now is None:
+            now = time.time()
+        return self.failure_rate * 0.5 ** (max(now - self.last_ts, 0) / APRSServer.HALF_LIFE)
+
+    def rank(self, now=None):
+        """Return a key to sort servers by: first the healthy ones, then the
+        fastest, then those that come first in the list."""
+        return (self.get_failure_rate(now) >= 0.5,
+                self.latency if self.latency is not None else float('inf'),
+                self.order)
+
+    def _update(self, outcome, now):
+        if now is None:
+            now = time.time()
+        _rate = self.get_failure_rate(now)
+        self.failure_rate = _rate + APRSServer.ALPHA * (outcome - _rate)
+        self.last_ts = now
+
+
+class APRSSession(object):
+    """A connection to an APRS-IS server, logged in as a station.
+
+    After the login, the server answers with a '# logresp' line. From then on,
+    it sends a comment line every 20 seconds or so, to keep the connection
+    alive. A session that has heard nothing for longer than that has most
+    likely been dropped."""
+
+    def __init__(self, server, login, timeout=10):
+        """Initialize an instance of APRSSession.
+
+        server: An instance of APRSServer.
+
+        login: The login string.
+
+        timeout: How long to wait for the server, in seconds. Default is 10.
+        """
+        self.server = server
+        self.login = login
+        self.timeout = timeout
+        self.sock = None
+        self.buffer = ''
+        # When something was last heard from the server:
+        self.last_rx = None
+
+    def open(self):
+        """Connect to the server and log in. Returns how long it took to
+        connect, in seconds."""
+        _start = time.time()
         try:
-            sock.send(msg)
+            self.sock = socket.create_connection((self.server.host, self.server.port),
+                                                 self.timeout)
+        except IOError, e:
+            raise ConnectError(e)
+        _latency = time.time() - _start
+        self.last_rx = time.time()
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        except socket.error:
+            pass
+        self.send(self.login, 'login')
+        _resp = self._read_response('# logresp')
+        if _resp is None:
+            syslog.syslog(syslog.LOG_DEBUG, "restx: CWOP: No login response from %s" %
+                          self.server)
+        elif weewx.debug >= 2:
+            syslog.syslog(syslog.LOG_DEBUG, "restx: CWOP: %s: %s" % (self.server, _resp))
+        return _latency
+
+    def send(self, msg, dbg_msg):
+        """Send a message to the server."""
+        try:
+            self.sock.settimeout(self.timeout)
+            self.sock.sendall(msg)
         except IOError, e:
-            # Unsuccessful. Log it and go around again for another try
             raise SendError("Packet %s; Error %s" % (dbg_msg, e))
-        else:
-            # Success. Look for response from the server.
-            try:
-                _resp = sock.recv(1024)
-                return _resp
-            except IOError, e:
-                syslog.syslog(
-                    syslog.LOG_DEBUG,
-                    "restx: %s: Exception %s (%s) when looking for response to %s packet" %
-                    (self.protocol_name, type(e), e, dbg_msg))
-                return
+
+    def is_alive(self, keepalive_timeout):
+        """Read whatever the server has sent since last time, and return True
+        if the session still seems to be alive."""
+        try:
+            while select.select([self.sock], [], [], 0)[0]:
+                _data = self.sock.recv(4096)
+                if not _data:
+                    # The server closed the connection
+                    return False
+                self.last_rx = time.time()
+        except (IOError, select.error):
+            return False
+        # What the server sent are only comments
+        self.buffer = ''
+        return time.time() - self.last_rx <= keepalive_timeout
+
+    def close(self):
+        """Close the session. Wait for the server to close its end first, so
+        that nothing it has yet to read is thrown away."""
+        if self.sock is None:
+            return
+        try:
+            self.sock.shutdown(socket.SHUT_WR)
+            self.sock.settimeout(min(self.timeout, 2))
+            while self.sock.recv(4096):
+                pass
+        except IOError:
+            pass
+        finally:
+            self.sock.close()
+            self.sock = None
+
+    def _read_response(self, prefix):
+        """Read lines from the server, until one starts with prefix. Returns
+        the line, or None if there is no such line within the timeout."""
+        _deadline = time.time() + self.timeout
+        while True:
+            while '\n' not in self.buffer:
+                _remaining = _deadline - time.time()
+                if _remaining <= 0:
+                    return None
+                try:
+                    self.sock.settimeout(_remaining)
+                    _data = self.sock.recv(1024)
+                except socket.timeout:
+                    return None
+                except IOError, e:
+                    raise SendError("Response; Error %s" % e)
+                if not _data:
+                    raise SendError("Connection closed by server")
+                self.last_rx = time.time()
+                self.buffer += _data
+            _line, self.buffer = self.buffer.split('\n', 1)
+            _line = _line.rstrip('\r')
+            if _line.startswith(prefix):
+                return _line
 
 
 # ==============================================================================
@@ -1300,17 +2089,15 @@ class StdStationRegistry(StdRESTful):
         _registry_dict.setdefault('longitude', self.engine.stn_info.longitude_f)
         _registry_dict.setdefault('station_model', self.engine.stn_info.hardware)
 
-        self.archive_queue = Queue.Queue()
+        self.archive_queue = RESTQueue()
         self.archive_thread = StationRegistryThread(self.archive_queue,
                                                     **_registry_dict)
         self.archive_thread.start()
         self.bind(weewx.NEW_ARCHIVE_RECORD, self.new_archive_record)
+        self.bind(weewx.NEW_ARCHIVE_BATCH, self.new_archive_batch)
         syslog.syslog(syslog.LOG_INFO, "restx: StationRegistry: "
                                        "Station will be registered.")
 
-    def new_archive_record(self, event):
-        self.archive_queue.put(event.record)
-
 
 class StationRegistryThread(RESTThread):
     """Concrete threaded class for posting to the weewx station registry."""
@@ -1515,17 +2302,15 @@ class StdAWEKAS(StdRESTful):
         site_dict['manager_dict'] = weewx.manager.get_manager_dict_from_config(
             config_dict, 'wx_binding')
 
-        self.archive_queue = Queue.Queue()
+        self.archive_queue = RESTQueue()
         self.archive_thread = AWEKASThread(self.archive_queue, **site_dict)
         self.archive_thread.start()
         self.bind(weewx.NEW_ARCHIVE_RECORD, self.new_archive_record)
+        self.bind(weewx.NEW_ARCHIVE_BATCH, self.new_archive_batch)
         syslog.syslog(syslog.LOG_INFO, "restx: AWEKAS: "
                                        "Data will be uploaded for user %s" %
                       site_dict['username'])
 
-    def new_archive_record(self, event):
-        self.archive_queue.put(event.record)
-
 
 # For compatibility with some early alpha versions:
 AWEKAS = StdAWEKAS
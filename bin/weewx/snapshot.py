@@ -0,0 +1,382 @@
+#
+#    Copyright (c) 2009-2017 Tom Keffer <tkeffer@gmail.com>
+#
+#    See the file LICENSE.txt for your full rights.
+#
+"""Publish current conditions in a memory-mapped file.
+
+Service StdSnapshot keeps the latest LOOP packet, the latest archive record,
+and the statistics of the day so far in a file. Other programs on the same
+computer, such as dashboards or alarm scripts, can map the file and read the
+current conditions from it with class SnapshotReader. They need neither poll
+the database nor contend with StdArchive for its lock.
+
+The layout of the file is fixed when the service starts. All numbers are
+little-endian.
+
+    offset  size
+         0     8   magic string 'weewxsnp'
+         8     4   version of the layout (1)
+        12     4   number of observation types, n
+        16     4   length of the name of an observation type (32)
+        24     8   sequence number
+        32  32*n   names of the observation types, padded with NULs
+    32+32*n  8*(6+10*n)  values, as doubles:
+                       the LOOP packet: dateTime, usUnits, n values
+                       the archive record: dateTime, usUnits, n values
+                       the day: start, stop, then for each type the
+                         statistics min, mintime, max, maxtime, sum, count,
+                         wsum, sumtime
+
+A value that is missing is a NaN. The values are protected by the sequence
+number, which is odd while the values are being written. A reader reads the
+sequence number, then the values, then the sequence number again. If the
+sequence number was odd, or has changed, the reader tries again.
+"""
+
+from __future__ import with_statement
+import mmap
+import os
+import os.path
+import struct
+import syslog
+import time
+
+import weewx
+import weewx.accum
+import weewx.engine
+import weewx.manager
+import weeutil.weeutil
+from weeutil.weeutil import to_bool, option_as_list
+
+MAGIC = 'weewxsnp'
+VERSION = 1
+NAME_LENGTH = 32
+
+# The names of the statistics kept for each type, in the order they are stored
+STATS = ('min', 'mintime', 'max', 'maxtime', 'sum', 'count', 'wsum', 'sumtime')
+
+NAN = float('nan')
+
+_header = struct.Struct('<8sIII')
+_seq = struct.Struct('<Q')
+_name = struct.Struct('<%ds' % NAME_LENGTH)
+_SEQ_OFFSET = 24
+_NAMES_OFFSET = 32
+
+def _data_struct(n):
+    return struct.Struct('<%dd' % (6 + 10 * n))
+
+def _to_float(val):
+    if val is None:
+        return NAN
+    try:
+        return float(val)
+    except (TypeError, ValueError):
+        return NAN
+
+def _to_int(val):
+    return int(val) if val is not None else None
+
+#==============================================================================
+#                    Class SnapshotWriter
+#==============================================================================
+
+class SnapshotWriter(object):
+    """Writes snapshots to a memory-mapped file."""
+
+    def __init__(self, path, obs_types):
+        """Create the file, replacing any there is at path.
+
+        path: The path to the file.
+
+        obs_types: The observation types to publish."""
+        self.obs_types = list(obs_types)
+        for obs_type in self.obs_types:
+            if len(obs_type) > NAME_LENGTH:
+                raise weewx.ViolatedPrecondition("Observation type '%s' has too long a name" % obs_type)
+        n = len(self.obs_types)
+        self.loop_offset = 0
+        self.archive_offset = 2 + n
+        self.day_offset = 4 + 2 * n
+        self.values = [NAN] * (6 + 10 * n)
+        self.seq = 0
+        self._data = _data_struct(n)
+        self._data_offset = _NAMES_OFFSET + NAME_LENGTH * n
+        size = self._data_offset + self._data.size
+
+        # Set up the file under another name, then move it into place, so
+        # that a reader never sees a file that is only partly set up.
+        tmp_path = path + '.tmp'
+        fd = os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0644)
+        try:
+            os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        _header.pack_into(self._map, 0, MAGIC, VERSION, n, NAME_LENGTH)
+        for i, obs_type in enumerate(self.obs_types):
+            _name.pack_into(self._map, _NAMES_OFFSET + NAME_LENGTH * i, obs_type)
+        self.publish()
+        os.rename(tmp_path, path)
+
+    def set_loop(self, packet):
+        self._set_record(self.loop_offset, packet)
+
+    def set_archive(self, record):
+        self._set_record(self.archive_offset, record)
+
+    def set_day(self, day_accum):
+        """Set the statistics of the day from an accumulator. Types that the
+        accumulator does not have, or that are not scalars, are missing."""
+        values = self.values
+        offset = self.day_offset
+        values[offset] = day_accum.timespan.start
+        values[offset + 1] = day_accum.timespan.stop
+        offset += 2
+        for obs_type in self.obs_types:
+            stats = day_accum.get(obs_type)
+            if isinstance(stats, weewx.accum.ScalarStats):
+                values[offset:offset + 8] = [_to_float(x) for x in stats.getStatsTuple()]
+            else:
+                values[offset:offset + 8] = [NAN] * 8
+            offset += 8
+
+    def publish(self):
+        """Write the values to the file. The sequence number is odd while they
+        are being written."""
+        self.seq += 1
+        _seq.pack_into(self._map, _SEQ_OFFSET, self.seq)
+        self._data.pack_into(self._map, self._data_offset, *self.values)
+        self.seq += 1
+        _seq.pack_into(self._map, _SEQ_OFFSET, self.seq)
+
+    def close(self):
+        self._map.close()
+
+    def _set_record(self, offset, record):
+        values = self.values
+        values[offset] = record['dateTime']
+        values[offset + 1] = record['usUnits']
+        offset += 2
+        for i, obs_type in enumerate(self.obs_types):
+            values[offset + i] = _to_float(record.get(obs_type))
+
+#==============================================================================
+#                    Class SnapshotReader
+#==============================================================================
+
+class SnapshotReader(object):
+    """Reads the snapshots in a file written by a SnapshotWriter.
+
+    Example:
+
+    >>> reader = SnapshotReader('/home/weewx/archive/snapshot')
+    >>> snapshot = reader.read()
+    >>> print snapshot['loop']['outTemp'], snapshot['day']['outTemp']['max']
+
+    Should weewxd be restarted, it writes a new file. A reader of the old file
+    sees its timestamps stop advancing, and should make a new SnapshotReader.
+    """
+
+    def __init__(self, path, max_tries=100, retry_wait=0.001):
+        """Map the file at path.
+
+        max_tries: How many times to try to read a snapshot while it is being
+        written, before giving up.
+
+        retry_wait: How long to wait between tries, in seconds."""
+        self.max_tries = max_tries
+        self.retry_wait = retry_wait
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, n, name_length) = _header.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION or name_length != NAME_LENGTH:
+            self._map.close()
+            raise weewx.WeeWxIOError("%s is not a snapshot file of version %d" % (path, VERSION))
+        self.obs_types = [_name.unpack_from(self._map, _NAMES_OFFSET + NAME_LENGTH * i)[0].rstrip('\0')
+                          for i in range(n)]
+        self._data = _data_struct(n)
+        self._data_offset = _NAMES_OFFSET + NAME_LENGTH * n
+
+    def read_values(self):
+        """Return the raw values, as a tuple of floats laid out as in the
+        file, and the sequence number they were written with."""
+        for _ in range(self.max_tries):
+            seq = _seq.unpack_from(self._map, _SEQ_OFFSET)[0]
+            if not seq & 1:
+                values = self._data.unpack_from(self._map, self._data_offset)
+                if _seq.unpack_from(self._map, _SEQ_OFFSET)[0] == seq:
+                    return values, seq
+            time.sleep(self.retry_wait)
+        raise weewx.WeeWxIOError("Snapshot was being written for all of %d tries" % self.max_tries)
+
+    def read(self):
+        """Return a snapshot, as a dictionary with keys:
+
+        'loop': The latest LOOP packet, or None if there has been none.
+
+        'archive': The latest archive record, or None if there has been none.
+
+        'day_span': The TimeSpan of the day, or None if it is not known yet.
+
+        'day': A dictionary of the statistics of the day, keyed by observation
+        type. The statistics of a type are a dictionary keyed by the names in
+        STATS.
+
+        Values that are missing are None."""
+        # NaN is the only value that is not equal to itself
+        values = [x if x == x else None for x in self.read_values()[0]]
+        n = len(self.obs_types)
+        day = dict()
+        offset = 6 + 2 * n
+        for obs_type in self.obs_types:
+            (min_, mintime, max_, maxtime, sum_, count, wsum, sumtime) = values[offset:offset + 8]
+            day[obs_type] = {'min'    : min_,
+                             'mintime': _to_int(mintime),
+                             'max'    : max_,
+                             'maxtime': _to_int(maxtime),
+                             'sum'    : sum_,
+                             'count'  : _to_int(count),
+                             'wsum'   : wsum,
+                             'sumtime': sumtime}
+            offset += 8
+        start = values[4 + 2 * n]
+        return {'loop'    : self._get_record(values, 0),
+                'archive' : self._get_record(values, 2 + n),
+                'day_span': weeutil.weeutil.TimeSpan(int(start), int(values[5 + 2 * n]))
+                            if start is not None else None,
+                'day'     : day}
+
+    def close(self):
+        self._map.close()
+
+    def _get_record(self, values, offset):
+        if values[offset] is None:
+            return None
+        record = dict(zip(self.obs_types, values[offset + 2:offset + 2 + len(self.obs_types)]))
+        record['dateTime'] = int(values[offset])
+        record['usUnits'] = int(values[offset + 1])
+        return record
+
+#==============================================================================
+#                    Class StdSnapshot
+#==============================================================================
+
+class StdSnapshot(weewx.engine.StdService):
+    """Service that publishes current conditions in a memory-mapped file.
+
+    The statistics of the day are read from the daily summaries when the
+    service starts, and again after each archive record. The highs and lows of
+    the LOOP packets since the last archive record are added to them as the
+    packets come in. The service must therefore run after StdArchive."""
+
+    def __init__(self, engine, config_dict):
+        super(StdSnapshot, self).__init__(engine, config_dict)
+
+        snapshot_dict = config_dict.get('StdSnapshot', {})
+        self.data_binding = snapshot_dict.get('data_binding', 'wx_binding')
+        self.snapshot_file = os.path.join(config_dict['WEEWX_ROOT'],
+                                          snapshot_dict.get('snapshot_file', 'archive/snapshot'))
+        snapshot_dir = os.path.dirname(self.snapshot_file)
+        if not os.path.exists(snapshot_dir):
+            os.makedirs(snapshot_dir)
+        obs_types = option_as_list(snapshot_dict.get('observations'))
+        if not obs_types:
+            obs_types = self.engine.db_binder.get_manager(self.data_binding).obskeys
+        # Use LOOP data in the highs and lows of the day, as StdArchive does
+        self.loop_hilo = to_bool(config_dict.get('StdArchive', {}).get('loop_hilo', True))
+
+        self.writer = SnapshotWriter(self.snapshot_file, obs_types)
+        syslog.syslog(syslog.LOG_INFO, "snapshot: Publishing %d observation types in %s" %
+                      (len(obs_types), self.snapshot_file))
+        self.day_accum = None
+        # The LOOP packets that are not in the daily summaries yet
+        self.recent_packets = []
+
+        self.bind(weewx.STARTUP, self.startup)
+        self.bind(weewx.NEW_LOOP_PACKET, self.new_loop_packet)
+        self.bind(weewx.NEW_ARCHIVE_RECORD, self.new_archive_record)
+
+    def startup(self, event):  # @UnusedVariable
+        self._set_day(self._get_day_summary(time.time()))
+        self.writer.publish()
+
+    def new_loop_packet(self, event):
+        packet = event.packet
+        self.writer.set_loop(packet)
+        if self.loop_hilo:
+            self.recent_packets.append(packet)
+            if self.day_accum is None or \
+                    not self.day_accum.timespan.includesArchiveTime(packet['dateTime']):
+                self._set_day(self._new_day(packet['dateTime']))
+            self._add_hilo(packet)
+            self.writer.set_day(self.day_accum)
+        self.writer.publish()
+
+    def new_archive_record(self, event):
+        record = event.record
+        self.writer.set_archive(record)
+        # StdArchive has put the record, and the highs and lows of the LOOP
+        # packets up to it, in the daily summaries. Read them back, then add
+        # the LOOP packets that have come in since.
+        self.recent_packets = [packet for packet in self.recent_packets
+                               if packet['dateTime'] > record['dateTime']]
+        latest_ts = max([record['dateTime']] + [packet['dateTime'] for packet in self.recent_packets])
+        self._set_day(self._get_day_summary(latest_ts))
+        for packet in self.recent_packets:
+            if self.day_accum.timespan.includesArchiveTime(packet['dateTime']):
+                self._add_hilo(packet)
+        self.writer.set_day(self.day_accum)
+        self.writer.publish()
+
+    def shutDown(self):
+        self.writer.close()
+
+    def _get_day_summary(self, time_ts):
+        """Return an accumulator with the daily summary of the day that
+        includes time_ts."""
+        dbmanager = self.engine.db_binder.get_manager(self.data_binding)
+        if isinstance(dbmanager, weewx.manager.DaySummaryManager):
+            return dbmanager._get_day_summary(weeutil.weeutil.startOfArchiveDay(time_ts))
+        return weewx.accum.Accum(weeutil.weeutil.archiveDaySpan(time_ts))
+
+    def _new_day(self, time_ts):
+        """Return an empty accumulator for the day that includes time_ts, with
+        the same types as the day before."""
+        day_accum = weewx.accum.Accum(weeutil.weeutil.archiveDaySpan(time_ts))
+        if self.day_accum is not None:
+            for obs_type in self.day_accum:
+                day_accum.set_stats(obs_type, None)
+        return day_accum
+
+    def _set_day(self, day_accum):
+        self.day_accum = day_accum
+        # The published types that have highs and lows in the accumulator
+        self.hilo_stats = [(obs_type, day_accum[obs_type]) for obs_type in self.writer.obs_types
+                           if isinstance(day_accum.get(obs_type), weewx.accum.ScalarStats)]
+        self.writer.set_day(day_accum)
+
+    def _add_hilo(self, packet):
+        for obs_type, stats in self.hilo_stats:
+            if obs_type in packet:
+                stats.addHiLo(packet[obs_type], packet['dateTime'])
+
+
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) != 2:
+        print "Usage: python -m weewx.snapshot path-to-snapshot-file"
+        sys.exit(1)
+    snapshot = SnapshotReader(sys.argv[1]).read()
+    for section in ('loop', 'archive'):
+        print "%s:" % section
+        record = snapshot[section]
+        if record is not None:
+            for obs_type in sorted(record):
+                print "    %s = %s" % (obs_type, record[obs_type])
+    print "day %s:" % (snapshot['day_span'],)
+    for obs_type in sorted(snapshot['day']):
+        stats = snapshot['day'][obs_type]
+        if stats['count'] or stats['max'] is not None:
+            print "    %s: min %s, max %s, count %s" % (obs_type, stats['min'], stats['max'], stats['count'])
@@ -0,0 +1,255 @@
+#
+#    Copyright (c) 2009-2017 Tom Keffer <tkeffer@gmail.com>
+#
+#    See the file LICENSE.txt for your full rights.
+#
+"""Benchmarks of the code that weewx runs most often, or that takes the
+longest. They are not unit tests, and are not run with them.
+
+Run them from this directory, all of them, or only the ones named in the
+list at the end of this file:
+
+    python benchmark.py [name ...]
+"""
+
+from __future__ import with_statement
+import os
+import random
+import shutil
+import StringIO
+import sys
+import syslog
+import time
+
+os.environ['TZ'] = 'America/Los_Angeles'
+time.tzset()
+
+def bench_packet():
+    from test_packet import run_packets
+    # A week of LOOP packets, every 2.5 seconds
+    npackets = 7 * 24 * 3600 * 2 / 5
+    for name, compact in (('dict', False), ('compact', True)):
+        allocated, t = run_packets(compact, npackets)
+        print "%d %s packets: %.1f MB allocated, %.0f bytes/packet, %.2f seconds" % \
+            (npackets, name, allocated / 1048576.0, allocated / float(npackets), t)
+
+def bench_crc16():
+    import weewx.crc16
+    from test_crc16 import gen_pages
+    # The CRC check of a full 512 page archive dump
+    pages = list(gen_pages(512))
+    t0 = time.time()
+    for page in pages:
+        weewx.crc16._crc16_table(page)
+    t1 = time.time()
+    for page in pages:
+        weewx.crc16.crc16(page)
+    t2 = time.time()
+    print "512 page dump: table %.4f s; crc16 %.4f s" % (t1 - t0, t2 - t1)
+
+def bench_vantage():
+    import weewx.drivers.vantage as vantage
+    from test_vantage import SimulatedConsole, dump, gen_archive_pages, \
+        gen_archive_stream, gen_loop_stream
+    # A dump over a slow link, to a consumer that takes time with each record
+    start_ts = int(time.mktime((2017, 7, 1, 0, 0, 0, 0, 0, -1)))
+    pages = gen_archive_pages(random.Random(7), 100, start_ts)
+    times = []
+    for read_ahead in (0, 8):
+        t1 = time.time()
+        dump(SimulatedConsole(pages, page_delay=0.01), read_ahead, delay=0.002)
+        times.append(time.time() - t1)
+    print "20 page dump: %.3f seconds; with read ahead %.3f seconds" % tuple(times)
+    # Decoding a full 512 page archive dump, and LOOP packets
+    rnd = random.Random(4)
+    station = vantage.VantageReplay()
+    stream, _ = gen_archive_stream(rnd, 512, 'B')
+    t1 = time.time()
+    n = len(list(station.genReplayArchiveRecords(StringIO.StringIO(stream))))
+    t2 = time.time()
+    print "%d archive records: %.0f records/second" % (n, n / max(t2 - t1, 1e-6))
+    stream, _ = gen_loop_stream(rnd, 2000)
+    t1 = time.time()
+    n = len(list(station.genReplayLoopPackets(StringIO.StringIO(stream))))
+    t2 = time.time()
+    print "%d LOOP packets: %.0f packets/second" % (n, n / max(t2 - t1, 1e-6))
+
+def bench_restx():
+    import threading
+    import weewx.restx
+    from test_restx import StandInServer, get_uploaders, get_record
+    server = StandInServer()
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.setDaemon(True)
+    server_thread.start()
+    # A server 10 ms away takes about 30 ms to set up a TLS connection
+    server.handshake_delay = 0.03
+    try:
+        for keep_alive in (False, True):
+            weewx.restx.http_pool.configure(keep_alive=keep_alive)
+            for uploader in get_uploaders(server.url):
+                weewx.restx.http_pool.close()
+                connections = server.connections
+                t1 = time.time()
+                for i in xrange(50):
+                    uploader.process_record(get_record(1500000000 + i), None)
+                print "%-18s keep_alive=%-5s %6.0f posts/second, %3d handshakes" % \
+                    (uploader.protocol_name, keep_alive, 50 / (time.time() - t1),
+                     server.connections - connections)
+    finally:
+        weewx.restx.http_pool.close()
+        server.shutdown()
+        server.server_close()
+
+def bench_ws28xx():
+    import weewx.drivers.ws28xx as ws28xx
+    from test_ws28xx import gen_corpus, reference_decode
+    for cls, layout, n in ((ws28xx.CCurrentWeatherData, ws28xx._current_weather_layout, 1000),
+                           (ws28xx.CHistoryData, ws28xx._history_layout, 5000)):
+        corpus = gen_corpus(3, n, layout)
+        t1 = time.time()
+        for frame in corpus:
+            reference_decode([frame], cls(), layout)
+        t2 = time.time()
+        for frame in corpus:
+            cls().read([frame])
+        t3 = time.time()
+        print "%s: %.0f frames/second, field by field %.0f frames/second" % \
+            (cls.__name__, n / max(t3 - t2, 1e-6), n / max(t2 - t1, 1e-6))
+
+def bench_fousb():
+    from test_fousb import StandInStation, make_memory
+    memory = make_memory('3080', 0x8000, 3000)
+    results = []
+    for name, read_ahead in (('no read ahead', 0), ('read ahead', 16)):
+        station = StandInStation(list(memory), data_format='3080', read_ahead=read_ahead)
+        # Reads from the station, and decoding the records, both take time
+        def slow(func):
+            def slow_func(arg):
+                time.sleep(0.0005)
+                return func(arg)
+            return slow_func
+        station._read_usb_block = slow(station._read_usb_block)
+        station.decode = slow(station.decode)
+        t1 = time.time()
+        station.get_records(num_rec=1000)
+        results.append("%s: %.2f seconds" % (name, time.time() - t1))
+    print "1000 Fine Offset records, %s" % '; '.join(results)
+
+def bench_te923():
+    from test_te923 import StandInStation, make_memory, old_gen_records
+    from weewx.drivers.te923 import TE923Station
+    # Reads from the station, and processing the records, both take time
+    end_ts = int(time.time() / 300) * 300 - 300
+    memory = make_memory(3442, 1000, end_ts)
+    delay = 0.0005
+    results = []
+    for name, gen_records, read_ahead in (('two reads a record', old_gen_records, 0),
+                                          ('block reads', TE923Station.gen_records, 0),
+                                          ('block reads, read ahead', TE923Station.gen_records, 16)):
+        station = StandInStation(memory, read_delay=delay, read_ahead=read_ahead)
+        reads = len(station.reads)
+        t1 = time.time()
+        for _ in gen_records(station, 0, 1000):
+            time.sleep(delay)
+        results.append("%s: %d reads, %.2f seconds" % (name, len(station.reads) - reads,
+                                                      time.time() - t1))
+    print "1000 TE923 records, %s" % '; '.join(results)
+
+def bench_snapshot():
+    from test_snapshot import make_packet, start_ts, test_root
+    from weewx.snapshot import SnapshotReader, SnapshotWriter
+    if not os.path.exists(test_root):
+        os.makedirs(test_root)
+    path = os.path.join(test_root, 'snapshot')
+    obs_types = ['obs%d' % i for i in range(50)]
+    writer = SnapshotWriter(path, obs_types)
+    writer.set_loop(make_packet(start_ts, **dict((obs_type, 1.0) for obs_type in obs_types)))
+    writer.publish()
+    reader = SnapshotReader(path)
+    n = 10000
+    t1 = time.time()
+    for _ in xrange(n):
+        reader.read_values()
+    t2 = time.time()
+    for _ in xrange(n / 10):
+        reader.read()
+    t3 = time.time()
+    for _ in xrange(n / 10):
+        writer.set_loop(make_packet(start_ts, **dict((obs_type, 1.0) for obs_type in obs_types)))
+        writer.publish()
+    t4 = time.time()
+    print "Snapshot of 50 types: raw read %.1f us, read %.1f us, publish a LOOP packet %.1f us" % \
+        ((t2 - t1) / n * 1e6, (t3 - t2) / (n / 10) * 1e6, (t4 - t3) / (n / 10) * 1e6)
+    writer.close()
+    reader.close()
+
+def bench_noaa():
+    """The NOAA reports of the Standard skin, for a decade of hourly data.
+    The database is generated the first time, which takes a while."""
+    import configobj
+    import weewx.cheetahgenerator
+    import weewx.station
+    import gen_fake_data
+
+    start_ts = int(time.mktime((2007, 1, 1, 0, 0, 0, 0, 0, -1)))
+    stop_ts = int(time.mktime((2016, 12, 31, 23, 0, 0, 0, 0, -1)))
+    test_root = '/var/tmp/weewx_test'
+    skin_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../skins'))
+    html_root = os.path.join(test_root, 'noaa_results')
+    config_dict = configobj.ConfigObj({
+        'WEEWX_ROOT' : test_root,
+        'Station'    : {'location'  : 'Benchmark',
+                        'latitude'  : '45.686',
+                        'longitude' : '-121.566',
+                        'altitude'  : ['100', 'meter'],
+                        'rain_year_start' : '1',
+                        'week_start' : '6'},
+        'DataBindings' : {'wx_binding' : {'database'   : 'noaa_sqlite',
+                                          'table_name' : 'archive',
+                                          'manager'    : 'weewx.wxmanager.WXDaySummaryManager',
+                                          'schema'     : 'schemas.wview.schema'}},
+        'Databases'  : {'noaa_sqlite' : {'root'          : test_root,
+                                         'database_name' : 'noaa_decade.sdb',
+                                         'driver'        : 'weedb.sqlite'}},
+        'StdReport'  : {'SKIN_ROOT' : skin_root,
+                        'HTML_ROOT' : 'noaa_results'}})
+    # The Standard skin, with just its NOAA templates
+    skin_dict = configobj.ConfigObj(os.path.join(skin_root, 'Standard', 'skin.conf'))
+    del skin_dict['CheetahGenerator']['ToDate']
+    skin_dict['SKIN_ROOT'] = skin_root
+    skin_dict['skin'] = 'Standard'
+    skin_dict['HTML_ROOT'] = html_root
+    skin_dict['REPORT_NAME'] = 'NOAA'
+    skin_dict['data_binding'] = 'wx_binding'
+
+    gen_fake_data.configDatabase(config_dict, 'wx_binding',
+                                 start_ts=start_ts, stop_ts=stop_ts, interval=3600)
+    # Summary files that already exist are not generated again
+    shutil.rmtree(html_root, ignore_errors=True)
+    cwd = os.getcwd()
+    try:
+        stn_info = weewx.station.StationInfo(**config_dict['Station'])
+        gen = weewx.cheetahgenerator.CheetahGenerator(config_dict, skin_dict,
+                                                      stop_ts, True, stn_info)
+        t1 = time.time()
+        gen.start()
+        gen.finalize()
+        t = time.time() - t1
+    finally:
+        os.chdir(cwd)
+    nfiles = sum(len(files) for _, _, files in os.walk(html_root))
+    print "%d NOAA files for a decade of data in %.2f seconds" % (nfiles, t)
+
+benchmarks = ['packet', 'crc16', 'vantage', 'restx', 'ws28xx', 'fousb', 'te923', 'snapshot', 'noaa']
+
+if __name__ == '__main__':
+    syslog.openlog('benchmark', syslog.LOG_CONS)
+    # Garbled records in the stand-in stations are reported as errors
+    syslog.setlogmask(syslog.LOG_UPTO(syslog.LOG_CRIT))
+    names = sys.argv[1:] or benchmarks
+    for name in names:
+        if name not in benchmarks:
+            sys.exit("Unknown benchmark '%s'. Choose from: %s" % (name, ', '.join(benchmarks)))
+    for name in names:
+        globals()['bench_' + name]()
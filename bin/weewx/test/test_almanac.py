@@ -0,0 +1,156 @@
+#
+#    Copyright (c) 2009-2017 Tom Keffer <tkeffer@gmail.com>
+#
+#    See the file LICENSE.txt for your full rights.
+#
+"""Test that the almanac calculations, and the weather the almanac uses, are
+remembered only for as long as they are right."""
+
+import syslog
+import time
+import unittest
+
+import weewx
+import weewx.almanac
+import weewx.cheetahgenerator
+
+# 2017-07-01 12:00 PDT
+noon_ts = int(time.mktime((2017, 7, 1, 12, 0, 0, 0, 0, -1)))
+lat = 45.686
+lon = -121.566
+
+def calculate(almanac, heavenly_body, attr):
+    """The result of a calculation, without looking in the cache"""
+    return weewx.almanac.AlmanacBinder(almanac, heavenly_body)._calc(attr)
+
+def observe(almanac, heavenly_body, attr):
+    """The result of a calculation, as the almanac gives it"""
+    result = getattr(getattr(almanac, heavenly_body), attr)
+    if isinstance(result, weewx.units.ValueHelper):
+        return result.value_t[0]
+    return result
+
+def lookup(almanac):
+    """Some of the results a skin might ask for"""
+    return (almanac.sun.rise.raw, almanac.sun.set.raw, almanac.sun.alt, almanac.sun.az,
+            almanac.sun(use_center=True).rise.raw, almanac.moon.moon_fullness,
+            almanac.next_full_moon.raw, almanac.mars.next_rising.raw)
+
+class StandInArchive(object):
+    """Holds records by time, and counts how many times it is asked for one."""
+
+    table_name = 'archive'
+
+    def __init__(self, database_name, records):
+        self.database_name = database_name
+        self.records = records
+        self.lookups = 0
+
+    def lastGoodStamp(self):
+        return max(self.records)
+
+    def getRecord(self, timestamp, max_delta=None):
+        self.lookups += 1
+        return self.records.get(timestamp)
+
+class StandInDBBinder(object):
+    def __init__(self, archive):
+        self.archive = archive
+
+    def get_manager(self, data_binding):
+        return self.archive
+
+class StandInGenerator(object):
+    def __init__(self, gen_ts, archive):
+        self.gen_ts = gen_ts
+        self.skin_dict = {}
+        self.db_binder = StandInDBBinder(archive)
+
+def make_record(ts, outTemp, barometer):
+    return {'dateTime': ts, 'usUnits': weewx.US, 'outTemp': outTemp, 'barometer': barometer}
+
+
+class AlmanacCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        syslog.openlog('test_almanac', syslog.LOG_CONS)
+        weewx.almanac._cache.clear()
+        weewx.cheetahgenerator._almanac_weather_cache.clear()
+
+    def test_repeated(self):
+        almanac = weewx.almanac.Almanac(noon_ts, lat, lon, altitude=100.0)
+        first = lookup(almanac)
+        cached = len(weewx.almanac._cache)
+        # Asked again, by the same almanac or another one just like it, the
+        # results are the same, and nothing more is calculated
+        self.assertEqual(lookup(almanac), first)
+        self.assertEqual(lookup(weewx.almanac.Almanac(noon_ts, lat, lon, altitude=100.0)), first)
+        self.assertEqual(len(weewx.almanac._cache), cached)
+        # ... and they are what would have been calculated without the cache
+        weewx.almanac._cache.clear()
+        self.assertEqual(lookup(weewx.almanac.Almanac(noon_ts, lat, lon, altitude=100.0)), first)
+        # The rise and set are for the day, whatever the time of day
+        later = weewx.almanac.Almanac(noon_ts + 3600, lat, lon, altitude=100.0)
+        self.assertEqual(later.sun.rise.raw, first[0])
+        self.assertNotEqual(later.sun.alt, first[2])
+
+    def test_changed(self):
+        almanac = weewx.almanac.Almanac(noon_ts, lat, lon, altitude=100.0)
+        first = lookup(almanac)
+        # Each of these changes the results. None of them may come from the
+        # cache entries of the first almanac.
+        for changes in ({'almanac_time': noon_ts + 86400},
+                        {'almanac_time': noon_ts + 600},
+                        {'almanac_time': noon_ts + 30 * 86400},
+                        {'lat': lat + 1.0},
+                        {'lon': lon + 1.0},
+                        {'altitude': 2000.0},
+                        {'horizon': -6.0},
+                        {'temperature': -30.0},
+                        {'pressure': 900.0}):
+            changed = almanac(**changes)
+            self.assertNotEqual(lookup(changed), first, changes)
+            for heavenly_body, attr in (('sun', 'rise'), ('sun', 'alt'), ('sun', 'az'),
+                                        ('moon', 'moon_fullness'), ('mars', 'next_rising')):
+                self.assertEqual(observe(changed, heavenly_body, attr),
+                                 calculate(changed, heavenly_body, attr),
+                                 (changes, heavenly_body, attr))
+            self.assertEqual(changed.next_full_moon.value_t[0],
+                             weewx.almanac.ephem.next_full_moon(changed.time_djd), changes)
+        # ... and the first almanac still gets its own results
+        self.assertEqual(lookup(almanac), first)
+
+    def test_weather(self):
+        archive = StandInArchive('weewx.sdb', {noon_ts: make_record(noon_ts, 68.0, 30.0),
+                                               noon_ts + 300: make_record(noon_ts + 300, 50.0, 29.5)})
+        generator = StandInGenerator(noon_ts, archive)
+        weather = weewx.cheetahgenerator._almanac_weather(generator)
+        self.assertEqual(weather[0], noon_ts)
+        self.assertAlmostEqual(weather[1], 20.0)
+        self.assertAlmostEqual(weather[2], 1015.92, 2)
+        # The next skin of the same report cycle does not look again
+        self.assertEqual(weewx.cheetahgenerator._almanac_weather(generator), weather)
+        self.assertEqual(archive.lookups, 1)
+        # A new report cycle gets the weather at its own time
+        generator.gen_ts = noon_ts + 300
+        weather = weewx.cheetahgenerator._almanac_weather(generator)
+        self.assertEqual(archive.lookups, 2)
+        self.assertEqual(weather[0], noon_ts + 300)
+        self.assertAlmostEqual(weather[1], 10.0)
+        self.assertAlmostEqual(weather[2], 999.0, 0)
+        # So does a skin with no time of its own, which uses the last record
+        generator.gen_ts = None
+        self.assertEqual(weewx.cheetahgenerator._almanac_weather(generator), weather)
+        self.assertEqual(archive.lookups, 2)
+        # The same time, in another database, is another lookup
+        other = StandInArchive('other.sdb', {noon_ts + 300: make_record(noon_ts + 300, 86.0, 30.5)})
+        weather = weewx.cheetahgenerator._almanac_weather(StandInGenerator(noon_ts + 300, other))
+        self.assertEqual(other.lookups, 1)
+        self.assertAlmostEqual(weather[1], 30.0)
+        # With no record near the time, the standard weather is used
+        weather = weewx.cheetahgenerator._almanac_weather(StandInGenerator(noon_ts + 600, other))
+        self.assertEqual(weather, (noon_ts + 600, 15.0, 1010.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+#
+#    Copyright (c) 2009-2017 Tom Keffer <tkeffer@gmail.com>
+#
+#    See the file LICENSE.txt for your full rights.
+#
+"""Test StdArchive catching up on the records in station memory, in batches."""
+
+from __future__ import with_statement
+import os
+import syslog
+import time
+import unittest
+
+import weewx
+import weewx.engine
+import weewx.manager
+
+test_root = '/var/tmp/weewx_test'
+
+interval = 300
+start_ts = int(time.mktime((2017, 7, 1, 0, 0, 0, 0, 0, -1)))
+nrecs = 12
+
+config_dict = {
+    'WEEWX_ROOT'   : test_root,
+    'StdArchive'   : {'data_binding'       : 'wx_binding',
+                      'archive_interval'   : interval,
+                      'catchup_batch_size' : 5},
+    'DataBindings' : {'wx_binding' : {'database'   : 'catchup_sqlite',
+                                      'table_name' : 'archive',
+                                      'manager'    : 'weewx.manager.DaySummaryManager',
+                                      'schema'     : 'schemas.wview.schema'}},
+    'Databases'    : {'catchup_sqlite' : {'root'          : test_root,
+                                          'database_name' : 'catchup.sdb',
+                                          'driver'        : 'weedb.sqlite'}}}
+
+def make_record(i):
+    return {'dateTime': start_ts + i * interval, 'usUnits': weewx.US,
+            'interval': interval / 60, 'outTemp': 60.0 + i}
+
+class StandInConsole(object):
+    """Has nrecs records in memory. Reading record fail_at raises an
+    exception."""
+
+    archive_interval = interval
+
+    def __init__(self, fail_at=None):
+        self.fail_at = fail_at
+
+    def genStartupRecords(self, since_ts):
+        for i in range(nrecs):
+            if i == self.fail_at:
+                raise weewx.WeeWxIOError("Lost the console")
+            record = make_record(i)
+            if since_ts is None or record['dateTime'] > since_ts:
+                yield record
+
+class StandInEngine(object):
+    def __init__(self, console):
+        self.console = console
+        self.db_binder = weewx.manager.DBBinder(config_dict)
+        self.callbacks = dict()
+        self.batches = []
+        self.bind(weewx.NEW_ARCHIVE_BATCH,
+                  lambda event: self.batches.append([r['dateTime'] for r in event.records]))
+
+    def bind(self, event_type, callback):
+        self.callbacks.setdefault(event_type, []).append(callback)
+
+    def dispatchEvent(self, event):
+        for callback in self.callbacks.get(event.event_type, []):
+            callback(event)
+
+def archived():
+    """The times of the records committed to the database"""
+    database_dict = {'database_name': os.path.join(test_root, 'catchup.sdb'),
+                     'driver': 'weedb.sqlite'}
+    with weewx.manager.Manager.open(database_dict) as manager:
+        return [record['dateTime'] for record in manager.genBatchRecords()]
+
+
+class CatchupTest(unittest.TestCase):
+
+    def setUp(self):
+        syslog.openlog('test_catchup', syslog.LOG_CONS)
+        syslog.setlogmask(syslog.LOG_UPTO(syslog.LOG_INFO))
+        if not os.path.exists(test_root):
+            os.makedirs(test_root)
+        db_path = os.path.join(test_root, 'catchup.sdb')
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        self.engines = []
+
+    def tearDown(self):
+        for engine in self.engines:
+            engine.db_binder.close()
+
+    def catchup(self, console):
+        engine = StandInEngine(console)
+        self.engines.append(engine)
+        weewx.engine.StdArchive(engine, config_dict)
+        engine.dispatchEvent(weewx.Event(weewx.STARTUP))
+        return engine
+
+    def test_catchup(self):
+        engine = self.catchup(StandInConsole())
+        expected = [make_record(i)['dateTime'] for i in range(nrecs)]
+        self.assertEqual(archived(), expected)
+        self.assertEqual(engine.batches, [expected[0:5], expected[5:10], expected[10:]])
+
+    def test_console_error(self):
+        # The console fails part way through the second batch. The records
+        # read so far are kept, and announced, before the error is passed on.
+        expected = [make_record(i)['dateTime'] for i in range(nrecs)]
+        engine = StandInEngine(StandInConsole(fail_at=8))
+        self.engines.append(engine)
+        weewx.engine.StdArchive(engine, config_dict)
+        self.assertRaises(weewx.WeeWxIOError, engine.dispatchEvent, weewx.Event(weewx.STARTUP))
+        self.assertEqual(archived(), expected[:8])
+        self.assertEqual(engine.batches, [expected[0:5], expected[5:8]])
+        # The next catch up starts after them
+        engine = self.catchup(StandInConsole())
+        self.assertEqual(archived(), expected)
+        self.assertEqual(engine.batches, [expected[8:]])
+
+    def test_service_error(self):
+        # A service fails on the seventh record, after StdArchive has added
+        # it. The records before it are kept.
+        expected = [make_record(i)['dateTime'] for i in range(nrecs)]
+        engine = StandInEngine(StandInConsole())
+        self.engines.append(engine)
+        weewx.engine.StdArchive(engine, config_dict)
+        def new_archive_record(event):
+            if event.record['dateTime'] == expected[6]:
+                raise ValueError("Service failed")
+        engine.bind(weewx.NEW_ARCHIVE_RECORD, new_archive_record)
+        self.assertRaises(ValueError, engine.dispatchEvent, weewx.Event(weewx.STARTUP))
+        self.assertEqual(archived(), expected[:7])
+        self.assertEqual(engine.batches, [expected[0:5], expected[5:6]])
+
+
+if __name__ == '__main__':
+    unittest.main()
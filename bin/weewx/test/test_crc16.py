@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+#
+#    Copyright (c) 2009-2015 Tom Keffer <tkeffer@gmail.com>
+#
+#    See the file LICENSE.txt for your full rights.
+#
+"""Test module weewx.crc16"""
+
+import random
+import struct
+import unittest
+
+import weewx.crc16
+from weewx.crc16 import crc16
+
+# This is the example given in the Davis documentation:
+davis_str = struct.pack("<HH", 0xCEC6, 0x03A2)
+
+def gen_pages(npages=512):
+    """Generate DMPAFT style pages of 267 bytes, each ending with its CRC."""
+    rnd = random.Random(1234)
+    for _ in range(npages):
+        body = ''.join(chr(rnd.randint(0, 255)) for _ in range(265))
+        yield body + struct.pack(">H", weewx.crc16._crc16_table(body))
+
+class Crc16Test(unittest.TestCase):
+
+    def test_davis(self):
+        self.assertEqual(crc16(davis_str), 0xe2b4)
+        self.assertEqual(weewx.crc16._crc16_table(davis_str), 0xe2b4)
+
+    def test_types(self):
+        self.assertEqual(crc16(bytearray(davis_str)), 0xe2b4)
+        self.assertEqual(crc16(memoryview(davis_str)), 0xe2b4)
+        self.assertEqual(crc16(buffer(davis_str)), 0xe2b4)
+        self.assertEqual(crc16([0xC6, 0xCE, 0xA2, 0x03]), 0xe2b4)
+        self.assertEqual(crc16(''), 0)
+
+    def test_crc_start(self):
+        # Calculating the CRC in two steps should give the same answer
+        self.assertEqual(crc16(davis_str[2:], crc16(davis_str[:2])), 0xe2b4)
+
+    def test_pages(self):
+        # A page with its CRC appended has a CRC of zero
+        for page in gen_pages(32):
+            self.assertEqual(crc16(page), 0)
+            self.assertEqual(crc16(page[:-2]), weewx.crc16._crc16_table(page[:-2]))
+
+
+if __name__ == '__main__':
+    unittest.main()
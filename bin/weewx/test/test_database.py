@@ -229,6 +229,27 @@ class Common(unittest.TestCase):
             rec = archive.getRecord(expected_rec['dateTime'])
         self.assertEqual(rec['outTemp'], -1.0)
 
+    def test_batch(self):
+        with weewx.manager.Manager.open_with_create(self.archive_db_dict, schema=archive_schema) as archive:
+            # Records added in a batch are visible through the same manager
+            # before the batch is committed:
+            with archive.batch():
+                for _rec in genRecords():
+                    archive.addRecord(_rec)
+                self.assertEqual(archive.lastGoodStamp(), stop_ts)
+            self.assertEqual(archive.getRecord(start_ts)['outTemp'], temperfunc(0))
+
+            # A failed batch is rolled back in its entirety:
+            try:
+                with archive.batch():
+                    archive.addRecord({'dateTime': stop_ts + interval, 'interval': interval,
+                                       'usUnits': 1, 'outTemp': 68.0})
+                    raise ValueError("Abandon batch")
+            except ValueError:
+                pass
+            self.assertEqual(archive.getRecord(stop_ts + interval), None)
+            self.assertEqual(archive.last_timestamp, stop_ts)
+
 
 class TestSqlite(Common):
 
@@ -246,7 +267,8 @@ class TestMySQL(Common):
     
 def suite():
     tests = ['test_no_archive', 'test_create_archive', 
-             'test_empty_archive', 'test_add_archive_records', 'test_get_records', 'test_update']
+             'test_empty_archive', 'test_add_archive_records', 'test_get_records', 'test_update',
+             'test_batch']
     return unittest.TestSuite(map(TestSqlite, tests) + map(TestMySQL, tests))
             
 if __name__ == '__main__':
@@ -0,0 +1,155 @@
+#
+#    Copyright (c) 2009-2017 Tom Keffer <tkeffer@gmail.com>
+#
+#    See the file LICENSE.txt for your full rights.
+#
+"""Test reading the circular buffer of a Fine Offset station, against a
+stand-in for the station."""
+
+import collections
+import datetime
+import imp
+import random
+import sys
+import syslog
+import unittest
+
+try:
+    import usb
+except ImportError:
+    # The tests bring their own station, so all they need from pyusb is its
+    # exception class, and the constants the driver uses when it is imported
+    usb = imp.new_module('usb')
+    class USBError(IOError):
+        pass
+    usb.USBError = USBError
+    usb.TYPE_CLASS = 0x20
+    usb.RECIP_OTHER = 0x03
+    sys.modules['usb'] = usb
+
+from weewx.drivers.fousb import FineOffsetUSB, data_start, reading_len
+
+def make_memory(data_format, current_pos, nrec, seed=1):
+    """The memory of a station whose latest record is at current_pos, with
+    nrec records, logged every 5 minutes, some of them garbled."""
+    rnd = random.Random(seed)
+    memory = [0x00] * 0x10000
+    memory[0:2] = [0x55, 0xaa]          # magic number
+    memory[16] = 5                      # read_period
+    memory[27:29] = [nrec & 0xff, nrec >> 8]
+    memory[30:32] = [current_pos & 0xff, current_pos >> 8]
+    count = reading_len[data_format]
+    ptr = current_pos
+    for i in range(nrec):
+        record = [rnd.randint(0, 0xff) for _ in range(count)]
+        record[0] = 0xff if rnd.random() < 0.01 else 5
+        memory[ptr:ptr + count] = record
+        ptr -= count
+        if ptr < data_start:
+            ptr = 0x10000 - count
+    return memory
+
+
+class StandInStation(FineOffsetUSB):
+    """A Fine Offset station whose memory is a list of bytes.
+
+    errors maps the address of a block to how many times reading it fails.
+    Before each attempt after the first, the station logs another record."""
+
+    def __init__(self, memory, errors=None, **stn_dict):
+        self.memory = memory
+        self.errors = errors or dict()
+        self.reads = []
+        self.syncs = 0
+        FineOffsetUSB.__init__(self, wait_before_retry=0, **stn_dict)
+        self.current_ptr = self.get_fixed_block(['current_pos'], True)
+
+    def openPort(self):
+        pass
+
+    def _read_usb_block(self, address):
+        if self.errors.get(address):
+            self.errors[address] -= 1
+            raise usb.USBError('Pipe error')
+        self.reads.append(address)
+        return self.memory[address:address + 0x20]
+
+    def sync(self, quality=None, read_period=None):
+        self.syncs += 1
+        if self.syncs > 1:
+            count = reading_len[self.data_format]
+            self.current_ptr = self.inc_ptr(self.current_ptr)
+            self.memory[self.current_ptr:self.current_ptr + count] = [5] + [0x42] * (count - 1)
+        return datetime.datetime(2017, 5, 20, 14, 30), self.current_ptr
+
+
+def old_get_records(station, num_rec):
+    """The records, read the way the driver used to, with get_raw_data."""
+    fixed_block = station.get_fixed_block(unbuffered=True)
+    dts, ptr = station.sync(read_period=fixed_block['read_period'])
+    records = []
+    while len(records) < num_rec:
+        raw_data = station.get_raw_data(ptr)
+        data = station.decode(raw_data)
+        if data['delay'] is None or data['delay'] > 30:
+            dts -= datetime.timedelta(minutes=fixed_block['read_period'])
+        else:
+            records.insert(0, {'ptr': ptr, 'datetime': dts, 'data': data,
+                               'raw_data': raw_data, 'interval': data['delay']})
+            dts -= datetime.timedelta(minutes=data['delay'])
+        ptr = station.dec_ptr(ptr)
+    return records
+
+
+class FineOffsetRecordsTest(unittest.TestCase):
+
+    def setUp(self):
+        syslog.openlog('test_fousb', syslog.LOG_CONS)
+        # Garbled records are reported as errors
+        syslog.setlogmask(syslog.LOG_UPTO(syslog.LOG_CRIT))
+
+    def buffer_reads(self, station):
+        return [addr for addr in station.reads if addr >= data_start]
+
+    def test_records(self):
+        for data_format in ('1080', '3080'):
+            # The latest records wrap around the end of the buffer
+            memory = make_memory(data_format, data_start + 0x0400, 3000)
+            for read_ahead in (0, 8):
+                station = StandInStation(list(memory), data_format=data_format,
+                                         read_ahead=read_ahead)
+                records = station.get_records(num_rec=1000)
+                reference = StandInStation(list(memory), data_format=data_format)
+                self.assertEqual(records, old_get_records(reference, 1000))
+                # No block is read more often than it used to be, but the
+                # reader may have read ahead of the last record needed.  Each
+                # block is read twice, to be sure it is stable.
+                self.assertEqual(len(set(self.buffer_reads(station))) * 2,
+                                 len(self.buffer_reads(station)))
+                self.assertTrue(len(self.buffer_reads(station)) <=
+                                len(self.buffer_reads(reference)) + 2 * 2 * (read_ahead + 1))
+
+    def test_retry(self):
+        memory = make_memory('3080', 0x8000, 3000)
+        for read_ahead in (0, 8):
+            # A read far into the records fails, and the records are read again
+            station = StandInStation(list(memory), data_format='3080', read_ahead=read_ahead,
+                                     errors={0x8000 - 0x2000: 1})
+            records = station.get_records(num_rec=1000)
+            self.assertEqual(station.syncs, 2)
+            # ... including the one the station logged in the meantime
+            reference = StandInStation(station.memory, data_format='3080')
+            reference.syncs = 1
+            self.assertEqual(records, old_get_records(reference, 1000))
+            self.assertEqual(records[-1]['raw_data'][1:], [0x42] * 19)
+            # Each block is read twice, to be sure it is stable.  Only the
+            # block that the latest record shares with the new one is read
+            # again.
+            reads = collections.Counter(self.buffer_reads(station))
+            self.assertEqual(reads.pop(0x8000), 2 * 2)
+            self.assertEqual(reads[0x8020], 2)
+            self.assertEqual(set(reads.values()), set([2]))
+
+
+if __name__ == '__main__':
+    unittest.main()
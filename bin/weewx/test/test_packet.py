@@ -0,0 +1,142 @@
+#
+#    Copyright (c) 2009-2017 Tom Keffer <tkeffer@gmail.com>
+#
+#    See the file LICENSE.txt for your full rights.
+#
+"""Test the compact packet representation in weewx.packet."""
+
+import cPickle
+import random
+import sys
+import time
+import unittest
+
+import weewx
+import weewx.packet
+import weewx.units
+from weewx.packet import CompactPacket
+
+# The types in a typical Vantage LOOP packet
+LOOP_TYPES = ['barometer', 'inTemp', 'inHumidity', 'outTemp', 'windSpeed',
+              'windSpeed10', 'windDir', 'outHumidity', 'rainRate', 'UV',
+              'radiation', 'stormRain', 'dayRain', 'monthRain', 'yearRain',
+              'dayET', 'monthET', 'yearET', 'insideAlarm', 'rainAlarm',
+              'outsideAlarm1', 'txBatteryStatus', 'consBatteryVoltage',
+              'forecastIcon', 'forecastRule', 'sunrise', 'sunset', 'rain',
+              'extraTemp1', 'soilTemp1', 'leafWet1', 'extraHumid1']
+
+def gen_loop_packets(rnd, npackets, start_ts, interval=2.5):
+    """Generate LOOP packets, as a driver would. Now and then, a sensor drops
+    out, and its type is missing from a packet."""
+    for i in xrange(npackets):
+        packet = {'dateTime': int(start_ts + i * interval), 'usUnits': weewx.US}
+        for obs_type in LOOP_TYPES:
+            packet[obs_type] = rnd.random() * 100.0
+        if rnd.random() < 0.01:
+            del packet[rnd.choice(LOOP_TYPES)]
+        yield packet
+
+def size_of(packet):
+    """The memory used by a packet, not counting the values themselves,
+    which are the same either way."""
+    if isinstance(packet, CompactPacket):
+        return sys.getsizeof(packet) + sys.getsizeof(packet._values)
+    return sys.getsizeof(packet)
+
+def run_packets(compact, npackets, interval=2.5):
+    """Pass LOOP packets through the steps the standard services take,
+    returning the bytes allocated for packets, and the time taken."""
+    rnd = random.Random(1)
+    allocated = 0
+    t1 = time.time()
+    for packet in gen_loop_packets(rnd, npackets, 1500000000, interval):
+        allocated += size_of(packet)
+        if compact:
+            # As done by the engine:
+            packet = CompactPacket(packet)
+            allocated += size_of(packet)
+        # StdWXCalculate adds derived types:
+        packet['dewpoint'] = packet.get('outTemp')
+        # StdQC checks the values:
+        for obs_type in packet:
+            value = packet[obs_type]
+            if value is not None and value < 0:
+                packet[obs_type] = None
+        # A RESTful uploader takes a copy, then reads it:
+        record = packet.copy()
+        allocated += size_of(record) if not compact else sys.getsizeof(record)
+        record.get('outTemp')
+        record.get('barometer')
+    return allocated, time.time() - t1
+
+
+class CompactPacketTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data = {'dateTime': 1500000000, 'usUnits': weewx.METRIC,
+                     'outTemp': 20.0, 'barometer': 1015.9166, 'rain': None}
+
+    def test_mapping(self):
+        p = CompactPacket(self.data)
+        self.assertEqual(p, self.data)
+        self.assertEqual(len(p), 5)
+        self.assertEqual(sorted(p), sorted(self.data))
+        self.assertEqual(sorted(p.items()), sorted(self.data.items()))
+        self.assertEqual(dict(p), self.data)
+        self.assertTrue('rain' in p)
+        self.assertFalse('windSpeed' in p)
+        self.assertEqual(p.get('windSpeed', 5), 5)
+        self.assertRaises(KeyError, p.__getitem__, 'windSpeed')
+        self.assertRaises(KeyError, p.__delitem__, 'windSpeed')
+        p.update({'windSpeed': 2.0, 'outTemp': 21.0})
+        self.assertEqual(p['windSpeed'], 2.0)
+        self.assertEqual(p['outTemp'], 21.0)
+        self.assertEqual(p.pop('rain'), None)
+        self.assertEqual(len(p), 5)
+        self.assertEqual(p.setdefault('UV', 3), 3)
+        # A type never seen before
+        p['fooBar'] = 1
+        self.assertEqual(p['fooBar'], 1)
+        self.assertFalse('fooBar' in CompactPacket(self.data))
+        # Used as the namespace of an expression, as StdCalibrate does
+        self.assertEqual(eval('outTemp * 2', None, p), 42.0)
+
+    def test_copy_on_write(self):
+        p = CompactPacket(self.data)
+        q = p.copy()
+        self.assertTrue(q._values is p._values)
+        self.assertEqual(q, p)
+        q['outTemp'] = 25.0
+        self.assertFalse(q._values is p._values)
+        self.assertEqual(p['outTemp'], 20.0)
+        self.assertEqual(q['outTemp'], 25.0)
+        # Writing to the original must not change the copy
+        r = p.copy()
+        p['barometer'] = 1000.0
+        del p['rain']
+        self.assertEqual(r['barometer'], 1015.9166)
+        self.assertTrue('rain' in r)
+        self.assertEqual(r, self.data)
+
+    def test_convert(self):
+        c = weewx.units.StdUnitConverters[weewx.US]
+        target = c.convertDict(CompactPacket(self.data))
+        self.assertTrue(isinstance(target, CompactPacket))
+        self.assertEqual(target, c.convertDict(self.data))
+        self.assertAlmostEqual(target['outTemp'], 68.0)
+
+    def test_pickle(self):
+        p = CompactPacket(self.data)
+        q = cPickle.loads(cPickle.dumps(p, cPickle.HIGHEST_PROTOCOL))
+        self.assertTrue(isinstance(q, CompactPacket))
+        self.assertEqual(q, p)
+
+    def test_allocation(self):
+        # An hour of LOOP packets takes less memory as compact packets
+        dict_allocated, _ = run_packets(False, 1440)
+        compact_allocated, _ = run_packets(True, 1440)
+        self.assertTrue(compact_allocated < dict_allocated)
+
+
+if __name__ == '__main__':
+    unittest.main()
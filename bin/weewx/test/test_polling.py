@@ -0,0 +1,105 @@
+#
+#    Copyright (c) 2009-2017 Tom Keffer <tkeffer@gmail.com>
+#
+#    See the file LICENSE.txt for your full rights.
+#
+"""Test the polling scheduler in weewx.drivers, against simulated sensors."""
+
+import random
+import unittest
+
+import weewx.drivers
+
+def run(poller, period, phase=7.3, duration=6 * 3600, same=0.0, drift=0.0, seed=1):
+    """Poll a simulated sensor that updates every period seconds.
+
+    same: The chance that an update leaves the readings unchanged.
+
+    drift: How much slower the sensor clock runs than the computer clock.
+
+    Returns the number of polls, and the mean time from an update to the
+    poll that saw it."""
+    rnd = random.Random(seed)
+    start = t = 1000000.0
+    next_update = start + phase
+    value = 0
+    pending = None
+    latencies = []
+    npolls = 0
+    while t < start + duration:
+        while next_update <= t:
+            if rnd.random() >= same:
+                value += 1
+                pending = next_update
+            next_update += period * (1.0 + drift)
+        if poller.update(value, t) and pending is not None:
+            latencies.append(t - pending)
+            pending = None
+        npolls += 1
+        t = poller.next_poll()
+    return npolls, sum(latencies) / len(latencies)
+
+
+class PollingSchedulerTest(unittest.TestCase):
+
+    def test_periodic(self):
+        poller = weewx.drivers.PollingScheduler('test', 'PERIODIC', 6)
+        npolls, latency = run(poller, 18)
+        self.assertEqual(npolls, 3600)
+        self.assertTrue(latency > 1.0)
+
+    def test_periodic_delay(self):
+        # In PERIODIC mode, the driver waits the full polling interval after
+        # each reading, however long it took, and nothing is reported
+        poller = weewx.drivers.PollingScheduler('test', 'PERIODIC', 6)
+        self.assertEqual(poller.delay(), 6)
+        poller.update(1, 1000000.0)
+        self.assertEqual(poller.delay(1000004.0), 6)
+        npolls, _ = run(poller, 18)
+        self.assertEqual(poller.polls, npolls + 1)
+        # ... whereas in ADAPTIVE mode the counts are reported, and started
+        # again, every hour
+        poller = weewx.drivers.PollingScheduler('test', 'ADAPTIVE', 18, sensor_period=18)
+        npolls, _ = run(poller, 18)
+        self.assertTrue(poller.polls < npolls / 5, poller.polls)
+
+    def test_adaptive(self):
+        # AcuRite 5-in-1: 18 seconds, which is known
+        poller = weewx.drivers.PollingScheduler('test', 'ADAPTIVE', 18, sensor_period=18)
+        npolls, latency = run(poller, 18)
+        # About one poll per update, and less than a second behind
+        self.assertTrue(npolls < 1250, npolls)
+        self.assertTrue(latency < 1.0, latency)
+        self.assertTrue(poller.latency < 1.0)
+
+    def test_learn(self):
+        # Fine Offset: 48 seconds, which must be measured
+        poller = weewx.drivers.PollingScheduler('test', 'ADAPTIVE', 60)
+        npolls, latency = run(poller, 48)
+        self.assertAlmostEqual(poller.period, 48.0, 3)
+        # Measuring the period takes a few minutes of polling every second
+        self.assertTrue(npolls < 1.5 * 6 * 3600 / 48, npolls)
+        self.assertTrue(latency < 1.5, latency)
+        # Compare with polling every 60 seconds:
+        npolls, latency = run(weewx.drivers.PollingScheduler('test', 'PERIODIC', 60), 48)
+        self.assertTrue(latency > 10.0, latency)
+
+    def test_unchanged(self):
+        # Updates that do not change the readings, and a sensor clock that
+        # drifts, must not lose track of the updates
+        poller = weewx.drivers.PollingScheduler('test', 'ADAPTIVE', 18)
+        npolls, latency = run(poller, 18, same=0.3, drift=0.001)
+        self.assertTrue(npolls < 2 * 6 * 3600 / 18, npolls)
+        self.assertTrue(latency < 1.5, latency)
+
+    def test_too_fast(self):
+        # Sensors that update too often are polled periodically
+        poller = weewx.drivers.PollingScheduler('test', 'ADAPTIVE', 5)
+        run(poller, 2.5)
+        self.assertFalse(poller.adaptive)
+
+    def test_bad_mode(self):
+        self.assertRaises(ValueError, weewx.drivers.PollingScheduler, 'test', 'SOMETIMES')
+
+if __name__ == '__main__':
+    unittest.main()
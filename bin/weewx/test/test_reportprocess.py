@@ -0,0 +1,155 @@
+#
+#    Copyright (c) 2009-2017 Tom Keffer <tkeffer@gmail.com>
+#
+#    See the file LICENSE.txt for your full rights.
+#
+"""Test running the reports in a child process, with a stand-in for the
+report engine."""
+
+from __future__ import with_statement
+import os
+import syslog
+import time
+import unittest
+
+import weewx
+import weewx.engine
+import weewx.reportengine
+
+test_root = '/var/tmp/weewx_test'
+log_path = os.path.join(test_root, 'reportprocess.log')
+
+class StandInReportEngine(object):
+    """Instead of running the reports, takes as many seconds as the record
+    asks for, and notes in a file when it started and finished."""
+
+    def __init__(self, config_dict, stn_info, record, first_run):
+        self.record = record
+        self.first_run = first_run
+
+    def run(self):
+        with open(log_path, 'a') as f:
+            f.write("%d %s %s\n" % (os.getpid(), self.record['dateTime'], self.first_run))
+        time.sleep(self.record['delay'])
+        with open(log_path, 'a') as f:
+            f.write("%d %s finished\n" % (os.getpid(), self.record['dateTime']))
+
+class StandInEngine(object):
+    stn_info = None
+
+    def __init__(self):
+        self.callbacks = dict()
+
+    def bind(self, event_type, callback):
+        self.callbacks.setdefault(event_type, []).append(callback)
+
+    def dispatchEvent(self, event):
+        for callback in self.callbacks.get(event.event_type, []):
+            callback(event)
+
+def read_log(event=None):
+    """The cycles that have started, as (pid, dateTime, first_run), or, if
+    event is 'finished', the cycles that have finished, as (pid, dateTime)"""
+    if not os.path.exists(log_path):
+        return []
+    with open(log_path) as f:
+        lines = [line.split() for line in f]
+    if event == 'finished':
+        return [(int(pid), int(ts)) for pid, ts, what in lines if what == 'finished']
+    return [(int(pid), int(ts), what == 'True') for pid, ts, what in lines if what != 'finished']
+
+def wait_for(condition, timeout=10.0):
+    t1 = time.time()
+    while not condition():
+        if time.time() - t1 > timeout:
+            raise AssertionError("Timed out")
+        time.sleep(0.01)
+
+
+class ReportProcessTest(unittest.TestCase):
+
+    def setUp(self):
+        syslog.openlog('test_reportprocess', syslog.LOG_CONS)
+        syslog.setlogmask(syslog.LOG_UPTO(syslog.LOG_INFO))
+        if not os.path.exists(test_root):
+            os.makedirs(test_root)
+        if os.path.exists(log_path):
+            os.remove(log_path)
+        # The child process is forked, so it runs the stand-in too
+        self.report_engine = weewx.reportengine.StdReportEngine
+        weewx.reportengine.StdReportEngine = StandInReportEngine
+
+    def tearDown(self):
+        weewx.reportengine.StdReportEngine = self.report_engine
+
+    def test_cycle(self):
+        process = weewx.reportengine.ReportProcess({})
+        process.start()
+        try:
+            self.assertEqual(process.poll(), None)
+            process.start_cycle(None, {'dateTime': 1, 'delay': 0.2})
+            self.assertTrue(process.busy)
+            self.assertEqual(process.poll(), None)
+            # The cycle finishes, and reports how long it took
+            elapsed = []
+            wait_for(lambda: elapsed.append(process.poll()) or elapsed[-1] is not None)
+            self.assertTrue(0.2 <= elapsed[-1] < 5.0, elapsed[-1])
+            self.assertFalse(process.busy)
+            self.assertEqual(process.poll(), None)
+            # The same process runs the next cycle
+            process.start_cycle(None, {'dateTime': 2, 'delay': 0}, first_run=False)
+            wait_for(lambda: process.poll() is not None)
+            pid = process.process.pid
+            self.assertEqual(read_log(), [(pid, 1, True), (pid, 2, False)])
+            self.assertEqual(read_log('finished'), [(pid, 1), (pid, 2)])
+        finally:
+            self.assertTrue(process.stop(5.0))
+        self.assertEqual(process.process, None)
+        self.assertFalse(process.is_alive())
+
+    def test_service(self):
+        engine = StandInEngine()
+        config_dict = {'StdReport': {'use_process': True, 'max_wait': 60}}
+        service = weewx.engine.StdReport(engine, config_dict)
+
+        def report_cycle(ts, delay):
+            engine.dispatchEvent(weewx.Event(weewx.NEW_ARCHIVE_RECORD,
+                                             record={'dateTime': ts, 'delay': delay}))
+            engine.dispatchEvent(weewx.Event(weewx.POST_LOOP))
+
+        # The first cycle hangs
+        report_cycle(1, 60)
+        process = service.process
+        first_pid = process.process.pid
+        wait_for(lambda: read_log())
+        # ... so the next one is not started
+        report_cycle(2, 0)
+        time.sleep(0.2)
+        self.assertEqual(read_log(), [(first_pid, 1, True)])
+        self.assertTrue(process.busy)
+        # ... until it has been going for longer than max_wait. Then the
+        # process is killed, and another one runs the cycle.
+        service.launch_time -= 61
+        report_cycle(3, 0)
+        self.assertFalse(os.path.exists('/proc/%d' % first_pid))
+        self.assertTrue(service.process is process)
+        second_pid = process.process.pid
+        self.assertNotEqual(second_pid, first_pid)
+        wait_for(lambda: len(read_log()) == 2)
+        self.assertEqual(read_log()[1], (second_pid, 3, False))
+
+        # The report process is stopped at shutdown, once it finishes the
+        # cycle it is running
+        wait_for(lambda: process.poll() is not None)
+        report_cycle(4, 0.5)
+        wait_for(lambda: len(read_log()) == 3)
+        service.shutDown()
+        self.assertEqual(service.process, None)
+        self.assertEqual(process.process, None)
+        self.assertFalse(os.path.exists('/proc/%d' % second_pid))
+        self.assertEqual(read_log()[2], (second_pid, 4, False))
+        self.assertEqual(read_log('finished'), [(second_pid, 3), (second_pid, 4)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,565 @@
+#
+#    Copyright (c) 2009-2017 Tom Keffer <tkeffer@gmail.com>
+#
+#    See the file LICENSE.txt for your full rights.
+#
+"""Test the RESTful uploaders in weewx.restx against local stand-ins for
+their servers, with and without persistent connections."""
+
+import BaseHTTPServer
+import Queue
+import SocketServer
+import select
+import socket
+import sys
+import threading
+import time
+import unittest
+
+import weewx
+import weewx.restx
+
+class StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Answers every request with 'OK', keeping the connection open."""
+
+    protocol_version = 'HTTP/1.1'
+    # Send each response in one piece, as real servers do. Otherwise, delayed
+    # ACKs stall every response on a persistent connection.
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        # Close connections that are idle for too long, as real servers do
+        self.connection.settimeout(self.server.idle_timeout)
+        # Stand in for the round trips of the TCP and TLS handshakes
+        time.sleep(self.server.handshake_delay)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests += 1
+        time.sleep(self.server.response_delay)
+        body = 'OK\n'
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_POST = do_GET
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, idle_timeout=5.0):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), StandInHandler)
+        self.idle_timeout = idle_timeout
+        self.handshake_delay = 0
+        self.response_delay = 0
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d/post' % self.server_address[1]
+
+
+class StandInAPRSHandler(SocketServer.BaseRequestHandler):
+    """Behaves like an APRS-IS server: a banner, a response to the login, then
+    a comment every so often, to keep the connection alive."""
+
+    def handle(self):
+        server = self.server
+        sock = self.request
+        with server.lock:
+            server.connections += 1
+        sock.sendall('# aprsc 2.1.4-stand-in\r\n')
+        buf = ''
+        last_tx = time.time()
+        while not server.closing:
+            if server.keepalive_interval:
+                timeout = max(server.keepalive_interval - (time.time() - last_tx), 0)
+            else:
+                timeout = 0.5
+            if not select.select([sock], [], [], timeout)[0]:
+                if server.keepalive_interval:
+                    sock.sendall('# keepalive\r\n')
+                    last_tx = time.time()
+                continue
+            data = sock.recv(4096)
+            if not data:
+                # The client has closed its end
+                with server.lock:
+                    server.disconnects += 1
+                return
+            buf += data
+            while '\n' in buf:
+                line, buf = buf.split('\n', 1)
+                line = line.rstrip('\r')
+                if line.startswith('user '):
+                    with server.lock:
+                        server.logins += 1
+                    sock.sendall('# logresp %s unverified, server T2TEST\r\n' % line.split()[1])
+                elif line and not line.startswith('#'):
+                    with server.lock:
+                        server.packets.append(line)
+                    if server.drop_sessions:
+                        return
+
+
+class StandInAPRSServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        SocketServer.TCPServer.__init__(self, ('127.0.0.1', 0), StandInAPRSHandler)
+        self.keepalive_interval = 0.05
+        # Drop the connection after each packet:
+        self.drop_sessions = False
+        self.closing = False
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.disconnects = 0
+        self.logins = 0
+        self.packets = []
+
+    @property
+    def address(self):
+        return '127.0.0.1:%d' % self.server_address[1]
+
+
+def get_record(ts):
+    return {'dateTime': ts, 'usUnits': weewx.US, 'interval': 5,
+            'outTemp': 68.2, 'outHumidity': 45.0, 'barometer': 30.012,
+            'windSpeed': 4.0, 'windDir': 180.0, 'windGust': 6.0,
+            'dewpoint': 45.6, 'rain': 0.0, 'rainRate': 0.0,
+            'hourRain': 0.0, 'rain24': 0.0, 'dayRain': 0.01}
+
+def get_uploaders(url):
+    """Return an instance of each of the HTTP uploaders, posting to url."""
+    common = {'server_url': url, 'retry_wait': 0, 'timeout': 5}
+    return [
+        weewx.restx.AmbientThread(Queue.Queue(), None, 'KTEST1', 'secret',
+                                  protocol_name='Wunderground-PWS', **common),
+        weewx.restx.AmbientLoopThread(Queue.Queue(), None, 'KTEST1', 'secret',
+                                      protocol_name='Wunderground-RF', **common),
+        weewx.restx.WOWThread(Queue.Queue(), None, '12345', 'secret',
+                              protocol_name='WOW', **common),
+        weewx.restx.StationRegistryThread(Queue.Queue(), 'http://example.com/station',
+                                          45.0, -122.0, **common),
+        weewx.restx.AWEKASThread(Queue.Queue(), 'user', 'secret', 45.0, -122.0, None, **common)]
+
+def get_dead_port():
+    """Return a port with nothing listening at it."""
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+def get_dead_url():
+    """Return a URL with nothing listening at it."""
+    return 'http://127.0.0.1:%d/post' % get_dead_port()
+
+
+class ConnectionPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInServer()
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.setDaemon(True)
+        self.server_thread.start()
+        weewx.restx.http_pool.configure(keep_alive=True)
+
+    def tearDown(self):
+        weewx.restx.http_pool.configure(keep_alive=True)
+        weewx.restx.http_pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def post(self, uploader, nposts):
+        """Post nposts records. Returns how many connections the server
+        saw."""
+        weewx.restx.http_pool.close()
+        connections = self.server.connections
+        ts = int(time.time())
+        for i in xrange(nposts):
+            uploader.process_record(get_record(ts + i), None)
+        return self.server.connections - connections
+
+    def test_uploaders(self):
+        for uploader in get_uploaders(self.server.url):
+            connections = self.post(uploader, 10)
+            self.assertEqual(connections, 1, uploader.protocol_name)
+
+    def test_no_keep_alive(self):
+        weewx.restx.http_pool.configure(keep_alive=False)
+        for uploader in get_uploaders(self.server.url):
+            connections = self.post(uploader, 10)
+            self.assertEqual(connections, 10, uploader.protocol_name)
+
+    def test_idle(self):
+        uploader = get_uploaders(self.server.url)[0]
+        # The server closes the connection while it is idle. The next post
+        # must reconnect, without using up any retries.
+        self.server.idle_timeout = 0.1
+        uploader.max_tries = 1
+        uploader.process_record(get_record(1500000000), None)
+        time.sleep(0.3)
+        uploader.process_record(get_record(1500000300), None)
+        self.assertEqual(self.server.requests, 2)
+        self.assertEqual(self.server.connections, 2)
+
+        # Connections idle for longer than the pool allows are not reused
+        self.server.idle_timeout = 5.0
+        weewx.restx.http_pool.configure(idle_timeout=0)
+        self.post(uploader, 3)
+        self.assertEqual(self.server.connections, 5)
+        weewx.restx.http_pool.configure()
+
+    def test_slow_server(self):
+        # A server that is slow to respond, on a reused connection. The post
+        # times out, and is not sent again behind the back of the uploader,
+        # as it may have been acted on.
+        uploader = get_uploaders(self.server.url)[0]
+        uploader.max_tries = 1
+        uploader.process_record(get_record(1500000000), None)
+        self.server.response_delay = 0.5
+        uploader.timeout = 0.2
+        self.assertRaises(weewx.restx.FailedPost,
+                          uploader.process_record, get_record(1500000300), None)
+        self.assertEqual(self.server.requests, 2)
+        self.assertEqual(self.server.connections, 1)
+        # Let the stand-in finish with the request
+        time.sleep(self.server.response_delay)
+
+    def test_errors(self):
+        # Nothing listening. The post fails, after max_tries.
+        self.server.shutdown()
+        self.server.server_close()
+        uploader = get_uploaders(self.server.url)[0]
+        self.assertRaises(weewx.restx.FailedPost,
+                          uploader.process_record, get_record(1500000000), None)
+
+
+class CWOPTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInAPRSServer()
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.setDaemon(True)
+        self.server_thread.start()
+
+    def tearDown(self):
+        weewx.restx.uploader_host = None
+        self.server.closing = True
+        self.server.shutdown()
+        self.server.server_close()
+
+    def get_uploader(self, server_list=None, **kwargs):
+        return weewx.restx.CWOPThread(weewx.restx.RESTQueue(), None, 'CW1234', '-1',
+                                      45.0, -122.0, 'Simulator',
+                                      server_list=server_list or [self.server.address],
+                                      post_interval=None, stale=None, timeout=2,
+                                      retry_wait=0, **kwargs)
+
+    def post(self, uploader, nposts, interval=0):
+        for i in xrange(nposts):
+            if i:
+                time.sleep(interval)
+            uploader.process_record(get_record(1500000000 + 300 * i), None)
+
+    def wait_for_packets(self, npackets):
+        """Wait for the stand-in to see the packets sent over open sessions."""
+        t1 = time.time()
+        while len(self.server.packets) < npackets and time.time() - t1 < 2.0:
+            time.sleep(0.01)
+        return len(self.server.packets)
+
+    def test_session(self):
+        uploader = self.get_uploader(keep_alive=True)
+        self.post(uploader, 5)
+        self.assertEqual(self.wait_for_packets(5), 5)
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(self.server.logins, 1)
+        self.assertTrue(self.server.packets[0].startswith('CW1234>APRS,TCPIP*:@140240z'))
+        uploader.close_session()
+
+        # Without keep_alive, every post has a session of its own
+        uploader = self.get_uploader()
+        self.post(uploader, 5)
+        self.assertEqual(self.wait_for_packets(10), 10)
+        self.assertEqual(self.server.connections, 6)
+
+    def test_shutdown(self):
+        # The session kept open between posts is closed when the service
+        # shuts down, after the server has read the last packet
+        for hosted in (False, True):
+            if hosted:
+                weewx.restx.start_uploader_host()
+            uploader = self.get_uploader(keep_alive=True)
+            uploader.start()
+            self.assertEqual(uploader.host is not None, hosted)
+            for i in range(3):
+                uploader.queue.put(get_record(1500000000 + 300 * i))
+            weewx.restx.StdRESTful.shutDown_thread(uploader.queue, uploader)
+            self.assertEqual(uploader.session, None)
+            self.assertEqual(len(self.server.packets), 3 * (1 + hosted))
+            self.assertTrue(self.server.packets[-1].startswith('CW1234>APRS,TCPIP*:@140250z'))
+            self.assertEqual(self.server.disconnects, self.server.connections)
+        self.assertEqual(self.server.connections, 2)
+
+    def test_lost_session(self):
+        # The server drops the session. The next post opens a new one, without
+        # using up a try.
+        self.server.drop_sessions = True
+        uploader = self.get_uploader(keep_alive=True, max_tries=1)
+        self.post(uploader, 3, interval=0.1)
+        self.assertEqual(self.wait_for_packets(3), 3)
+        self.assertEqual(self.server.connections, 3)
+
+    def test_keepalive(self):
+        uploader = self.get_uploader(keep_alive=True)
+        uploader.keepalive_timeout = 0.2
+        # Comments from the server keep the session alive
+        self.post(uploader, 1)
+        time.sleep(0.3)
+        self.post(uploader, 1)
+        self.assertEqual(self.server.connections, 1)
+        # A session that hears nothing is assumed to be dead. Each post opens
+        # a new one.
+        self.server.keepalive_interval = 0
+        time.sleep(0.3)
+        self.post(uploader, 1)
+        time.sleep(0.3)
+        self.post(uploader, 1)
+        self.assertEqual(self.wait_for_packets(4), 4)
+        self.assertEqual(self.server.connections, 3)
+        uploader.close_session()
+
+    def test_ranking(self):
+        # The first server in the list is down. After the first post, the
+        # working server is tried first.
+        dead_address = '127.0.0.1:%d' % get_dead_port()
+        uploader = self.get_uploader([dead_address, self.server.address])
+        self.post(uploader, 3)
+        self.assertEqual(self.wait_for_packets(3), 3)
+        dead, live = uploader.servers
+        self.assertAlmostEqual(dead.get_failure_rate(), 0.3, 2)
+        self.assertEqual(live.get_failure_rate(), 0.0)
+        self.assertTrue(live.rank() < dead.rank())
+        # Nothing works
+        self.server.shutdown()
+        self.server.server_close()
+        uploader.max_tries = 2
+        self.assertRaises(weewx.restx.FailedPost, self.post, uploader, 1)
+
+    def test_health(self):
+        fast = weewx.restx.APRSServer('fast.example.com', 14580, 1)
+        slow = weewx.restx.APRSServer('slow.example.com', 14580, 0)
+        untried = weewx.restx.APRSServer('untried.example.com', 14580, 2)
+        servers = [slow, fast, untried]
+        # Servers not yet tried come in list order
+        self.assertEqual(sorted(servers, key=lambda s: s.rank(0)), [slow, fast, untried])
+        slow.succeeded(0.2, 0)
+        fast.succeeded(0.05, 0)
+        self.assertEqual(sorted(servers, key=lambda s: s.rank(0)), [fast, slow, untried])
+        # Failures put the fast server last ...
+        fast.failed(10)
+        fast.failed(20)
+        self.assertEqual(sorted(servers, key=lambda s: s.rank(20)), [slow, untried, fast])
+        # ... until it has had time to recover
+        now = 20 + weewx.restx.APRSServer.HALF_LIFE
+        self.assertEqual(sorted(servers, key=lambda s: s.rank(now)), [fast, slow, untried])
+
+
+class BatchThread(weewx.restx.AmbientThread):
+    """Posts up to 10 records at a time, noting each batch."""
+
+    max_batch = 10
+
+    def __init__(self, *args, **kwargs):
+        weewx.restx.AmbientThread.__init__(self, *args, **kwargs)
+        self.batches = []
+
+    def process_records(self, records, dbmanager):
+        self.batches.append([r['dateTime'] for r in records])
+
+    def process_record(self, record, dbmanager):
+        self.process_records([record], dbmanager)
+
+
+class RESTQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInServer()
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.setDaemon(True)
+        self.server_thread.start()
+
+    def tearDown(self):
+        weewx.restx.uploader_host = None
+        weewx.restx.http_pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_coalesce(self):
+        q = weewx.restx.RESTQueue(0)
+        for i in range(5):
+            q.put(get_record(1500000000 + i))
+        self.assertEqual(q.qsize(), 1)
+        self.assertEqual(q.dropped, 4)
+        self.assertEqual(q.get()['dateTime'], 1500000004)
+        # The signal to exit is never dropped
+        q.put(None)
+        q.put(get_record(1500000005))
+        self.assertEqual(q.get(), None)
+
+        # The queue takes the backlog of its thread
+        q = weewx.restx.RESTQueue()
+        weewx.restx.AmbientLoopThread(q, None, 'KTEST1', 'secret', max_backlog=0,
+                                      protocol_name='Wunderground-RF',
+                                      server_url=self.server.url)
+        self.assertEqual(q.max_backlog, 0)
+
+    def test_recovery(self):
+        # A slow server, as after a network outage. While the first post is
+        # held up, LOOP packets pile up. Only the newest gets posted.
+        self.server.handshake_delay = 0.3
+        uploader = weewx.restx.AmbientLoopThread(weewx.restx.RESTQueue(), None,
+                                                 'KTEST1', 'secret', max_backlog=0,
+                                                 protocol_name='Wunderground-RF',
+                                                 server_url=self.server.url)
+        uploader.start()
+        uploader.queue.put(get_record(1500000000))
+        time.sleep(0.1)
+        for i in range(1, 100):
+            uploader.queue.put(get_record(1500000000 + i))
+        self.assertEqual(uploader.queue.qsize(), 1)
+        t1 = time.time()
+        while self.server.requests < 2 and time.time() - t1 < 2.0:
+            time.sleep(0.01)
+        weewx.restx.StdRESTful.shutDown_thread(uploader.queue, uploader)
+        self.assertEqual(self.server.requests, 2)
+        self.assertEqual(uploader.queue.dropped, 98)
+
+    def batches(self):
+        uploader = BatchThread(weewx.restx.RESTQueue(), None, 'KTEST1', 'secret',
+                               protocol_name='Wunderground-PWS',
+                               server_url=self.server.url)
+        for i in range(15):
+            uploader.queue.put(get_record(1500000000 + 300 * i))
+        uploader.start()
+        weewx.restx.StdRESTful.shutDown_thread(uploader.queue, uploader)
+        return uploader.batches
+
+    def test_batch(self):
+        expected = [[1500000000 + 300 * i for i in range(10)],
+                    [1500000000 + 300 * i for i in range(10, 15)]]
+        self.assertEqual(self.batches(), expected)
+        weewx.restx.start_uploader_host()
+        self.assertEqual(self.batches(), expected)
+
+    def test_default_batch(self):
+        # A protocol that takes batches, but does not say how to post them,
+        # posts the records of a batch one at a time
+        class DefaultBatchThread(weewx.restx.AmbientThread):
+            max_batch = 10
+        uploader = DefaultBatchThread(weewx.restx.RESTQueue(), None, 'KTEST1', 'secret',
+                                      protocol_name='Wunderground-PWS',
+                                      server_url=self.server.url)
+        for i in range(15):
+            uploader.queue.put(get_record(1500000000 + 300 * i))
+        uploader.start()
+        weewx.restx.StdRESTful.shutDown_thread(uploader.queue, uploader)
+        self.assertEqual(self.server.requests, 15)
+
+
+class UploaderHostTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInServer()
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.setDaemon(True)
+        self.server_thread.start()
+        self.host = weewx.restx.start_uploader_host()
+
+    def tearDown(self):
+        weewx.restx.uploader_host = None
+        weewx.restx.http_pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_hosted(self):
+        nthreads = threading.active_count()
+        uploaders = get_uploaders(self.server.url)
+        for uploader in uploaders:
+            # Post every record
+            uploader.post_interval = None
+            uploader.max_backlog = sys.maxint
+            uploader.start()
+            self.assertTrue(uploader.host is self.host)
+            # The host keeps its retry state to itself
+            self.assertEqual((uploader.max_tries, uploader.retry_wait), (3, 0))
+            self.assertTrue(uploader.queue.__class__ is Queue.Queue)
+        self.assertEqual(threading.active_count(), nthreads)
+        # A plain queue cannot wake the host, so it is polled
+        uploaders[0].queue.put(get_record(1500000000))
+        t1 = time.time()
+        while self.server.requests < 1 and time.time() - t1 < 2.0:
+            time.sleep(0.01)
+        self.assertEqual(self.server.requests, 1)
+        for i in range(1, 5):
+            for uploader in uploaders:
+                uploader.queue.put(get_record(1500000000 + 300 * i))
+        for uploader in uploaders[1:]:
+            uploader.queue.put(get_record(1500000000))
+        # Whatever is in the queues is posted before the services shut down
+        for uploader in uploaders:
+            weewx.restx.StdRESTful.shutDown_thread(uploader.queue, uploader)
+            self.assertTrue(uploader.host is None)
+        self.assertEqual(self.server.requests, 25)
+        self.assertEqual(self.host.services, [])
+
+    def test_backoff(self):
+        dead, live = get_uploaders(get_dead_url())[0], get_uploaders(self.server.url)[0]
+        dead.retry_wait = 0.2
+        dead.start()
+        live.start()
+        t1 = time.time()
+        dead.queue.put(get_record(1500000000))
+        for i in range(3):
+            live.queue.put(get_record(1500000000 + 300 * i))
+        # The failing service must not hold up the other
+        weewx.restx.StdRESTful.shutDown_thread(live.queue, live)
+        self.assertEqual(self.server.requests, 3)
+        self.assertTrue(time.time() - t1 < 0.2)
+        # The failing service tries 3 times, waiting 0.2, then 0.4 seconds
+        weewx.restx.StdRESTful.shutDown_thread(dead.queue, dead)
+        self.assertTrue(time.time() - t1 >= 0.6)
+        self.assertEqual(dead.retry_wait, 0.2)
+
+    def test_not_hostable(self):
+        # A thread that runs its own loop gets a thread of its own
+        class LoopThread(weewx.restx.AmbientThread):
+            def run_loop(self, dbmanager=None):
+                while self.queue.get() is not None:
+                    pass
+        uploader = LoopThread(Queue.Queue(), None, 'KTEST1', 'secret',
+                              protocol_name='Wunderground-PWS', server_url=self.server.url)
+        uploader.start()
+        self.assertTrue(uploader.host is None)
+        self.assertTrue(uploader.isAlive())
+        weewx.restx.StdRESTful.shutDown_thread(uploader.queue, uploader)
+        self.assertFalse(uploader.isAlive())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,201 @@
+#
+#    Copyright (c) 2009-2017 Tom Keffer <tkeffer@gmail.com>
+#
+#    See the file LICENSE.txt for your full rights.
+#
+"""Test the snapshots of current conditions published by StdSnapshot."""
+
+from __future__ import with_statement
+import os
+import syslog
+import threading
+import time
+import unittest
+
+os.environ['TZ'] = 'America/Los_Angeles'
+time.tzset()
+
+import weewx
+import weewx.accum
+import weewx.snapshot
+import weeutil.weeutil
+from weewx.snapshot import SnapshotReader, SnapshotWriter
+
+test_root = '/var/tmp/weewx_test'
+
+OBS_TYPES = ['outTemp', 'outHumidity', 'barometer', 'windSpeed', 'rain']
+
+# 2017-05-20 14:30
+start_ts = int(time.mktime((2017, 5, 20, 14, 30, 0, 0, 0, -1)))
+
+def make_packet(ts, **values):
+    packet = {'dateTime': ts, 'usUnits': weewx.US}
+    packet.update(values)
+    return packet
+
+class StandInEngine(object):
+    def __init__(self):
+        self.callbacks = dict()
+
+    def bind(self, event_type, callback):
+        self.callbacks.setdefault(event_type, []).append(callback)
+
+    def dispatchEvent(self, event):
+        for callback in self.callbacks.get(event.event_type, []):
+            callback(event)
+
+class StandInSnapshot(weewx.snapshot.StdSnapshot):
+    """A StdSnapshot whose daily summaries are kept in a dictionary, instead
+    of a database."""
+    def __init__(self, engine, config_dict, day_summaries):
+        self.day_summaries = day_summaries
+        self.reads = 0
+        weewx.snapshot.StdSnapshot.__init__(self, engine, config_dict)
+
+    def _get_day_summary(self, time_ts):
+        self.reads += 1
+        day_accum = weewx.accum.Accum(weeutil.weeutil.archiveDaySpan(time_ts))
+        for obs_type in OBS_TYPES:
+            day_accum.set_stats(obs_type, self.day_summaries.get((day_accum.timespan.start, obs_type)))
+        return day_accum
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        syslog.openlog('test_snapshot', syslog.LOG_CONS)
+        syslog.setlogmask(syslog.LOG_UPTO(syslog.LOG_INFO))
+        if not os.path.exists(test_root):
+            os.makedirs(test_root)
+        self.path = os.path.join(test_root, 'snapshot')
+
+    def test_write_read(self):
+        writer = SnapshotWriter(self.path, OBS_TYPES)
+        reader = SnapshotReader(self.path)
+        self.assertEqual(reader.obs_types, OBS_TYPES)
+        snapshot = reader.read()
+        self.assertEqual((snapshot['loop'], snapshot['archive'], snapshot['day_span']), (None, None, None))
+        self.assertEqual(snapshot['day']['outTemp']['max'], None)
+
+        writer.set_loop(make_packet(start_ts, outTemp=68.5, outHumidity=None, barometer=30.01, extraTemp1=12.0))
+        day_accum = weewx.accum.Accum(weeutil.weeutil.archiveDaySpan(start_ts))
+        day_accum.addRecord(make_packet(start_ts, outTemp=68.5, windSpeed=5.0, windDir=270.0), weight=300)
+        writer.set_day(day_accum)
+        writer.publish()
+        snapshot = reader.read()
+        self.assertEqual(snapshot['loop'], {'dateTime': start_ts, 'usUnits': weewx.US, 'outTemp': 68.5,
+                                            'outHumidity': None, 'barometer': 30.01, 'windSpeed': None,
+                                            'rain': None})
+        self.assertEqual(snapshot['archive'], None)
+        self.assertEqual(snapshot['day_span'], day_accum.timespan)
+        self.assertEqual(snapshot['day']['outTemp'],
+                         dict(zip(weewx.snapshot.STATS, day_accum['outTemp'].getStatsTuple())))
+        self.assertEqual(snapshot['day']['windSpeed']['max'], 5.0)
+        self.assertEqual(snapshot['day']['rain']['count'], None)
+        writer.close()
+        reader.close()
+
+    def test_consistency(self):
+        # A reader never sees a snapshot that is only partly written
+        obs_types = ['obs%d' % i for i in range(50)]
+        writer = SnapshotWriter(self.path, obs_types)
+        writer.set_loop(make_packet(0, **dict((obs_type, 0) for obs_type in obs_types)))
+        writer.set_archive(make_packet(0, **dict((obs_type, 0) for obs_type in obs_types)))
+        writer.publish()
+        stop = threading.Event()
+        def write():
+            i = 0
+            while not stop.isSet():
+                i += 1
+                writer.set_loop(make_packet(i, **dict((obs_type, i) for obs_type in obs_types)))
+                writer.set_archive(make_packet(i, **dict((obs_type, i) for obs_type in obs_types)))
+                writer.publish()
+        writer_thread = threading.Thread(target=write)
+        writer_thread.start()
+        try:
+            reader = SnapshotReader(self.path)
+            seqs = set()
+            for _ in range(2000):
+                values, seq = reader.read_values()
+                self.assertEqual(seq % 2, 0)
+                self.assertEqual(len(set(values[:2 * 52]) - set([weewx.US])), 1)
+                seqs.add(seq)
+            # ... while the writer is writing them
+            self.assertTrue(len(seqs) > 1)
+        finally:
+            stop.set()
+            writer_thread.join()
+
+    def test_bad_file(self):
+        with open(self.path, 'wb') as f:
+            f.write('\0' * 64)
+        self.assertRaises(weewx.WeeWxIOError, SnapshotReader, self.path)
+
+    def test_service(self):
+        sod_ts = weeutil.weeutil.startOfArchiveDay(start_ts)
+        day_summaries = {(sod_ts, 'outTemp'): (50.0, sod_ts + 3600, 70.0, start_ts - 600, 6000.0, 100, 1800000.0, 30000)}
+        engine = StandInEngine()
+        config_dict = {'WEEWX_ROOT': test_root,
+                       'StdSnapshot': {'snapshot_file': 'snapshot',
+                                       'observations': OBS_TYPES}}
+        service = StandInSnapshot(engine, config_dict, day_summaries)
+        self.assertEqual(service.snapshot_file, self.path)
+        # At startup, the statistics of today are read
+        engine.dispatchEvent(weewx.Event(weewx.STARTUP))
+        reader = SnapshotReader(self.path)
+        snapshot = reader.read()
+        self.assertTrue(snapshot['day_span'].includesArchiveTime(time.time()))
+        self.assertEqual(service.reads, 1)
+        # ... but these tests are of a day in the past
+        service._set_day(service._get_day_summary(start_ts))
+        service.writer.publish()
+        snapshot = reader.read()
+        self.assertEqual(snapshot['day']['outTemp']['max'], 70.0)
+        self.assertEqual(snapshot['day_span'].start, sod_ts)
+
+        # A LOOP packet sets a new high
+        packet = make_packet(start_ts + 2, outTemp=71.0)
+        engine.dispatchEvent(weewx.Event(weewx.NEW_LOOP_PACKET, packet=packet))
+        snapshot = reader.read()
+        self.assertEqual(snapshot['loop']['outTemp'], 71.0)
+        self.assertEqual((snapshot['day']['outTemp']['max'], snapshot['day']['outTemp']['maxtime']),
+                         (71.0, start_ts + 2))
+        # ... but the sums come from the daily summaries
+        self.assertEqual(snapshot['day']['outTemp']['count'], 100)
+
+        # StdArchive puts the archive record, and the LOOP packets before it,
+        # in the daily summaries. A LOOP packet after it still counts.
+        engine.dispatchEvent(weewx.Event(weewx.NEW_LOOP_PACKET, packet=make_packet(start_ts + 302, outTemp=72.0)))
+        day_summaries[(sod_ts, 'outTemp')] = (50.0, sod_ts + 3600, 71.0, start_ts + 2, 6070.5, 101, 1821150.0, 30300)
+        record = make_packet(start_ts + 300, outTemp=70.5, interval=5)
+        reads = service.reads
+        engine.dispatchEvent(weewx.Event(weewx.NEW_ARCHIVE_RECORD, record=record))
+        self.assertEqual(service.reads, reads + 1)
+        snapshot = reader.read()
+        self.assertEqual(snapshot['archive']['outTemp'], 70.5)
+        self.assertEqual(snapshot['day']['outTemp'],
+                         {'min': 50.0, 'mintime': sod_ts + 3600, 'max': 72.0, 'maxtime': start_ts + 302,
+                          'sum': 6070.5, 'count': 101, 'wsum': 1821150.0, 'sumtime': 30300})
+        self.assertEqual(service.recent_packets, [make_packet(start_ts + 302, outTemp=72.0)])
+
+        # The first LOOP packet of a new day starts a new day, without
+        # reading the database
+        next_day_ts = weeutil.weeutil.archiveDaySpan(start_ts).stop + 10
+        engine.dispatchEvent(weewx.Event(weewx.NEW_LOOP_PACKET, packet=make_packet(next_day_ts, outTemp=60.0)))
+        self.assertEqual(service.reads, reads + 1)
+        snapshot = reader.read()
+        self.assertEqual(snapshot['day_span'].start, next_day_ts - 10)
+        self.assertEqual((snapshot['day']['outTemp']['min'], snapshot['day']['outTemp']['max']), (60.0, 60.0))
+        self.assertEqual(snapshot['day']['outTemp']['count'], 0)
+        # The archive record at midnight belongs to the day before, but the
+        # snapshot stays with the new day
+        engine.dispatchEvent(weewx.Event(weewx.NEW_ARCHIVE_RECORD, record=make_packet(next_day_ts - 10, outTemp=61.0)))
+        snapshot = reader.read()
+        self.assertEqual(snapshot['day_span'].start, next_day_ts - 10)
+        self.assertEqual(snapshot['day']['outTemp']['max'], 60.0)
+        service.shutDown()
+        reader.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+#
+#    Copyright (c) 2009-2017 Tom Keffer <tkeffer@gmail.com>
+#
+#    See the file LICENSE.txt for your full rights.
+#
+"""Test reading the logger of a TE923 station, against a stand-in for the
+station."""
+
+import imp
+import random
+import sys
+import syslog
+import threading
+import time
+import unittest
+
+try:
+    import usb
+except ImportError:
+    # The tests bring their own station, so all they need from pyusb is its
+    # exception class
+    usb = imp.new_module('usb')
+    class USBError(IOError):
+        pass
+    usb.USBError = USBError
+    sys.modules['usb'] = usb
+
+import weewx
+from weewx.drivers.te923 import TE923Station, bcd2int, decode
+
+def int2bcd(i):
+    return (i // 10) * 0x10 + i % 10
+
+def make_memory(nrec, next_index, end_ts, seed=1):
+    """The memory of a large logger, with nrec records, one every 5 minutes
+    up to end_ts, the latest of them just before next_index."""
+    rnd = random.Random(seed)
+    memory = [0xff] * (4096 * 0x20)
+    memory[0xfc] = 2                    # large memory
+    memory[0xfd] = next_index >> 8
+    memory[0xfe] = 1                    # archive interval of 5 minutes
+    memory[0xff] = next_index & 0xff
+    for k in range(nrec):
+        idx = (next_index - 1 - k) % 3442
+        addr = TE923Station.START_ADDRESS + idx * TE923Station.RECORD_SIZE
+        tt = time.localtime(end_ts - k * 300)
+        memory[addr:addr + 4] = [tt.tm_mon, int2bcd(tt.tm_mday),
+                                 int2bcd(tt.tm_hour), int2bcd(tt.tm_min)]
+        for i in range(4, TE923Station.RECORD_SIZE):
+            memory[addr + i] = rnd.randint(0, 0xff)
+    return memory
+
+
+class StandInStation(TE923Station):
+    """A TE923 station whose logger memory is a list of bytes.
+
+    Each read takes read_delay seconds. errors maps an address to how many
+    times reading it fails before it succeeds."""
+
+    def __init__(self, memory, read_delay=0, errors=None, **kwargs):
+        TE923Station.__init__(self, retry_wait=0, **kwargs)
+        self.memory = memory
+        self.read_delay = read_delay
+        self.errors = errors or dict()
+        self.reads = []
+        self.read_memory_size()
+
+    def _raw_read(self, addr):
+        if self.read_delay:
+            time.sleep(self.read_delay)
+        if self.errors.get(addr):
+            self.errors[addr] -= 1
+            raise usb.USBError('Pipe error')
+        self.reads.append(addr)
+        buf = [0x5a] + self.memory[addr:addr + 0x20]
+        buf += [0xff] * (33 - len(buf))
+        crc = 0x00
+        for x in buf:
+            crc ^= x
+        return buf + [crc]
+
+
+def old_gen_records(station, since_ts, requested):
+    """The records, read and decoded the way the driver used to: with a read
+    at the address of each record, then another 16 bytes on."""
+    tt = time.localtime()
+    oldest_addr, count = station._get_starting_addr(requested)
+    for n in range(count):
+        addr = oldest_addr + n * station.RECORD_SIZE
+        if addr < station.START_ADDRESS:
+            addr += station._num_rec * station.RECORD_SIZE
+        buf = station._read(addr)
+        if buf[1] == 0xff:
+            continue
+        year = tt.tm_year
+        month = buf[1] & 0x0f
+        if month > tt.tm_mon:
+            year -= 1
+        ts = time.mktime((year, month, bcd2int(buf[2]), bcd2int(buf[3]),
+                          bcd2int(buf[4]), 0, 0, 0, -1))
+        tmpbuf = buf[5:16]
+        tmpbuf.extend(station._read(addr + 0x10)[1:22])
+        data = decode(tmpbuf)
+        data['dateTime'] = int(ts)
+        if data['dateTime'] > since_ts:
+            yield data
+
+
+class TE923RecordsTest(unittest.TestCase):
+
+    def setUp(self):
+        syslog.openlog('test_te923', syslog.LOG_CONS)
+        syslog.setlogmask(syslog.LOG_UPTO(syslog.LOG_INFO))
+        self.end_ts = int(time.time() / 300) * 300 - 300
+
+    def check_records(self, memory, since_ts, requested, read_ahead=0):
+        station = StandInStation(memory, read_ahead=read_ahead)
+        records = list(station.gen_records(since_ts, requested))
+        expected = list(old_gen_records(StandInStation(memory), since_ts, requested))
+        self.assertEqual(records, expected)
+        return station, records
+
+    def test_records(self):
+        # The latest records wrap around the end of memory
+        memory = make_memory(3442, 1000, self.end_ts)
+        station, records = self.check_records(memory, 0, 1500)
+        self.assertEqual(len(records), 1500)
+        self.assertEqual(records[-1]['dateTime'], self.end_ts)
+        # Most blocks hold parts of two records, and are read once
+        self.assertTrue(len(station.reads) < 1.3 * 1500)
+        self.assertEqual(len(station.reads), len(set(station.reads)))
+        station, records = self.check_records(memory, self.end_ts - 3600, None)
+        self.assertEqual(len(records), 12)
+
+    def test_partly_filled(self):
+        # Records that have never been written are skipped
+        memory = make_memory(100, 100, self.end_ts)
+        station, records = self.check_records(memory, 0, 200)
+        self.assertEqual(len(records), 100)
+
+    def test_read_ahead(self):
+        memory = make_memory(3442, 3000, self.end_ts)
+        station, records = self.check_records(memory, 0, None, read_ahead=8)
+        self.assertEqual(len(records), 3442)
+        self.assertEqual(len(station.reads), len(set(station.reads)))
+
+    def test_close_early(self):
+        memory = make_memory(3442, 3000, self.end_ts)
+        station = StandInStation(memory, read_ahead=8)
+        gen = station.gen_records(0, 1000)
+        for _ in range(10):
+            gen.next()
+        gen.close()
+        # The reader has stopped, and got no further than it was allowed
+        self.assertFalse([t for t in threading.enumerate() if t.name == 'TE923Reader'])
+        reads = len(station.reads)
+        self.assertTrue(reads < 3 + 2 * (10 + 8 + 2))
+        time.sleep(0.1)
+        self.assertEqual(len(station.reads), reads)
+
+    def test_errors(self):
+        memory = make_memory(3442, 1000, self.end_ts)
+        for read_ahead in (0, 8):
+            # A read that fails is tried again
+            station = StandInStation(memory, read_ahead=read_ahead,
+                                     errors={0x1000: 2, 0x1200: 1})
+            expected = list(old_gen_records(StandInStation(memory), 0, 1500))
+            self.assertEqual(list(station.gen_records(0, 1500)), expected)
+            # ... until it has failed too many times
+            station = StandInStation(memory, read_ahead=read_ahead, max_tries=2,
+                                     errors={0x1000: 2})
+            self.assertRaises(weewx.RetriesExceeded, list, station.gen_records(0, 1500))
+
+
+if __name__ == '__main__':
+    unittest.main()
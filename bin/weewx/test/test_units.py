@@ -7,6 +7,7 @@
 """Test module weewx.units"""
 
 import unittest
+import locale
 import operator
 
 import weewx.units
@@ -91,7 +92,77 @@ class ConverterTest(unittest.TestCase):
         self.assertRaises(KeyError, c.convert, d_m)
         d_m['outTemp'] = (20.01, 'degree_C', 'group_foo')
         self.assertRaises(KeyError, c.convert, d_m)
-        
+
+    def testConvertDictPlan(self):
+        # The cached conversion plan must give the same results as
+        # converting each type on its own
+        d_m = {'dateTime'  : 194758100,
+               'outTemp'   : 20.01,
+               'dewpoint'  : None,
+               'barometer' : 1002.3,
+               'rain'      : [1.0, None, 2.5],
+               'fooBar'    : 7,
+               'usUnits'   : weewx.METRIC}
+        c = weewx.units.Converter()
+        for i in range(2):
+            d_test = c.convertDict(d_m)
+            self.assertEqual(sorted(d_test), sorted(k for k in d_m if k != 'usUnits'))
+            for obs_type in d_test:
+                self.assertEqual(d_test[obs_type],
+                                 c.convert(weewx.units.as_value_tuple(d_m, obs_type))[0])
+        # Types that need no conversion are left out of the plan
+        self.assertEqual(sorted(t for t, _ in c._get_plan(d_m)), ['barometer', 'dewpoint', 'outTemp', 'rain'])
+
+        # A type given a unit group after the plan was made
+        weewx.units.obs_group_dict['fooBar'] = 'group_temperature'
+        try:
+            self.assertAlmostEqual(c.convertDict(d_m)['fooBar'], 44.6)
+        finally:
+            del weewx.units.obs_group_dict['fooBar']
+        self.assertEqual(c.convertDict(d_m)['fooBar'], 7)
+
+    def testChangedUnits(self):
+        # Changes made to the unit dictionaries after the first conversion
+        # must not be hidden by what the converter has cached
+        d_m = {'dateTime': 194758100, 'outTemp': 20.0, 'barometer': 1002.3, 'usUnits': weewx.METRIC}
+        c = weewx.units.Converter()
+        self.assertAlmostEqual(c.convertDict(d_m)['outTemp'], 68.0)
+        self.assertAlmostEqual(c.convert((20.0, 'degree_C', 'group_temperature'))[0], 68.0)
+        # A type re-assigned to another group
+        weewx.units.obs_group_dict['outTemp'] = 'group_percent'
+        try:
+            self.assertEqual(c.convertDict(d_m)['outTemp'], 20.0)
+        finally:
+            weewx.units.obs_group_dict['outTemp'] = 'group_temperature'
+        self.assertAlmostEqual(c.convertDict(d_m)['outTemp'], 68.0)
+        # A conversion replaced, or added for a new unit
+        conversions = weewx.units.conversionDict['degree_C']
+        degree_C_to_F = conversions['degree_F']
+        conversions['degree_F'] = lambda x: 0.0
+        try:
+            self.assertEqual(c.convertDict(d_m)['outTemp'], 0.0)
+            self.assertEqual(c.convert((20.0, 'degree_C', 'group_temperature'))[0], 0.0)
+        finally:
+            conversions['degree_F'] = degree_C_to_F
+        self.assertAlmostEqual(c.convert((20.0, 'degree_C', 'group_temperature'))[0], 68.0)
+        weewx.units.conversionDict['mbar_x10'] = {'inHg': lambda x: x / 10.0 * weewx.units.INHG_PER_MBAR}
+        try:
+            self.assertAlmostEqual(c.convert((10023.0, 'mbar_x10', 'group_pressure'))[0],
+                                   c.convertDict(d_m)['barometer'])
+        finally:
+            del weewx.units.conversionDict['mbar_x10']
+        # The target unit of a group changed
+        c_us = weewx.units.StdUnitConverters[weewx.US]
+        self.assertEqual(c_us.convert((20.0, 'degree_C', 'group_temperature'))[1], 'degree_F')
+        weewx.units.USUnits['group_temperature'] = 'degree_C'
+        try:
+            self.assertEqual(c_us.convert((20.0, 'degree_C', 'group_temperature')),
+                             (20.0, 'degree_C', 'group_temperature'))
+            self.assertEqual(weewx.units.to_US(d_m)['outTemp'], 20.0)
+        finally:
+            weewx.units.USUnits['group_temperature'] = 'degree_F'
+        self.assertAlmostEqual(weewx.units.to_US(d_m)['outTemp'], 68.0)
+
     def testTargetUnits(self):
         c = weewx.units.Converter()
         self.assertEqual(c.getTargetUnit('outTemp'),            ('degree_F', 'group_temperature'))
@@ -147,7 +218,42 @@ class ValueHelperTest(unittest.TestCase):
         # Now try a 'None' value:
         vh = weewx.units.ValueHelper((None, "second", "group_deltatime"))
         self.assertEqual(vh.string(), "   N/A")
-        
+
+    def testFormattingPlans(self):
+        # Formatting the same unit again must use the same plan, and give the
+        # same results for each value
+        f = weewx.units.Formatter()
+        c = weewx.units.Converter()
+        for i in range(2):
+            self.assertEqual(str(weewx.units.ValueHelper((1.0, "inch", "group_rain"), formatter=f, converter=c)), "1.00 in")
+            self.assertEqual(str(weewx.units.ValueHelper((10.0, "mm", "group_rain"), formatter=f, converter=c)), "0.39 in")
+            self.assertEqual(f.toString((3600, "second", "group_deltatime"), addLabel=False), "0 days, 1 hour, 0 minutes")
+            self.assertEqual(f.toString((1.0, "hour", "group_elapsed")), "1.0 hour")
+            self.assertEqual(f.toString((2.0, "hour", "group_elapsed")), "2.0 hours")
+            self.assertEqual(f.toString((2.0, "hour", "group_elapsed"), addLabel=False), "2.0")
+            self.assertEqual(f.toString((2.0, "hour", "group_elapsed"), useThisFormat="%.0f"), "2 hours")
+        self.assertEqual(len(f._plans), 5)
+        # Sequences are still converted
+        self.assertEqual(c.convert(([1.0, None], "foot", "group_altitude")), ([1.0, None], "foot", "group_altitude"))
+        self.assertEqual(c.convert(([10.0, None], "mm", "group_rain"))[0][1], None)
+
+    def testLocaleFormat(self):
+        # A compiled format must give the same result as locale.format_string,
+        # including in locales that use a decimal comma
+        localeconv = locale.localeconv
+        for decimal_point in ('.', ','):
+            conv = dict(localeconv(), decimal_point=decimal_point)
+            locale.localeconv = lambda: conv
+            try:
+                for format_string in ('%.1f', '%5.2f', 'T=%.3f mm.', '%d', '%e', '%g', '%s', '%.1f %.1f'):
+                    for val in (68.01, 0, -1.5, 1234567.891):
+                        if format_string == '%.1f %.1f':
+                            val = (val, val)
+                        self.assertEqual(weewx.units.compile_locale_format(format_string)(val),
+                                         locale.format_string(format_string, val))
+            finally:
+                locale.localeconv = localeconv
+
 if __name__ == '__main__':
     unittest.main()
     
@@ -0,0 +1,390 @@
+# -*- coding: utf-8 -*-
+#
+#    Copyright (c) 2009-2015 Tom Keffer <tkeffer@gmail.com>
+#
+#    See the file LICENSE.txt for your full rights.
+#
+"""Test the decoders in module weewx.drivers.vantage, by replaying packets
+through them."""
+
+import os
+import random
+import StringIO
+import struct
+import tempfile
+import threading
+import time
+import unittest
+
+import weewx
+import weewx.drivers.transport as transport
+import weewx.drivers.vantage as vantage
+from weewx.crc16 import crc16
+
+# Raw values that stand for 'no data'
+dash_values = {'B': 0xff, 'H': 0xffff, 'h': 0x7fff}
+
+def random_tuple(rnd, packet_format, fixed):
+    """Return a tuple of raw values for a packet, with some of them null."""
+    values = []
+    for obs_type, obs_fmt in packet_format:
+        if obs_type in fixed:
+            v = fixed[obs_type]
+        elif obs_fmt in dash_values and rnd.random() < 0.1:
+            v = dash_values[obs_fmt]
+        elif obs_fmt == 'B':
+            v = rnd.randint(0, 254)
+        elif obs_fmt == 'H':
+            v = rnd.randint(0, 0xfffe)
+        elif obs_fmt == 'h':
+            v = rnd.randint(-1000, 1200)
+        else:
+            v = rnd.randint(0, 100)
+        values.append(v)
+    return tuple(values)
+
+def gen_loop_stream(rnd, npackets):
+    """Return a LOOP stream, and the raw value tuples that went into it."""
+    data = []
+    tuples = []
+    for i in xrange(npackets):
+        fixed = {'loop': 'LOO', 'loop_type': ord('P') if i % 2 else -20, 'packet_type': 0,
+                 'stormStart': 0x7000 + (12 << 7) + 18 if i % 3 else 0xffff,
+                 'monthRain': 100 + i, 'sunrise': 615, 'sunset': 1842}
+        t = random_tuple(rnd, vantage.loop_format, fixed)
+        body = vantage.loop_fmt.pack(*t) + '\n\r'
+        data.append(body + struct.pack(">H", crc16(body)))
+        tuples.append(t)
+    return ''.join(data), tuples
+
+def gen_archive_stream(rnd, npages, rev):
+    """Return an archive stream of pages with rev A or rev B records."""
+    if rev == 'A':
+        packet_format, fmt = vantage.rec_format_A, vantage.rec_fmt_A
+        fixed = {'leafWet4': 0xff}
+    else:
+        packet_format, fmt = vantage.rec_format_B, vantage.rec_fmt_B
+        fixed = {'download_record_type': 0x00}
+    data = []
+    tuples = []
+    for ipage in xrange(npages):
+        page = [chr(ipage % 256)]
+        for i in xrange(5):
+            fixed['date_stamp'] = 18 + (7 << 5) + (17 << 9)
+            fixed['time_stamp'] = (ipage * 5 + i) % 24 * 100 + 5 * (i % 12)
+            t = random_tuple(rnd, packet_format, fixed)
+            page.append(fmt.pack(*t))
+            tuples.append(t)
+        page = ''.join(page) + 4 * chr(0)
+        data.append(page + struct.pack(">H", crc16(page)))
+    return ''.join(data), tuples
+
+def gen_archive_pages(rnd, nrecords, start_ts, interval=300):
+    """Return pages of rev B records holding nrecords records, one every
+    interval seconds, then unused records to fill the last page."""
+    records = []
+    for i in xrange(nrecords):
+        tt = time.localtime(start_ts + i * interval)
+        fixed = {'download_record_type': 0x00,
+                 'date_stamp': tt[2] + (tt[1] << 5) + ((tt[0] - 2000) << 9),
+                 'time_stamp': tt[3] * 100 + tt[4]}
+        records.append(vantage.rec_fmt_B.pack(*random_tuple(rnd, vantage.rec_format_B, fixed)))
+    while len(records) % 5:
+        records.append(52 * chr(0xff))
+    pages = []
+    for ipage in xrange(len(records) / 5):
+        page = chr(ipage % 256) + ''.join(records[5 * ipage:5 * ipage + 5]) + 4 * chr(0)
+        pages.append(page + struct.pack(">H", crc16(page)))
+    return pages
+
+class SimulatedConsole(vantage.BaseWrapper):
+    """Emulates the responses of a Vantage console to a DMPAFT dump.
+
+    pages: The pages of archive data held by the console.
+
+    bad_pages: A set of page numbers that are corrupted the first time they
+    are sent.
+
+    page_delay: How long it takes to send a page, in seconds."""
+
+    def __init__(self, pages, bad_pages=(), page_delay=0.0):
+        super(SimulatedConsole, self).__init__(wait_before_retry=0, command_delay=0)
+        self.pages = pages
+        self.bad_pages = set(bad_pages)
+        self.page_delay = page_delay
+        self.output = ''
+        self.state = None
+        self.next_page = None
+        self.pages_sent = 0
+        self.lock = threading.Lock()
+
+    def openPort(self):
+        pass
+
+    def closePort(self):
+        pass
+
+    def flush_input(self):
+        self.output = ''
+
+    def queued_bytes(self):
+        return len(self.output)
+
+    def read(self, chars=1):
+        if len(self.output) < chars:
+            self.output = ''
+            raise weewx.WeeWxIOError("Expected to read %d chars" % chars)
+        _buffer, self.output = self.output[:chars], self.output[chars:]
+        return _buffer
+
+    def write(self, data):
+        if data == '\n':
+            self.state = None
+            self.output += '\n\r'
+        elif data == 'DMPAFT\n':
+            self.state = 'date'
+            self.output += vantage._ack
+        elif self.state == 'date':
+            self.output += vantage._ack
+            self._start_dump(data)
+        elif self.state == 'dump' and data in (vantage._ack, vantage._resend):
+            if data == vantage._ack:
+                self.next_page += 1
+            if self.next_page < len(self.pages):
+                self._send_page(self.next_page, data == vantage._resend)
+
+    def _start_dump(self, data):
+        # Find the first record after the requested time
+        datestamp, timestamp = struct.unpack("<HH", data[:4])
+        since_ts = vantage._archive_datetime(datestamp, timestamp) if datestamp else 0
+        index = 0
+        for ipage, page in enumerate(self.pages):
+            for i in xrange(5):
+                rec = page[1 + 52 * i:5 + 52 * i]
+                if rec == 4 * chr(0xff):
+                    break
+                if vantage._archive_datetime(*struct.unpack("<HH", rec)) > since_ts:
+                    break
+                index += 1
+            else:
+                continue
+            break
+        header = struct.pack("<HH", len(self.pages) - index // 5, index % 5)
+        self.output += header + struct.pack(">H", crc16(header))
+        self.state = 'dump'
+        # The first ACK asks for the first page
+        self.next_page = index // 5 - 1
+
+    def _send_page(self, ipage, resend):
+        time.sleep(self.page_delay)
+        page = self.pages[ipage]
+        if ipage in self.bad_pages and not resend:
+            self.bad_pages.discard(ipage)
+            page = chr(ord(page[0]) ^ 0xff) + page[1:]
+        self.pages_sent += 1
+        self.output += page
+
+def dump(console, read_ahead, since_ts=None, delay=0.0):
+    """Dump the records of a simulated console, taking delay seconds with
+    each record. Returns their times."""
+    station = vantage.VantageReplay()
+    station.port = console
+    station.read_ahead = read_ahead
+    station.max_tries = 3
+    records = []
+    for record in station.genArchiveRecords(since_ts):
+        time.sleep(delay)
+        records.append(record['dateTime'])
+    return records
+
+class FakeSerial(object):
+    """Looks like a serial.Serial port connected to a simulated console."""
+
+    def __init__(self, console):
+        self.console = console
+
+    def read(self, chars=1):
+        try:
+            return self.console.read(chars)
+        except weewx.WeeWxIOError:
+            # A serial port returns what it has when it times out
+            return ''
+
+    def write(self, data):
+        self.console.write(data)
+        return len(data)
+
+    def inWaiting(self):
+        return self.console.queued_bytes()
+
+    def flushInput(self):
+        self.console.flush_input()
+
+    def close(self):
+        pass
+
+def reference_decode(packet_format, type_map, data_tuple):
+    """Decode a tuple of raw values the straightforward way."""
+    types = [obs_type for obs_type, _ in packet_format]
+    packet = {}
+    for obs_type, v in zip(types, data_tuple):
+        func = type_map.get(obs_type)
+        if func:
+            val = func(v)
+            if val is not None:
+                packet[obs_type] = val
+    return packet
+
+
+class VantageDecoderTest(unittest.TestCase):
+
+    def test_loop(self):
+        rnd = random.Random(1)
+        for bucket in (0, 1, 2):
+            loop_map, _ = vantage._get_maps(bucket)
+            station = vantage.VantageReplay(rain_bucket_type=bucket)
+            stream, tuples = gen_loop_stream(rnd, 200)
+            packets = list(station.genReplayLoopPackets(StringIO.StringIO(stream)))
+            self.assertEqual(len(packets), len(tuples))
+            for packet, t in zip(packets, tuples):
+                expected = reference_decode(vantage.loop_format, loop_map, t)
+                if t[1] != ord('P'):
+                    expected['trendIcon'] = t[1]
+                for obs_type in ('dateTime', 'usUnits', 'sunrise', 'sunset', 'rain'):
+                    expected[obs_type] = packet[obs_type]
+                self.assertEqual(packet, expected)
+
+    def test_archive(self):
+        rnd = random.Random(2)
+        for bucket in (0, 1, 2):
+            _, archive_map = vantage._get_maps(bucket)
+            station = vantage.VantageReplay(rain_bucket_type=bucket)
+            for rev, packet_format in (('A', vantage.rec_format_A), ('B', vantage.rec_format_B)):
+                stream, tuples = gen_archive_stream(rnd, 20, rev)
+                records = list(station.genReplayArchiveRecords(StringIO.StringIO(stream)))
+                self.assertEqual(len(records), len(tuples))
+                for record, t in zip(records, tuples):
+                    expected = reference_decode(packet_format, archive_map, t)
+                    expected['dateTime'] = vantage._archive_datetime(t[0], t[1])
+                    expected['usUnits'] = weewx.US
+                    expected['interval'] = 5
+                    expected['rxCheckPercent'] = vantage._rxcheck(2, 5, 1, t[9])
+                    self.assertEqual(record, expected)
+
+    def test_crc_error(self):
+        stream, _ = gen_loop_stream(random.Random(3), 2)
+        stream = stream[:150] + chr(ord(stream[150]) ^ 0x01) + stream[151:]
+        station = vantage.VantageReplay()
+        self.assertRaises(weewx.CRCError, list,
+                          station.genReplayLoopPackets(StringIO.StringIO(stream)))
+
+    def test_dmpaft(self):
+        start_ts = int(time.mktime((2017, 7, 1, 0, 0, 0, 0, 0, -1)))
+        pages = gen_archive_pages(random.Random(5), 98, start_ts)
+        expected = [start_ts + 300 * i for i in xrange(98)]
+        for read_ahead in (0, 1, 4):
+            nthreads = threading.activeCount()
+            # Complete dump:
+            self.assertEqual(dump(SimulatedConsole(pages), read_ahead), expected)
+            # Dump of the records after a time:
+            self.assertEqual(dump(SimulatedConsole(pages), read_ahead,
+                                  since_ts=expected[41]), expected[42:])
+            # Bad pages cause the dump to be retried from the last good record:
+            console = SimulatedConsole(pages, bad_pages=(3, 11))
+            self.assertEqual(dump(console, read_ahead), expected)
+            # No reader threads should be left behind
+            self.assertEqual(threading.activeCount(), nthreads)
+
+    def test_dmpaft_stop(self):
+        # A consumer that stops early must stop the reader thread
+        start_ts = int(time.mktime((2017, 7, 1, 0, 0, 0, 0, 0, -1)))
+        pages = gen_archive_pages(random.Random(6), 100, start_ts)
+        nthreads = threading.activeCount()
+        station = vantage.VantageReplay()
+        station.port = SimulatedConsole(pages)
+        station.read_ahead = 4
+        gen = station.genArchiveRecords(None)
+        self.assertEqual(gen.next()['dateTime'], start_ts)
+        gen.close()
+        self.assertEqual(threading.activeCount(), nthreads)
+        self.assertTrue(station.port.pages_sent <= 6)
+
+
+class TransportTest(unittest.TestCase):
+    """Record the traffic of a dump with a console, then replay it."""
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.rec')
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def dump(self, port):
+        station = vantage.VantageReplay()
+        station.port = port
+        station.max_tries = 3
+        return [record['dateTime'] for record in station.genArchiveRecords(None)]
+
+    def test_record_replay(self):
+        start_ts = int(time.mktime((2017, 7, 1, 0, 0, 0, 0, 0, -1)))
+        console = SimulatedConsole(gen_archive_pages(random.Random(8), 48, start_ts),
+                                   bad_pages=(4,))
+
+        # Record a dump from the simulated console:
+        port = vantage.SerialWrapper('/dev/null', 19200, 1.0, 0, 0)
+        port.serial_port = transport.Transport(record=self.path).open(FakeSerial, console)
+        records = self.dump(port)
+        self.assertEqual(records, [start_ts + 300 * i for i in xrange(48)])
+
+        # Replay it, without a console. The serial port is never opened:
+        port = vantage.SerialWrapper('/dev/null', 19200, 1.0, 0, 0,
+                                     transport.Transport(replay=self.path))
+        port.openPort()
+        self.assertTrue(transport.is_replay(port.serial_port))
+        self.assertEqual(self.dump(port), records)
+
+        # Asking for more than was recorded is an error:
+        self.assertRaises(transport.ReplayFinished, self.dump, port)
+
+    def test_errors(self):
+        # Errors are recorded, and replayed
+        class Handle(object):
+            def read(self, n):
+                if n > 2:
+                    raise IOError("too many")
+                return 'x' * n
+        handle = transport.Transport(record=self.path).open(Handle)
+        self.assertEqual(handle.read(2), 'xx')
+        self.assertRaises(IOError, handle.read, 3)
+        handle = transport.Transport(replay=self.path).open(Handle)
+        self.assertEqual(handle.read(2), 'xx')
+        self.assertRaises(IOError, handle.read, 3)
+        self.assertRaises(transport.ReplayFinished, handle.read, 1)
+        # Closing the handle does nothing if it was not recorded. Other
+        # methods that were not called while recording are errors.
+        self.assertEqual(handle.close(), None)
+        self.assertRaises(AttributeError, getattr, handle, 'write')
+        self.assertFalse(hasattr(handle, 'write'))
+
+    def test_attributes(self):
+        # Attribute reads are recorded, each time, and replayed in order
+        class Handle(object):
+            in_waiting = 0
+            def read(self, n):
+                Handle.in_waiting -= n
+                return 'x' * n
+        Handle.in_waiting = 3
+        handle = transport.Transport(record=self.path).open(Handle)
+        reads = []
+        while handle.in_waiting:
+            reads.append(handle.read(1))
+        self.assertEqual(reads, ['x'] * 3)
+        self.assertRaises(AttributeError, getattr, handle, 'timeout')
+        handle = transport.Transport(replay=self.path).open(Handle)
+        self.assertEqual([handle.in_waiting for _ in range(4)], [3, 2, 1, 0])
+        self.assertRaises(transport.ReplayFinished, getattr, handle, 'in_waiting')
+        self.assertRaises(AttributeError, getattr, handle, 'timeout')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,198 @@
+#
+#    Copyright (c) 2009-2017 Tom Keffer <tkeffer@gmail.com>
+#
+#    See the file LICENSE.txt for your full rights.
+#
+"""Test the WMR300 driver against a stand-in for the console."""
+
+from __future__ import with_statement
+import collections
+import imp
+import sys
+import syslog
+import time
+import unittest
+
+try:
+    import usb
+except ImportError:
+    # The tests bring their own device, so all they need from pyusb is its
+    # exception class
+    usb = imp.new_module('usb')
+    class USBError(IOError):
+        def __init__(self, strerror, error_code=None, errno=None):
+            IOError.__init__(self, errno, strerror)
+    usb.USBError = USBError
+    sys.modules['usb'] = usb
+
+from weewx.drivers.wmr300 import Station, WMR300Driver
+
+def make_message(msg_type, length, data):
+    """A message as the console sends it: the type, the length, the data, and
+    a checksum, padded out to the USB message length."""
+    buf = [msg_type, length] + data
+    buf += [0x00] * (length - 2 - len(buf))
+    cs = sum(buf)
+    buf += [cs >> 8, cs & 0xff]
+    return buf + [0x00] * (Station.MESSAGE_LENGTH - len(buf))
+
+def make_57(latest_index):
+    buf = [ord(c) for c in 'WMR300,A004,'] + [0x0e, 0xc1, 0x00, 0x00, 0x2c,
+           latest_index >> 8, latest_index & 0xff, 0x2c, 0x4b, 0x2c, 0x52, 0x2c]
+    return buf + [0x00] * (Station.MESSAGE_LENGTH - len(buf))
+
+# A timestamp, as the console sends it: 2017-05-20 14:31
+TS = [17, 5, 20, 14, 31]
+
+# Packets as captured from a console, one of each type of LOOP data
+PACKETS = [
+    make_message(0xd3, 0x3d, TS + [0x01, 0x00, 0xcd, 0x37, 0x00, 0x6f, 0x00, 0xcd]),
+    make_message(0xd4, 0x36, TS + [0x00, 0x00, 0x1e, 0x00, 0xb4, 0x00, 0x14, 0x00, 0xaa, 0x00, 0x00, 0x00, 0xcd]),
+    make_message(0xd5, 0x28, TS + [0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x2a, 0x00, 0x00]),
+    make_message(0xd6, 0x2e, TS + [0x00, 0x27, 0x9f, 0x27, 0xa9, 0x00, 0x64])]
+
+ACK_73 = [0x41, 0x43, 0x4b, 0x73, 0xe5, 0x0a, 0x26, 0x0e, 0xc1] + [0x00] * 55
+
+
+class StandInConsole(object):
+    """Stands in for the USB handle of a WMR300 console.
+
+    It answers each heartbeat with a 0x57 message, and the initialization
+    with an ACK. Then it sends its packets, one every interval seconds. Like
+    the console, a read blocks until there is something to read, or the read
+    times out. If no_wait is True, a read with nothing to read reports 'No
+    data available' at once instead, as some versions of libusb do."""
+
+    def __init__(self, packets, interval, latest_index=0x0030, no_wait=False):
+        self.packets = collections.deque(packets)
+        self.interval = interval
+        self.latest_index = latest_index
+        self.no_wait = no_wait
+        self.replies = collections.deque()
+        self.next_ts = None
+        self.reads = 0
+        self.heartbeats = []
+
+    def interruptWrite(self, ep, buf, timeout):
+        if buf[0] == 0xa6:
+            self.heartbeats.append(time.time())
+            self.replies.append(make_57(self.latest_index))
+        elif buf[0] == 0x73:
+            self.replies.append(ACK_73)
+            self.next_ts = time.time() + self.interval
+        return len(buf)
+
+    def interruptRead(self, ep, length, timeout):
+        self.reads += 1
+        if self.replies:
+            return self.replies.popleft()
+        wait = self.next_ts - time.time() if self.next_ts and self.packets else None
+        if wait is not None and wait <= 0:
+            self.next_ts += self.interval
+            return self.packets.popleft()
+        if self.no_wait:
+            raise usb.USBError('No data available')
+        if wait is not None and wait <= timeout / 1000.0:
+            time.sleep(wait)
+            self.next_ts += self.interval
+            return self.packets.popleft()
+        time.sleep(timeout / 1000.0)
+        raise usb.USBError('Connection timed out', errno=110)
+
+    def reset(self):
+        pass
+
+    def claimInterface(self, interface):
+        pass
+
+    def releaseInterface(self):
+        pass
+
+
+class StandInDevice(object):
+    def __init__(self, console):
+        self.console = console
+
+    def open(self):
+        return self.console
+
+
+class WMR300Test(unittest.TestCase):
+
+    def setUp(self):
+        syslog.openlog('test_wmr300', syslog.LOG_CONS)
+        syslog.setlogmask(syslog.LOG_UPTO(syslog.LOG_INFO))
+        self.find_dev = Station.__dict__['_find_dev']
+
+    def tearDown(self):
+        Station._find_dev = self.find_dev
+
+    def get_driver(self, console):
+        Station._find_dev = staticmethod(lambda vendor_id, product_id: StandInDevice(console))
+        return WMR300Driver()
+
+    def get_packets(self, driver, n):
+        packets = []
+        for packet in driver.genLoopPackets():
+            packets.append((time.time(), packet))
+            if len(packets) >= n:
+                break
+        return packets
+
+    def test_loop_packets(self):
+        console = StandInConsole(PACKETS * 3, 0.1)
+        driver = self.get_driver(console)
+        reads = console.reads
+        t1 = time.time()
+        c1 = time.clock()
+        packets = self.get_packets(driver, len(PACKETS) * 3)
+        cpu = time.clock() - c1
+        self.assertEqual(packets[0][1]['outTemp'], 20.5)
+        self.assertEqual(packets[0][1]['outHumidity'], 55)
+        self.assertEqual(packets[1][1]['windSpeed'], 2.0)
+        self.assertEqual(packets[1][1]['windDir'], 170)
+        self.assertAlmostEqual(packets[3][1]['barometer'], 1015.3)
+        # Each packet is read as soon as it is sent, with one read
+        self.assertEqual(console.reads - reads, len(PACKETS) * 3)
+        for i, (ts, _) in enumerate(packets):
+            self.assertTrue(ts - (t1 + (i + 1) * 0.1) < 0.05)
+        # Waiting for the packets takes next to no processor time
+        self.assertTrue(cpu < 0.5 * (time.time() - t1))
+
+    def test_no_data_at_once(self):
+        # Some libusb versions do not wait for the timeout
+        console = StandInConsole(PACKETS, 0.2, no_wait=True)
+        driver = self.get_driver(console)
+        reads = console.reads
+        packets = self.get_packets(driver, len(PACKETS))
+        self.assertEqual(len(packets), len(PACKETS))
+        # Polling, but not spinning
+        self.assertTrue(console.reads - reads < 2 * len(PACKETS) * 0.2 / driver.idle_wait)
+
+    def test_heartbeat(self):
+        console = StandInConsole(PACKETS * 10, 0.1, latest_index=0x7000)
+        driver = self.get_driver(console)
+        driver.heartbeat = 0.25
+        dumps = []
+        driver.dump_history = lambda: dumps.append(time.time())
+        self.get_packets(driver, len(PACKETS) * 2)
+        # A heartbeat every 0.25 seconds, for 0.8 seconds of packets
+        self.assertTrue(3 <= len(console.heartbeats) <= 5)
+        for t1, t2 in zip(console.heartbeats, console.heartbeats[1:]):
+            self.assertTrue(0.2 < t2 - t1 < 0.4)
+        # The history is over the limit, so each reply to a heartbeat,
+        # including the one at startup, clears it
+        self.assertEqual(len(dumps), len(console.heartbeats))
+
+    def test_heartbeat_between_packets(self):
+        # A read that is waiting for a packet must not hold up the heartbeat
+        console = StandInConsole(PACKETS, 1.0)
+        driver = self.get_driver(console)
+        driver.heartbeat = 0.2
+        heartbeats = len(console.heartbeats)
+        self.get_packets(driver, 1)
+        self.assertTrue(4 <= len(console.heartbeats) - heartbeats <= 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+#
+#    Copyright (c) 2009-2017 Tom Keffer <tkeffer@gmail.com>
+#
+#    See the file LICENSE.txt for your full rights.
+#
+"""Test the decoders of the frames sent by a WS28xx station."""
+
+from datetime import datetime
+import imp
+import random
+import sys
+import syslog
+import time
+import unittest
+
+try:
+    import usb
+except ImportError:
+    # The decoders do not need pyusb
+    sys.modules['usb'] = imp.new_module('usb')
+
+import weewx.drivers.ws28xx as ws28xx
+from weewx.drivers.ws28xx import USBHardware, CWeatherTraits
+
+# The 'no data' and overflow values that make the time of a measurement None
+invalid_values = {'temperature': (CWeatherTraits.TemperatureNP(), CWeatherTraits.TemperatureOFL()),
+                  'humidity':    (CWeatherTraits.HumidityNP(), CWeatherTraits.HumidityOFL()),
+                  'windspeed':   (CWeatherTraits.WindNP(), CWeatherTraits.WindOFL())}
+
+def get_attr(obj, attr):
+    for name in attr.split('.'):
+        obj = getattr(obj, name)
+    return obj
+
+def set_attr(obj, attr, value):
+    names = attr.split('.')
+    for name in names[:-1]:
+        obj = getattr(obj, name)
+    setattr(obj, names[-1], value)
+
+def reference_decode(buf, obj, layout):
+    """Decode the fields of a frame one at a time, with the functions of
+    USBHardware, the way the driver used to."""
+    kinds = {}
+    for field in layout:
+        attr, kind, start, hi = field[:4]
+        kinds[attr] = kind
+        if kind == 'nibble':
+            value = buf[0][start] >> 4 if hi else buf[0][start] & 0xF
+        elif kind == 'windspeed_6_2':
+            value = USBHardware.toWindspeed_6_2(buf, start)
+        elif kind in ('datetime', 'datetime_if_valid'):
+            value = USBHardware.toDateTime(buf, start, hi, field[4])
+            if kind == 'datetime_if_valid':
+                value_attr = attr.rsplit('.', 1)[0] + '._Value'
+                if get_attr(obj, value_attr) in invalid_values[kinds[value_attr].split('_')[0]]:
+                    value = None
+        else:
+            value = getattr(USBHardware, 'to' + kind[0].upper() + kind[1:])(buf, start, hi)
+        set_attr(obj, attr, value)
+
+def gen_frame(rnd, layout, length=0x131):
+    """A frame of random nibbles, mostly decimal digits, with dates that are
+    mostly valid where the layout has dates."""
+    nibbles = []
+    for i in xrange(2 * length):
+        r = rnd.random()
+        if r < 0.02:
+            nibbles.append(rnd.choice('abcde'))
+        elif r < 0.04:
+            nibbles.append('f')
+        else:
+            nibbles.append(str(rnd.randint(0, 9)))
+    for field in layout:
+        if field[1].startswith('datetime') and rnd.random() < 0.9:
+            n = 2 * field[2] + (0 if field[3] else 1)
+            nibbles[n:n + 10] = '%02d%02d%02d%02d%02d' % (rnd.randint(0, 99), rnd.randint(1, 12),
+                                                          rnd.randint(1, 28), rnd.randint(0, 23),
+                                                          rnd.randint(0, 59))
+    return [int(''.join(nibbles[2 * i:2 * i + 2]), 16) for i in xrange(length)]
+
+def gen_corpus(seed, nframes, layout):
+    rnd = random.Random(seed)
+    return [gen_frame(rnd, layout) for _ in xrange(nframes)]
+
+def make_frame(fields, length=0x131):
+    """A frame of '1' nibbles, which make valid dates, with the fields given
+    as (byte, StartOnHiNibble, hex digits) put in."""
+    nibbles = ['1'] * (2 * length)
+    for start, hi, digits in fields:
+        n = 2 * start + (0 if hi else 1)
+        nibbles[n:n + len(digits)] = digits
+    return [int(''.join(nibbles[2 * i:2 * i + 2]), 16) for i in xrange(length)]
+
+
+class WS28xxDecoderTest(unittest.TestCase):
+
+    def setUp(self):
+        syslog.openlog('test_ws28xx', syslog.LOG_CONS)
+        # Bogus dates in the corpus are reported as errors
+        syslog.setlogmask(syslog.LOG_UPTO(syslog.LOG_CRIT))
+
+    def check_corpus(self, cls, layout, corpus):
+        for frame in corpus:
+            obj = cls()
+            obj.read([list(frame)])
+            ref = cls()
+            reference_decode([list(frame)], ref, layout)
+            for field in layout:
+                value = get_attr(obj, field[0])
+                expected = get_attr(ref, field[0])
+                # The same value, to the last bit, and of the same type
+                self.assertEqual((repr(value), type(value)), (repr(expected), type(expected)))
+
+    def test_current_weather_corpus(self):
+        self.check_corpus(ws28xx.CCurrentWeatherData, ws28xx._current_weather_layout,
+                          gen_corpus(1, 500, ws28xx._current_weather_layout))
+
+    def test_history_corpus(self):
+        self.check_corpus(ws28xx.CHistoryData, ws28xx._history_layout,
+                          gen_corpus(2, 2000, ws28xx._history_layout))
+
+    def test_current_weather(self):
+        frame = make_frame([(8, 1, '12'),
+                            (24, 0, '62350'),          # indoor temperature
+                            (22, 1, 'aaaaa'),          # indoor minimum temperature
+                            (37, 0, '65125'),          # outdoor maximum temperature
+                            (27, 0, '1705201431'),     # ... and its time
+                            (106, 1, '55'),            # outdoor humidity
+                            (93, 1, 'ff'),             # indoor humidity
+                            (156, 0, '0012345'),       # total rain
+                            (162, 1, '35'),            # wind directions
+                            (172, 1, '000a00'),        # wind speed
+                            (210, 1, '02992'),         # pressure in inHg
+                            (212, 0, '10132')])        # ... and in hPa
+        data = ws28xx.CCurrentWeatherData()
+        data.read([frame])
+        self.assertEqual(data._WeatherTendency, 1)
+        self.assertEqual(data._WeatherState, 2)
+        self.assertAlmostEqual(data._TempIndoor, 22.35)
+        self.assertEqual(data._TempIndoorMinMax._Min._Value, CWeatherTraits.TemperatureNP())
+        self.assertTrue(data._TempIndoorMinMax._Min._IsError)
+        self.assertEqual(data._TempIndoorMinMax._Min._Time, None)
+        self.assertAlmostEqual(data._TempOutdoorMinMax._Max._Value, 25.125)
+        self.assertEqual(data._TempOutdoorMinMax._Max._Time, datetime(2017, 5, 20, 14, 31))
+        self.assertEqual(data._HumidityOutdoor, 55)
+        self.assertEqual(data._HumidityIndoor, CWeatherTraits.HumidityOFL())
+        self.assertAlmostEqual(data._RainTotal, 12.345)
+        self.assertEqual((data._WindDirection, data._WindDirection1), (5, 3))
+        self.assertAlmostEqual(data._WindSpeed, 0.1)
+        self.assertAlmostEqual(data._PressureRelative_inHg, 29.92)
+        self.assertAlmostEqual(data._PressureRelative_hPa, 1013.2)
+        self.assertEqual(data._PressureRelative_hPaMinMax._Min._Time, datetime(2011, 11, 11, 11, 11))
+
+    def test_history(self):
+        frame = make_frame([(12, 0, '01e'),                # gust
+                            (14, 1, '5'),                  # gust and wind direction
+                            (16, 1, 'ffe'),                # rain
+                            (22, 1, '623'),                # outdoor temperature
+                            (25, 1, '1705201430')])
+        data = ws28xx.CHistoryData()
+        data.read([frame])
+        self.assertAlmostEqual(data.Gust, 10.8)
+        self.assertEqual(data.GustDirection, 5)
+        self.assertEqual(data.RainCounterRaw, CWeatherTraits.RainNP())
+        self.assertAlmostEqual(data.TempOutdoor, 22.3)
+        self.assertEqual(data.Time, datetime(2017, 5, 20, 14, 30))
+        self.assertEqual(data.asDict()['dateTime'], time.mktime((2017, 5, 20, 14, 30, 0, 0, 0, -1)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,10 +8,12 @@
 """Data structures and functions for dealing with units."""
 
 import locale
+import re
 import time
 import syslog
 
 import weewx
+import weewx.packet
 import weeutil.weeutil
 from weeutil.weeutil import ListOfDicts
 
@@ -43,6 +45,69 @@ class UnknownType(object):
     def __init__(self, obs_type):
         self.obs_type = obs_type
 
+# Converters cache what they work out from obs_group_dict, the unit systems
+# and conversionDict below. Any change made to those dictionaries bumps this
+# version, and the converters then start over.
+_version = 0
+
+def _changed():
+    global _version
+    _version += 1
+
+class _TracksChanges(object):
+    """Mixin for a dictionary that bumps the version whenever it is
+    changed."""
+
+    def __setitem__(self, key, value):
+        super(_TracksChanges, self).__setitem__(key, value)
+        _changed()
+
+    def __delitem__(self, key):
+        super(_TracksChanges, self).__delitem__(key)
+        _changed()
+
+    def clear(self):
+        super(_TracksChanges, self).clear()
+        _changed()
+
+    def pop(self, *args):
+        _changed()
+        return super(_TracksChanges, self).pop(*args)
+
+    def popitem(self):
+        _changed()
+        return super(_TracksChanges, self).popitem()
+
+    def setdefault(self, key, default=None):
+        if not dict.__contains__(self, key):
+            self[key] = default
+        return dict.__getitem__(self, key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).iteritems():
+            self[key] = value
+
+class _UnitDict(_TracksChanges, dict):
+    pass
+
+class _UnitListOfDicts(_TracksChanges, ListOfDicts):
+
+    def extend(self, new_dict):
+        super(_UnitListOfDicts, self).extend(new_dict)
+        _changed()
+
+class _ConversionDict(_UnitDict):
+    """Conversion functions, keyed by unit type, then by the unit type to
+    convert to. Changes to the dictionaries it holds are tracked too."""
+
+    def __init__(self, conversions):
+        super(_ConversionDict, self).__init__()
+        for unit_type, funcs in conversions.iteritems():
+            dict.__setitem__(self, unit_type, _UnitDict(funcs))
+
+    def __setitem__(self, key, value):
+        super(_ConversionDict, self).__setitem__(key, _UnitDict(value))
+
 unit_constants = {'US'       : weewx.US,
                   'METRIC'   : weewx.METRIC,
                   'METRICWX' : weewx.METRICWX}
@@ -54,7 +119,7 @@ unit_nicknames = {weewx.US       : 'US',
 # This data structure maps observation types to a "unit group"
 # We start with a standard object group dictionary, but users are
 # free to extend it:
-obs_group_dict = ListOfDicts({"altitude"           : "group_altitude",
+obs_group_dict = _UnitListOfDicts({"altitude"           : "group_altitude",
                               "cloudbase"          : "group_altitude",
                               "cooldeg"            : "group_degree_day",
                               "heatdeg"            : "group_degree_day",
@@ -155,7 +220,7 @@ agg_group = {'mintime'    : "group_time",
 
 # This dictionary maps unit groups to a standard unit type in the 
 # US customary unit system:
-USUnits = ListOfDicts({"group_altitude"    : "foot",
+USUnits = _UnitListOfDicts({"group_altitude"    : "foot",
                        "group_amp"         : "amp",
                        "group_count"       : "count",
                        "group_data"        : "byte",
@@ -184,7 +249,7 @@ USUnits = ListOfDicts({"group_altitude"    : "foot",
 
 # This dictionary maps unit groups to a standard unit type in the 
 # metric unit system:
-MetricUnits = ListOfDicts({"group_altitude"    : "meter",
+MetricUnits = _UnitListOfDicts({"group_altitude"    : "meter",
                            "group_amp"         : "amp",
                            "group_count"       : "count",
                            "group_data"        : "byte",
@@ -214,7 +279,7 @@ MetricUnits = ListOfDicts({"group_altitude"    : "meter",
 # This dictionary maps unit groups to a standard unit type in the 
 # "Metric WX" unit system. It's the same as the "Metric" system,
 # except for rain and speed:
-MetricWXUnits = ListOfDicts(MetricUnits)
+MetricWXUnits = _UnitListOfDicts(MetricUnits)
 MetricWXUnits['group_rain']     = "mm"
 MetricWXUnits['group_rainrate'] = "mm_per_hour"
 MetricWXUnits['group_speed']    = "meter_per_second"
@@ -222,7 +287,7 @@ MetricWXUnits['group_speed2']   = "meter_per_second2"
 
 
 # Conversion functions to go from one unit type to another.
-conversionDict = {
+conversionDict = _ConversionDict({
       'inHg'             : {'mbar'             : lambda x : x / INHG_PER_MBAR, 
                             'hPa'              : lambda x : x / INHG_PER_MBAR,
                             'mmHg'             : lambda x : x * 25.4},
@@ -297,7 +362,7 @@ conversionDict = {
       'bit'              : {'byte'             : lambda x : x / 8},
       'byte'             : {'bit'              : lambda x : x * 8},
       'km'               : {'mile'             : lambda x : x * 0.621371192},
-      'mile'             : {'km'               : lambda x : x * 1.609344}}
+      'mile'             : {'km'               : lambda x : x * 1.609344}})
 
 # Default unit formatting when nothing specified in skin configuration file
 default_unit_format_dict = {"amp"                : "%.1f",
@@ -434,6 +499,10 @@ default_ordinate_names = ['N', 'NNE','NE', 'ENE', 'E', 'ESE', 'SE', 'SSE',
 class ValueTuple(tuple):
     def __new__(cls, *args):
         return tuple.__new__(cls, args)
+    def __getnewargs__(self):
+        # Required so that the binary pickle protocols, which are used when
+        # passing data between processes, can reconstruct a ValueTuple.
+        return tuple(self)
     @property
     def value(self):
         return self[0]
@@ -522,6 +591,8 @@ class Formatter(object):
         # Add new keys for backwards compatibility on old skin dictionaries:
         self.time_format_dict.setdefault('ephem_day', "%H:%M")
         self.time_format_dict.setdefault('ephem_year', "%d-%b-%Y %H:%M")
+        # Formatting plans, keyed by unit, context, and formatting options
+        self._plans = {}
         
     @staticmethod
     def fromSkinDict(skin_dict):
@@ -621,44 +692,70 @@ class Formatter(object):
                 return NONE_string
             else:
                 return self.unit_format_dict.get('NONE', 'N/A')
-            
-        if val_t[1] == "unix_epoch":
+
+        # Templates format the same few units, in the same few ways, over and
+        # over again. So, work out how to format each combination just once.
+        # The decimal point depends on the locale, so localized plans are
+        # kept for each locale.
+        key = (val_t[1], val_t[2], context, addLabel, useThisFormat,
+               localize and locale.setlocale(locale.LC_NUMERIC))
+        try:
+            plan = self._plans[key]
+        except KeyError:
+            plan = self._make_plan(val_t[1], val_t[2], context, addLabel,
+                                   useThisFormat, localize)
+            # Should the keys vary more than expected, keep the cache from
+            # growing without limit.
+            if len(self._plans) >= 1000:
+                self._plans.clear()
+            self._plans[key] = plan
+        return plan(val_t[0])
+
+    def _make_plan(self, unit, unit_group, context, addLabel, useThisFormat, localize):
+        """Return a function that formats a value, which cannot be None, in
+        the given unit and unit group. See toString() for the parameters."""
+        if unit == "unix_epoch":
             # Different formatting routines are used if the value is a time.
             if useThisFormat is not None:
-                val_str = time.strftime(useThisFormat, time.localtime(val_t[0]))
+                time_format = useThisFormat
             else:
-                val_str = time.strftime(self.time_format_dict.get(context, "%d-%b-%Y %H:%M"), time.localtime(val_t[0]))
-        elif val_t[2] == "group_deltatime":
+                time_format = self.time_format_dict.get(context, "%d-%b-%Y %H:%M")
+            format_func = lambda val: time.strftime(time_format, time.localtime(val))
+        elif unit_group == "group_deltatime":
             # Get a delta-time format string. Use a default if the user did not supply one:
             if useThisFormat is not None:
                 format_string = useThisFormat
             else:
                 format_string = self.time_format_dict.get("delta_time", default_time_format_dict["delta_time"])
-            # Now format the delta time, using the function delta_secs_to_string:
-            val_str = self.delta_secs_to_string(val_t[0], format_string)
-            # Return it right away, because it does not take a label
-            return val_str
+            # Format the delta time, using the function delta_secs_to_string.
+            # It does not take a label.
+            delta_secs_to_string = self.delta_secs_to_string
+            return lambda val: delta_secs_to_string(val, format_string)
         else:
             # It's not a time. It's a regular value. Get a suitable
             # format string:
             if useThisFormat is None:
                 # No user-specified format string. Go get one:
-                format_string = self.get_format_string(val_t[1])
+                format_string = self.get_format_string(unit)
             else:
                 # User has specified a string. Use it.
                 format_string = useThisFormat
             if localize:
                 # Localization requested. Use locale with the supplied format:
-                val_str = locale.format_string(format_string, val_t[0])
+                format_func = compile_locale_format(format_string)
             else:
                 # No localization. Just format the string.
-                val_str = format_string % val_t[0]
+                format_func = format_string.__mod__
 
-        # Add a label, if requested:
-        if addLabel:
-            val_str += self.get_label_string(val_t[1], plural=(not val_t[0]==1))
+        if not addLabel:
+            return format_func
 
-        return val_str
+        # Add a label. Look up both versions now.
+        label = self.get_label_string(unit, plural=True)
+        label_singular = self.get_label_string(unit, plural=False)
+        if label == label_singular:
+            return lambda val: format_func(val) + label
+        return lambda val: format_func(val) + (label_singular if val == 1 else label)
 
     def to_ordinal_compass(self, val_t):
         if val_t[0] is None:
@@ -705,6 +802,13 @@ class Converter(object):
         unit type ('mbar')"""
 
         self.group_unit_dict  = group_unit_dict
+        # The target unit type, and conversion function, keyed by unit type
+        # and unit group
+        self._conversions = {}
+        # Conversion plans, keyed by source unit system and observation types
+        self._plans = {}
+        # The version of the unit dictionaries they were worked out from
+        self._version = _version
         
     @staticmethod
     def fromSkinDict(skin_dict):
@@ -757,12 +861,56 @@ class Converter(object):
         """
         if val_t[1] is None and val_t[2] is None:
             return val_t
+        if self._version != _version:
+            self._start_over()
+        try:
+            (new_unit_type, conversion_func) = self._conversions[val_t[1], val_t[2]]
+        except KeyError:
+            (new_unit_type, conversion_func) = self._get_conversion(val_t[1], val_t[2])
+        # If the value is already in the target unit type, then just return it:
+        if conversion_func is None:
+            return val_t
+        val = val_t[0]
+        if val is None:
+            new_val = None
+        elif type(val) in (float, int, long):
+            new_val = conversion_func(val)
+        else:
+            # Try converting a sequence first, as function convert() does
+            try:
+                new_val = map(lambda x : conversion_func(x) if x is not None else None, val)
+            except TypeError:
+                new_val = conversion_func(val)
+        return ValueTuple(new_val, new_unit_type, val_t[2])
+
+    def _get_conversion(self, unit_type, unit_group):
+        """Return the target unit type for a unit type and group, and the
+        function to convert to it, or None if no conversion is needed."""
         # Determine which units (eg, "mbar") this group should be in.
         # If the user has not specified anything, then fall back to US Units.
-        new_unit_type = self.group_unit_dict.get(val_t[2], USUnits[val_t[2]])
-        # Now convert to this new unit type: 
-        new_val_t = convert(val_t, new_unit_type)
-        return new_val_t
+        new_unit_type = self.group_unit_dict.get(unit_group, USUnits[unit_group])
+        if new_unit_type == unit_type:
+            conversion_func = None
+        else:
+            # An exception of type KeyError will occur if the target or source
+            # units are invalid
+            try:
+                conversion_func = conversionDict[unit_type][new_unit_type]
+            except KeyError:
+                if weewx.debug:
+                    syslog.syslog(syslog.LOG_DEBUG, "units: Unable to convert from %s to %s" % (unit_type, new_unit_type))
+                raise
+        if len(self._conversions) >= 100:
+            self._conversions.clear()
+        self._conversions[unit_type, unit_group] = (new_unit_type, conversion_func)
+        return (new_unit_type, conversion_func)
+
+    def _start_over(self):
+        """Forget the conversions and plans worked out so far. Extensions
+        may have changed the unit groups, unit systems or conversions."""
+        self._conversions = {}
+        self._plans = {}
+        self._version = _version
 
     def convertDict(self, obs_dict):
         """Convert an observation dictionary into the target unit system.
@@ -789,14 +937,60 @@ class Converter(object):
          target_dict['barometer'], target_dict['outTemp'])
         dateTime: 194758100, interval: 15, barometer: 30.000, outTemp: 68.000
         """
-        target_dict = {}
-        for obs_type in obs_dict:
-            if obs_type == 'usUnits': continue
-            # Do the conversion, but keep only the first value in
-            # the ValueTuple:
-            target_dict[obs_type] = self.convert(as_value_tuple(obs_dict, obs_type))[0]
+        # The same set of observation types arrives over and over again, so
+        # work out how to convert each type just once, then reuse the plan.
+        plan = self._get_plan(obs_dict)
+        # Keep compact packets compact
+        if isinstance(obs_dict, weewx.packet.CompactPacket):
+            target_dict = obs_dict.copy()
+        else:
+            target_dict = dict(obs_dict)
+        target_dict.pop('usUnits', None)
+        for (obs_type, conversion_func) in plan:
+            val = target_dict[obs_type]
+            if val is None:
+                continue
+            # Try a scalar first. A TypeError exception will occur if the value
+            # is actually a sequence:
+            try:
+                target_dict[obs_type] = conversion_func(val)
+            except TypeError:
+                target_dict[obs_type] = [conversion_func(x) if x is not None else None for x in val]
         return target_dict
-            
+
+    def _get_plan(self, obs_dict):
+        """Return a list of (obs_type, conversion function) pairs that will
+        convert a dictionary with the same unit system and observation types
+        as obs_dict. Types that need no conversion are left out."""
+        if self._version != _version:
+            self._start_over()
+        key = (obs_dict.get('usUnits'), tuple(obs_dict))
+        try:
+            return self._plans[key]
+        except KeyError:
+            pass
+        plan = []
+        for obs_type in key[1]:
+            if obs_type == 'usUnits': continue
+            (unit_type, unit_group) = StdUnitConverters[obs_dict['usUnits']].getTargetUnit(obs_type)
+            if unit_type is None and unit_group is None:
+                continue
+            # Determine which units this group should be in, as convert() does
+            new_unit_type = self.group_unit_dict.get(unit_group, USUnits[unit_group])
+            if new_unit_type == unit_type:
+                continue
+            try:
+                plan.append((obs_type, conversionDict[unit_type][new_unit_type]))
+            except KeyError:
+                if weewx.debug:
+                    syslog.syslog(syslog.LOG_DEBUG, "units: Unable to convert from %s to %s" % (unit_type, new_unit_type))
+                raise
+        # Keys in this cache are not expected to vary much. Should they, keep
+        # the cache from growing without limit.
+        if len(self._plans) >= 100:
+            self._plans.clear()
+        self._plans[key] = plan
+        return plan
             
     def getTargetUnit(self, obs_type, agg_type=None):
         """Given an observation type and an aggregation type, return the 
@@ -1146,6 +1340,36 @@ def getStandardUnitType(target_std_unit_system, obs_type, agg_type=None):
     else:
         return (None, None)
 
+# Matches a conversion specifier in a format string, the same way the locale
+# module does
+_conversion_re = re.compile(r'%(?:\((?P<key>.*?)\))?(?P<modifiers>[-#0-9 +*.hlL]*?)[eEfFgGdiouxXcrs%]')
+
+def compile_locale_format(format_string):
+    """Return a function that formats a value the same way as
+    locale.format_string(format_string, value), in the current locale. Simple
+    format strings, with a single conversion specifier, are parsed just once.
+    
+    Example:
+    >>> f = compile_locale_format("T=%.1f")
+    >>> print f(68.01)
+    T=68.0
+    """
+    conversions = list(_conversion_re.finditer(format_string))
+    if len(conversions) == 1:
+        m = conversions[0]
+        spec = m.group()
+        prefix = format_string[:m.start()]
+        suffix = format_string[m.end():]
+        if m.group('key') is None and '*' not in spec and spec[-1] != '%' \
+                and '%' not in prefix and '%' not in suffix:
+            decimal_point = locale.localeconv()['decimal_point']
+            if spec[-1] not in 'eEfFgG' or decimal_point == '.':
+                # The result is the same as plain string formatting
+                return format_string.__mod__
+            return lambda val: prefix + (spec % val).replace('.', decimal_point) + suffix
+    # Leave anything more complicated to the locale module
+    return lambda val: locale.format_string(format_string, val)
+
 def get_format_string(formatter, converter, obs_type):
     # First convert to the target unit type:
     u = converter.getTargetUnit(obs_type)[0]
@@ -81,6 +81,31 @@ class WXCalculate(object):
         'windrun',
         ]
 
+    # These quantities depend on earlier records, either through state held by
+    # this object or through a database lookup, and must be calculated in
+    # record order. The pressure quantities are kept together as they depend
+    # on each other.
+    history_list = [
+        'pressure',
+        'barometer',
+        'altimeter',
+        'rainRate',
+        'ET',
+        'windrun',
+        ]
+
+    # These quantities depend only on the record itself.
+    independent_list = [
+        'windchill',
+        'heatindex',
+        'dewpoint',
+        'inDewpoint',
+        'maxSolarRad',
+        'cloudbase',
+        'humidex',
+        'appTemp',
+        ]
+
     def __init__(self, config_dict, alt_vt, lat_f, long_f, db_binder=None):
         """Initialize the calculation service.  Sample configuration:
 
@@ -173,11 +198,18 @@ class WXCalculate(object):
         syslog.syslog(syslog.LOG_INFO, "wxcalculate: The following algorithms will be used for calculations: %s" %
                       ', '.join(["%s=%s" % (k, self.algorithms[k]) for k in self.algorithms]))
 
-    def do_calculations(self, data_dict, data_type):
+    def do_calculations(self, data_dict, data_type, obs_list=None):
+        """Add any missing derived quantities to data_dict.
+
+        If obs_list is given only the quantities in obs_list are considered,
+        otherwise all quantities in the dispatch list are considered.
+        Calculations are always done in dispatch list order."""
         if self.ignore_zero_wind:
             self.adjust_winddir(data_dict)
         data_us = weewx.units.to_US(data_dict)
         for obs in self._dispatch_list:
+            if obs_list is not None and obs not in obs_list:
+                continue
             calc = False
             if obs in self.calculations:
                 if self.calculations[obs] == 'software':